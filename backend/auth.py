@@ -1,10 +1,11 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError, jwt
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List, Annotated
+from typing import Optional, Dict, Any, List, Annotated, Sequence
 from datetime import datetime, timedelta, timezone
 import os
+import uuid
 import logging
 from dotenv import load_dotenv
 from passlib.context import CryptContext
@@ -14,6 +15,11 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 # Import utility functions
 from utils.validators import validate_email, validate_password_strength
 from utils.error_handlers import AuthenticationError, ValidationError
+from utils.password_hasher import password_hasher, BCRYPT_ROUNDS
+from utils.token_store import RefreshTokenStore, token_ids
+from utils.token_cache import VerifiedTokenCache
+from utils.fieldsets import mongo_projection, parse_fields
+from utils.prometheus import time_redis
 
 # Load environment variables
 load_dotenv()
@@ -38,9 +44,9 @@ redis_client = None
 # Only attempt Redis connection if enabled
 if REDIS_ENABLED:
     try:
+        # The asyncio client connects lazily; the first refresh verifies the connection
         redis_client = redis.Redis.from_url(REDIS_URL, db=REDIS_DB, decode_responses=True, socket_timeout=2.0)
-        redis_client.ping()  # Test connection with a short timeout
-        logger.info("Successfully connected to Redis")
+        logger.info("Redis client configured for refresh token rotation")
     except redis.ConnectionError as e:
         logger.warning(f"Failed to connect to Redis: {str(e)}")
         logger.warning("Token reuse prevention will be disabled")
@@ -51,11 +57,21 @@ if REDIS_ENABLED:
 else:
     logger.info("Redis disabled by configuration. Token reuse prevention will be disabled.")
 
+refresh_token_store = RefreshTokenStore(redis_client, family_ttl=REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+access_token_cache = VerifiedTokenCache()
+
 # Import the actual get_db dependency function
 from database import get_db
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes whose cost differs from BCRYPT_ROUNDS are flagged by
+# needs_update() and transparently rehashed on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 # Models
 class Token(BaseModel):
@@ -98,13 +114,20 @@ class UserInDB(User):
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 # Authentication functions
-async def get_user(username: str, db: Annotated[AsyncIOMotorDatabase, Depends(get_db)]) -> Optional[dict]:
-    """Get user from database."""
-    logger.info(f"[get_user] Attempting to find user: '{username}'")
+async def get_user(
+    username: str,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
+    projection: Optional[Dict[str, int]] = None
+) -> Optional[dict]:
+    """Get user from database, optionally reading only the ``projection`` fields."""
+    logger.debug(f"[get_user] Attempting to find user: '{username}'")
     try:
-        user = await db.users.find_one({"username": username})
+        if projection is None:
+            user = await db.users.find_one({"username": username})
+        else:
+            user = await db.users.find_one({"username": username}, projection)
         if user:
-            logger.info(f"[get_user] Found user '{username}': {{'id': str(user.get('_id')), 'disabled': user.get('disabled')}})")
+            logger.debug(f"[get_user] Found user '{username}': {{'id': str(user.get('_id')), 'disabled': user.get('disabled')}})")
         else:
             logger.warning(f"[get_user] User '{username}' not found in database.")
         return user
@@ -112,32 +135,64 @@ async def get_user(username: str, db: Annotated[AsyncIOMotorDatabase, Depends(ge
         logger.error(f"[get_user] Error querying database for user '{username}': {type(e).__name__} - {str(e)}")
         return None
 
+def is_account_closed(user: dict) -> bool:
+    """Whether the account is disabled or tombstoned for deletion; no tokens are issued for it."""
+    return bool(user.get("disabled") or user.get("deleted_at"))
+
 async def authenticate_user(
     username: str,
     password: str,
     db: Annotated[AsyncIOMotorDatabase, Depends(get_db)]
 ) -> Optional[dict]:
     """Authenticate a user."""
-    logger.info(f"[authenticate_user] Attempting to authenticate user: {username}")
+    logger.debug(f"[authenticate_user] Attempting to authenticate user: {username}")
     user = await get_user(username, db)
     if not user:
         logger.warning(f"[authenticate_user] User not found: {username}")
         return None
-    logger.info(f"[authenticate_user] User found: {username}. Verifying password...")
-    # Explicitly call verify_password and log the result
+    if is_account_closed(user):
+        logger.warning(f"[authenticate_user] Login attempt for disabled or deleted account: {username}")
+        return None
+    logger.debug(f"[authenticate_user] User found: {username}. Verifying password...")
+    # Verify on the hashing pool so bcrypt never blocks the event loop
     try:
-        password_verified = verify_password(password, user["hashed_password"])
-        logger.info(f"[authenticate_user] verify_password result: {password_verified}")
+        password_verified = await verify_password_async(password, user["hashed_password"])
+        logger.debug(f"[authenticate_user] verify_password result: {password_verified}")
         if not password_verified:
             logger.warning(f"[authenticate_user] Password verification failed for user: {username}")
             return None
+    except HTTPException:
+        raise  # Hashing queue full: surface the 503 instead of a bogus 401
     except Exception as e:
         logger.error(f"[authenticate_user] Error during verify_password for user {username}: {str(e)}")
         return None # Treat errors during verification as failure
 
-    logger.info(f"[authenticate_user] Password verified successfully for user: {username}")
+    logger.debug(f"[authenticate_user] Password verified successfully for user: {username}")
+    await rehash_password_if_needed(user, password, db)
     return user
 
+async def rehash_password_if_needed(user: dict, password: str, db: AsyncIOMotorDatabase) -> bool:
+    """
+    Upgrade a stored hash to the current cost parameters after a successful login.
+
+    Failures are logged and ignored; the old hash stays valid and the upgrade is
+    retried on the next login.
+    """
+    try:
+        if not pwd_context.needs_update(user["hashed_password"]):
+            return False
+        new_hash = await get_password_hash_async(password)
+        await db.users.update_one(
+            {"_id": user["_id"], "hashed_password": user["hashed_password"]},
+            {"$set": {"hashed_password": new_hash}}
+        )
+        user["hashed_password"] = new_hash
+        logger.info(f"[authenticate_user] Rehashed password for user: {user.get('username')}")
+        return True
+    except Exception as e:
+        logger.warning(f"[authenticate_user] Skipping password rehash: {str(e)}")
+        return False
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -146,6 +201,14 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the bounded hashing pool (503 when saturated)."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the bounded hashing pool (503 when saturated)."""
+    return await password_hasher.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create an access token."""
     to_encode = data.copy()
@@ -153,28 +216,74 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    logger.info(f"[create_access_token] Generated token: {encoded_jwt}")
+    logger.debug(f"[create_access_token] Generated access token {to_encode['jti']}")
     return encoded_jwt
 
-def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create a refresh token."""
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None, family: Optional[str] = None) -> str:
+    """
+    Create a refresh token.
+
+    Each token gets a unique ``jti``. ``family`` links it to the login it was
+    rotated from; a new login starts a new family.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    jti = uuid.uuid4().hex
+    to_encode.update({"exp": expire, "type": "refresh", "jti": jti, "fam": family or jti})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    logger.info(f"[create_refresh_token] Generated token: {encoded_jwt}")
+    logger.debug(f"[create_refresh_token] Generated refresh token {jti}")
     return encoded_jwt
 
+async def _is_blacklisted(jti: str) -> bool:
+    """Check the shared blacklist so revocations made by other workers are honoured."""
+    if redis_client is None:
+        return False
+    try:
+        with time_redis("exists"):
+            return bool(await redis_client.exists(f"blacklist:{jti}"))
+    except Exception as e:
+        logger.debug(f"Token blacklist unavailable: {str(e)}")
+        return False
+
+async def decode_access_token(token: str) -> Dict[str, Any]:
+    """
+    Return the verified claims of an access token.
+
+    Signature and ``exp`` are fully validated the first time a token is seen;
+    the claims are then served from ``access_token_cache`` until the token
+    expires, the cache TTL lapses or the token is revoked.
+
+    Raises:
+        ExpiredSignatureError: If the token has expired.
+        JWTError: If the token is invalid or revoked.
+    """
+    claims = access_token_cache.get(token)
+    if claims is not None:
+        return claims
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    jti = claims.get("jti")
+    if jti and (access_token_cache.is_revoked(jti) or await _is_blacklisted(jti)):
+        raise JWTError("Token has been revoked")
+    access_token_cache.put(token, claims)
+    return claims
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[AsyncIOMotorDatabase, Depends(get_db)]
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
+    request: Request = None
 ) -> dict:
-    """Get current user from token."""
+    """
+    Get current user from token.
+
+    Only the fields of the projection set by ``user_fields`` for this request
+    are read, if the endpoint declares it.
+    """
+    projection = getattr(request.state, "user_projection", None) if request is not None else None
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -203,43 +312,7 @@ async def get_current_user(
             # Optional: Log or raise if prefix was expected but missing?
             # logger.warning("Authorization header missing 'Bearer ' prefix.")
 
-        # logger.debug("Attempting to decode JWT token value")
-        # logger.info(f"Token debug info: Length={len(token_value)}, Prefix={token_value[:10] + '...' if len(token_value) > 10 else 'N/A'}")
-
-        # --- JWT Decode Debugging ---
-        # current_time_utc = datetime.utcnow()
-        # current_timestamp = int(current_time_utc.timestamp())
-        # logger.info(f"[JWT Decode] Current UTC Time: {current_time_utc}")
-        # logger.info(f"[JWT Decode] Current Timestamp: {current_timestamp}")
-        # try:
-        #     # Decode without validation just to get claims for logging
-        #     unverified_payload = jwt.decode(token_value, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_signature": False, "verify_exp": False})
-        #     token_exp = unverified_payload.get('exp')
-        #     logger.info(f"[JWT Decode] Token 'exp' claim: {token_exp}")
-        #     if token_exp:
-        #         logger.info(f"[JWT Decode] Time difference (exp - now): {token_exp - current_timestamp} seconds")
-        # except Exception as log_err:
-        #     logger.error(f"[JWT Decode] Error getting token claims for logging: {log_err}")
-        # --- End JWT Decode Debugging ---
-
-        # WORKAROUND: Skip internal expiry validation due to python-jose bug/issue
-        # logger.info("[JWT Decode] Attempting decode with verify_exp=False")
-        payload = jwt.decode(
-            token_value,
-            SECRET_KEY,
-            algorithms=[ALGORITHM],
-            options={"verify_exp": False} # Skip internal expiry check - WORKAROUND
-        )
-        # logger.info("[JWT Decode] Decode successful (verify_exp=False)")
-
-        # Manual expiry check (Now handled implicitly by subsequent logic or should be added back if strict check needed)
-        # token_exp_manual = payload.get("exp", 0)
-        # logger.info(f"[Manual Check] Token exp: {token_exp_manual}, Current time: {current_timestamp}")
-        # if token_exp_manual < current_timestamp:
-        #     logger.error(f"[Manual Check] Manual check failed: Token expired ({token_exp_manual} < {current_timestamp})")
-        #     raise JWTError("Manual Check: Signature has expired.")
-        # else:
-        #     logger.info("[Manual Check] Manual check passed.")
+        payload = await decode_access_token(token_value)
 
         username: str = payload.get("sub")
         if username is None:
@@ -250,12 +323,18 @@ async def get_current_user(
         logger.debug(f"JWT token decoded for user: {username}")
 
         # Fetch user from DB using the username from token
-        user = await get_user(username=token_data.username, db=db)
+        if projection is None:
+            user = await get_user(username=token_data.username, db=db)
+        else:
+            user = await get_user(username=token_data.username, db=db, projection=projection)
         if user is None:
             logger.warning(f"User {token_data.username} from token not found in DB")
             raise credentials_exception
 
         return user
+    except ExpiredSignatureError:
+        logger.info("Rejected expired access token")
+        raise credentials_exception_expired
     except JWTError as e:
         logger.error(f"JWT decoding error: {e}")
         # Raise the exception with the detail message the test expects
@@ -269,8 +348,36 @@ async def get_current_active_user(
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def verify_refresh_token(token: str) -> Optional[Dict[str, Any]]:
-    """Verify a refresh token and return its payload if valid."""
+def user_fields(allowed: Sequence[str], default_fields: Optional[Sequence[str]] = None):
+    """
+    Dependency factory for endpoints supporting ``?fields=`` (see utils.fieldsets).
+
+    The dependency resolves to the selected field names (None for all) and
+    records the matching projection for ``get_current_user``, so it must be
+    declared before the current-user dependency. ``default_fields`` limits what
+    is read from the database when no ``fields`` are requested.
+    """
+    async def select_user_fields(
+        request: Request,
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated fields to return; 'profile' for the light profile, '*' for all"
+        )
+    ) -> Optional[List[str]]:
+        selected = parse_fields(fields, allowed)
+        read = selected if fields is not None else parse_fields(None, allowed, default_fields)
+        request.state.user_projection = mongo_projection(read)
+        return selected
+
+    return select_user_fields
+
+async def verify_refresh_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a refresh token and redeem it.
+
+    Returns the payload only for the token's first redemption; a reused token
+    is rejected and its whole family revoked (see utils.token_store).
+    """
     try:
         logger.debug(f"Attempting to verify refresh token")
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -280,22 +387,9 @@ def verify_refresh_token(token: str) -> Optional[Dict[str, Any]]:
             logger.debug("Token type is not 'refresh'")
             return None
 
-        # Check if token has been used before
-        if redis_client and redis_client.get(f"used_token:{token}"):
-            logger.debug("Token has been used before")
+        if not await refresh_token_store.redeem(token, payload):
             return None
 
-        # Mark token as used in Redis with expiration
-        if redis_client:
-            # Set expiration to match token expiry
-            exp = payload.get("exp")
-            if exp:
-                ttl = max(0, int(exp - datetime.now(timezone.utc).timestamp()))
-                redis_client.setex(f"used_token:{token}", ttl, "1")
-                logger.debug(f"Token marked as used with TTL: {ttl}")
-        else:
-            logger.warning("Redis client not available, token reuse prevention disabled")
-
         return payload
     except JWTError as e:
         logger.debug(f"Failed to verify refresh token: {str(e)}")
@@ -304,20 +398,39 @@ def verify_refresh_token(token: str) -> Optional[Dict[str, Any]]:
         logger.error(f"Unexpected error verifying refresh token: {str(e)}")
         return None
 
+async def revoke_refresh_token_family(token: str) -> None:
+    """Revoke the family of a refresh token so none of its rotations can be redeemed."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    except JWTError:
+        return
+    if payload.get("type") == "refresh":
+        _, family = token_ids(token, payload)
+        await refresh_token_store.revoke_family(family)
+
 async def revoke_token(token_id: str, exp: int):
     """Add token ID to the blacklist with its expiration time as TTL."""
+    # Stop serving the token from this worker's cache immediately
+    access_token_cache.revoke(token_id, exp)
+    # Calculate TTL based on the token's 'exp' claim
+    ttl = max(0, int(exp - datetime.now(timezone.utc).timestamp()))
+    if ttl <= 0:
+        logger.info(f"Token {token_id} already expired, not adding to blacklist.")
+        return
+    if redis_client is None:
+        return
     try:
-        redis_client = await get_redis_client()
-        # Use expiration time to set TTL. Ensure TTL is positive.
-        # Calculate TTL based on the token's 'exp' claim
-        ttl = max(0, int(exp - datetime.now(timezone.utc).timestamp()))
-        if ttl > 0:
+        with time_redis("setex"):
             await redis_client.setex(f"blacklist:{token_id}", ttl, "revoked")
-            logger.info(f"Token {token_id} blacklisted with TTL {ttl} seconds")
-        else:
-            logger.info(f"Token {token_id} already expired, not adding to blacklist.")
+        logger.info(f"Token {token_id} blacklisted with TTL {ttl} seconds")
     except Exception as e:
         logger.error(f"Redis error when revoking token: {e}")
-    finally:
-        if redis_client:
-            await redis_client.close()
\ No newline at end of file
+
+async def revoke_access_token(token: str) -> None:
+    """Revoke an access token by its ``jti`` (tokens without one simply expire)."""
+    try:
+        claims = await decode_access_token(token)
+    except JWTError:
+        return
+    if claims.get("jti"):
+        await revoke_token(claims["jti"], claims["exp"])
@@ -3,7 +3,8 @@ import motor.motor_asyncio
 from dotenv import load_dotenv
 import logging
 import asyncio
-from typing import Optional
+from typing import Optional, List
+from pymongo import monitoring
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,14 +23,86 @@ else:
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "learning_platform")
 
+class CommandEventRelay(monitoring.CommandListener):
+    """
+    Forward pymongo command events to listeners registered at runtime.
+
+    pymongo only accepts listeners when a client is constructed, so every
+    client gets this relay and instrumentation modules register with it later.
+    """
+
+    def __init__(self):
+        self.listeners: List[monitoring.CommandListener] = []
+
+    def register(self, listener: monitoring.CommandListener) -> None:
+        """Register a listener once per listener type."""
+        if not any(type(existing) is type(listener) for existing in self.listeners):
+            self.listeners.append(listener)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        for listener in self.listeners:
+            listener.started(event)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        for listener in self.listeners:
+            listener.succeeded(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        for listener in self.listeners:
+            listener.failed(event)
+
+command_events = CommandEventRelay()
+
+class ConnectionPoolStats(monitoring.ConnectionPoolListener):
+    """Track open and checked-out connections across all clients' pools."""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open = max(0, self.open - 1)
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "max_pool_size": MAX_POOL_SIZE,
+            "open": self.open,
+            "checked_out": self.checked_out,
+            "checkout_failures": self.checkout_failures,
+        }
+
+MAX_POOL_SIZE = 50
+pool_stats = ConnectionPoolStats()
+
 # Create MongoDB client with proper settings
 client = motor.motor_asyncio.AsyncIOMotorClient(
     MONGODB_URL,
     serverSelectionTimeoutMS=5000,  # 5 second timeout
     connectTimeoutMS=10000,         # 10 second timeout
     retryWrites=True,
-    maxPoolSize=50,                 # Increase connection pool size
-    uuidRepresentation='standard'   # Added standard UUID representation
+    maxPoolSize=MAX_POOL_SIZE,      # Increase connection pool size
+    uuidRepresentation='standard',  # Added standard UUID representation
+    event_listeners=[command_events, pool_stats]
 )
 
 db = client[DB_NAME]
@@ -48,7 +121,8 @@ async def get_database():
         serverSelectionTimeoutMS=5000,
         connectTimeoutMS=10000,
         retryWrites=True,
-        uuidRepresentation='standard'  # Added standard UUID representation
+        uuidRepresentation='standard',  # Added standard UUID representation
+        event_listeners=[command_events, pool_stats]
     )
     new_db = new_client[DB_NAME]
     return {
@@ -78,21 +152,54 @@ async def create_indexes():
         # Resources collection indexes
         await db.resources.create_index([("type", 1), ("user_id", 1)])
         await db.resources.create_index("created_at")
+        await db.resources.create_index("user_id")  # For per-user purges (account deletion)
 
         # Reviews collection indexes
         await db.reviews.create_index([("resource_id", 1), ("user_id", 1)])
         await db.reviews.create_index("created_at")
+        await db.reviews.create_index("user_id")  # For per-user purges (account deletion)
+
+        # Central library completion status, keyed by username
+        await db.user_library_status.create_index([("username", 1), ("resource_id", 1)])
 
         # Learning paths collection indexes
         await db.learning_paths.create_index("user_id")
         await db.learning_paths.create_index("created_at")
 
         # Notes collection indexes - Updated for better performance
-        await db.notes.create_index([("user_id", 1), ("updated_at", -1)])  # For listing notes
-        await db.notes.create_index([("user_id", 1), ("tags", 1)])  # For tag filtering
+        # Keyset pagination sorts by (updated_at, _id); these also serve the old (user_id, updated_at) and (user_id, tags) prefixes
+        await db.notes.create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])  # For listing notes
+        await db.notes.create_index([("user_id", 1), ("tags", 1), ("updated_at", -1), ("_id", -1)])  # For tag filtering
         await db.notes.create_index("created_at")
         await db.notes.create_index("updated_at")
-        await db.notes.create_index([("title", "text"), ("content", "text")])  # For future text search
+        await db.notes.create_index([("title", "text"), ("content", "text")])  # For /api/notes/search
+
+        # Sessions collection indexes
+        # TTL: MongoDB deletes each session once expires_at passes (checked about once a minute),
+        # so no worker needs to sweep; reads still filter on expires_at to hide not-yet-deleted rows
+        await db.sessions.create_index("expires_at", expireAfterSeconds=0)
+        await db.sessions.create_index([("user_id", 1), ("expires_at", 1)])  # For active session listing
+        # Study/review sessions have no session_id, so uniqueness only applies where it is set
+        await db.sessions.create_index(
+            "session_id", unique=True, partialFilterExpression={"session_id": {"$type": "string"}}
+        )
+
+        # Background jobs: finished jobs carry expires_at and are removed by TTL
+        await db.jobs.create_index("expires_at", expireAfterSeconds=0)
+        await db.jobs.create_index([("status", 1), ("kind", 1)])  # For resuming unfinished jobs
+        await db.jobs.create_index([("user_id", 1), ("kind", 1), ("status", 1)])
+
+        # Note tag counts: one document per (user, tag); unique key also required by $merge in rebuilds
+        await db.note_tag_counts.create_index([("user_id", 1), ("tag", 1)], unique=True)
+        await db.note_tag_counts.create_index([("user_id", 1), ("count", -1), ("tag", 1)])  # For /api/notes/tags
+
+        # Goals and milestones, one document each, keyed per user
+        await db.goals.create_index([("user_id", 1), ("id", 1)], unique=True)
+        await db.milestones.create_index([("user_id", 1), ("goal_id", 1), ("id", 1)], unique=True)
+
+        # Learning-path progress counters and append-only history
+        await db.progress_counters.create_index([("user_id", 1), ("category", 1)], unique=True)
+        await db.progress_history.create_index([("user_id", 1), ("date", 1)])
 
         logger.info("All database indexes created successfully")
     except Exception as e:
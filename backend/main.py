@@ -11,11 +11,9 @@ import logging
 from dotenv import load_dotenv
 from pymongo.errors import DuplicateKeyError
 from jose import jwt, JWTError
-import asyncio
 import time
 import traceback
 import re
-import uuid
 import psutil
 import platform
 from datetime import timezone
@@ -33,7 +31,7 @@ from auth import (
 )
 
 # Import database connection
-from database import db, verify_db_connection
+from database import db, command_events
 
 # Import utility modules
 from utils.error_handlers import APIError, handle_exception
@@ -45,14 +43,25 @@ from utils.rate_limiter import (
     reset_rate_limit
 )
 from utils.monitoring import (
-    track_request_performance,
     log_auth_metrics,
-    log_request_metrics,
     log_session_event,
     startup_monitoring,
     shutdown_monitoring,
     get_metrics,
-    log_error
+    log_error,
+    record_loop_lag,
+    record_loop_block
+)
+from utils.loop_monitor import LoopLagMonitor, LOOP_MONITOR_ENABLED
+from utils.health import dependency_health
+from utils.middleware import RequestContextMiddleware
+from utils.password_hasher import password_hasher
+from utils.jobs import jobs
+from utils.logging_config import configure_logging
+from utils.query_tracker import RequestCommandListener
+from utils.prometheus import (
+    PROMETHEUS_ENABLED, MongoCommandTimer,
+    render_latest, verify_metrics_token
 )
 
 # Import routers directly
@@ -62,15 +71,15 @@ from routers.resources import router as resources_router
 from routers.progress import router as progress_router
 from routers.learning_path import router as learning_path_router
 from routers.reviews import router as reviews_router
-from routers.sessions import router as sessions_router
+from routers.sessions import router as sessions_router, session_activity
 from routers.lessons import router as lessons_router
 from routers.url_extractor import router as url_extractor_router
 from routers.notes import router as notes_router
 from routers.users import normalize_user_data
 from routers.test_utils import router as test_utils_router
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queue-based, see utils.logging_config)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # CSRF Secret (Load from environment)
@@ -102,39 +111,47 @@ async def lifespan(app: FastAPI):
 
     # Initialize monitoring
     await startup_monitoring()
+    command_events.register(MongoCommandTimer())
+    command_events.register(RequestCommandListener())
+
+    # Watch the event loop for lag and blocking calls
+    loop_monitor = None
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor = LoopLagMonitor(on_lag=record_loop_lag, on_block=record_loop_block)
+        await loop_monitor.start()
+
+    # Refresh dependency status for the health probes in the background
+    dependency_health.start()
 
-    # Schedule session cleanup task (if needed, keep it simple)
-    # Note: A more robust solution might use APScheduler or similar
-    async def cleanup_sessions_periodically():
-        try:
-            while True:
-                await asyncio.sleep(3600) # Wait 1 hour
-                from routers.sessions import cleanup_expired_sessions
-                count = await cleanup_expired_sessions()
-                if count > 0:
-                    logger.info(f"Background Task: Cleaned up {count} expired sessions")
-        except asyncio.CancelledError:
-             logger.info("Session cleanup task cancelled.")
-        except Exception as e:
-            logger.error(f"Error in periodic session cleanup task: {str(e)}")
-
-    session_cleanup_task = asyncio.create_task(cleanup_sessions_periodically())
-    logger.info("Session cleanup background task scheduled.")
+    # Expired sessions are removed by the TTL index on sessions.expires_at (see database.create_indexes)
+    # Coalesced session heartbeats are flushed in the background
+    session_activity.start()
+
+    # Pick up background jobs (exports, account deletion) left unfinished by a previous process,
+    # then keep reclaiming jobs whose worker died once their lease expires
+    try:
+        await jobs.resume()
+    except Exception as e:
+        logger.error(f"Could not resume background jobs: {str(e)}")
+    jobs.start()
 
     yield # Application runs here
 
     # Shutdown logic
     logger.info("Shutting down learning platform API...")
 
-    # Cancel background tasks
-    session_cleanup_task.cancel()
-    try:
-        await session_cleanup_task # Wait for task to acknowledge cancellation
-    except asyncio.CancelledError:
-        logger.info("Session cleanup task successfully cancelled during shutdown.")
+    # Write out buffered session activity before the process exits
+    await session_activity.stop()
+
+    # Stop running jobs; they resume from their last checkpoint on the next start
+    await jobs.shutdown()
 
     # Shutdown monitoring
+    await dependency_health.stop()
+    if loop_monitor is not None:
+        await loop_monitor.stop()
     await shutdown_monitoring()
+    password_hasher.shutdown()
     logger.info("API shutdown complete.")
 # --- End Lifespan Management ---
 
@@ -173,6 +190,9 @@ if ENVIRONMENT != "test":
 else:
     logger.info("CSRF Middleware disabled for test environment.")
 
+# Request ID, security/rate-limit headers and metrics in a single ASGI pass (outermost)
+app.add_middleware(RequestContextMiddleware, environment=ENVIRONMENT)
+
 # Mount routers
 app.include_router(auth_router, prefix="/api/auth", tags=["authentication"])
 app.include_router(users_router, prefix="/api/users", tags=["users"])
@@ -239,28 +259,35 @@ async def health():
     """Health check endpoint."""
     return {"status": "ok"}
 
+@app.get("/api/health/live")
+async def liveness_probe():
+    """Liveness probe: the process is up and the event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/api/health/ready")
+async def readiness_probe():
+    """
+    Readiness probe served from the cached dependency status.
+
+    The status is refreshed by a background task; this endpoint does no I/O.
+    Returns 503 until MongoDB has answered a recent ping.
+    """
+    snapshot = dependency_health.snapshot()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if snapshot["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=dict(snapshot, status="ok" if snapshot["ready"] else "unavailable"),
+    )
+
 @app.get("/api/health")
 async def health_check():
     """
     API health check endpoint with detailed system information.
-    Used by monitoring systems and Docker health checks.
+    Dependency status comes from the background-refreshed cache, so the
+    endpoint never blocks the event loop or touches the database.
     """
-    # Check database connection
-    db_status = await verify_db_connection()
-
-    # Check Redis connection if available
-    redis_status = "unavailable"
-    try:
-        from utils.cache import get_redis_connection
-        redis = get_redis_connection()
-        if redis and await redis.ping():
-            redis_status = "ok"
-    except Exception as e:
-        redis_status = f"error: {str(e)}"
-
-    # Get memory usage
     process = psutil.Process()
     memory_info = process.memory_info()
+    services = dependency_health.snapshot()
 
     return {
         "status": "ok",
@@ -273,74 +300,32 @@ async def health_check():
         },
         "resources": {
             "memory_usage_mb": memory_info.rss / (1024 * 1024),
-            "cpu_percent": process.cpu_percent(interval=0.1),
+            # interval=None compares with the previous call instead of sleeping
+            "cpu_percent": process.cpu_percent(interval=None),
         },
         "services": {
-            "database": db_status,
-            "redis": redis_status
+            "database": services["database"],
+            "redis": services["redis"],
+            "checked_at": services["checked_at"],
+            "database_pool": services["database_pool"],
+            "event_loop_lag": services["event_loop_lag"],
         }
     }
 
-# Add middleware to include rate limit headers in responses
-@app.middleware("http")
-async def add_rate_limit_headers(request: Request, call_next):
-    """Add rate limit headers to responses."""
-    response = await call_next(request)
-
-    # Add rate limit headers if they exist
-    if hasattr(request.state, "rate_limit_headers"):
-        for header, value in request.state.rate_limit_headers.items():
-            response.headers[header] = str(value)
-
-    return response
-
-# Add security headers middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    """Add security headers to all responses."""
-    response = await call_next(request)
-    path = request.url.path
-
-    # Apply strict CSP only to non-doc paths
-    if not (path.startswith("/docs") or path.startswith("/redoc") or path == "/openapi.json"):
-        response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'self'; img-src 'self' data:; style-src 'self' 'unsafe-inline'"
-    # Note: For a production environment, you might want a more specific,
-    # permissive policy for /docs and /redoc if needed, rather than no policy.
-
-    # XSS Protection
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-
-    # Content-Type Options
-    response.headers["X-Content-Type-Options"] = "nosniff"
-
-    # Frame Options
-    response.headers["X-Frame-Options"] = "DENY"
-
-    # Strict Transport Security (only enable in production)
-    if ENVIRONMENT == "production":
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-
-    return response
-
-# Add performance monitoring middleware
-@app.middleware("http")
-async def monitor_requests(request: Request, call_next):
-    """Monitor request performance and metrics."""
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-
-    # Run metrics logging in the background to avoid impacting response time
-    asyncio.create_task(log_request_metrics(request, response, process_time))
-
-    return response
-
 # Metrics endpoint
 @app.get("/api/metrics", dependencies=[Depends(get_current_active_user)])
 async def metrics_endpoint():
     """Get current metrics (only for authenticated users)."""
     return get_metrics()
 
+# Prometheus scrape endpoint (labels use route templates, so cardinality is bounded)
+if PROMETHEUS_ENABLED:
+    @app.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_metrics_token)])
+    async def prometheus_metrics_endpoint():
+        """Expose request, database and Redis timings in Prometheus text format."""
+        payload, content_type = render_latest()
+        return Response(content=payload, media_type=content_type)
+
 # Add this in the API router section
 if ENVIRONMENT.lower() == "development":
     @app.post("/api/dev/reset-rate-limit")
@@ -370,25 +355,6 @@ if ENVIRONMENT.lower() == "development":
              # This case should ideally not happen if Request is required
              raise HTTPException(status_code=400, detail="Request object required for client identification.")
 
-# Add request tracking middleware
-@app.middleware("http")
-async def add_request_tracking(request: Request, call_next):
-    """Add request tracking headers and logging."""
-    request_id = str(uuid.uuid4())
-    request.state.request_id = request_id
-
-    # Add timing
-    start_time = datetime.now(timezone.utc)
-
-    response = await call_next(request)
-
-    # Add headers
-    response.headers["X-Request-ID"] = request_id
-    process_time = (datetime.now(timezone.utc) - start_time).total_seconds()
-    response.headers["X-Process-Time"] = str(process_time)
-
-    return response
-
 # Run the application
 if __name__ == "__main__":
     import uvicorn
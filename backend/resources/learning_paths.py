@@ -28,6 +28,7 @@ CAREER_PATHS = {
 }
 
 # Standard milestones for machine learning engineer path
+# "prerequisites" refer to milestones by their formatted ID (1-based position)
 ML_ENGINEER_MILESTONES = [
     {
         "title": "Learn Python Fundamentals",
@@ -40,7 +41,8 @@ ML_ENGINEER_MILESTONES = [
             "pg-codecademy-py",
             "pg-futurecoder"
         ],
-        "estimated_days": 14
+        "estimated_days": 14,
+        "prerequisites": []
     },
     {
         "title": "Master Data Processing with Pandas",
@@ -50,7 +52,8 @@ ML_ENGINEER_MILESTONES = [
             "pg-pandas-docs",
             "pg-pandas-cheatsheet"
         ],
-        "estimated_days": 14
+        "estimated_days": 14,
+        "prerequisites": ["1"]
     },
     {
         "title": "Learn Machine Learning Fundamentals",
@@ -60,14 +63,16 @@ ML_ENGINEER_MILESTONES = [
             "course-ng-ml",
             "book-ml-yearning"
         ],
-        "estimated_days": 30
+        "estimated_days": 30,
+        "prerequisites": ["1"]
     },
     {
         "title": "Master Scikit-learn",
         "description": "Become proficient with the most popular ML library for Python",
         "verification_method": "Build and evaluate multiple ML models using scikit-learn",
         "resources": ["pg-sklearn-docs"],
-        "estimated_days": 21
+        "estimated_days": 21,
+        "prerequisites": ["2", "3"]
     },
     {
         "title": "Learn Deep Learning Fundamentals",
@@ -79,7 +84,8 @@ ML_ENGINEER_MILESTONES = [
             "course-mit-dl-intro", # This links to the course page which has videos too
             # "video-mit-dl-intro" # Redundant with course link
         ],
-        "estimated_days": 30
+        "estimated_days": 30,
+        "prerequisites": ["3"]
     },
     {
         "title": "Master TensorFlow or PyTorch",
@@ -90,7 +96,8 @@ ML_ENGINEER_MILESTONES = [
             "pg-pytorch-tutorials",
             "book-d2l"
         ],
-        "estimated_days": 30
+        "estimated_days": 30,
+        "prerequisites": ["5"]
     }
 ]
 
@@ -295,12 +302,27 @@ def get_formatted_learning_path(career_path="ml_engineer"):
             "notes": ""
         })
 
-    # Format roadmap
+    # Format roadmap, with the milestones as a dependency graph for scheduling
+    roadmap_milestones = [
+        {
+            "id": str(idx + 1),
+            "title": milestone["title"],
+            "description": milestone["description"],
+            "estimated_days": milestone["estimated_days"],
+            "prerequisites": milestone.get("prerequisites", []),
+            "resources": milestone["resources"],
+            "completed": False,
+            "completion_date": None
+        }
+        for idx, milestone in enumerate(milestones)
+    ]
     formatted_roadmap = {
         "id": "1",
         "title": f"{CAREER_PATHS[career_path]['title']} Roadmap",
         "description": CAREER_PATHS[career_path]['description'],
         "phases": roadmap_phases,
+        "milestones": roadmap_milestones,
+        "version": 1,
         "created_at": today.strftime("%Y-%m-%d"),
         "updated_at": today.strftime("%Y-%m-%d")
     }
@@ -312,4 +334,35 @@ def get_formatted_learning_path(career_path="ml_engineer"):
         "roadmap": formatted_roadmap
     }
 
-    return learning_path
\ No newline at end of file
+    return learning_path
+
+def get_resource_ids(learning_path):
+    """
+    Collect the central library resource IDs referenced by a learning path
+
+    Accepts a formatted learning path, a roadmap, or a list of milestones or
+    phases; looks at the ``resources`` of milestones, goals, phases and
+    roadmap milestones.
+
+    Args:
+        learning_path (dict | list): The learning path, roadmap or items
+
+    Returns:
+        list: Unique resource IDs in the order they first appear
+    """
+    ids = {}
+    pending = [learning_path]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, list):
+            pending.extend(reversed(item))
+        elif isinstance(item, dict):
+            for resource in item.get("resources") or []:
+                resource_id = resource.get("id") if isinstance(resource, dict) else resource
+                if isinstance(resource_id, str):
+                    ids.setdefault(resource_id, None)
+            for key in reversed(("milestones", "goals", "phases", "roadmap")):
+                if item.get(key):
+                    pending.append(item[key])
+    return list(ids)
+
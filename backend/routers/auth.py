@@ -1,7 +1,7 @@
 """Authentication related routes."""
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel, EmailStr
@@ -10,10 +10,11 @@ from jose import jwt, JWTError
 
 from auth import (
     User, Token, UserInDB, TokenData,
-    authenticate_user, create_access_token, create_refresh_token,
+    authenticate_user, create_access_token, create_refresh_token, get_user, is_account_closed,
     get_current_active_user, get_current_user, verify_refresh_token,
+    revoke_refresh_token_family, revoke_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash,
-    SECRET_KEY, ALGORITHM, oauth2_scheme
+    SECRET_KEY, ALGORITHM, oauth2_scheme, user_fields
 )
 # Use relative import for modules within the same package
 from .users import create_user
@@ -25,6 +26,7 @@ from utils.rate_limiter import (
     reset_rate_limit # Keep reset_rate_limit if used elsewhere, otherwise remove if unused
 )
 from utils.error_handlers import AuthenticationError, ValidationError
+from utils.fieldsets import PROFILE_FIELDS, sparse_response
 from database import get_db
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.errors import DuplicateKeyError
@@ -212,13 +214,10 @@ async def refresh_access_token(
     Refresh the access token using a valid refresh token from an HttpOnly cookie.
     Returns a new access token in the body and sets a new refresh token cookie.
     """
-    logger.info(f"--- ENTERING /token/refresh ---")
-    logger.info(f"Request Headers: {request.headers}")
-    logger.info(f"Request Cookies: {request.cookies}")
     try:
         # Get the refresh token from the HttpOnly cookie
         refresh_token = request.cookies.get(REFRESH_TOKEN_COOKIE_NAME)
-        logger.info(f"Refresh token from cookie: {'Present' if refresh_token else 'MISSING'}")
+        logger.debug(f"Refresh token from cookie: {'Present' if refresh_token else 'MISSING'}")
         if not refresh_token:
             logger.warning("Refresh attempt failed: No refresh token cookie found.")
             raise HTTPException(
@@ -228,7 +227,7 @@ async def refresh_access_token(
             )
 
         # Verify the refresh token
-        payload = verify_refresh_token(refresh_token)
+        payload = await verify_refresh_token(refresh_token)
         if not payload:
             logger.warning("Refresh attempt failed: Invalid or expired refresh token from cookie.")
             # Clear potentially invalid cookie on verification failure
@@ -247,12 +246,24 @@ async def refresh_access_token(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        # The account may have been disabled or deleted since the token was issued
+        user = await get_user(username, db, projection={"disabled": 1, "deleted_at": 1})
+        if not user or is_account_closed(user):
+            logger.warning(f"Refresh attempt failed: account {username} is missing, disabled or deleted.")
+            await revoke_refresh_token_family(refresh_token)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Account is disabled",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
         # Create new access and refresh tokens
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
             data={"sub": username}, expires_delta=access_token_expires
         )
-        new_refresh_token = create_refresh_token(data={"sub": username})
+        # Rotate within the same family so reuse of any ancestor revokes this token too
+        new_refresh_token = create_refresh_token(data={"sub": username}, family=payload.get("fam"))
 
         # Set the new refresh token as an HttpOnly cookie
         set_refresh_token_cookie(response, new_refresh_token)
@@ -357,6 +368,16 @@ async def logout(
             except Exception as session_err:
                 logger.error(f"Error invalidating session {session_id} for user {username}: {session_err}")
 
+        # Revoke the refresh token family so copies of the cookie stop working
+        refresh_token = request.cookies.get(REFRESH_TOKEN_COOKIE_NAME)
+        if refresh_token:
+            await revoke_refresh_token_family(refresh_token)
+
+        # Revoke the access token used for this request so cached claims stop validating
+        scheme, _, access_token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and access_token:
+            await revoke_access_token(access_token)
+
         # Always clear the refresh token cookie on logout
         clear_refresh_token_cookie(response)
         logger.info(f"Cleared refresh token cookie for user {username} during logout.")
@@ -371,8 +392,16 @@ async def logout(
         return response
 
 @router.get("/me", response_model=User)
-async def get_me(current_user: Any = Depends(get_current_active_user)):
-    """Get information about the currently authenticated user."""
+async def get_me(
+    selected: Optional[List[str]] = Depends(user_fields(PROFILE_FIELDS, default_fields=PROFILE_FIELDS)),
+    current_user: Any = Depends(get_current_active_user)
+):
+    """
+    Get information about the currently authenticated user.
+
+    Only the profile fields are read unless ``?fields=`` asks for more;
+    ``fields=profile`` also drops the empty learning-data lists from the response.
+    """
     logger.debug(f"Retrieving info for user: Type={type(current_user)}")
     try:
         # Handle both dict (from DB) and object (from mock/test) cases
@@ -417,6 +446,8 @@ async def get_me(current_user: Any = Depends(get_current_active_user)):
             # Add other fields required by User model if necessary
         )
 
+        if selected is not None:
+            return sparse_response(user_response, selected)
         return user_response
 
     except Exception as e:
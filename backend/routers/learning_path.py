@@ -8,6 +8,8 @@ from dotenv import load_dotenv
 import logging
 from bson.objectid import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +22,16 @@ from utils.db_utils import get_document_by_id, update_document, delete_document
 from utils.validators import validate_date_format, validate_rating, validate_required_fields
 from utils.error_handlers import ValidationError, ResourceNotFoundError
 from utils.response_models import StandardResponse, ResponseMessages
+from utils.fast_json import fast_response
+from utils.goals import (
+    GOAL_PROJECTION, MILESTONE_PROJECTION, attach_milestones, delete_goal_documents,
+    ensure_goals_migrated, find_goals, milestone_sort_key, split_goal
+)
+from utils.roadmap_graph import ROADMAP_NEXT_ACTIONABLE, RoadmapGraphError, RoadmapSchedule, plan_cache
+from utils.goal_progress import (
+    apply_counter_delta, count_milestone_change, find_progress_history, goal_delta,
+    merge_deltas, read_progress_counters
+)
 
 # Create router
 router = APIRouter()
@@ -40,6 +52,21 @@ def get_username_from_user(current_user) -> str:
 
     return username
 
+def get_user_id_from_user(current_user) -> str:
+    """Extract the user ID (stringified ``_id``) from current_user, handling different types."""
+    if isinstance(current_user, dict):
+        user_id = current_user.get("_id") or current_user.get("id")
+    else:
+        user_id = getattr(current_user, "_id", None) or getattr(current_user, "id", None)
+
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID could not be determined from user object"
+        )
+
+    return str(user_id)
+
 # Models
 class MilestoneBase(BaseModel):
     title: str
@@ -98,10 +125,25 @@ class GoalUpdate(BaseModel):
     notes: Optional[str] = None
     progress: Optional[int] = None
 
+class RoadmapMilestone(BaseModel):
+    id: str
+    title: str
+    description: str = ""
+    estimated_days: int = 1
+    prerequisites: List[str] = []
+    resources: List[str] = []
+    completed: bool = False
+    completion_date: Optional[str] = None
+
+class RoadmapMilestoneUpdate(BaseModel):
+    estimated_days: Optional[int] = None
+    completed: Optional[bool] = None
+
 class RoadmapBase(BaseModel):
     title: str
     description: str
     phases: List[Dict[str, Any]]
+    milestones: List[RoadmapMilestone] = []
 
 class RoadmapCreate(RoadmapBase):
     pass
@@ -110,11 +152,13 @@ class Roadmap(RoadmapBase):
     id: str
     created_at: str
     updated_at: str
+    version: int = 0
 
 class RoadmapUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     phases: Optional[List[Dict[str, Any]]] = None
+    milestones: Optional[List[RoadmapMilestone]] = None
 
 # Add these models for learning paths
 class ResourceInPath(BaseModel):
@@ -142,6 +186,16 @@ class LearningPath(LearningPathBase):
     created_at: str
     updated_at: str
 
+async def goal_exists(db: AsyncIOMotorDatabase, user_id: str, goal_id: str) -> bool:
+    """Check whether the user has a goal with this ID."""
+    return await db.goals.find_one({"user_id": user_id, "id": goal_id}, {"_id": 1}) is not None
+
+async def get_goal_owner(current_user, db: AsyncIOMotorDatabase) -> str:
+    """Return the user ID goals are stored under, migrating embedded goals on first use."""
+    user_id = get_user_id_from_user(current_user)
+    await ensure_goals_migrated(db, current_user, user_id)
+    return user_id
+
 # Routes for Milestones
 @router.post("/goals/{goal_id}/milestones", response_model=Milestone, status_code=status.HTTP_201_CREATED)
 async def create_milestone(
@@ -152,6 +206,7 @@ async def create_milestone(
 ):
     """Create a new milestone for a specific goal."""
     username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
     # Validate date format
     try:
@@ -162,6 +217,13 @@ async def create_milestone(
             detail="Target date must be in YYYY-MM-DD format"
         )
 
+    # Counting the new milestone against its goal also checks the goal exists
+    if await count_milestone_change(db, user_id, goal_id, total=1) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Goal with ID '{goal_id}' not found for user '{username}'."
+        )
+
     # Generate a unique ID for the milestone (consider using ObjectId or UUID)
     milestone_id = f"m_{datetime.now().strftime('%Y%m%d%H%M%S%f')}" # Added prefix and microseconds
 
@@ -172,34 +234,7 @@ async def create_milestone(
     milestone_dict["completion_date"] = None
     milestone_dict["notes"] = milestone_dict.get("notes", "")
 
-    # Add milestone to the specific goal's milestones array
-    result = await db.users.update_one(
-        {"username": username, "goals.id": goal_id},
-        {"$push": {"goals.$.milestones": milestone_dict}}
-    )
-
-    if result.matched_count == 0:
-        # Check if the user exists first
-        user = await db.users.find_one({"username": username})
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"User '{username}' not found."
-            )
-        # If user exists, but goal doesn't
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Goal with ID '{goal_id}' not found for user '{username}'."
-        )
-
-    if result.modified_count == 0:
-        # This might happen if the goal was found but the update didn't succeed
-        # Potentially a concurrent modification or schema issue
-        logging.error(f"Failed to add milestone {milestone_id} to goal {goal_id} for user {username}. Matched={result.matched_count}, Modified={result.modified_count}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create milestone for goal ID '{goal_id}'."
-        )
+    await db.milestones.insert_one({**milestone_dict, "user_id": user_id, "goal_id": goal_id})
 
     logging.info(f"Milestone '{milestone.title}' (ID: {milestone_id}) added to goal {goal_id} for user '{username}'.")
     return milestone_dict
@@ -213,35 +248,22 @@ async def get_milestones(
 ):
     """Get all milestones for a specific goal with optional filtering."""
     username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
-    # Find the user and the specific goal
-    user = await db.users.find_one(
-        {"username": username, "goals.id": goal_id},
-        {"goals.$": 1} # Project only the matched goal
-    )
+    query = {"user_id": user_id, "goal_id": goal_id}
+    # Filter by completion status if specified
+    if completed is not None:
+        query["completed"] = completed if completed else {"$ne": True}
+    milestones = await db.milestones.find(query, MILESTONE_PROJECTION).to_list(length=None)
 
-    if not user or not user.get("goals"):
-        # Check if user exists but goal doesn't
-        user_exists = await db.users.count_documents({"username": username})
-        if not user_exists:
-             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"User '{username}' not found."
-            )
+    if not milestones and not await goal_exists(db, user_id, goal_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Goal with ID '{goal_id}' not found for user '{username}'."
         )
 
-    goal = user["goals"][0] # Get the matched goal
-    milestones = goal.get("milestones", [])
-
-    # Filter by completion status if specified
-    if completed is not None:
-        milestones = [m for m in milestones if m.get("completed", False) == completed]
-
     # Sort by target date (and completion status)
-    milestones.sort(key=lambda x: (x.get("completed", False), x.get("target_date", "")))
+    milestones.sort(key=milestone_sort_key)
 
     return milestones
 
@@ -253,27 +275,17 @@ async def get_milestone(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get a specific milestone by ID within a specific goal."""
-    username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
-    user = await db.users.find_one(
-        {"username": username, "goals.id": goal_id},
-        {"goals.$": 1}
+    milestone = await db.milestones.find_one(
+        {"user_id": user_id, "goal_id": goal_id, "id": milestone_id},
+        MILESTONE_PROJECTION
     )
+    if milestone:
+        return milestone
 
-    if not user or not user.get("goals"):
-        user_exists = await db.users.count_documents({"username": username})
-        if not user_exists:
-            raise HTTPException(status.HTTP_404_NOT_FOUND, f"User '{username}' not found.")
+    if not await goal_exists(db, user_id, goal_id):
         raise HTTPException(status.HTTP_404_NOT_FOUND, f"Goal with ID '{goal_id}' not found.")
-
-    goal = user["goals"][0]
-    milestones = goal.get("milestones", [])
-
-    # Find the specific milestone
-    for milestone in milestones:
-        if milestone.get("id") == milestone_id:
-            return milestone
-
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail=f"Milestone with ID '{milestone_id}' not found within goal '{goal_id}'."
@@ -289,13 +301,10 @@ async def update_milestone(
 ):
     """Update a milestone within a specific goal."""
     username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
-    # Prepare fields for $set using arrayFilters
-    update_fields = {}
     # Convert Pydantic model to dict, excluding unset fields
     update_data = milestone_update.model_dump(exclude_unset=True)
-
-    # *** ADD LOGGING HERE TO INSPECT ***
     logging.info(f"[update_milestone] update_data received for milestone {milestone_id}: {update_data}")
 
     # Validate date format if present
@@ -314,65 +323,30 @@ async def update_milestone(
     elif "completed" in update_data and not update_data["completed"]: # Explicitly setting to false
         update_data["completion_date"] = None
 
-    # Dynamically build the $set update document
-    for key, value in update_data.items():
-        update_fields[f"goals.$[goal].milestones.$[milestone].{key}"] = value
-
-    result = await db.users.update_one(
-        {"username": username, "goals.id": goal_id},
-        {"$set": update_fields},
-        array_filters=[
-            {"goal.id": goal_id},
-            {"milestone.id": milestone_id}
-        ]
-    )
-
-    if result.matched_count == 0:
-        # Check if user/goal exists to give a more specific error
-        user = await db.users.find_one(
-            {"username": username, "goals.id": goal_id},
-            {"_id": 1} # Check existence
+    # Only this milestone's document is written; the before-image tells whether completion changed
+    query = {"user_id": user_id, "goal_id": goal_id, "id": milestone_id}
+    if update_data:
+        previous = await db.milestones.find_one_and_update(
+            query,
+            {"$set": update_data},
+            projection=MILESTONE_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
-        if not user:
+    else:
+        previous = await db.milestones.find_one(query, MILESTONE_PROJECTION)
+
+    if previous is None:
+        if not await goal_exists(db, user_id, goal_id):
             raise HTTPException(status.HTTP_404_NOT_FOUND, f"Goal with ID '{goal_id}' not found for user '{username}'.")
-        else:
-             # Goal exists, but milestone doesn't match the filter
-            raise HTTPException(status.HTTP_404_NOT_FOUND, f"Milestone with ID '{milestone_id}' not found within goal '{goal_id}'.")
-
-    if result.modified_count == 0 and result.matched_count == 1:
-        # Found user, goal, and milestone, but nothing changed (e.g., same data sent)
-        # Re-fetch the milestone to return current state
-        logging.warning(f"Update for milestone {milestone_id} in goal {goal_id} resulted in no changes.")
-    elif result.modified_count == 0:
-         # This case should ideally be covered by matched_count == 0 check
-         logging.error(f"Milestone update failed unexpectedly for {username}, goal {goal_id}, milestone {milestone_id}. Matched: {result.matched_count}, Modified: {result.modified_count}")
-         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Milestone update failed.")
-
-    # Fetch the updated user document to get the updated milestone
-    # Add projection to fetch only the relevant goal
-    updated_user = await db.users.find_one(
-        {"username": username, "goals.id": goal_id},
-        {"goals.$": 1} # Projection added here
-    )
-    # Check if the user and the specific goal were found after the update
-    if not updated_user or not updated_user.get("goals") or len(updated_user["goals"]) != 1:
-        # This indicates a problem, potentially the goal was deleted concurrently
-        logging.error(f"Failed to find goal {goal_id} for user {username} after update attempt.")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Goal {goal_id} not found after update.")
-
-    # The projection ensures updated_user['goals'] contains only the one matched goal
-    goal = updated_user["goals"][0]
-
-    # Find and return the specific milestone from the fetched goal
-    for updated_milestone in goal.get("milestones", []):
-        if updated_milestone.get("id") == milestone_id:
-             logging.info(f"Milestone {milestone_id} in goal {goal_id} updated for user {username}.")
-             return updated_milestone
-
-    # If the loop completes without finding the milestone, something is wrong
-    # (e.g., the milestone_id was valid for the update filter but not found in the fetched goal)
-    logging.error(f"Updated milestone {milestone_id} not found in goal {goal_id} for user {username} despite successful update report.")
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Updated milestone {milestone_id} could not be retrieved.")
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Milestone with ID '{milestone_id}' not found within goal '{goal_id}'.")
+
+    updated_milestone = {**previous, **update_data}
+    completed_change = int(bool(updated_milestone.get("completed"))) - int(bool(previous.get("completed")))
+    if completed_change:
+        await count_milestone_change(db, user_id, goal_id, completed=completed_change)
+
+    logging.info(f"Milestone {milestone_id} in goal {goal_id} updated for user {username}.")
+    return updated_milestone
 
 @router.delete("/goals/{goal_id}/milestones/{milestone_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_milestone(
@@ -383,40 +357,22 @@ async def delete_milestone(
 ):
     """Delete a milestone within a specific goal."""
     username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
-    # Use $pull to remove the milestone from the array
-    result = await db.users.update_one(
-        {"username": username, "goals.id": goal_id},
-        {"$pull": {"goals.$.milestones": {"id": milestone_id}}}
+    deleted = await db.milestones.find_one_and_delete(
+        {"user_id": user_id, "goal_id": goal_id, "id": milestone_id},
+        projection={"_id": 0, "completed": 1}
     )
 
-    if result.matched_count == 0:
-         # Check if user/goal exists
-        user = await db.users.find_one(
-            {"username": username, "goals.id": goal_id},
-            {"_id": 1}
-        )
-        if not user:
-             raise HTTPException(status.HTTP_404_NOT_FOUND, f"Goal with ID '{goal_id}' not found for user '{username}'.")
-        else:
-            # Goal found, but likely milestone wasn't present (or already deleted)
-            # For DELETE, returning 204 is idempotent, so maybe just log a warning?
-            logging.warning(f"Attempted to delete milestone {milestone_id} from goal {goal_id} for user {username}, but it was not found in the array (or goal not found). MatchedCount: {result.matched_count}")
-            # We still return 204 as the state matches the desired outcome (milestone is gone)
-            # Or raise 404 if we want to be strict:
-            # raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Milestone with ID '{milestone_id}' not found within goal '{goal_id}'.")
-            return # Return None for 204 status
-
-    if result.modified_count == 0 and result.matched_count == 1:
-        # Goal found, but the milestone wasn't in the array to be pulled
-        logging.warning(f"Milestone {milestone_id} was not found in goal {goal_id} for user {username} during delete attempt, though goal was matched.")
-        # Still return 204 as the state is effectively achieved
-        return # Return None for 204 status
-    elif result.modified_count > 0:
-        logging.info(f"Milestone {milestone_id} deleted from goal {goal_id} for user {username}.")
-
-    # No content to return for 204
-    return
+    if deleted is None:
+        if not await goal_exists(db, user_id, goal_id):
+            raise HTTPException(status.HTTP_404_NOT_FOUND, f"Goal with ID '{goal_id}' not found for user '{username}'.")
+        # Goal found but the milestone is already gone: the desired state, so still 204
+        logging.warning(f"Milestone {milestone_id} was not found in goal {goal_id} for user {username} during delete attempt.")
+        return
+
+    await count_milestone_change(db, user_id, goal_id, total=-1, completed=-int(bool(deleted.get("completed"))))
+    logging.info(f"Milestone {milestone_id} deleted from goal {goal_id} for user {username}.")
 
 # Routes for Goals
 @router.post("/goals", response_model=Goal, status_code=status.HTTP_201_CREATED)
@@ -427,6 +383,7 @@ async def create_goal(
 ):
     """Create a new goal for the user."""
     username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
     # Validate date format if present
     if goal.target_date:
@@ -446,36 +403,12 @@ async def create_goal(
     goal_dict["completed"] = False
     goal_dict["completion_date"] = None
     goal_dict["notes"] = goal_dict.get("notes", "")
-    goal_dict["milestones"] = [] # Initialize milestones for the new goal
-
-    # Check if user exists
-    user = await db.users.find_one({"username": username})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User '{username}' not found."
-        )
-
-    # Add goal to user's goals array
-    result = await db.users.update_one(
-        {"username": username},
-        {"$push": {"goals": goal_dict}}
-    )
+    goal_dict["milestones"] = [] # Milestones are added through their own endpoint
 
-    if result.modified_count == 0:
-        # Handle case where 'goals' array might not exist (though unlikely if user exists)
-        result = await db.users.update_one(
-            {"username": username},
-            {"$set": {"goals": [goal_dict]}},
-            upsert=False # Don't create user if not found, already checked
-        )
-        if result.modified_count == 0:
-             # If still 0, maybe user doc structure issue or concurrent modification?
-            logging.error(f"Failed to add goal {goal_id} for user {username}. Update count was 0.")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create goal. Could not update user document."
-            )
+    goal_doc, _ = split_goal(user_id, goal_dict)
+    goal_doc.update(milestones_total=0, milestones_completed=0)
+    await db.goals.insert_one(goal_doc)
+    await apply_counter_delta(db, user_id, goal_delta(None, goal_doc))
 
     logging.info(f"Goal '{goal.title}' (ID: {goal_id}) created for user '{username}'.")
     return goal_dict
@@ -488,27 +421,20 @@ async def get_goals(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get all goals with optional filtering."""
-    # Handle both User objects and dictionaries
-    username = get_username_from_user(current_user)
-
-    user = await db.users.find_one({"username": username})
-    if not user or "goals" not in user:
-        return []
-
-    goals = user["goals"]
+    user_id = await get_goal_owner(current_user, db)
 
+    query: Dict[str, Any] = {}
     # Filter by completion status if specified
     if completed is not None:
-        goals = [g for g in goals if g.get("completed", False) == completed]
+        query["completed"] = completed if completed else {"$ne": True}
+
+    goals = await find_goals(db, user_id, query)
 
-    # Filter by category if specified
+    # Filter by category if specified (case-insensitive)
     if category:
         goals = [g for g in goals if g.get("category", "").lower() == category.lower()]
 
-    # Sort by priority (highest first) and then by target date
-    goals.sort(key=lambda x: (x.get("completed", False), -x.get("priority", 0), x.get("target_date", "")))
-
-    return goals
+    return fast_response(List[Goal], goals)
 
 @router.get("/goals/{goal_id}", response_model=Goal)
 async def get_goal(
@@ -517,25 +443,15 @@ async def get_goal(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get a specific goal by ID."""
-    # Handle both User objects and dictionaries
-    username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
-    user = await db.users.find_one({"username": username})
-    if not user or "goals" not in user:
+    goals = await find_goals(db, user_id, {"id": goal_id})
+    if not goals:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Goals not found"
+            detail=f"Goal with ID {goal_id} not found"
         )
-
-    # Find the goal
-    for goal in user["goals"]:
-        if goal.get("id") == goal_id:
-            return goal
-
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Goal with ID {goal_id} not found"
-    )
+    return goals[0]
 
 @router.put("/goals/{goal_id}", response_model=Goal)
 async def update_goal(
@@ -546,6 +462,7 @@ async def update_goal(
 ):
     """Update a goal."""
     username = get_username_from_user(current_user)
+    user_id = await get_goal_owner(current_user, db)
 
     # Validate date format if present
     if goal_update.target_date:
@@ -565,63 +482,34 @@ async def update_goal(
         )
 
     # Prepare the $set dictionary for MongoDB
-    set_update = {}
     current_time_iso = datetime.now().isoformat()
-    set_update["goals.$[goalElem].updated_at"] = current_time_iso
-
-    for key, value in update_data.items():
-        set_update[f"goals.$[goalElem].{key}"] = value
-        # If marking as completed, set completion_date
-        if key == "completed" and value is True:
-            set_update["goals.$[goalElem].completion_date"] = current_time_iso
-        elif key == "completed" and value is False:
-             # If explicitly setting completed to False, clear completion_date
-            set_update["goals.$[goalElem].completion_date"] = None
-
-    # Use arrayFilters to target the specific goal within the array
-    result = await db.users.update_one(
-        {"username": username, "goals.id": goal_id},
+    set_update = dict(update_data, updated_at=current_time_iso)
+    # If marking as completed, set completion_date; if un-completing, clear it
+    if update_data.get("completed") is True:
+        set_update["completion_date"] = current_time_iso
+    elif update_data.get("completed") is False:
+        set_update["completion_date"] = None
+
+    # Only the goal's own document is written; its milestones are untouched
+    previous = await db.goals.find_one_and_update(
+        {"user_id": user_id, "id": goal_id},
         {"$set": set_update},
-        array_filters=[{"goalElem.id": goal_id}]
+        projection=GOAL_PROJECTION,
+        return_document=ReturnDocument.BEFORE
     )
 
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Goal with ID {goal_id} not found for user {username}."
         )
-    if result.modified_count == 0:
-        logging.warning(f"Goal {goal_id} for user {username} was matched but not modified. Update data: {update_data}")
-        # Optionally, could return the existing goal state or a 304 Not Modified, but Pydantic model might expect full Goal object
-        # Fetching the current goal state to return it
-        user_after_attempt = await db.users.find_one({"username": username})
-        if user_after_attempt:
-            for goal in user_after_attempt.get("goals", []):
-                if goal.get("id") == goal_id:
-                    return goal
-        # Fallback if fetching fails after no modification
-        raise HTTPException(
-            status_code=status.HTTP_304_NOT_MODIFIED,
-            detail="Goal found, but no changes were applied based on the provided data."
-        )
 
-    # Fetch the updated user document to return the modified goal
-    # Using projection to only get the relevant goal
-    updated_user = await db.users.find_one(
-        {"username": username, "goals.id": goal_id},
-        {"goals.$": 1}
-    )
+    # Completion or category changes move the goal between counters
+    updated_goal = {**previous, **set_update}
+    await apply_counter_delta(db, user_id, goal_delta(previous, updated_goal))
 
-    if updated_user and "goals" in updated_user and len(updated_user["goals"]) == 1:
-        logging.info(f"Goal {goal_id} updated successfully for user {username}.")
-        return updated_user["goals"][0]
-    else:
-        # This case should theoretically not happen if modified_count > 0
-        logging.error(f"Failed to retrieve updated goal {goal_id} for user {username} after successful update.")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to retrieve goal {goal_id} after update."
-        )
+    logging.info(f"Goal {goal_id} updated successfully for user {username}.")
+    return (await attach_milestones(db, user_id, [updated_goal]))[0]
 
 @router.delete("/goals/{goal_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_goal(
@@ -629,20 +517,16 @@ async def delete_goal(
     current_user: User = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Delete a goal."""
-    # Handle both User objects and dictionaries
-    username = get_username_from_user(current_user)
+    """Delete a goal and its milestones."""
+    user_id = await get_goal_owner(current_user, db)
 
-    result = await db.users.update_one(
-        {"username": username},
-        {"$pull": {"goals": {"id": goal_id}}}
-    )
-
-    if result.modified_count == 0:
+    deleted = await delete_goal_documents(db, user_id, goal_id)
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Goal with ID {goal_id} not found"
         )
+    await apply_counter_delta(db, user_id, goal_delta(deleted, None))
 
 @router.post("/goals/batch", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
 async def create_goals_batch(
@@ -655,68 +539,53 @@ async def create_goals_batch(
         "success": [],
         "errors": []
     }
+    user_id = await get_goal_owner(current_user, db)
 
+    goal_docs = []
     for goal_data in goals_batch.goals:
+        # Validate required fields
         try:
-            # Validate required fields
-            try:
-                validate_required_fields(goal_data.dict(), ["title", "description", "target_date"])
-            except ValidationError as e:
-                result["errors"].append({
-                    "data": goal_data.dict(),
-                    "error": str(e)
-                })
-                continue
-
-            # Validate date format
-            try:
-                validate_date_format(goal_data.target_date)
-            except ValidationError as e:
-                result["errors"].append({
-                    "data": goal_data.dict(),
-                    "error": str(e)
-                })
-                continue
-
-            # Create a unique ID for the goal
-            goal_id = str(ObjectId())
-
-            # Create goal document
-            goal_doc = {
-                "id": goal_id,
-                "title": goal_data.title,
-                "description": goal_data.description,
-                "target_date": goal_data.target_date,
-                "priority": goal_data.priority,
-                "category": goal_data.category,
-                "completed": False,
-                "completion_date": None,
-                "notes": "",
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
-
-            # Update user document
-            update_result = await db.users.update_one(
-                {"username": get_username_from_user(current_user)},
-                {"$push": {"goals": goal_doc}}
-            )
-
-            if update_result.modified_count == 0:
-                result["errors"].append({
-                    "data": goal_data.dict(),
-                    "error": "Failed to add goal to user"
-                })
-                continue
-
-            # Add to success list
-            result["success"].append(goal_doc)
-
-        except Exception as e:
+            validate_required_fields(goal_data.dict(), ["title", "description", "target_date"])
+            validate_date_format(goal_data.target_date)
+        except ValidationError as e:
             result["errors"].append({
                 "data": goal_data.dict(),
                 "error": str(e)
             })
+            continue
+
+        # Create goal document
+        now = datetime.now().isoformat()
+        goal_docs.append({
+            "id": str(ObjectId()),
+            "title": goal_data.title,
+            "description": goal_data.description,
+            "target_date": goal_data.target_date,
+            "priority": goal_data.priority,
+            "category": goal_data.category,
+            "completed": False,
+            "completion_date": None,
+            "notes": "",
+            "created_at": now,
+            "updated_at": now
+        })
+
+    if goal_docs:
+        # One round trip for the whole batch
+        try:
+            await db.goals.insert_many(
+                [{**doc, "user_id": user_id, "milestones_total": 0, "milestones_completed": 0} for doc in goal_docs],
+                ordered=False
+            )
+            result["success"].extend(goal_docs)
+        except BulkWriteError as e:
+            failed = {error["index"]: error.get("errmsg", "Failed to add goal") for error in e.details.get("writeErrors", [])}
+            for index, doc in enumerate(goal_docs):
+                if index in failed:
+                    result["errors"].append({"data": doc, "error": failed[index]})
+                else:
+                    result["success"].append(doc)
+        await apply_counter_delta(db, user_id, merge_deltas(*(goal_delta(None, doc) for doc in result["success"])))
 
     return result
 
@@ -729,7 +598,7 @@ async def create_roadmap(
 ):
     """Create or replace the learning roadmap."""
     # Generate a unique ID for the roadmap
-    roadmap_id = f"roadmap_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    roadmap_id = f"roadmap_{datetime.now().strftime('%Y%m%d%H%M%S%f')}" # Unique per roadmap: cached schedules are keyed by it
     now = datetime.now().isoformat()
 
     # Create roadmap object
@@ -737,10 +606,13 @@ async def create_roadmap(
     roadmap_dict["id"] = roadmap_id
     roadmap_dict["created_at"] = now
     roadmap_dict["updated_at"] = now
+    roadmap_dict["version"] = 1
+    schedule = build_roadmap_schedule(roadmap_dict["milestones"])
 
     # Replace user's roadmap
+    username = get_username_from_user(current_user)
     result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
+        {"username": username},
         {"$set": {"roadmap": roadmap_dict}}
     )
 
@@ -750,6 +622,7 @@ async def create_roadmap(
             detail="Failed to create roadmap"
         )
 
+    plan_cache.put((username, roadmap_id), roadmap_dict["version"], schedule)
     return roadmap_dict
 
 @router.get("/roadmap", response_model=Roadmap)
@@ -758,7 +631,7 @@ async def get_roadmap(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get the learning roadmap."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
+    user = await db.users.find_one({"username": get_username_from_user(current_user)}, {"roadmap": 1})
     if not user or "roadmap" not in user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -774,112 +647,162 @@ async def update_roadmap(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Update the learning roadmap."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "roadmap" not in user:
+    # Set only the changed roadmap fields
+    update_data = {k: v for k, v in roadmap_update.model_dump().items() if v is not None}
+    if "milestones" in update_data:
+        build_roadmap_schedule(update_data["milestones"])  # Reject cycles and unknown prerequisites
+    set_update = {f"roadmap.{key}": value for key, value in update_data.items()}
+    set_update["roadmap.updated_at"] = datetime.now().isoformat()
+
+    username = get_username_from_user(current_user)
+    user = await db.users.find_one_and_update(
+        {"username": username, "roadmap": {"$exists": True}},
+        {"$set": set_update, "$inc": {"roadmap.version": 1}},
+        projection={"roadmap": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Roadmap not found"
         )
 
-    # Get current roadmap
-    roadmap = user["roadmap"]
+    # The version bump makes every worker's cached schedule stale
+    plan_cache.invalidate((username, user["roadmap"].get("id")))
+    return user["roadmap"]
 
-    # Update roadmap fields
-    update_data = {k: v for k, v in roadmap_update.model_dump().items() if v is not None}
-    for key, value in update_data.items():
-        roadmap[key] = value
+def build_roadmap_schedule(milestones: List[Dict[str, Any]]) -> RoadmapSchedule:
+    """Schedule the roadmap milestones, turning graph errors into a 400."""
+    try:
+        return RoadmapSchedule(milestones)
+    except RoadmapGraphError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
-    # Update the updated_at timestamp
-    roadmap["updated_at"] = datetime.now().isoformat()
+async def get_roadmap_schedule(username: str, db: AsyncIOMotorDatabase) -> RoadmapSchedule:
+    """The cached schedule of the user's roadmap, rebuilt if the roadmap changed since."""
+    user = await db.users.find_one({"username": username}, {"roadmap.id": 1, "roadmap.version": 1})
+    roadmap = (user or {}).get("roadmap")
+    if not roadmap:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Roadmap not found"
+        )
 
-    # Save updated roadmap
-    result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
-        {"$set": {"roadmap": roadmap}}
-    )
+    key, version = (username, roadmap.get("id")), roadmap.get("version", 0)
+    schedule = plan_cache.get(key, version)
+    if schedule is None:
+        user = await db.users.find_one({"username": username}, {"roadmap.milestones": 1, "roadmap.version": 1})
+        roadmap = (user or {}).get("roadmap") or {}
+        schedule = build_roadmap_schedule(roadmap.get("milestones") or [])
+        plan_cache.put(key, roadmap.get("version", 0), schedule)
+    return schedule
+
+@router.get("/roadmap/plan", response_model=Dict[str, Any])
+async def get_roadmap_plan(
+    next_limit: int = ROADMAP_NEXT_ACTIONABLE,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Schedule the roadmap milestones from today: earliest and latest dates,
+    slack, the critical path and the next actionable milestones.
+    """
+    schedule = await get_roadmap_schedule(get_username_from_user(current_user), db)
+    return schedule.plan(datetime.now().date(), next_limit)
+
+@router.patch("/roadmap/milestones/{milestone_id}", response_model=Dict[str, Any])
+async def update_roadmap_milestone(
+    milestone_id: str,
+    milestone_update: RoadmapMilestoneUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Update one roadmap milestone's duration or completion and return the new plan."""
+    # Explicit nulls would store null durations/completion; treat them as not sent
+    update_data = {k: v for k, v in milestone_update.model_dump(exclude_unset=True).items() if v is not None}
+    if not update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No update data provided"
+        )
+    if update_data.get("estimated_days", 0) < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Estimated days cannot be negative"
+        )
+    if "completed" in update_data:
+        update_data["completion_date"] = datetime.now().isoformat() if update_data["completed"] else None
 
-    if result.modified_count == 0:
+    username = get_username_from_user(current_user)
+    set_update = {f"roadmap.milestones.$.{key}": value for key, value in update_data.items()}
+    set_update["roadmap.updated_at"] = datetime.now().isoformat()
+    user = await db.users.find_one_and_update(
+        {"username": username, "roadmap.milestones.id": milestone_id},
+        {"$set": set_update, "$inc": {"roadmap.version": 1}},
+        projection={"roadmap.id": 1, "roadmap.version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update roadmap"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Roadmap milestone with ID {milestone_id} not found"
         )
 
-    return roadmap
+    # Reschedule incrementally if this worker holds the schedule of the previous version
+    key, version = (username, user["roadmap"].get("id")), user["roadmap"]["version"]
+    schedule = plan_cache.get(key, version - 1)
+    if schedule is not None:
+        schedule.update_node(milestone_id, **update_data)
+        plan_cache.put(key, version, schedule)
+    else:
+        schedule = await get_roadmap_schedule(username, db)
+    return schedule.plan(datetime.now().date())
 
 @router.get("/progress", response_model=Dict[str, Any])
 async def get_learning_path_progress(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get learning path progress statistics."""
-    username = get_username_from_user(current_user)
+    """
+    Get learning path progress statistics.
 
-    user = await db.users.find_one({"username": username})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    Totals come from the per-category counters maintained by the goal and
+    milestone endpoints; ``since``/``until`` (ISO dates, ``since <= date < until``)
+    bound the progress history.
+    """
+    user_id = await get_goal_owner(current_user, db)
 
-    goals = user.get("goals", [])
-
-    total_goals = len(goals)
-    completed_goals = sum(1 for g in goals if g.get("completed", False))
-
-    total_milestones = 0
-    completed_milestones = 0
-    categories = {}
-    progress_history = []
-
-    for goal in goals:
-        goal_milestones = goal.get("milestones", [])
-        total_milestones += len(goal_milestones)
-        # Correctly check the 'completed' field for milestones
-        completed_milestones += sum(1 for m in goal_milestones if m.get("completed", False)) # Corrected check
-
-        # --- Category aggregation ---
-        category = goal.get("category", "Uncategorized")
-        if category not in categories:
-            # Initialize with milestone counts as well
-            categories[category] = {"total": 0, "completed": 0, "milestones_total": 0, "milestones_completed": 0}
-
-        categories[category]["total"] += 1
-        categories[category]["milestones_total"] += len(goal_milestones)
-        if goal.get("completed", False):
-            categories[category]["completed"] += 1
-        # Aggregate completed milestones per category
-        categories[category]["milestones_completed"] += sum(1 for m in goal_milestones if m.get("completed", False))
-
-        # --- Progress history aggregation ---
-        for entry in goal.get("progress_history", []):
-             if isinstance(entry, dict): # Ensure entry is a dict
-                progress_history.append({
-                    "date": entry.get("date"),
-                    "progress": entry.get("progress", 0),
-                    "goal_id": goal.get("id"),
-                    "goal_title": goal.get("title")
-                })
+    counters = await read_progress_counters(db, user_id)
+    progress_history = await find_progress_history(db, user_id, since, until)
+
+    total_goals = sum(c.get("goals", 0) for c in counters)
+    completed_goals = sum(c.get("completed_goals", 0) for c in counters)
+    total_milestones = sum(c.get("milestones", 0) for c in counters)
+    completed_milestones = sum(c.get("completed_milestones", 0) for c in counters)
 
     # Calculate overall progress based on milestone completion
     overall_progress = (completed_milestones / total_milestones * 100) if total_milestones > 0 else 0
 
     # Calculate category progress based on milestone completion
     progress_by_category = []
-    for category, data in categories.items():
-        # Calculate progress based on milestones within the category
-        category_progress = (data["milestones_completed"] / data["milestones_total"] * 100) if data["milestones_total"] > 0 else 0
+    for counter in counters:
+        milestones_total = counter.get("milestones", 0)
+        milestones_completed = counter.get("completed_milestones", 0)
+        category_progress = (milestones_completed / milestones_total * 100) if milestones_total > 0 else 0
         progress_by_category.append({
-            "name": category,
-            "total_goals": data["total"],             # Renamed for clarity
-            "completed_goals": data["completed"],       # Renamed for clarity
-            "total_milestones": data["milestones_total"], # Added
-            "completed_milestones": data["milestones_completed"], # Added
+            "name": counter["category"],
+            "total_goals": counter.get("goals", 0),
+            "completed_goals": counter.get("completed_goals", 0),
+            "total_milestones": milestones_total,
+            "completed_milestones": milestones_completed,
             "progress": category_progress
         })
 
-    # Sort progress history by date
-    progress_history.sort(key=lambda x: x.get("date", ""))
-
     return {
         "overall_progress": overall_progress,
         "completed_goals": completed_goals,
@@ -891,6 +814,52 @@ async def get_learning_path_progress(
     }
 
 # Add these routes for learning paths
+def learning_path_projection(learning_path_id: str) -> Dict[str, Any]:
+    """Projection returning only the one embedded learning path."""
+    return {"_id": 0, "learning_paths": {"$elemMatch": {"id": learning_path_id}}}
+
+async def update_embedded_learning_path(
+    db: AsyncIOMotorDatabase,
+    username: str,
+    learning_path_id: str,
+    update: Dict[str, Any],
+    path_match: Optional[Dict[str, Any]] = None,
+    array_filters: Optional[List[Dict[str, Any]]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Apply ``update`` to one embedded learning path, addressed as ``learning_paths.$[lp]``.
+
+    Only the targeted fields are written, never the whole ``learning_paths``
+    array. Returns the updated learning path, or None if no path with this ID
+    matched ``path_match``.
+    """
+    user = await db.users.find_one_and_update(
+        {"username": username, "learning_paths": {"$elemMatch": {"id": learning_path_id, **(path_match or {})}}},
+        update,
+        array_filters=[{"lp.id": learning_path_id}, *(array_filters or [])],
+        projection=learning_path_projection(learning_path_id),
+        return_document=ReturnDocument.AFTER
+    )
+    if not user or not user.get("learning_paths"):
+        return None
+    return user["learning_paths"][0]
+
+async def learning_path_exists(db: AsyncIOMotorDatabase, username: str, learning_path_id: str) -> bool:
+    """Check whether the user has a learning path with this ID."""
+    return await db.users.find_one({"username": username, "learning_paths.id": learning_path_id}, {"_id": 1}) is not None
+
+async def raise_learning_path_not_found(db: AsyncIOMotorDatabase, username: str, learning_path_id: str, resource_id: str) -> None:
+    """Raise 404 for whichever of the learning path or its resource is missing."""
+    if not await learning_path_exists(db, username, learning_path_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Learning path with ID {learning_path_id} not found"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Resource with ID {resource_id} not found in learning path"
+    )
+
 @router.get("/", response_model=List[LearningPath])
 async def get_learning_paths(
     topic: Optional[str] = None,
@@ -902,7 +871,7 @@ async def get_learning_paths(
     # Extract username with proper type checking
     username = get_username_from_user(current_user)
 
-    user = await db.users.find_one({"username": username})
+    user = await db.users.find_one({"username": username}, {"learning_paths": 1})
     if not user or "learning_paths" not in user:
         return []
 
@@ -938,25 +907,18 @@ async def create_learning_path(
     learning_path_dict["created_at"] = now
     learning_path_dict["updated_at"] = now
 
-    # Add to user's learning paths
+    # Add to user's learning paths ($push creates the array if it is missing)
     result = await db.users.update_one(
         {"username": get_username_from_user(current_user)},
         {"$push": {"learning_paths": learning_path_dict}}
     )
 
     if result.modified_count == 0:
-        # If the learning_paths array doesn't exist yet, create it
-        result = await db.users.update_one(
-            {"username": get_username_from_user(current_user)},
-            {"$set": {"learning_paths": [learning_path_dict]}}
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create learning path"
         )
 
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create learning path"
-            )
-
     return learning_path_dict
 
 @router.get("/{learning_path_id}", response_model=LearningPath)
@@ -966,22 +928,17 @@ async def get_learning_path(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get a specific learning path by ID."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "learning_paths" not in user:
+    user = await db.users.find_one(
+        {"username": get_username_from_user(current_user)},
+        learning_path_projection(learning_path_id)
+    )
+    if not user or not user.get("learning_paths"):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Learning paths not found"
+            detail=f"Learning path with ID {learning_path_id} not found"
         )
 
-    # Find the learning path
-    for lp in user["learning_paths"]:
-        if lp.get("id") == learning_path_id:
-            return lp
-
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Learning path with ID {learning_path_id} not found"
-    )
+    return user["learning_paths"][0]
 
 @router.put("/{learning_path_id}", response_model=LearningPath)
 async def update_learning_path(
@@ -991,49 +948,21 @@ async def update_learning_path(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Update a learning path."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "learning_paths" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Learning paths not found"
-        )
-
-    # Find the learning path to update
-    learning_paths = user["learning_paths"]
-    lp_index = None
-    for i, lp in enumerate(learning_paths):
-        if lp.get("id") == learning_path_id:
-            lp_index = i
-            break
+    # Update learning path fields, except resources (managed by their own endpoints)
+    update_data = learning_path_update.model_dump(exclude={"resources"})
+    set_update = {f"learning_paths.$[lp].{key}": value for key, value in update_data.items()}
+    set_update["learning_paths.$[lp].updated_at"] = datetime.now().isoformat()
 
-    if lp_index is None:
+    learning_path = await update_embedded_learning_path(
+        db, get_username_from_user(current_user), learning_path_id, {"$set": set_update}
+    )
+    if learning_path is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Learning path with ID {learning_path_id} not found"
         )
 
-    # Update learning path fields
-    update_data = learning_path_update.model_dump()
-    for key, value in update_data.items():
-        if key != "resources":  # Don't overwrite resources
-            learning_paths[lp_index][key] = value
-
-    # Update timestamp
-    learning_paths[lp_index]["updated_at"] = datetime.now().isoformat()
-
-    # Save updated learning paths
-    result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
-        {"$set": {"learning_paths": learning_paths}}
-    )
-
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update learning path"
-        )
-
-    return learning_paths[lp_index]
+    return learning_path
 
 @router.delete("/{learning_path_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_learning_path(
@@ -1061,58 +990,29 @@ async def add_resource_to_learning_path(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Add a resource to a learning path."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "learning_paths" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Learning paths not found"
-        )
-
-    # Find the learning path
-    learning_paths = user["learning_paths"]
-    lp_index = None
-    for i, lp in enumerate(learning_paths):
-        if lp.get("id") == learning_path_id:
-            lp_index = i
-            break
-
-    if lp_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Learning path with ID {learning_path_id} not found"
-        )
-
-    # Add resource to learning path
-    if "resources" not in learning_paths[lp_index]:
-        learning_paths[lp_index]["resources"] = []
+    username = get_username_from_user(current_user)
 
-    # Check if resource already exists
-    for existing_resource in learning_paths[lp_index]["resources"]:
-        if existing_resource.get("id") == resource.id:
+    # Push only if the path does not hold this resource yet
+    learning_path = await update_embedded_learning_path(
+        db, username, learning_path_id,
+        {
+            "$push": {"learning_paths.$[lp].resources": resource.model_dump()},
+            "$set": {"learning_paths.$[lp].updated_at": datetime.now().isoformat()}
+        },
+        path_match={"resources.id": {"$ne": resource.id}}
+    )
+    if learning_path is None:
+        if not await learning_path_exists(db, username, learning_path_id):
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Resource with ID {resource.id} already exists in this learning path"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Learning path with ID {learning_path_id} not found"
             )
-
-    # Add resource
-    learning_paths[lp_index]["resources"].append(resource.model_dump())
-
-    # Update timestamp
-    learning_paths[lp_index]["updated_at"] = datetime.now().isoformat()
-
-    # Save updated learning paths
-    result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
-        {"$set": {"learning_paths": learning_paths}}
-    )
-
-    if result.modified_count == 0:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to add resource to learning path"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Resource with ID {resource.id} already exists in this learning path"
         )
 
-    return learning_paths[lp_index]
+    return learning_path
 
 @router.put("/{learning_path_id}/resources/{resource_id}", response_model=LearningPath)
 async def update_resource_in_learning_path(
@@ -1123,67 +1023,23 @@ async def update_resource_in_learning_path(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Update a resource in a learning path."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "learning_paths" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Learning paths not found"
-        )
-
-    # Find the learning path
-    learning_paths = user["learning_paths"]
-    lp_index = None
-    for i, lp in enumerate(learning_paths):
-        if lp.get("id") == learning_path_id:
-            lp_index = i
-            break
-
-    if lp_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Learning path with ID {learning_path_id} not found"
-        )
-
-    # Find the resource
-    if "resources" not in learning_paths[lp_index]:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No resources found in learning path with ID {learning_path_id}"
-        )
-
-    resource_index = None
-    for i, r in enumerate(learning_paths[lp_index]["resources"]):
-        if r.get("id") == resource_id:
-            resource_index = i
-            break
-
-    if resource_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Resource with ID {resource_id} not found in learning path"
-        )
-
-    # Update resource
-    update_data = resource_update.model_dump()
-    for key, value in update_data.items():
-        learning_paths[lp_index]["resources"][resource_index][key] = value
+    username = get_username_from_user(current_user)
 
-    # Update timestamp
-    learning_paths[lp_index]["updated_at"] = datetime.now().isoformat()
+    set_update = {
+        f"learning_paths.$[lp].resources.$[res].{key}": value
+        for key, value in resource_update.model_dump().items()
+    }
+    set_update["learning_paths.$[lp].updated_at"] = datetime.now().isoformat()
 
-    # Save updated learning paths
-    result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
-        {"$set": {"learning_paths": learning_paths}}
+    learning_path = await update_embedded_learning_path(
+        db, username, learning_path_id, {"$set": set_update},
+        path_match={"resources.id": resource_id},
+        array_filters=[{"res.id": resource_id}]
     )
+    if learning_path is None:
+        await raise_learning_path_not_found(db, username, learning_path_id, resource_id)
 
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update resource in learning path"
-        )
-
-    return learning_paths[lp_index]
+    return learning_path
 
 @router.post("/{learning_path_id}/resources/{resource_id}/complete", response_model=LearningPath)
 async def mark_resource_completed_in_learning_path(
@@ -1194,70 +1050,27 @@ async def mark_resource_completed_in_learning_path(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Mark a resource as completed in a learning path."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "learning_paths" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Learning paths not found"
-        )
-
-    # Find the learning path
-    learning_paths = user["learning_paths"]
-    lp_index = None
-    for i, lp in enumerate(learning_paths):
-        if lp.get("id") == learning_path_id:
-            lp_index = i
-            break
-
-    if lp_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Learning path with ID {learning_path_id} not found"
-        )
-
-    # Find the resource
-    if "resources" not in learning_paths[lp_index]:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No resources found in learning path with ID {learning_path_id}"
-        )
-
-    resource_index = None
-    for i, r in enumerate(learning_paths[lp_index]["resources"]):
-        if r.get("id") == resource_id:
-            resource_index = i
-            break
-
-    if resource_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Resource with ID {resource_id} not found in learning path"
-        )
-
-    # Mark as completed
-    learning_paths[lp_index]["resources"][resource_index]["completed"] = True
-    learning_paths[lp_index]["resources"][resource_index]["completion_date"] = datetime.now().isoformat()
+    username = get_username_from_user(current_user)
 
+    now = datetime.now().isoformat()
+    set_update = {
+        "learning_paths.$[lp].resources.$[res].completed": True,
+        "learning_paths.$[lp].resources.$[res].completion_date": now,
+        "learning_paths.$[lp].updated_at": now
+    }
     # Add notes if provided
     if notes and "notes" in notes:
-        learning_paths[lp_index]["resources"][resource_index]["notes"] = notes["notes"]
+        set_update["learning_paths.$[lp].resources.$[res].notes"] = notes["notes"]
 
-    # Update timestamp
-    learning_paths[lp_index]["updated_at"] = datetime.now().isoformat()
-
-    # Save updated learning paths
-    result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
-        {"$set": {"learning_paths": learning_paths}}
+    learning_path = await update_embedded_learning_path(
+        db, username, learning_path_id, {"$set": set_update},
+        path_match={"resources.id": resource_id},
+        array_filters=[{"res.id": resource_id}]
     )
+    if learning_path is None:
+        await raise_learning_path_not_found(db, username, learning_path_id, resource_id)
 
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to mark resource as completed"
-        )
-
-    return learning_paths[lp_index]
+    return learning_path
 
 @router.delete("/{learning_path_id}/resources/{resource_id}", response_model=LearningPath)
 async def remove_resource_from_learning_path(
@@ -1267,59 +1080,17 @@ async def remove_resource_from_learning_path(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Remove a resource from a learning path."""
-    user = await db.users.find_one({"username": get_username_from_user(current_user)})
-    if not user or "learning_paths" not in user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Learning paths not found"
-        )
-
-    # Find the learning path
-    learning_paths = user["learning_paths"]
-    lp_index = None
-    for i, lp in enumerate(learning_paths):
-        if lp.get("id") == learning_path_id:
-            lp_index = i
-            break
-
-    if lp_index is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Learning path with ID {learning_path_id} not found"
-        )
-
-    # Find the resource
-    if "resources" not in learning_paths[lp_index]:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No resources found in learning path with ID {learning_path_id}"
-        )
-
-    # Remove resource
-    resources = learning_paths[lp_index]["resources"]
-    resources_filtered = [r for r in resources if r.get("id") != resource_id]
-
-    if len(resources) == len(resources_filtered):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Resource with ID {resource_id} not found in learning path"
-        )
-
-    learning_paths[lp_index]["resources"] = resources_filtered
-
-    # Update timestamp
-    learning_paths[lp_index]["updated_at"] = datetime.now().isoformat()
+    username = get_username_from_user(current_user)
 
-    # Save updated learning paths
-    result = await db.users.update_one(
-        {"username": get_username_from_user(current_user)},
-        {"$set": {"learning_paths": learning_paths}}
+    learning_path = await update_embedded_learning_path(
+        db, username, learning_path_id,
+        {
+            "$pull": {"learning_paths.$[lp].resources": {"id": resource_id}},
+            "$set": {"learning_paths.$[lp].updated_at": datetime.now().isoformat()}
+        },
+        path_match={"resources.id": resource_id}
     )
+    if learning_path is None:
+        await raise_learning_path_not_found(db, username, learning_path_id, resource_id)
 
-    if result.modified_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to remove resource from learning path"
-        )
-
-    return learning_paths[lp_index]
\ No newline at end of file
+    return learning_path
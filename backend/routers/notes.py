@@ -1,9 +1,14 @@
 """Notes management endpoints."""
 from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
-from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import List, Optional, Dict
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator, ConfigDict, ValidationError
+from pymongo.errors import BulkWriteError
+from typing import Any, List, Optional, Dict, Tuple
+from collections import Counter
 from datetime import datetime, timezone
+import os
 import logging
+import re
 from bson import ObjectId
 import uuid
 
@@ -13,6 +18,14 @@ from utils.rate_limiter import (
     notes_read_rate_limit,
     notes_write_rate_limit
 )
+from utils.pagination import CountCache, decode_cursor, encode_cursor, keyset_filter
+from utils.tag_counts import apply_tag_diff, get_tag_counts, increment_tag_counts, rebuild_tag_counts
+from utils.ndjson import NDJSON_MEDIA_TYPE, encode_line, iter_lines
+
+# Configuration
+NOTE_IMPORT_BATCH_SIZE = int(os.getenv("NOTE_IMPORT_BATCH_SIZE", "500"))
+NOTE_IMPORT_MAX_ERRORS = int(os.getenv("NOTE_IMPORT_MAX_ERRORS", "100"))  # errors reported in the response
+NOTE_EXPORT_BATCH_SIZE = int(os.getenv("NOTE_EXPORT_BATCH_SIZE", "500"))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +33,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Per-user note counts, invalidated locally on create/delete
+note_counts = CountCache()
+
 class NoteBase(BaseModel):
     """Base note model."""
     title: str = Field(
@@ -82,13 +98,21 @@ class NoteUpdate(BaseModel):
     )
 
 class NotePagination(BaseModel):
-    """Pagination response model."""
+    """
+    Pagination response model.
+
+    ``next_cursor`` is passed back as ``after`` to fetch the next page. The
+    offset fields are only filled in for legacy ``skip`` requests, and
+    ``total`` only when ``include_total`` is set.
+    """
     items: List[Dict]
-    total: int
-    skip: int
     limit: int
-    total_pages: int
-    current_page: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total: Optional[int] = None
+    skip: Optional[int] = None
+    total_pages: Optional[int] = None
+    current_page: Optional[int] = None
 
 class Note(NoteBase):
     """Note response model."""
@@ -100,6 +124,89 @@ class Note(NoteBase):
         """Pydantic config for Note model."""
         from_attributes = True
 
+class NoteSearchHit(BaseModel):
+    """A search result: note metadata plus a highlighted snippet, without the full content."""
+    id: str
+    title: str
+    tags: List[str] = []
+    updated_at: datetime
+    score: float
+    snippet: str
+    highlights: List[Tuple[int, int]] = Field(default=[], description="[start, end) offsets of matches in snippet")
+
+class NoteSearchResults(BaseModel):
+    """Search response model; pass ``next_cursor`` back as ``after``."""
+    items: List[NoteSearchHit]
+    limit: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+class TagCount(BaseModel):
+    """A tag and the number of the user's notes carrying it."""
+    tag: str
+    count: int
+
+class TagCounts(BaseModel):
+    """Tag facet response model, most used tags first."""
+    tags: List[TagCount]
+    total_tags: int
+
+class NoteImportError(BaseModel):
+    """A rejected import line."""
+    line: int
+    error: str
+
+class NoteImportResult(BaseModel):
+    """
+    Import summary.
+
+    ``errors`` lists at most NOTE_IMPORT_MAX_ERRORS rejected lines;
+    ``failed`` counts all of them.
+    """
+    imported: int
+    failed: int
+    errors: List[NoteImportError]
+    errors_truncated: bool = False
+
+SNIPPET_LENGTH = 200
+
+def search_terms(query: str) -> List[str]:
+    """Return the positive terms of a $text query (phrases split, negations dropped)."""
+    terms = []
+    for token in re.findall(r'-?"[^"]*"|\S+', query):
+        if token.startswith("-"):
+            continue
+        terms.extend(word for word in re.findall(r"\w+", token) if word)
+    return terms
+
+def build_snippet(content: str, terms: List[str], length: int = SNIPPET_LENGTH) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Cut a window of ``content`` around the first matching term.
+
+    Returns the snippet and the offsets of every term match inside it. Matching
+    is by word prefix so "learn" also highlights "learning", roughly following
+    the text index's stemming.
+    """
+    if not terms:
+        return content[:length], []
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    first = pattern.search(content)
+    start = 0
+    if first and first.start() > length // 3:
+        start = first.start() - length // 3
+        # Begin on a word boundary
+        space = content.find(" ", start)
+        if space != -1 and space < first.start():
+            start = space + 1
+    snippet = content[start:start + length]
+    highlights = [(m.start(), m.end()) for m in pattern.finditer(snippet)]
+    if start > 0:
+        snippet = "…" + snippet
+        highlights = [(a + 1, b + 1) for a, b in highlights]
+    if start + length < len(content):
+        snippet += "…"
+    return snippet, highlights
+
 def get_user_id(current_user) -> str:
     """Safely extract user ID from current_user which can be a dict or an object."""
     if current_user is None:
@@ -124,16 +231,31 @@ def get_user_id(current_user) -> str:
                 detail="Error identifying user"
             )
 
+async def count_notes(user_id: str, note_filter: Dict, tag: Optional[str]) -> int:
+    """Return the number of notes matching the filter, cached briefly per user."""
+    total = note_counts.get(user_id, tag)
+    if total is None:
+        total = await db.notes.count_documents(note_filter)
+        note_counts.set(user_id, tag, total)
+    return total
+
 @router.get("/", response_model=NotePagination)
 async def get_notes(
     request: Request,
     tag: Optional[str] = Query(None, description="Filter notes by tag"),
-    skip: int = Query(0, ge=0, description="Number of notes to skip"),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's next_cursor"),
+    skip: Optional[int] = Query(None, ge=0, description="Deprecated offset pagination; use 'after'"),
     limit: int = Query(20, ge=1, le=100, description="Maximum number of notes to return"),
+    include_total: bool = Query(True, description="Include the (cached) total note count"),
     current_user: dict = Depends(get_current_active_user),
     _: None = Depends(notes_read_rate_limit)
 ):
-    """Get all notes for the current user with pagination."""
+    """
+    Get the current user's notes, most recently updated first.
+
+    Pages are fetched by keyset on the (user_id, updated_at, _id) index, so
+    every page costs the same regardless of depth.
+    """
     try:
         user_id = get_user_id(current_user)
         note_filter = {"user_id": user_id}
@@ -141,33 +263,43 @@ async def get_notes(
         if tag:
             note_filter["tags"] = tag
 
-        # Get total count for pagination
-        total = await db.notes.count_documents(note_filter)
-        total_pages = (total + limit - 1) // limit
-        current_page = (skip // limit) + 1
+        query = dict(note_filter)
+        if after:
+            position = decode_cursor(after)
+            if "u" not in position or "i" not in position:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+            query.update(keyset_filter("updated_at", position["u"], position["i"]))
 
-        # Query database with pagination
-        notes_cursor = db.notes.find(note_filter)\
-            .sort("updated_at", -1)\
-            .skip(skip)\
-            .limit(limit)
+        # Fetch one extra document to learn whether another page exists
+        notes_cursor = db.notes.find(query).sort([("updated_at", -1), ("_id", -1)])
+        if skip and not after:
+            notes_cursor = notes_cursor.skip(skip)
+        notes = await notes_cursor.limit(limit + 1).to_list(length=None)
 
-        notes = await notes_cursor.to_list(length=None)
+        has_more = len(notes) > limit
+        notes = notes[:limit]
 
         # Format response
         for note in notes:
             note["id"] = str(note["_id"])
 
-        logger.info(f"Retrieved {len(notes)} notes for user {user_id}")
+        logger.debug(f"Retrieved {len(notes)} notes for user {user_id}")
 
-        return {
+        page = {
             "items": notes,
-            "total": total,
-            "skip": skip,
             "limit": limit,
-            "total_pages": total_pages,
-            "current_page": current_page
+            "has_more": has_more,
+            "next_cursor": encode_cursor({"u": notes[-1]["updated_at"], "i": notes[-1]["_id"]}) if has_more else None,
         }
+        if include_total or skip is not None:
+            total = await count_notes(user_id, note_filter, tag)
+            page["total"] = total
+            if not after:
+                offset = skip or 0
+                page["skip"] = offset
+                page["total_pages"] = (total + limit - 1) // limit
+                page["current_page"] = (offset // limit) + 1
+        return page
     except HTTPException as e:
         logger.error(f"Error getting notes: {str(e)}")
         raise e
@@ -178,6 +310,228 @@ async def get_notes(
             detail="Error retrieving notes"
         )
 
+@router.get("/search", response_model=NoteSearchResults)
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=200, description="Text query (MongoDB $text syntax)"),
+    tags: List[str] = Query([], description="Only notes carrying all of these tags"),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's next_cursor"),
+    limit: int = Query(20, ge=1, le=50, description="Maximum number of results to return"),
+    current_user: dict = Depends(get_current_active_user),
+    _: None = Depends(notes_read_rate_limit)
+):
+    """
+    Rank the current user's notes against ``q`` using the notes text index.
+
+    Results are ordered by text score (ties by ``_id``) and paged by keyset on
+    that order. Only a snippet around the first match is returned, not the
+    full note content.
+    """
+    try:
+        user_id = get_user_id(current_user)
+
+        match: Dict[str, Any] = {"$text": {"$search": q}, "user_id": user_id}
+        if tags:
+            match["tags"] = {"$all": [tag.lower().strip() for tag in tags]}
+
+        # $text must be in the first stage; the score only exists after it
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": match},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+        ]
+        if after:
+            position = decode_cursor(after)
+            if "s" not in position or "i" not in position:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+            pipeline.append({"$match": keyset_filter("score", position["s"], position["i"])})
+        pipeline += [
+            {"$sort": {"score": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {"title": 1, "content": 1, "tags": 1, "updated_at": 1, "score": 1}},
+        ]
+
+        hits = await db.notes.aggregate(pipeline).to_list(length=None)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+
+        terms = search_terms(q)
+        items = []
+        for hit in hits:
+            snippet, highlights = build_snippet(hit.get("content", ""), terms)
+            items.append({
+                "id": str(hit["_id"]),
+                "title": hit.get("title", ""),
+                "tags": hit.get("tags", []),
+                "updated_at": hit.get("updated_at"),
+                "score": hit["score"],
+                "snippet": snippet,
+                "highlights": highlights,
+            })
+
+        logger.debug(f"Search matched {len(items)} notes for user {user_id}")
+        return {
+            "items": items,
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": encode_cursor({"s": hits[-1]["score"], "i": hits[-1]["_id"]}) if has_more else None,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching notes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error searching notes"
+        )
+
+@router.get("/tags", response_model=TagCounts)
+async def get_note_tags(
+    current_user: dict = Depends(get_current_active_user),
+    _: None = Depends(notes_read_rate_limit)
+):
+    """
+    Get the current user's tags with note counts.
+
+    Served from the maintained ``note_tag_counts`` aggregate, so the cost grows
+    with the number of tags rather than notes. Users whose counts predate the
+    aggregate are backfilled once on first request.
+    """
+    try:
+        user_id = get_user_id(current_user)
+
+        if not current_user.get("note_tag_counts_built"):
+            await rebuild_tag_counts(db, user_id)
+            await db.users.update_one({"_id": current_user["_id"]}, {"$set": {"note_tag_counts_built": True}})
+
+        tags = await get_tag_counts(db, user_id)
+        return {"tags": tags, "total_tags": len(tags)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting note tags: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving note tags"
+        )
+
+def format_validation_error(error: ValidationError) -> str:
+    """Flatten a pydantic error into a single line for import reports."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+        for item in error.errors()
+    )
+
+@router.post("/import", response_model=NoteImportResult)
+async def import_notes(
+    request: Request,
+    current_user: dict = Depends(get_current_active_user),
+    _: None = Depends(notes_write_rate_limit)
+):
+    """
+    Bulk-create notes from an NDJSON request body, one NoteCreate object per line.
+
+    The body is parsed as it streams in and valid notes are written with
+    ``insert_many`` every NOTE_IMPORT_BATCH_SIZE lines, so memory stays bounded
+    regardless of upload size. Invalid lines are skipped and reported by line
+    number; blank lines are ignored.
+    """
+    user_id = get_user_id(current_user)
+    result = {"imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    batch: List[Dict[str, Any]] = []
+    batch_lines: List[int] = []
+
+    def reject(line: int, error: str) -> None:
+        result["failed"] += 1
+        if len(result["errors"]) < NOTE_IMPORT_MAX_ERRORS:
+            result["errors"].append({"line": line, "error": error})
+        else:
+            result["errors_truncated"] = True
+
+    async def flush() -> None:
+        if not batch:
+            return
+        failed_indexes = set()
+        try:
+            await db.notes.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed_indexes.add(write_error["index"])
+                reject(batch_lines[write_error["index"]], write_error.get("errmsg", "Write failed"))
+        inserted = [doc for i, doc in enumerate(batch) if i not in failed_indexes]
+        result["imported"] += len(inserted)
+        await increment_tag_counts(db, user_id, Counter(tag for doc in inserted for tag in doc.get("tags", [])))
+        batch.clear()
+        batch_lines.clear()
+
+    try:
+        async for line_number, line in iter_lines(request.stream()):
+            if line is None:
+                reject(line_number, "Line too long")
+                continue
+            if not line.strip():
+                continue
+            try:
+                note = NoteCreate.model_validate_json(line)
+            except ValidationError as e:
+                reject(line_number, format_validation_error(e))
+                continue
+
+            now = datetime.now(timezone.utc)
+            batch.append({**note.model_dump(), "user_id": user_id, "created_at": now, "updated_at": now})
+            batch_lines.append(line_number)
+            if len(batch) >= NOTE_IMPORT_BATCH_SIZE:
+                await flush()
+        await flush()
+    except Exception as e:
+        logger.error(f"Error importing notes for user {user_id} after {result['imported']} notes: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error importing notes; {result['imported']} notes were imported before the failure"
+        )
+    finally:
+        if result["imported"]:
+            note_counts.invalidate(user_id)
+
+    logger.info(f"Imported {result['imported']} notes for user {user_id} ({result['failed']} rejected)")
+    return result
+
+@router.get("/export")
+async def export_notes(
+    current_user: dict = Depends(get_current_active_user),
+    _: None = Depends(notes_read_rate_limit)
+):
+    """
+    Stream all of the current user's notes as NDJSON, newest first.
+
+    The cursor is consumed in NOTE_EXPORT_BATCH_SIZE batches while the response
+    is written, so the full note set is never held in memory. Each line can be
+    fed back to ``POST /import``.
+    """
+    user_id = get_user_id(current_user)
+    cursor = db.notes.find(
+        {"user_id": user_id},
+        {"user_id": 0}
+    ).sort([("updated_at", -1), ("_id", -1)]).batch_size(NOTE_EXPORT_BATCH_SIZE)
+
+    async def lines():
+        exported = 0
+        try:
+            async for note in cursor:
+                note["id"] = str(note.pop("_id"))
+                yield encode_line(note)
+                exported += 1
+        except Exception as e:
+            # Headers are already sent; the truncated body is the only signal left
+            logger.error(f"Error exporting notes for user {user_id} after {exported} notes: {str(e)}")
+            raise
+        logger.info(f"Exported {exported} notes for user {user_id}")
+
+    return StreamingResponse(
+        lines(),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'}
+    )
+
+# Registered before "/{note_id}" so "search", "tags" and "export" are not taken for a note ID
 @router.get("/{note_id}", response_model=Note)
 async def get_note(
     note_id: str,
@@ -205,7 +559,7 @@ async def get_note(
             )
 
         note["id"] = str(note["_id"])
-        logger.info(f"Retrieved note {note_id} for user {user_id}")
+        logger.debug(f"Retrieved note {note_id} for user {user_id}")
         return note
     except HTTPException:
         raise
@@ -236,6 +590,8 @@ async def create_note(
         created_note = await db.notes.find_one({"_id": result.inserted_id})
         created_note["id"] = str(created_note["_id"])
 
+        note_counts.invalidate(user_id)
+        await apply_tag_diff(db, user_id, [], note_dict.get("tags", []))
         logger.info(f"Created note {created_note['id']} for user {user_id}")
         return created_note
     except Exception as e:
@@ -278,10 +634,15 @@ async def update_note(
         if note_update.tags is not None: update_data["tags"] = note_update.tags
         if update_data:
             update_data["updated_at"] = datetime.now(timezone.utc)
-            update_result = await db.notes.update_one(
+            # Returns the pre-update tags atomically, so concurrent edits diff correctly
+            previous = await db.notes.find_one_and_update(
                 {"_id": object_id, "user_id": user_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"tags": 1}
             )
+            if "tags" in update_data and previous is not None:
+                note_counts.invalidate(user_id)
+                await apply_tag_diff(db, user_id, previous.get("tags", []), update_data["tags"])
 
         updated_note = await db.notes.find_one({"_id": object_id})
         updated_note["id"] = str(updated_note["_id"])
@@ -323,7 +684,13 @@ async def delete_note(
                 detail="Note not found"
             )
 
-        await db.notes.delete_one({"_id": object_id, "user_id": user_id})
+        deleted = await db.notes.find_one_and_delete(
+            {"_id": object_id, "user_id": user_id},
+            projection={"tags": 1}
+        )
+        note_counts.invalidate(user_id)
+        if deleted is not None:
+            await apply_tag_diff(db, user_id, deleted.get("tags", []), [])
         logger.info(f"Deleted note {note_id} for user {user_id}")
     except HTTPException:
         raise
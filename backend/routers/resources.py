@@ -21,9 +21,11 @@ from database import get_db # Import get_db dependency function
 from utils.db_utils import get_document_by_id, update_document, delete_document
 from utils.validators import validate_resource_type, validate_url, validate_rating
 from utils.error_handlers import ValidationError
+from utils.fast_json import fast_response
 
 # --- Import Central Library Data ---
 from resources.ai_ml_resources import get_formatted_resources
+from resources.learning_paths import CAREER_PATHS, get_formatted_learning_path, get_resource_ids
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -136,11 +138,51 @@ class LibraryStatusUpdate(BaseModel):
     completed: bool
     notes: Optional[str] = None
 
+# Models for resolving the resources a learning path references
+class LibraryResolveRequest(BaseModel):
+    resource_ids: List[str] = []
+    learning_path: Optional[Any] = None # A formatted learning path, roadmap, or list of milestones/phases
+    career_path: Optional[str] = None # Key of a predefined career path (see resources.learning_paths)
+
+class LibraryResolveResponse(BaseModel):
+    resources: Dict[str, LibraryResource]
+    missing: List[str] = []
+
 # We need to add this model to the top of the file with other models
 class ResourceBatchCreateTest(BaseModel):
     resources: List[BatchResourceItem]
 
 # Helper functions
+async def get_library_statuses(db: AsyncIOMotorDatabase, username: str, resource_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """The user's status records for these central library resources, in one ``$in`` query."""
+    statuses = {}
+    if resource_ids:
+        cursor = db.user_library_status.find(
+            {"username": username, "resource_id": {"$in": resource_ids}},
+            {"_id": 0, "resource_id": 1, "completed": 1, "completion_date": 1, "notes": 1}
+        )
+        async for status_doc in cursor:
+            statuses[status_doc["resource_id"]] = status_doc
+    return statuses
+
+def merge_library_status(resource: Dict[str, Any], status_info: Optional[Dict[str, Any]]) -> LibraryResource:
+    """A central library resource with the user's completion status merged in."""
+    resource_copy = resource.copy()
+    resource_copy.pop('_id', None) # Remove potential mongo id if it crept in
+    if status_info:
+        completion_date = status_info.get('completion_date')
+        resource_copy['completed'] = status_info.get('completed', False)
+        # Stored as a datetime; the model carries ISO strings
+        resource_copy['completion_date'] = completion_date.isoformat() if isinstance(completion_date, datetime) else completion_date
+        resource_copy['notes'] = status_info.get('notes') or resource_copy.get('notes', '') # Prioritize user notes
+    else:
+        # Default status if no user record exists
+        resource_copy['completed'] = False
+        resource_copy['completion_date'] = None
+        # Keep original notes if no user notes
+        resource_copy['notes'] = resource_copy.get('notes', '')
+    return LibraryResource(**resource_copy)
+
 async def get_next_resource_id(db: AsyncIOMotorDatabase, username: str, resource_type: str):
     """Get the next available integer ID for a user-added resource."""
     try:
@@ -216,32 +258,32 @@ async def get_central_library_resources(
     username = get_username(current_user)
     # Make a copy to avoid modifying the original list in memory
     filtered_resources = list(ALL_CENTRAL_RESOURCES_LIST)
-    logger.info(f"Initial library resource count: {len(filtered_resources)}") # Log initial count
+    logger.debug(f"Initial library resource count: {len(filtered_resources)}") # Log initial count
 
     # Apply filters first
     if topic:
         # topic is now a list of strings
-        logger.info(f"Filtering library by topics: {topic}")
+        logger.debug(f"Filtering library by topics: {topic}")
         topics_lower = [t.lower() for t in topic]
         filtered_resources = [
             r for r in filtered_resources
             if any(res_topic.lower() in topics_lower for res_topic in r.get("topics", []))
         ]
-        logger.info(f"Resources after topic filter: {len(filtered_resources)}")
+        logger.debug(f"Resources after topic filter: {len(filtered_resources)}")
     if type:
         # type is now a list of strings
-        logger.info(f"Filtering library by types: {type}")
+        logger.debug(f"Filtering library by types: {type}")
         types_lower = [t.lower() for t in type]
         filtered_resources = [r for r in filtered_resources if r.get("type", "").lower() in types_lower]
-        logger.info(f"Resources after type filter: {len(filtered_resources)}")
+        logger.debug(f"Resources after type filter: {len(filtered_resources)}")
     if difficulty:
         # difficulty is now a list of strings
-        logger.info(f"Filtering library by difficulties: {difficulty}")
+        logger.debug(f"Filtering library by difficulties: {difficulty}")
         difficulties_lower = [d.lower() for d in difficulty]
         filtered_resources = [r for r in filtered_resources if r.get("difficulty", "").lower() in difficulties_lower]
-        logger.info(f"Resources after difficulty filter: {len(filtered_resources)}")
+        logger.debug(f"Resources after difficulty filter: {len(filtered_resources)}")
     if search:
-        logger.info(f"Filtering library by search: '{search}'")
+        logger.debug(f"Filtering library by search: '{search}'")
         search_lower = search.lower()
         filtered_resources = [
             r for r in filtered_resources
@@ -249,7 +291,7 @@ async def get_central_library_resources(
                search_lower in r.get("notes", "").lower() or \
                any(search_lower in t.lower() for t in r.get("topics", []))
         ]
-        logger.info(f"Resources after search filter: {len(filtered_resources)}")
+        logger.debug(f"Resources after search filter: {len(filtered_resources)}")
 
     # Calculate pagination details AFTER filtering
     total_items = len(filtered_resources)
@@ -265,45 +307,62 @@ async def get_central_library_resources(
     paginated_metadata = filtered_resources[start_index:end_index]
 
     # Fetch user's completion status ONLY for the paginated resources
-    user_statuses = {}
-    resource_ids_to_fetch = [r['id'] for r in paginated_metadata]
-    if resource_ids_to_fetch:
-        status_cursor = db.user_library_status.find({
-            "username": username,
-            "resource_id": {"$in": resource_ids_to_fetch}
-        })
-        async for status_doc in status_cursor:
-            user_statuses[status_doc["resource_id"]] = status_doc
+    user_statuses = await get_library_statuses(db, username, [r['id'] for r in paginated_metadata])
 
     # Merge status into the paginated results
     results_with_status = []
     for resource in paginated_metadata:
-        resource_copy = resource.copy()
-        status_info = user_statuses.get(resource_copy['id'])
-        if status_info:
-            resource_copy['completed'] = status_info.get('completed', False)
-            resource_copy['completion_date'] = status_info.get('completion_date')
-            resource_copy['notes'] = status_info.get('notes', resource_copy.get('notes', '')) # Prioritize user notes
-        else:
-            # Default status if no user record exists
-            resource_copy['completed'] = False
-            resource_copy['completion_date'] = None
-            # Keep original notes if no user notes
-            resource_copy['notes'] = resource_copy.get('notes', '')
-
-        # Ensure all fields match LibraryResource model
-        # 'id' is already string from CENTRAL_RESOURCES_DICT key
-        # 'type' was added during initial load
-        resource_copy.pop('_id', None) # Remove potential mongo id if it crept in
-
         # Validate against the model before appending (optional but good practice)
         try:
-            validated_resource = LibraryResource(**resource_copy)
-            results_with_status.append(validated_resource)
+            results_with_status.append(merge_library_status(resource, user_statuses.get(resource['id'])))
         except Exception as model_exc: # Catch Pydantic validation error specifically if needed
-             logger.warning(f"Skipping resource due to validation error: {resource_copy.get('id')}, Error: {model_exc}")
+             logger.warning(f"Skipping resource due to validation error: {resource.get('id')}, Error: {model_exc}")
+
+    # Already validated above: serialise without FastAPI's second validation pass
+    return fast_response(List[LibraryResource], results_with_status, validated=True, headers=dict(response.headers))
 
-    return results_with_status
+@router.post("/library/resolve", response_model=LibraryResolveResponse)
+async def resolve_library_resources(
+    resolve_request: LibraryResolveRequest,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Resolve every central library resource a learning path or roadmap
+    references, with the user's completion status, in one request.
+
+    IDs come from ``resource_ids``, the ``resources`` found anywhere in
+    ``learning_path``, and the predefined ``career_path``. IDs that are not in
+    the central library are listed in ``missing``.
+    """
+    username = get_username(current_user)
+
+    if resolve_request.career_path is not None and resolve_request.career_path not in CAREER_PATHS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Career path '{resolve_request.career_path}' not found"
+        )
+
+    requested = list(resolve_request.resource_ids)
+    if resolve_request.learning_path is not None:
+        requested += get_resource_ids(resolve_request.learning_path)
+    if resolve_request.career_path is not None:
+        requested += get_resource_ids(get_formatted_learning_path(resolve_request.career_path))
+    requested = list(dict.fromkeys(requested)) # Deduplicate, keeping order
+
+    found = [resource_id for resource_id in requested if resource_id in CENTRAL_RESOURCES_DICT]
+    missing = [resource_id for resource_id in requested if resource_id not in CENTRAL_RESOURCES_DICT]
+
+    # One query for the status of every resolved resource
+    user_statuses = await get_library_statuses(db, username, found)
+    resolved = LibraryResolveResponse(
+        resources={
+            resource_id: merge_library_status(CENTRAL_RESOURCES_DICT[resource_id], user_statuses.get(resource_id))
+            for resource_id in found
+        },
+        missing=missing
+    )
+    return fast_response(LibraryResolveResponse, resolved, validated=True)
 
 @router.get("/topics", response_model=List[str])
 async def get_central_library_topics():
@@ -608,7 +667,7 @@ async def get_all_user_resources_grouped(
                             logger.error(f"Validation error for resource in {plural_type_key}: {resource_dict.get('id')} - {e}")
             validated_grouped_resources[plural_type_key] = validated_list
 
-        return validated_grouped_resources
+        return fast_response(Dict[str, List[UserResource]], validated_grouped_resources, validated=True)
     except Exception as e:
         logger.error(f"Error fetching grouped resources for user {username}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error fetching resources")
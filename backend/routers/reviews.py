@@ -25,6 +25,7 @@ from utils.db_utils import get_document_by_id, update_document, delete_document
 from utils.validators import validate_date_format, validate_rating, validate_required_fields, validate_resource_type
 from utils.error_handlers import ValidationError, ResourceNotFoundError
 from utils.response_models import StandardResponse, ResponseMessages
+from utils.fast_json import fast_response
 
 # Create router
 router = APIRouter()
@@ -195,7 +196,7 @@ async def get_concepts(
         ]
 
     print(f"DEBUG: returning {len(concepts)} concepts")
-    return concepts
+    return fast_response(List[Concept], concepts)
 
 @router.get("/concepts/{concept_id}", response_model=Concept)
 async def get_concept(
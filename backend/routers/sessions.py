@@ -8,6 +8,7 @@ from bson import ObjectId
 
 from auth import get_current_active_user  # Corrected import path
 from database import db  # Corrected import path
+from utils.session_activity import SessionActivityBuffer
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -17,6 +18,9 @@ router = APIRouter(tags=["sessions"])
 # Session expiry duration in minutes (e.g., 1 hour)
 SESSION_EXPIRY_MINUTES = 60
 
+# Heartbeats are coalesced here and flushed in bulk (started/stopped in main.lifespan)
+session_activity = SessionActivityBuffer(ttl=timedelta(minutes=SESSION_EXPIRY_MINUTES))
+
 class Session(BaseModel):
     session_id: str = Field(default_factory=lambda: str(uuid4()))
     user_id: str
@@ -58,10 +62,7 @@ async def create_session(
         result = await db.sessions.insert_one(session.dict())
         if not result.inserted_id:
             raise HTTPException(status_code=500, detail="Could not create session")
-
-        # Cleanup expired sessions in the background
-        if background_tasks:
-            background_tasks.add_task(cleanup_expired_sessions)
+        session_activity.remember(session.session_id, session.user_id, session.expires_at)
 
         logger.info(f"Created new session {session.session_id} for user {current_user['username']}")
         return SessionCreateResponse(
@@ -76,12 +77,18 @@ async def create_session(
 @router.get("/me", response_model=Session)
 async def get_my_session(session_id: str, current_user: dict = Depends(get_current_active_user)) -> Any:
     """Retrieve the current session info based on session_id provided by the client."""
-    session = await db.sessions.find_one({"session_id": session_id, "user_id": str(current_user["_id"])})
+    user_id = str(current_user["_id"])
+    session = await db.sessions.find_one({
+        "session_id": session_id,
+        "user_id": user_id,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     # Update last_active time
-    await update_session_activity(session_id)
+    session_activity.remember(session_id, user_id, session["expires_at"])
+    await session_activity.touch(session_id, user_id)
 
     return session
 
@@ -99,17 +106,12 @@ async def get_active_sessions(current_user: dict = Depends(get_current_active_us
 
 @router.put("/{session_id}/activity")
 async def update_session_activity(session_id: str, current_user: dict = Depends(get_current_active_user)) -> Any:
-    """Update the last_active timestamp of a session."""
-    user_id = str(current_user["_id"])
-    now = datetime.now(timezone.utc)
-    expires_at = now + timedelta(minutes=SESSION_EXPIRY_MINUTES)
-
-    result = await db.sessions.update_one(
-        {"session_id": session_id, "user_id": user_id},
-        {"$set": {"last_active": now, "expires_at": expires_at}}
-    )
+    """
+    Update the last_active timestamp of a session.
 
-    if result.matched_count == 0:
+    Buffered in ``session_activity``; expired sessions are never revived.
+    """
+    if not await session_activity.touch(session_id, str(current_user["_id"])):
         raise HTTPException(status_code=404, detail="Session not found")
 
     return {"message": "Session activity updated"}
@@ -119,6 +121,7 @@ async def delete_session(session_id: str, current_user: dict = Depends(get_curre
     """Invalidate (delete) a session for the current user."""
     try:
         result = await db.sessions.delete_one({"session_id": session_id, "user_id": str(current_user["_id"])})
+        session_activity.forget(session_id)
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Session not found or already deleted")
 
@@ -132,13 +135,19 @@ async def delete_all_sessions(current_user: dict = Depends(get_current_active_us
     """Invalidate (delete) all sessions for the current user except the current one."""
     try:
         result = await db.sessions.delete_many({"user_id": str(current_user["_id"])})
+        session_activity.forget_user(str(current_user["_id"]))
         logger.info(f"Deleted {result.deleted_count} sessions for user {current_user['username']}")
     except Exception as e:
         logger.error(f"Error deleting all sessions: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Could not delete sessions: {str(e)}")
 
 async def cleanup_expired_sessions() -> int:
-    """Delete all sessions that have expired."""
+    """
+    Delete all sessions that have expired.
+
+    Routine expiry is handled by the TTL index on ``expires_at``; this is only
+    for forcing an immediate purge (the TTL monitor runs about once a minute).
+    """
     try:
         now = datetime.now(timezone.utc)
         result = await db.sessions.delete_many({"expires_at": {"$lt": now}})
@@ -213,6 +222,7 @@ async def create_login_session(
         if not result.inserted_id:
             logger.error("Could not create login session")
             return None
+        session_activity.remember(session.session_id, user_id, session.expires_at)
 
         logger.info(f"Created new login session {session.session_id} for user {username}")
         return session.session_id
@@ -228,16 +238,19 @@ async def start_study_session(current_user: dict = Depends(get_current_active_us
     expires_at = now + timedelta(minutes=SESSION_EXPIRY_MINUTES)
 
     session_data = {
+        "session_id": str(uuid4()),
         "user_id": user_id,
         "is_active": True,
+        "last_active": now,
         "expires_at": expires_at
     }
 
     result = await db.sessions.insert_one(session_data)
     if not result.inserted_id:
         raise HTTPException(status_code=500, detail="Could not start study session")
+    session_activity.remember(session_data["session_id"], user_id, expires_at)
 
-    return {"session_id": result.inserted_id}
+    return {"session_id": session_data["session_id"]}
 
 @router.post("/log-activity", status_code=status.HTTP_200_OK)
 async def log_activity(current_user: dict = Depends(get_current_active_user)) -> Any:
@@ -246,12 +259,20 @@ async def log_activity(current_user: dict = Depends(get_current_active_user)) ->
     now = datetime.now(timezone.utc)
 
     # Check if session exists and belongs to the user
-    session = await db.sessions.find_one({"user_id": user_id, "is_active": True})
+    session = await db.sessions.find_one({"user_id": user_id, "is_active": True, "expires_at": {"$gt": now}})
     if not session:
         raise HTTPException(status_code=404, detail="No active study session found")
 
     # Update last_active time
-    await update_session_activity(session["session_id"])
+    if "session_id" in session:
+        session_activity.remember(session["session_id"], user_id, session["expires_at"])
+        await session_activity.touch(session["session_id"], user_id)
+    else:
+        # Sessions started before study sessions carried a session_id
+        await db.sessions.update_one(
+            {"_id": session["_id"]},
+            {"$set": {"last_active": now, "expires_at": now + timedelta(minutes=SESSION_EXPIRY_MINUTES)}}
+        )
 
     return {"message": "Activity logged successfully"}
 
@@ -285,57 +306,39 @@ async def start_review_session(current_user: dict = Depends(get_current_active_u
     expires_at = now + timedelta(minutes=SESSION_EXPIRY_MINUTES)
 
     session_data = {
+        "session_id": str(uuid4()),
         "user_id": user_id,
         "is_active": True,
+        "last_active": now,
         "expires_at": expires_at
     }
 
     result = await db.sessions.insert_one(session_data)
     if not result.inserted_id:
         raise HTTPException(status_code=500, detail="Could not start review session")
+    session_activity.remember(session_data["session_id"], user_id, expires_at)
 
-    return {"session_id": result.inserted_id}
+    return {"session_id": session_data["session_id"]}
 
 @router.get("/all-sessions", response_model=SessionList)
 async def get_all_sessions(current_user: dict = Depends(get_current_active_user)) -> Any:
     """Get all active sessions (both study and review) for the current user."""
     user_id = str(current_user["_id"])
     now = datetime.now(timezone.utc)
-    active_sessions = []
-
-    # Find all active study sessions
-    study_sessions = await db.sessions.find({
-        "user_id": user_id,
-        "is_active": True,
-        "expires_at": {"$gt": now}
-    }).to_list(length=None)
-    active_sessions.extend(study_sessions)
 
-    # Find all active review sessions
-    review_sessions = await db.sessions.find({
+    # Study and review sessions share the collection; one query covers both
+    active_sessions = await db.sessions.find({
         "user_id": user_id,
         "is_active": True,
         "expires_at": {"$gt": now}
     }).to_list(length=None)
-    active_sessions.extend(review_sessions)
 
     return SessionList(sessions=active_sessions)
 
 @router.post("/renew-session", status_code=status.HTTP_200_OK)
 async def renew_session(session_id: str, current_user: dict = Depends(get_current_active_user)) -> Any:
     """Renew an existing session's expiry time."""
-    user_id = str(current_user["_id"])
-    now = datetime.now(timezone.utc)
-    expires_at = now + timedelta(minutes=SESSION_EXPIRY_MINUTES)
-
-    session_oid = ObjectId(session_id)
-
-    result = await db.sessions.update_one(
-        {"session_id": session_id, "user_id": user_id},
-        {"$set": {"expires_at": expires_at}}
-    )
-
-    if result.matched_count == 0:
+    if not await session_activity.touch(session_id, str(current_user["_id"]), active=False):
         raise HTTPException(status_code=404, detail="Session not found")
 
     return {"message": "Session expiry time renewed"}
\ No newline at end of file
@@ -1,19 +1,28 @@
 """User management endpoints."""
-from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
 from pydantic import BaseModel, EmailStr, constr, Field, ConfigDict
 from typing import Optional, List, Dict, Any, Union, Annotated
 import logging
 from datetime import datetime, timedelta, timezone
-import json
-from bson import json_util, ObjectId
-from fastapi.responses import JSONResponse, FileResponse
-import tempfile
+from bson import ObjectId
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 import os
 
 from database import get_db
-from auth import get_current_active_user, get_password_hash
+from auth import get_current_active_user, get_password_hash_async, user_fields
 from utils.validators import validate_email, validate_password_strength
 from utils.rate_limiter import rate_limit_dependency_with_logging, create_user_rate_limit
+from utils.fieldsets import sparse_response
+from utils.jobs import jobs, job_status, COMPLETED
+from utils.account_deletion import purge_plan, tombstone_user
+from utils.user_export import (
+    USER_EXPORT_INLINE_LIMIT,
+    count_export_items,
+    export_filename,
+    export_media_type,
+    export_path,
+    stream_export,
+)
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo.errors import DuplicateKeyError
 from loguru import logger
@@ -85,6 +94,17 @@ class UserStatistics(BaseModel):
     active_days: int = 0
     completion_rate: float = 0.0
 
+class JobStatus(BaseModel):
+    """Background job status; poll until ``status`` is completed or failed."""
+    job_id: str
+    kind: str
+    status: str
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class NotificationPreferences(BaseModel):
     """User notification preferences model."""
     email_notifications: bool = True
@@ -223,7 +243,7 @@ async def create_user(
         user_dict = user.model_dump()
         user_dict["created_at"] = datetime.now(timezone.utc)
         user_dict["updated_at"] = user_dict["created_at"] # Set initial updated_at
-        user_dict["hashed_password"] = get_password_hash(user.password)
+        user_dict["hashed_password"] = await get_password_hash_async(user.password)
         user_dict["is_active"] = True
         user_dict["disabled"] = False # Ensure default
         # Initialize empty lists/dicts for fields managed elsewhere or optional
@@ -233,7 +253,8 @@ async def create_user(
         user_dict["learning_paths"] = []
         user_dict["reviews"] = []
         user_dict["concepts"] = []
-        user_dict["goals"] = []
+        user_dict["goals_migrated"] = True # Goals live in the goals collection
+        user_dict["progress_counters_built"] = True # Nothing to count yet
         user_dict["metrics"] = []
         user_dict["review_log"] = {}
         user_dict["milestones"] = []
@@ -272,9 +293,14 @@ async def create_user(
 @router.get("/me", response_model=User, response_model_by_alias=False)
 async def read_users_me(
     db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
+    selected: Optional[List[str]] = Depends(user_fields(list(User.model_fields))),
     current_user: dict = Depends(get_current_active_user)
 ):
-    """Get current user profile."""
+    """
+    Get current user profile.
+
+    ``?fields=`` selects the fields to read and return, e.g. ``fields=profile``.
+    """
     # Check if current_user is already a User object or MockUser (for tests)
     if hasattr(current_user, 'model_dump') and callable(current_user.model_dump):
         user_data = current_user.model_dump()
@@ -293,6 +319,8 @@ async def read_users_me(
     try:
         user_model = User(**normalized_user_data)
         logger.debug(f"[read_users_me] Pydantic User model created: {user_model.model_dump(exclude_unset=True)}")
+        if selected is not None:
+            return sparse_response(user_model, selected)
         return user_model
     except Exception as e:
         logger.error(f"[read_users_me] Error creating User model from normalized data: {e}", exc_info=True)
@@ -302,11 +330,12 @@ async def read_users_me(
 @router.get("/me/", response_model=User, response_model_by_alias=False)
 async def read_users_me_with_slash(
     db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
+    selected: Optional[List[str]] = Depends(user_fields(list(User.model_fields))),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get current user profile (trailing slash)."""
     # Delegate to the non-slash version to avoid code duplication
-    return await read_users_me(db=db, current_user=current_user)
+    return await read_users_me(db=db, selected=selected, current_user=current_user)
 
 @router.get("/{username}", response_model=User)
 async def read_user(
@@ -426,49 +455,43 @@ async def update_notification_preferences(
             detail="Error updating notification preferences"
         )
 
-@router.post("/me/export", response_model=dict)
+@router.post("/me/export", responses={202: {"model": JobStatus}})
 async def export_user_data(
     db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(get_current_active_user),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json (single object) or ndjson (one item per line)"),
+    compress: bool = Query(False, description="gzip the export"),
+    background: Optional[bool] = Query(None, description="Force (true) or forbid (false) a background job; by default only large accounts get one")
 ):
-    """Export current user's data."""
-    try:
-        # Create a clean copy of user data for export
-        export_data = {
-            "user_info": {
-                "username": current_user["username"],
-                "email": current_user["email"],
-                "first_name": current_user.get("first_name"),
-                "last_name": current_user.get("last_name"),
-                "created_at": current_user["created_at"]
-            },
-            "learning_data": {
-                "resources": current_user.get("resources", {}),
-                "learning_paths": current_user.get("learning_paths", []),
-                "concepts": current_user.get("concepts", []),
-                "study_sessions": current_user.get("study_sessions", []),
-                "review_sessions": current_user.get("review_sessions", []),
-                "goals": current_user.get("goals", []),
-                "milestones": current_user.get("milestones", [])
-            },
-            "statistics": (await get_user_statistics(db=db, current_user=current_user)).model_dump(),
-            "preferences": (await get_notification_preferences(db=db, current_user=current_user)).model_dump(),
-            "export_date": datetime.now(timezone.utc)
-        }
-
-        # Use ISO format for consistency
-        export_data["export_date"] = export_data["export_date"].isoformat()
+    """
+    Export current user's data.
 
-        # Create a temporary file to store the export
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as tmp:
-            json.dump(export_data, tmp, default=json_util.default, indent=2)
-            tmp_path = tmp.name
+    The export is streamed from database cursors as it is generated. Accounts
+    with more than USER_EXPORT_INLINE_LIMIT items (or ``background=true``) get a
+    202 with a job to poll at ``/me/export/jobs/{job_id}`` instead.
+    """
+    try:
+        user_id = current_user["_id"]
+        item_count = await count_export_items(db, user_id)
+
+        if background or (background is None and item_count > USER_EXPORT_INLINE_LIMIT):
+            job = await jobs.submit(
+                "user_export",
+                user_id=str(user_id),
+                params={"format": format, "compress": compress, "username": current_user["username"]},
+                progress={"items_written": 0, "items_total": item_count}
+            )
+            logger.info(f"Started export job {job['_id']} for user {current_user['username']} ({item_count} items)")
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=JobStatus(**job_status(job)).model_dump(mode="json")
+            )
 
-        # Return the file as a download
-        return FileResponse(
-            tmp_path,
-            media_type='application/json',
-            filename=f'user_data_export_{current_user["username"]}_{datetime.now(timezone.utc).strftime("%Y%m%d")}.json'
+        filename = export_filename(current_user["username"], format, compress)
+        return StreamingResponse(
+            stream_export(db, user_id, format, compress),
+            media_type=export_media_type(format, compress),
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
     except Exception as e:
         logger.error(f"Error exporting user data: {str(e)}")
@@ -476,46 +499,61 @@ async def export_user_data(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error exporting user data"
         )
-    finally:
-        # Clean up the temporary file
-        if 'tmp_path' in locals():
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-
-@router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/me/export/jobs/{job_id}", response_model=JobStatus)
+async def get_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get the status and progress of one of the current user's export jobs."""
+    job = await jobs.get(job_id, user_id=str(current_user["_id"]))
+    if not job or job["kind"] != "user_export":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found")
+    return job_status(job)
+
+@router.get("/me/export/jobs/{job_id}/download")
+async def download_export(
+    job_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Download the file produced by a completed export job."""
+    job = await jobs.get(job_id, user_id=str(current_user["_id"]))
+    if not job or job["kind"] != "user_export":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found")
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Export is {job['status']}")
+
+    path = export_path(job_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export file has expired")
+    return FileResponse(path, media_type=job["result"]["media_type"], filename=job["result"]["filename"])
+
+@router.delete("/me", status_code=status.HTTP_202_ACCEPTED, response_model=JobStatus)
 async def delete_account(
     db: Annotated[AsyncIOMotorDatabase, Depends(get_db)],
     current_user: dict = Depends(get_current_active_user)
 ):
-    """Delete current user's account."""
-    try:
-        # Start a transaction for atomic operations
-        async with await db.client.start_session() as session:
-            async with session.start_transaction():
-                # Delete user's resources
-                await db.resources.delete_many({"user_id": str(current_user["_id"])})
-
-                # Delete user's learning paths
-                await db.learning_paths.delete_many({"user_id": str(current_user["_id"])})
-
-                # Delete user's study sessions
-                await db.study_sessions.delete_many({"user_id": str(current_user["_id"])})
-
-                # Delete user's reviews
-                await db.reviews.delete_many({"user_id": str(current_user["_id"])})
-
-                # Finally, delete the user
-                result = await db.users.delete_one({"_id": current_user["_id"]})
+    """
+    Delete current user's account.
 
-                if result.deleted_count == 0:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Could not delete user account"
-                    )
+    The account is disabled immediately and its data is purged in batches by
+    a background ``account_deletion`` job. Progress can be followed at
+    ``/deletion-jobs/{job_id}`` (the account itself can no longer sign in).
+    """
+    try:
+        user_id = str(current_user["_id"])
+        job = await jobs.find_active("account_deletion", user_id)
+        if job is None:
+            job = await jobs.submit(
+                "account_deletion",
+                user_id=user_id,
+                params={"username": current_user["username"]},
+                progress={"collections_done": 0, "collections_total": len(purge_plan(user_id, current_user["username"]))}
+            )
+        await tombstone_user(db, user_id)
 
-        return None
+        logger.info(f"Scheduled account deletion job {job['_id']} for user {current_user['username']}")
+        return job_status(job)
     except Exception as e:
         logger.error(f"Error deleting user account: {str(e)}")
         raise HTTPException(
@@ -523,6 +561,20 @@ async def delete_account(
             detail="Error deleting user account"
         )
 
+@router.get("/deletion-jobs/{job_id}", response_model=JobStatus)
+async def get_deletion_job(job_id: str):
+    """
+    Progress of an account deletion.
+
+    Unauthenticated because the account is disabled (and finally removed)
+    while the job runs; the random job ID is the capability, and the response
+    only carries per-collection counts.
+    """
+    job = await jobs.get(job_id)
+    if not job or job["kind"] != "account_deletion":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion job not found")
+    return job_status(job)
+
 @router.patch("/me", response_model=User)
 async def update_user_me(
     update_data: UserUpdate,
@@ -560,7 +612,7 @@ async def update_user_me(
 
     # If password is included, hash it
     if "password" in update_payload:
-        hashed_password = get_password_hash(update_payload["password"])
+        hashed_password = await get_password_hash_async(update_payload["password"])
         db_update_dict["hashed_password"] = hashed_password
 
     # Add updated_at timestamp
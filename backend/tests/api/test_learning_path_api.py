@@ -10,6 +10,7 @@ from auth import User, get_current_user, get_current_active_user, oauth2_scheme
 from database import get_db
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Dict
+from mongomock_motor import AsyncMongoMockClient
 
 # Import standardized utilities
 from utils.error_handlers import AuthenticationError, ResourceNotFoundError
@@ -86,76 +87,79 @@ async def mock_auth_dependencies():
     app.dependency_overrides.pop(get_current_user, None)
     app.dependency_overrides.pop(get_current_active_user, None)
 
-@pytest.mark.asyncio
-async def test_get_goals(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test getting all goals."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    # Create test goals
-    goals = [
-        {
-            "id": "goal1",
-            "title": "Learn Python",
-            "description": "Master Python programming",
-            "target_date": str(datetime.now() + timedelta(days=30)),
-            "priority": 5,
-            "category": "Programming",
-            "completed": False,
-            "completion_date": None,
-            "notes": ""
-        },
-        {
-            "id": "goal2",
-            "title": "Learn FastAPI",
-            "description": "Master FastAPI framework",
-            "target_date": str(datetime.now() + timedelta(days=60)),
-            "priority": 4,
-            "category": "Web Development",
-            "completed": False,
-            "completion_date": None,
-            "notes": ""
-        }
-    ]
+USER_ID = "testuser"  # MockUser.id
 
-    # --- Corrected Mock Setup ---
-    # Create an AsyncMock for the find_one method
-    mock_find_one = AsyncMock()
-    # Set the return value for the find_one call
-    mock_find_one.return_value = {
-        "username": "testuser",
-        "goals": goals
+def _goal(goal_id, **fields):
+    goal = {
+        "id": goal_id,
+        "title": f"Goal {goal_id}",
+        "description": "Description",
+        "target_date": (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d"),
+        "priority": 3,
+        "category": "Programming",
+        "completed": False,
+        "completion_date": None,
+        "notes": ""
     }
+    goal.update(fields)
+    return goal
+
+def _milestone(milestone_id, **fields):
+    milestone = {
+        "id": milestone_id,
+        "title": f"Milestone {milestone_id}",
+        "description": "Step",
+        "target_date": (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d"),
+        "verification_method": "Check code",
+        "resources": [],
+        "completed": False,
+        "completion_date": None,
+        "notes": "",
+        "status": "not_started"
+    }
+    milestone.update(fields)
+    return milestone
 
-    # Create a mock for the users collection
-    mock_users = MagicMock() # Collection itself can be MagicMock
-    # Assign the AsyncMock to the find_one attribute
-    mock_users.find_one = mock_find_one
-
-    # Create a mock for the db object
-    mock_db = MagicMock()
-    mock_db.users = mock_users # Assign the collection mock
-    # --- End Corrected Mock Setup ---
+@pytest_asyncio.fixture
+async def goal_db():
+    """In-memory database with an already-migrated test user; overrides get_db."""
+    db = AsyncMongoMockClient()["learning_path_test"]
+    await db.users.insert_one({"_id": USER_ID, "username": "testuser", "goals_migrated": True})
 
-    # Define override for DB
     async def override_get_db():
-        return mock_db
+        return db
     app.dependency_overrides[get_db] = override_get_db
+    yield db
+
+async def _seed(db, goal, milestones=()):
+    await db.goals.insert_one({**goal, "user_id": USER_ID})
+    for milestone in milestones:
+        await db.milestones.insert_one({**milestone, "user_id": USER_ID, "goal_id": goal["id"]})
+
+# --- Goal Tests --- #
+
+@pytest.mark.asyncio
+async def test_get_goals(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test getting all goals, sorted by priority, with their milestones."""
+    await _seed(goal_db, _goal("goal1", title="Learn Python", priority=5), [_milestone("m1")])
+    await _seed(goal_db, _goal("goal2", title="Learn FastAPI", priority=4))
+    await _seed(goal_db, _goal("goal3", title="Done", priority=9, completed=True))
+    await goal_db.goals.insert_one({**_goal("other"), "user_id": "someone_else"})
 
-    # Mock the database operations
     response = await async_client.get("/api/learning-path/goals", headers=auth_headers)
 
     assert response.status_code == 200
     goals_data = response.json()
-    assert len(goals_data) == 2
-    assert goals_data[0]["title"] == "Learn Python"
-    assert goals_data[1]["title"] == "Learn FastAPI"
+    assert [g["title"] for g in goals_data] == ["Learn Python", "Learn FastAPI", "Done"]
+    assert [m["id"] for m in goals_data[0]["milestones"]] == ["m1"]
+    assert goals_data[1]["milestones"] == []
+
+    response = await async_client.get("/api/learning-path/goals", params={"completed": False}, headers=auth_headers)
+    assert [g["id"] for g in response.json()] == ["goal1", "goal2"]
 
 @pytest.mark.asyncio
-async def test_create_goal(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_create_goal(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test creating a new goal."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    # New goal data
     new_goal = {
         "title": "New Goal",
         "description": "New Goal Description",
@@ -164,83 +168,23 @@ async def test_create_goal(async_client: AsyncClient, auth_headers, mock_auth_de
         "category": "New Category"
     }
 
-    # Create a mock for the find_one method
-    mock_find_one = AsyncMock()
-    mock_find_one.return_value = {
-        "username": "testuser",
-        "goals": []
-    }
-
-    # Create a mock for the update_one method
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.modified_count = 1
-    mock_update_one.return_value = mock_update_result
-
-    # Create a mock for the users collection
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    mock_users.update_one = mock_update_one
-
-    # Create a mock for the db
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    # Mock the database operations
     response = await async_client.post("/api/learning-path/goals", json=new_goal, headers=auth_headers)
 
     assert response.status_code == 201
     created_goal = response.json()
     assert created_goal["title"] == "New Goal"
     assert created_goal["description"] == "New Goal Description"
-    assert "id" in created_goal
+    assert created_goal["milestones"] == []
+    stored = await goal_db.goals.find_one({"user_id": USER_ID, "id": created_goal["id"]})
+    assert stored["title"] == "New Goal"
+    assert "milestones" not in stored
+    # The user document is not touched
+    assert "goals" not in await goal_db.users.find_one({"_id": USER_ID})
 
 @pytest.mark.asyncio
-async def test_create_goals_batch(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_create_goals_batch(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test creating multiple goals in a batch."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    # Create a mock for the find_one method
-    mock_find_one = AsyncMock()
-    mock_find_one.return_value = {
-        "username": "testuser",
-        "goals": []
-    }
-
-    # Create a mock for the update_one method
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.modified_count = 1
-    mock_update_one.return_value = mock_update_result
-
-    # Create a mock for the users collection
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    mock_users.update_one = mock_update_one
-
-    # Create a mock for the db
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    # Get tomorrow's date for the target dates
-    tomorrow = datetime.now() + timedelta(days=1)
-    target_date = tomorrow.strftime("%Y-%m-%d")
-
-    # Mock the ObjectId for predictable IDs in tests
-    mock_object_id = MagicMock()
-    mock_object_id.return_value = "mock_object_id"
-
-    # Test data
+    target_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
     batch_goals = {
         "goals": [
             {
@@ -260,908 +204,559 @@ async def test_create_goals_batch(async_client: AsyncClient, auth_headers, mock_
         ]
     }
 
-    # Mock the database operations
-    with patch('routers.learning_path.ObjectId', return_value=mock_object_id), \
-         patch('routers.learning_path.Goal') as MockGoal:
-
-        # Set up the mock Goal class to return a dict from model_dump
-        MockGoal.side_effect = lambda **kwargs: MagicMock(**kwargs, model_dump=lambda: kwargs)
-
-        response = await async_client.post("/api/learning-path/goals/batch", json=batch_goals, headers=auth_headers)
-
-        assert response.status_code == 201
-        response_data = response.json()
-        assert isinstance(response_data, dict)
-        assert "success" in response_data
-        assert "errors" in response_data
-        assert isinstance(response_data["success"], list)
-        assert isinstance(response_data["errors"], list)
-        assert len(response_data["errors"]) == 0 # Expect no errors
-        assert len(response_data["success"]) == 2 # Expect 2 successful creations
-
-        # Check the content of the created goals
-        assert response_data["success"][0]["title"] == "Learn Python"
-        assert response_data["success"][1]["title"] == "Learn FastAPI"
-        # Verify the mock database call
-        # Since batch pushes goals in one update operation
-        # Update: Endpoint calls update_one for each goal in the batch
-        assert mock_update_one.call_count == 2
-
-    # Clean up dependencies
-    app.dependency_overrides = {}
+    response = await async_client.post("/api/learning-path/goals/batch", json=batch_goals, headers=auth_headers)
+
+    assert response.status_code == 201
+    response_data = response.json()
+    assert [g["title"] for g in response_data["success"]] == ["Learn Python", "Learn FastAPI"]
+    assert response_data["errors"] == []
+    assert await goal_db.goals.count_documents({"user_id": USER_ID}) == 2
 
 @pytest.mark.asyncio
-async def test_get_goal_by_id(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_get_goal_by_id(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test getting a specific goal by ID."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_to_get = "goal123"
-    specific_goal_data = {
-        "id": goal_id_to_get,
-        "title": "Specific Goal Title",
-        "description": "Details of the specific goal",
-        "target_date": datetime.now().strftime("%Y-%m-%d"),
-        "priority": 5,
-        "category": "Testing",
-        "completed": False
-    }
-
-    # Mock find_one for the endpoint logic (user already authenticated by fixture)
-    # We assume the auth fixture already mocked find_one for auth check if needed.
-    # Here we configure the mock DB provided by the override for the *endpoint's* call.
-    mock_find_one_for_endpoint = AsyncMock()
-    mock_find_one_for_endpoint.return_value = {
-        "username": "testuser",
-        "goals": [specific_goal_data, {"id": "other_goal"}] # User data for the endpoint
-    }
-
-    mock_users_for_endpoint = MagicMock()
-    mock_users_for_endpoint.find_one = mock_find_one_for_endpoint
-    mock_db_for_endpoint = MagicMock()
-    mock_db_for_endpoint.users = mock_users_for_endpoint
+    await _seed(goal_db, _goal("goal123", title="Specific Goal"), [_milestone("m2", completed=True), _milestone("m1")])
 
-    # Define override specifically for this test context
-    async def override_get_db_for_test():
-        # This mock DB will be used by the endpoint's `db.users.find_one` call
-        return mock_db_for_endpoint
-    app.dependency_overrides[get_db] = override_get_db_for_test
-
-    response = await async_client.get(f"/api/learning-path/goals/{goal_id_to_get}", headers=auth_headers)
+    response = await async_client.get("/api/learning-path/goals/goal123", headers=auth_headers)
 
     assert response.status_code == 200
     goal_data = response.json()
-    assert goal_data["id"] == goal_id_to_get
-    assert goal_data["title"] == specific_goal_data["title"]
-
-    # Verify the endpoint's find_one was called as expected
-    mock_find_one_for_endpoint.assert_awaited_once_with({"username": "testuser"})
-
-    # Clean up override
-    app.dependency_overrides.pop(get_db, None)
+    assert goal_data["id"] == "goal123"
+    assert goal_data["title"] == "Specific Goal"
+    # Open milestones first
+    assert [m["id"] for m in goal_data["milestones"]] == ["m1", "m2"]
 
 @pytest.mark.asyncio
-async def test_get_goal_by_id_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test getting a goal by ID when it doesn't exist for the user."""
-    # mock_auth_dependencies handles auth
-
-    goal_id_nonexistent = "goal_not_here"
-
-    # Mock find_one for the endpoint logic (user exists, but goal doesn't)
-    mock_find_one_for_endpoint = AsyncMock()
-    mock_find_one_for_endpoint.return_value = {
-        "username": "testuser",
-        "goals": [{"id": "other_goal"}] # User has goals, but not the one requested
-    }
-
-    mock_users_for_endpoint = MagicMock()
-    mock_users_for_endpoint.find_one = mock_find_one_for_endpoint
-    mock_db_for_endpoint = MagicMock()
-    mock_db_for_endpoint.users = mock_users_for_endpoint
-
-    # Define override
-    async def override_get_db_for_test():
-        return mock_db_for_endpoint
-    app.dependency_overrides[get_db] = override_get_db_for_test
-
-    response = await async_client.get(f"/api/learning-path/goals/{goal_id_nonexistent}", headers=auth_headers)
+async def test_get_goal_by_id_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test getting a goal that does not exist."""
+    response = await async_client.get("/api/learning-path/goals/nonexistent_goal", headers=auth_headers)
 
     assert response.status_code == 404
-    assert "Goal with ID goal_not_here not found" in response.json()["detail"]
-
-    # Verify the endpoint's find_one was called
-    mock_find_one_for_endpoint.assert_awaited_once_with({"username": "testuser"})
-
-    # Clean up override
-    app.dependency_overrides.pop(get_db, None)
+    assert response.json()["detail"] == "Goal with ID nonexistent_goal not found"
 
 @pytest.mark.asyncio
-async def test_update_goal(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_update_goal(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test updating an existing goal."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_to_update = "goal_to_update"
-    original_goal = {
-        "id": goal_id_to_update,
-        "title": "Original Goal Title",
-        "description": "Original Description",
-        "target_date": datetime.now().strftime("%Y-%m-%d"),
-        "priority": 3,
-        "category": "Original Category",
-        "completed": False,
-        "completion_date": None,
-        "notes": "Original Notes"
-    }
+    await _seed(goal_db, _goal("goal_to_update", title="Original Goal Title", notes="Original Notes"), [_milestone("m1")])
     update_payload = {
         "title": "Updated Goal Title",
         "priority": 4,
         "completed": True # Mark as completed
     }
 
-    # Simulate user state *after* the update
-    expected_completion_date_str = datetime.now().isoformat()
-    updated_goal_state = {
-        "id": goal_id_to_update,
-        "title": update_payload["title"],
-        "description": original_goal["description"], # Preserved
-        "target_date": original_goal["target_date"], # Preserved
-        "priority": update_payload["priority"],
-        "category": original_goal["category"], # Preserved
-        "completed": update_payload["completed"],
-        "completion_date": expected_completion_date_str, # Updated
-        "notes": original_goal["notes"], # Preserved
-        "updated_at": ANY # Endpoint should add this
-    }
-    user_state_after_update = {
-        "username": "testuser",
-        "goals": [updated_goal_state]
-    }
-
-    # Mock find_one to return the correct state *after* update
-    mock_find_one = AsyncMock(return_value=user_state_after_update)
-
-    # Mock update_one (as before)
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.modified_count = 1
-    mock_update_one.return_value = mock_update_result
-
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    mock_users.update_one = mock_update_one
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    response = await async_client.put(f"/api/learning-path/goals/{goal_id_to_update}", json=update_payload, headers=auth_headers)
+    response = await async_client.put("/api/learning-path/goals/goal_to_update", json=update_payload, headers=auth_headers)
 
     assert response.status_code == 200
     updated_goal = response.json()
-    assert updated_goal["id"] == goal_id_to_update
+    assert updated_goal["id"] == "goal_to_update"
     assert updated_goal["title"] == "Updated Goal Title" # Check updated field
     assert updated_goal["priority"] == 4 # Check updated field
-    assert updated_goal["description"] == "Original Description" # Check preserved field
+    assert updated_goal["description"] == "Description" # Check preserved field
+    assert updated_goal["notes"] == "Original Notes"
     assert updated_goal["completed"] is True # Check updated field
-    assert updated_goal["completion_date"] is not None # Completion date should be set
-    # Use approx for comparing the completion date string due to potential microsecond differences
-    assert datetime.fromisoformat(updated_goal["completion_date"]) == pytest.approx(datetime.fromisoformat(expected_completion_date_str))
-
-    # Verify update_one call structure (important for MongoDB updates)
-    mock_update_one.assert_called_once()
-    call_args, call_kwargs = mock_update_one.call_args
-    # Check filter
-    assert call_args[0] == {"username": "testuser", "goals.id": goal_id_to_update}
-    # Check update operation ($set)
-    update_doc = call_args[1]["$set"]
-    # Corrected Assertions for Goal Update:
-    # Check fields present in the update payload
-    assert "goals.$[goalElem].title" in update_doc
-    assert update_doc["goals.$[goalElem].title"] == update_payload["title"]
-    assert "goals.$[goalElem].priority" in update_doc
-    assert update_doc["goals.$[goalElem].priority"] == update_payload["priority"]
-    assert "goals.$[goalElem].completed" in update_doc
-    assert update_doc["goals.$[goalElem].completed"] == update_payload["completed"]
-
-    # Check fields that are automatically set when marking goal as completed
-    if update_payload.get("completed"):
-        assert "goals.$[goalElem].completion_date" in update_doc
-        assert "goals.$[goalElem].updated_at" in update_doc # Check for updated_at
-
-    # Check arrayFilters (should only filter by goalElem.id for goal update)
-    assert "array_filters" in call_kwargs
-    assert call_kwargs["array_filters"] == [{"goalElem.id": goal_id_to_update}] # Corrected filter
-
-    # Verify find_one was called *after* update_one to return the result
-    # The endpoint fetches the updated goal using a filter and projection.
-    mock_find_one.assert_called_once_with(
-        {"username": "testuser", "goals.id": goal_id_to_update},
-        {"goals.$": 1}
-    )
+    assert abs(datetime.now() - datetime.fromisoformat(updated_goal["completion_date"])) < timedelta(minutes=1)
+    assert [m["id"] for m in updated_goal["milestones"]] == ["m1"]
+    stored = await goal_db.goals.find_one({"user_id": USER_ID, "id": "goal_to_update"})
+    assert stored["title"] == "Updated Goal Title"
+    assert "updated_at" in stored
 
 @pytest.mark.asyncio
-async def test_update_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_update_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test updating a goal that does not exist."""
-    # mock_auth_dependencies handles auth
-    goal_id_not_found = "goal_xyz"
-    update_payload = {"title": "Attempted Update"}
-
-    # Mock find_one to return user without the goal
-    mock_find_one = AsyncMock(return_value={"username": "testuser", "goals": []})
-    # Mock update_one to simulate no match
-    mock_update_one = AsyncMock(return_value=MagicMock(modified_count=0))
-
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    mock_users.update_one = mock_update_one
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    response = await async_client.put(f"/api/learning-path/goals/{goal_id_not_found}", json=update_payload, headers=auth_headers)
-    assert response.status_code == 304
+    response = await async_client.put("/api/learning-path/goals/goal_xyz", json={"title": "Attempted Update"}, headers=auth_headers)
+    assert response.status_code == 404
 
 @pytest.mark.asyncio
-async def test_delete_goal(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test deleting an existing goal."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_to_delete = "goal_to_delete"
-    goal_to_delete_data = {
-        "id": goal_id_to_delete,
-        "title": "Goal To Delete",
-        "description": "Description for Delete",
-        "target_date": str(datetime.now() + timedelta(days=1)),
-        "priority": 1,
-        "category": "Deletion",
-        "completed": False
-    }
-
-    # Mock find_one to return user with the goal
-    mock_find_one = AsyncMock()
-    mock_find_one.return_value = {
-        "username": "testuser",
-        "goals": [goal_to_delete_data]
-    }
-
-    # Mock update_one for the $pull operation
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.modified_count = 1
-    mock_update_one.return_value = mock_update_result
-
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    mock_users.update_one = mock_update_one
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+async def test_delete_goal(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test deleting an existing goal removes its milestones too."""
+    await _seed(goal_db, _goal("goal_to_delete"), [_milestone("m1"), _milestone("m2")])
+    await _seed(goal_db, _goal("goal_to_keep"), [_milestone("m3")])
 
-    response = await async_client.delete(f"/api/learning-path/goals/{goal_id_to_delete}", headers=auth_headers)
+    response = await async_client.delete("/api/learning-path/goals/goal_to_delete", headers=auth_headers)
 
-    # Successful deletion should return 204 No Content
     assert response.status_code == 204
-
-    # Verify update_one was called with $pull
-    mock_update_one.assert_called_once()
-    call_args, _ = mock_update_one.call_args
-    assert call_args[0] == {"username": "testuser"}
-    assert "$pull" in call_args[1]
-    assert call_args[1]["$pull"] == {"goals": {"id": goal_id_to_delete}}
+    assert await goal_db.goals.find_one({"id": "goal_to_delete"}) is None
+    assert [m["id"] async for m in goal_db.milestones.find({})] == ["m3"]
 
 @pytest.mark.asyncio
-async def test_delete_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_delete_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test deleting a goal that does not exist."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_nonexistent = "nonexistent_goal"
-
-    # Mock find_one to simulate user found, but goal not in their list
-    mock_find_one = AsyncMock()
-    mock_find_one.return_value = {"username": "testuser", "goals": []}
+    response = await async_client.delete("/api/learning-path/goals/nonexistent_goal", headers=auth_headers)
 
-    # Mock update_one to simulate no document being modified
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.modified_count = 0 # Simulate no modification
-    mock_update_one.return_value = mock_update_result
-
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one # Used by get_current_active_user implicitly
-    mock_users.update_one = mock_update_one
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    response = await async_client.delete(f"/api/learning-path/goals/{goal_id_nonexistent}", headers=auth_headers)
-
-    # Expect 404 Not Found if the goal doesn't exist for the user
     assert response.status_code == 404
-    assert f"Goal with ID {goal_id_nonexistent} not found" in response.json()["detail"]
-    # Ensure update_one was still attempted based on username, but $pull matched nothing
-    mock_update_one.assert_called_once()
-    call_args, _ = mock_update_one.call_args
-    assert call_args[0] == {"username": "testuser"}
-    assert call_args[1] == {"$pull": {"goals": {"id": goal_id_nonexistent}}}
+    assert response.json()["detail"] == "Goal with ID nonexistent_goal not found"
 
 # --- Milestone Tests --- #
 
 @pytest.mark.asyncio
-async def test_get_milestones(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_get_milestones(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test getting all milestones for a specific goal."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_with_milestones = "goal_with_milestones"
-    milestone1 = {
-        "id": "milestone1",
-        "title": "Milestone 1",
-        "description": "First step",
-        "target_date": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d"),
-        "status": "in_progress",
-        "verification_method": "Check code",
-        "resources": []
-    }
-    milestone2 = {
-        "id": "milestone2",
-        "title": "Milestone 2",
-        "description": "Second step",
-        "target_date": (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d"),
-        "status": "not_started",
-        "verification_method": "Demo feature",
-        "resources": []
-    }
-    goal_data_with_milestones = {
-        "id": goal_id_with_milestones,
-        "title": "Goal With Milestones",
-        "description": "A goal that has milestones",
-        "target_date": str(datetime.now() + timedelta(days=10)),
-        "priority": 5,
-        "category": "Testing Milestones",
-        "completed": False,
-        "milestones": [milestone1, milestone2]
-    }
+    await _seed(goal_db, _goal("goal_with_milestones"), [
+        _milestone("milestone2", title="Milestone 2", target_date="2030-01-05"),
+        _milestone("milestone1", title="Milestone 1", target_date="2030-01-02"),
+        _milestone("milestone0", title="Milestone 0", target_date="2030-01-01", completed=True),
+    ])
 
-    # Mock find_one to return the user with this goal
-    mock_find_one = AsyncMock()
-    mock_find_one.return_value = {
-        "username": "testuser",
-        "goals": [goal_data_with_milestones]
-    }
-
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    mock_users.count_documents = AsyncMock(return_value=1)
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    response = await async_client.get(f"/api/learning-path/goals/{goal_id_with_milestones}/milestones", headers=auth_headers)
+    response = await async_client.get("/api/learning-path/goals/goal_with_milestones/milestones", headers=auth_headers)
 
     assert response.status_code == 200
     milestones_data = response.json()
-    assert isinstance(milestones_data, list)
-    assert len(milestones_data) == 2
-    assert milestones_data[0]["title"] == "Milestone 1"
-    assert milestones_data[1]["title"] == "Milestone 2"
-    mock_find_one.assert_called_once_with(
-        {"username": "testuser", "goals.id": goal_id_with_milestones},
-        {"goals.$": 1}
+    assert [m["title"] for m in milestones_data] == ["Milestone 1", "Milestone 2", "Milestone 0"]
+
+    response = await async_client.get(
+        "/api/learning-path/goals/goal_with_milestones/milestones", params={"completed": True}, headers=auth_headers
     )
+    assert [m["id"] for m in response.json()] == ["milestone0"]
 
 @pytest.mark.asyncio
-async def test_get_milestones_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_get_milestones_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test getting milestones when the goal ID does not exist for the user."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_nonexistent = "nonexistent_goal"
-
-    # Mock find_one to return None, simulating the goal not being found
-    mock_find_one = AsyncMock(return_value=None)
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
-    # Mock count_documents to simulate the user *does* exist
-    mock_users.count_documents = AsyncMock(return_value=1)
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+    response = await async_client.get("/api/learning-path/goals/nonexistent_goal/milestones", headers=auth_headers)
 
-    # Use the new nested URL
-    response = await async_client.get(f"/api/learning-path/goals/{goal_id_nonexistent}/milestones", headers=auth_headers)
-
-    # Expect 404 Not Found
     assert response.status_code == 404
-    # Check the specific error message from the refactored endpoint
-    assert f"Goal with ID '{goal_id_nonexistent}' not found for user 'testuser'." in response.json()["detail"]
-    # Verify the find_one call
-    mock_find_one.assert_called_once_with(
-        {"username": "testuser", "goals.id": goal_id_nonexistent},
-        {"goals.$": 1}
-    )
-    # Verify the count_documents call was made after find_one failed
-    mock_users.count_documents.assert_called_once_with({"username": "testuser"})
+    assert "Goal with ID 'nonexistent_goal' not found for user 'testuser'." in response.json()["detail"]
 
 @pytest.mark.asyncio
-async def test_create_milestone(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_create_milestone(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test creating a new milestone for a goal."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id_for_new_milestone = "goal_for_new_milestone"
-    # This goal data is no longer needed in the mock as the endpoint now only needs to find the goal
-    # goal_data = {
-    #     "id": goal_id_for_new_milestone,
-    #     "title": "Goal For New Milestone",
-    #     "description": "Description",
-    #     "target_date": str(datetime.now() + timedelta(days=10)),
-    #     "milestones": [] # Start with empty milestones
-    # }
+    await _seed(goal_db, _goal("goal_for_new_milestone"))
     new_milestone_payload = {
         "title": "New Milestone Title",
         "description": "New Milestone Description",
-        "target_date": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d"),
-        "verification_method": "Test it", # Added missing field
-        # "status": "not_started" # Status is not part of create payload
+        "target_date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"),
+        "verification_method": "Test verification",
+        "resources": ["resource1"]
     }
 
-    # Mock update_one for adding the milestone to the nested array
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.matched_count = 1 # Simulate goal was found
-    mock_update_result.modified_count = 1 # Simulate milestone was added
-    mock_update_one.return_value = mock_update_result
-
-    mock_users = MagicMock()
-    # No find_one mock needed directly here anymore, update_one confirms existence
-    mock_users.update_one = mock_update_one
-    mock_db = MagicMock()
-    mock_db.users = mock_users
-
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
-
-    # Use new nested URL
-    response = await async_client.post(f"/api/learning-path/goals/{goal_id_for_new_milestone}/milestones", json=new_milestone_payload, headers=auth_headers)
+    response = await async_client.post(
+        "/api/learning-path/goals/goal_for_new_milestone/milestones", json=new_milestone_payload, headers=auth_headers
+    )
 
     assert response.status_code == 201
     created_milestone = response.json()
     assert created_milestone["title"] == "New Milestone Title"
-    assert created_milestone["description"] == "New Milestone Description"
-    assert "id" in created_milestone # Check if ID was generated
-    assert created_milestone["completed"] is False # Default value
-
-    # Verify the update_one call
-    mock_update_one.assert_called_once()
-    call_args, call_kwargs = mock_update_one.call_args
-    # Check the filter
-    assert call_args[0] == {"username": "testuser", "goals.id": goal_id_for_new_milestone}
-    # Check the update operation ($push)
-    assert "$push" in call_args[1]
-    assert "goals.$.milestones" in call_args[1]["$push"]
-    # Check the content being pushed (match payload + defaults)
-    pushed_milestone = call_args[1]["$push"]["goals.$.milestones"]
-    assert pushed_milestone["title"] == new_milestone_payload["title"]
-    assert pushed_milestone["description"] == new_milestone_payload["description"]
-    assert pushed_milestone["target_date"] == new_milestone_payload["target_date"]
-    assert pushed_milestone["verification_method"] == new_milestone_payload["verification_method"]
-    assert "id" in pushed_milestone # Check ID exists
-    assert pushed_milestone["completed"] is False
-    assert pushed_milestone["completion_date"] is None
+    assert created_milestone["completed"] is False
+    stored = await goal_db.milestones.find_one({"id": created_milestone["id"]})
+    assert stored["user_id"] == USER_ID
+    assert stored["goal_id"] == "goal_for_new_milestone"
 
 @pytest.mark.asyncio
-async def test_create_milestone_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+async def test_create_milestone_goal_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
     """Test creating a milestone for a goal that does not exist."""
-    # mock_auth_dependencies handles auth
-
-    goal_id_nonexistent = "nonexistent_goal_id"
-    new_milestone_payload = {
-        "title": "Milestone for Nonexistent Goal",
-        "description": "This should fail",
-        "target_date": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d"),
+    payload = {
+        "title": "Orphan",
+        "description": "No goal",
+        "target_date": datetime.now().strftime("%Y-%m-%d"),
         "verification_method": "None"
     }
 
-    # Mock update_one to simulate the goal not being found
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.matched_count = 0 # Goal not found
-    mock_update_result.modified_count = 0
-    mock_update_one.return_value = mock_update_result
+    response = await async_client.post("/api/learning-path/goals/nonexistent_goal/milestones", json=payload, headers=auth_headers)
 
-    # Mock find_one used for the secondary check after update fails
-    mock_find_one = AsyncMock(return_value={"username": "testuser"}) # Simulate user exists
+    assert response.status_code == 404
+    assert "Goal with ID 'nonexistent_goal' not found" in response.json()["detail"]
+    assert await goal_db.milestones.count_documents({}) == 0
 
-    mock_users = MagicMock()
-    mock_users.update_one = mock_update_one
-    mock_users.find_one = mock_find_one # Needed for the 404 detail message check
-    mock_db = MagicMock()
-    mock_db.users = mock_users
+@pytest.mark.asyncio
+async def test_update_milestone(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test updating a milestone writes only that milestone's document."""
+    await _seed(goal_db, _goal("goal1"), [_milestone("m1"), _milestone("m2")])
+    await _seed(goal_db, _goal("goal2"))
+
+    response = await async_client.put(
+        "/api/learning-path/goals/goal1/milestones/m1",
+        json={"title": "Updated Milestone", "completed": True},
+        headers=auth_headers
+    )
 
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+    assert response.status_code == 200
+    updated = response.json()
+    assert updated["id"] == "m1"
+    assert updated["title"] == "Updated Milestone"
+    assert updated["completed"] is True
+    assert updated["completion_date"] is not None
+    assert (await goal_db.milestones.find_one({"id": "m2"}))["title"] == "Milestone m2"
+    assert "updated_at" not in await goal_db.goals.find_one({"id": "goal2"})
 
-    # Use new nested URL
-    response = await async_client.post(f"/api/learning-path/goals/{goal_id_nonexistent}/milestones", json=new_milestone_payload, headers=auth_headers)
+@pytest.mark.asyncio
+async def test_update_milestone_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test updating a milestone that does not exist, in an existing and a missing goal."""
+    await _seed(goal_db, _goal("goal1"))
 
-    # Expect 404 Not Found
+    response = await async_client.put("/api/learning-path/goals/goal1/milestones/nope", json={"title": "X"}, headers=auth_headers)
     assert response.status_code == 404
-    assert f"Goal with ID '{goal_id_nonexistent}' not found for user 'testuser'" in response.json()["detail"]
+    assert response.json()["detail"] == "Milestone with ID 'nope' not found within goal 'goal1'."
 
-    # Verify update_one was called
-    mock_update_one.assert_called_once_with(
-        {"username": "testuser", "goals.id": goal_id_nonexistent},
-        {"$push": {"goals.$.milestones": ANY}} # Use ANY from unittest.mock
-    )
-    # Verify find_one was called after update failed
-    mock_find_one.assert_called_once_with({"username": "testuser"})
+    response = await async_client.put("/api/learning-path/goals/goal9/milestones/nope", json={"title": "X"}, headers=auth_headers)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Goal with ID 'goal9' not found for user 'testuser'."
 
 @pytest.mark.asyncio
-async def test_update_milestone(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test updating an existing milestone."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id = "goal_for_update_milestone"
-    milestone_id_to_update = "milestone_to_update"
-    original_milestone = {
-        "id": milestone_id_to_update,
-        "title": "Original Milestone Title",
-        "description": "Original Description",
-        "target_date": (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d"),
-        "status": "not_started", # Added missing field
-        "verification_method": "Original Method", # Added missing field
-        "resources": [], # Added missing field
-        "completed": False, # Added missing field
-        "completion_date": None, # Added missing field
-        "notes": "Original Notes" # Added missing field
-    }
-    # This initial goal data mock is less critical now, as the endpoint verifies existence
-    # via the update query itself, but we need it for the find_one mock *after* the update.
-    goal_data = {
-        "id": goal_id,
-        "title": "Goal for Update Milestone",
-        "milestones": [original_milestone]
-    }
-    update_payload = {
-        "title": "Updated Milestone Title",
-        "status": "in_progress",
-        "completed": True # Lets also mark as completed
-    }
+async def test_delete_milestone(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test deleting a milestone within a goal."""
+    await _seed(goal_db, _goal("goal1"), [_milestone("m1"), _milestone("m2")])
 
-    # Mock update_one for modifying the milestone using arrayFilters
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.matched_count = 1
-    mock_update_result.modified_count = 1
-    mock_update_one.return_value = mock_update_result
-
-    # Mock find_one called *after* update to return the updated milestone
-    # Simulate the state *after* the update would have occurred
-    updated_milestone_state = original_milestone.copy()
-    # Generate the expected completion date string *once*
-    expected_completion_date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    updated_milestone_state.update({
-        "title": update_payload["title"],
-        "status": update_payload["status"],
-        "completed": update_payload["completed"],
-        # Use the generated string, not approx
-        "completion_date": expected_completion_date_str
-    })
-    mock_find_one_after_update = AsyncMock()
-    mock_find_one_after_update.return_value = {
-        "username": "testuser",
-        "goals": [{
-            "id": goal_id,
-            "milestones": [updated_milestone_state]
-        }]
-    }
+    response = await async_client.delete("/api/learning-path/goals/goal1/milestones/m1", headers=auth_headers)
 
-    mock_users = MagicMock()
-    mock_users.update_one = mock_update_one
-    mock_users.find_one = mock_find_one_after_update # This mock is for the find *after* update
-    mock_db = MagicMock()
-    mock_db.users = mock_users
+    assert response.status_code == 204
+    assert [m["id"] async for m in goal_db.milestones.find({})] == ["m2"]
 
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+@pytest.mark.asyncio
+async def test_delete_milestone_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Deleting a missing milestone is idempotent; a missing goal is a 404."""
+    await _seed(goal_db, _goal("goal1"))
+
+    response = await async_client.delete("/api/learning-path/goals/goal1/milestones/gone", headers=auth_headers)
+    assert response.status_code == 204
+
+    response = await async_client.delete("/api/learning-path/goals/goal9/milestones/gone", headers=auth_headers)
+    assert response.status_code == 404
 
-    # Use new nested URL
-    response = await async_client.put(f"/api/learning-path/goals/{goal_id}/milestones/{milestone_id_to_update}", json=update_payload, headers=auth_headers)
+# --- Lazy migration from the embedded layout --- #
+
+@pytest.mark.asyncio
+async def test_embedded_goals_are_migrated_on_first_use(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Goals embedded in an old user document move to the collections the first time they are read."""
+    embedded = _goal("old_goal", title="Embedded", milestones=[_milestone("old_m")])
+    await goal_db.users.replace_one({"_id": USER_ID}, {"_id": USER_ID, "username": "testuser", "goals": [embedded]})
+
+    response = await async_client.get("/api/learning-path/goals", headers=auth_headers)
 
     assert response.status_code == 200
-    updated_milestone = response.json()
-    assert updated_milestone["id"] == milestone_id_to_update
-    assert updated_milestone["title"] == "Updated Milestone Title"
-    assert updated_milestone["status"] == "in_progress"
-    assert updated_milestone["completed"] is True
-    assert updated_milestone["completion_date"] == expected_completion_date_str
-    assert updated_milestone["description"] == "Original Description" # Check preserved
-
-    # Verify update_one call structure
-    mock_update_one.assert_called_once()
-    call_args, call_kwargs = mock_update_one.call_args
-    # Check filter
-    assert call_args[0] == {"username": "testuser", "goals.id": goal_id}
-    # Check update operation ($set)
-    update_doc = call_args[1]["$set"]
-    assert "goals.$[goal].milestones.$[milestone].title" in update_doc
-    assert update_doc["goals.$[goal].milestones.$[milestone].title"] == update_payload["title"]
-    assert "goals.$[goal].milestones.$[milestone].status" in update_doc
-    assert update_doc["goals.$[goal].milestones.$[milestone].status"] == update_payload["status"]
-    assert "goals.$[goal].milestones.$[milestone].completed" in update_doc
-    assert update_doc["goals.$[goal].milestones.$[milestone].completed"] == update_payload["completed"]
-    # Check that completion_date is set when completed is True
-    assert "goals.$[goal].milestones.$[milestone].completion_date" in update_doc
-    # Completion date is approximate, so we don't check the exact value here
-
-    # Verify find_one was called *after* update_one to return the result
-    mock_find_one_after_update.assert_called_once_with(
-         {"username": "testuser", "goals.id": goal_id},
-         {"goals.$": 1}
-    )
+    assert [g["title"] for g in response.json()] == ["Embedded"]
+    assert [m["id"] for m in response.json()[0]["milestones"]] == ["old_m"]
+    user = await goal_db.users.find_one({"_id": USER_ID})
+    assert user["goals_migrated"] is True
+    assert "goals" not in user
+    assert (await goal_db.milestones.find_one({"id": "old_m"}))["goal_id"] == "old_goal"
+
+    # Running the migration again (e.g. after an interruption) does not duplicate anything
+    from utils.goals import migrate_embedded_goals
+    await goal_db.users.update_one({"_id": USER_ID}, {"$set": {"goals": [embedded]}})
+    await migrate_embedded_goals(goal_db, USER_ID)
+    assert await goal_db.goals.count_documents({}) == 1
+    assert await goal_db.milestones.count_documents({}) == 1
+
+# --- Progress Tests --- #
 
 @pytest.mark.asyncio
-async def test_update_milestone_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test updating a milestone that does not exist within a goal."""
-    # mock_auth_dependencies handles auth
-
-    goal_id_exists = "existing_goal_id"
-    milestone_id_nonexistent = "nonexistent_milestone_id"
-    update_payload = {"title": "Attempted Update"}
-
-    # Mock update_one to simulate the milestone not being matched by arrayFilters
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.matched_count = 0 # Goal might be matched, but not the milestone via array filter
-    mock_update_result.modified_count = 0
-    mock_update_one.return_value = mock_update_result
-
-    # Mock find_one used for the secondary check after update fails
-    # Simulate goal exists, needed for specific 404 message
-    mock_find_one_check = AsyncMock(return_value={"_id": "some_user_id"})
-
-    mock_users = MagicMock()
-    mock_users.update_one = mock_update_one
-    mock_users.find_one = mock_find_one_check # For the secondary check
-    mock_db = MagicMock()
-    mock_db.users = mock_users
+async def test_get_learning_path_progress(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test getting the overall learning path progress."""
+    await _seed(goal_db, _goal("goal1", completed=True), [_milestone("m1.1", completed=True), _milestone("m1.2", completed=True)])
+    await _seed(goal_db, _goal("goal2", category="Web"), [
+        _milestone("m2.1", completed=True), _milestone("m2.2"), _milestone("m2.3")
+    ])
+    await _seed(goal_db, _goal("goal3")) # Goal with no milestones
 
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+    response = await async_client.get("/api/learning-path/progress", headers=auth_headers)
 
-    # Use new nested URL
-    response = await async_client.put(f"/api/learning-path/goals/{goal_id_exists}/milestones/{milestone_id_nonexistent}", json=update_payload, headers=auth_headers)
+    assert response.status_code == 200
+    progress_data = response.json()
+    assert progress_data["total_goals"] == 3
+    assert progress_data["completed_goals"] == 1
+    # Total milestones = 2 (goal1) + 3 (goal2) + 0 (goal3) = 5
+    assert progress_data["total_milestones"] == 5
+    # Completed milestones = 2 (goal1) + 1 (goal2) = 3
+    assert progress_data["completed_milestones"] == 3
+    # Overall progress: (3 completed milestones / 5 total milestones) * 100 = 60%
+    assert progress_data["overall_progress"] == pytest.approx(60.0)
+    by_category = {c["name"]: c for c in progress_data["progress_by_category"]}
+    assert by_category["Programming"]["total_milestones"] == 2
+    assert by_category["Web"]["progress"] == pytest.approx(100 / 3)
 
-    # Expect 404 Not Found
-    assert response.status_code == 404
-    assert f"Milestone with ID '{milestone_id_nonexistent}' not found within goal '{goal_id_exists}'." in response.json()["detail"]
-
-    # Verify update_one was called
-    mock_update_one.assert_called_once()
-    # Verify find_one check was called after update failed
-    mock_find_one_check.assert_called_once_with(
-        {"username": "testuser", "goals.id": goal_id_exists},
-        {"_id": 1}
-    )
+@pytest.mark.asyncio
+async def test_get_learning_path_progress_no_goals(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Test getting progress when the user has no goals."""
+    response = await async_client.get("/api/learning-path/progress", headers=auth_headers)
+
+    assert response.status_code == 200
+    progress_data = response.json()
+    assert progress_data["total_goals"] == 0
+    assert progress_data["completed_goals"] == 0
+    assert progress_data["total_milestones"] == 0
+    assert progress_data["completed_milestones"] == 0
+    assert progress_data["overall_progress"] == 0
+
+@pytest_asyncio.fixture
+async def counted_user(goal_db):
+    """A user whose counters are already built, so every change must be counted incrementally."""
+    user = {"_id": USER_ID, "username": "testuser", "disabled": False,
+            "goals_migrated": True, "progress_counters_built": True}
+
+    async def get_user(): return user
+    app.dependency_overrides[get_current_user] = get_user
+    app.dependency_overrides[get_current_active_user] = get_user
+    yield user
+
+async def _counters(db):
+    counters = await db.progress_counters.find({"user_id": USER_ID}, {"_id": 0, "user_id": 0}).to_list(None)
+    return {c["category"]: {k: v for k, v in c.items() if k != "category" and v} for c in counters if c.get("goals")}
+
+async def _rebuilt_counters(db):
+    from utils.goal_progress import rebuild_progress_counters
+    await rebuild_progress_counters(db, USER_ID)
+    return await _counters(db)
 
 @pytest.mark.asyncio
-async def test_delete_milestone(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test deleting an existing milestone."""
-    # mock_auth_dependencies fixture handles auth mocking
-
-    goal_id = "goal_for_delete_milestone"
-    milestone_id_to_delete = "milestone_to_delete"
-    milestone_to_delete_data = {
-        "id": milestone_id_to_delete,
-        "title": "Milestone To Delete",
-        "description": "Desc", # Added missing field
-        "target_date": "2025-01-01", # Added missing field
-        "verification_method": "Method", # Added missing field
-        "resources": [], # Added missing field
-        "completed": False, # Added missing field
+async def test_progress_counters_follow_goal_and_milestone_writes(async_client: AsyncClient, auth_headers, goal_db, counted_user):
+    """Each write adjusts the counters exactly as a full recount would."""
+    target_date = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+    goal = {"title": "G", "description": "d", "target_date": target_date, "priority": 1, "category": "Python"}
+    milestone = {"title": "M", "description": "d", "target_date": target_date, "verification_method": "v"}
+    base = "/api/learning-path/goals"
+
+    goal_id = (await async_client.post(base, json=goal, headers=auth_headers)).json()["id"]
+    await async_client.post(f"{base}/batch", json={"goals": [dict(goal, category="Web")]}, headers=auth_headers)
+    m1 = (await async_client.post(f"{base}/{goal_id}/milestones", json=milestone, headers=auth_headers)).json()["id"]
+    await async_client.post(f"{base}/{goal_id}/milestones", json=milestone, headers=auth_headers)
+    await async_client.put(f"{base}/{goal_id}/milestones/{m1}", json={"completed": True}, headers=auth_headers)
+    await async_client.put(f"{base}/{goal_id}/milestones/{m1}", json={"completed": True}, headers=auth_headers)  # No change
+
+    expected = {
+        "Python": {"goals": 1, "milestones": 2, "completed_milestones": 1},
+        "Web": {"goals": 1},
     }
-    # Goal data mock not strictly needed for the delete operation itself
-    # goal_data = {
-    #     "id": goal_id,
-    #     "title": "Goal For Delete Milestone",
-    #     "milestones": [milestone_to_delete_data]
-    # }
-
-    # Mock update_one for the $pull operation on the sub-array
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.matched_count = 1 # Goal found
-    mock_update_result.modified_count = 1 # Milestone pulled
-    mock_update_one.return_value = mock_update_result
-
-    mock_users = MagicMock()
-    # No find_one needed for the success path
-    mock_users.update_one = mock_update_one
-    mock_db = MagicMock()
-    mock_db.users = mock_users
+    assert await _counters(goal_db) == expected
 
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+    # Completing the goal and moving it to another category carries its milestones along
+    await async_client.put(f"{base}/{goal_id}", json={"category": "Web", "completed": True}, headers=auth_headers)
+    expected = {"Web": {"goals": 2, "completed_goals": 1, "milestones": 2, "completed_milestones": 1}}
+    assert await _counters(goal_db) == expected
 
-    # Use new nested URL
-    response = await async_client.delete(f"/api/learning-path/goals/{goal_id}/milestones/{milestone_id_to_delete}", headers=auth_headers)
+    await async_client.delete(f"{base}/{goal_id}/milestones/{m1}", headers=auth_headers)
+    assert await _counters(goal_db) == {"Web": {"goals": 2, "completed_goals": 1, "milestones": 1}}
+    assert await _rebuilt_counters(goal_db) == await _counters(goal_db)
 
-    # Expect 204 No Content on successful deletion
-    assert response.status_code == 204
+    await async_client.delete(f"{base}/{goal_id}", headers=auth_headers)
+    assert await _counters(goal_db) == {"Web": {"goals": 1}}
 
-    # Verify update_one call structure
-    mock_update_one.assert_called_once()
-    call_args, call_kwargs = mock_update_one.call_args
-    # Check filter
-    assert call_args[0] == {"username": "testuser", "goals.id": goal_id}
-    # Check update operation ($pull)
-    assert call_args[1] == {"$pull": {"goals.$.milestones": {"id": milestone_id_to_delete}}}
+    response = await async_client.get("/api/learning-path/progress", headers=auth_headers)
+    assert response.json()["total_goals"] == 1
+    assert [c["name"] for c in response.json()["progress_by_category"]] == ["Web"]
 
 @pytest.mark.asyncio
-async def test_delete_milestone_not_found(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test deleting a milestone that does not exist within an existing goal."""
-    # mock_auth_dependencies handles auth
-
-    goal_id_exists = "existing_goal_for_delete"
-    milestone_id_nonexistent = "nonexistent_milestone_to_delete"
-
-    # Mock update_one to simulate the milestone not being found to be pulled
-    mock_update_one = AsyncMock()
-    mock_update_result = MagicMock()
-    mock_update_result.matched_count = 1 # Goal *was* found
-    mock_update_result.modified_count = 0 # But milestone wasn't pulled
-    mock_update_one.return_value = mock_update_result
-
-    # Mock find_one used for the secondary check (though not strictly needed for 204 path)
-    mock_find_one_check = AsyncMock(return_value={"_id": "some_user_id"})
-
-    mock_users = MagicMock()
-    mock_users.update_one = mock_update_one
-    mock_users.find_one = mock_find_one_check
-    mock_db = MagicMock()
-    mock_db.users = mock_users
+async def test_progress_history_is_appended_and_range_queried(async_client: AsyncClient, auth_headers, goal_db, counted_user):
+    """Milestone changes append the goal's progress; the endpoint returns a date range of it."""
+    await _seed(goal_db, _goal("goal1", title="Learn", milestones_total=0, milestones_completed=0))
+    await goal_db.progress_counters.insert_one({"user_id": USER_ID, "category": "Programming", "goals": 1})
+    milestone = {"title": "M", "description": "d", "target_date": "2030-01-01", "verification_method": "v"}
 
-    # Define override for DB
-    async def override_get_db():
-        return mock_db
-    app.dependency_overrides[get_db] = override_get_db
+    m1 = (await async_client.post("/api/learning-path/goals/goal1/milestones", json=milestone, headers=auth_headers)).json()["id"]
+    await async_client.post("/api/learning-path/goals/goal1/milestones", json=milestone, headers=auth_headers)
+    await async_client.put(f"/api/learning-path/goals/goal1/milestones/{m1}", json={"completed": True}, headers=auth_headers)
 
-    # Use new nested URL
-    response = await async_client.delete(f"/api/learning-path/goals/{goal_id_exists}/milestones/{milestone_id_nonexistent}", headers=auth_headers)
+    response = await async_client.get("/api/learning-path/progress", headers=auth_headers)
+    history = response.json()["progress_history"]
+    assert [entry["progress"] for entry in history] == [0, 0, 50]
+    assert {entry["goal_title"] for entry in history} == {"Learn"}
+    assert response.json()["overall_progress"] == pytest.approx(50.0)
 
-    # Expect 204 No Content even if milestone wasn't found (idempotent)
-    assert response.status_code == 204
+    await goal_db.progress_history.insert_one(
+        {"user_id": USER_ID, "goal_id": "goal1", "goal_title": "Learn", "date": "2020-01-01T00:00:00", "progress": 10}
+    )
+    response = await async_client.get(
+        "/api/learning-path/progress", params={"since": "2019-12-01", "until": "2020-02-01"}, headers=auth_headers
+    )
+    assert [entry["progress"] for entry in response.json()["progress_history"]] == [10]
 
-    # Verify update_one was called
-    mock_update_one.assert_called_once()
-    call_args, call_kwargs = mock_update_one.call_args
-    assert call_args[0] == {"username": "testuser", "goals.id": goal_id_exists}
-    assert call_args[1] == {"$pull": {"goals.$.milestones": {"id": milestone_id_nonexistent}}}
-    # Verify the secondary find_one check was *not* called in this path (because matched_count was 1)
-    mock_find_one_check.assert_not_called()
+@pytest.mark.asyncio
+async def test_rebuild_moves_embedded_progress_history(goal_db):
+    """Building the counters moves legacy per-goal history into the collection, once."""
+    from utils.goal_progress import rebuild_progress_counters
+    history = [{"date": "2024-01-02", "progress": 50}, {"date": "2024-01-01", "progress": 0}]
+    await _seed(goal_db, _goal("goal1", progress_history=history), [_milestone("m1", completed=True), _milestone("m2")])
+
+    await rebuild_progress_counters(goal_db, USER_ID)
+    await rebuild_progress_counters(goal_db, USER_ID)
+
+    goal = await goal_db.goals.find_one({"id": "goal1"})
+    assert "progress_history" not in goal
+    assert (goal["milestones_total"], goal["milestones_completed"]) == (2, 1)
+    assert await goal_db.progress_history.count_documents({"user_id": USER_ID}) == 2
+    assert await _counters(goal_db) == {"Programming": {"goals": 1, "milestones": 2, "completed_milestones": 1}}
+    assert (await goal_db.users.find_one({"_id": USER_ID}))["progress_counters_built"] is True
 
-# --- Learning Path Progress Test --- #
+@pytest.mark.asyncio
+async def test_concurrent_first_requests_build_counters_once(goal_db):
+    """Two requests racing to build the counters: one builds, the other waits; nothing fails."""
+    import asyncio
+    from unittest.mock import patch
+    from utils import goal_progress
+    await _seed(goal_db, _goal("goal1"), [_milestone("m1", completed=True)])
+
+    real_rebuild = goal_progress.rebuild_progress_counters
+    rebuild_calls = []
+
+    async def slow_rebuild(db, user_id):
+        rebuild_calls.append(user_id)
+        await asyncio.sleep(0.1)
+        await real_rebuild(db, user_id)
+
+    with patch.object(goal_progress, "rebuild_progress_counters", slow_rebuild):
+        await asyncio.gather(
+            goal_progress.ensure_progress_counters(goal_db, USER_ID),
+            goal_progress.ensure_progress_counters(goal_db, USER_ID),
+        )
+
+    assert rebuild_calls == [USER_ID]
+    assert await _counters(goal_db) == {"Programming": {"goals": 1, "milestones": 1, "completed_milestones": 1}}
+    user = await goal_db.users.find_one({"_id": USER_ID})
+    assert user["progress_counters_built"] is True
+    assert "progress_counters_claimed_at" not in user
 
 @pytest.mark.asyncio
-async def test_get_learning_path_progress(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test getting the overall learning path progress."""
-    # mock_auth_dependencies fixture handles auth mocking
+async def test_stalled_counter_build_is_taken_over(goal_db):
+    """A build claimed by a request that died is reclaimed after the timeout."""
+    from utils.goal_progress import ensure_progress_counters
+    await goal_db.users.update_one({"_id": USER_ID}, {"$set": {
+        "progress_counters_built": "building",
+        "progress_counters_claimed_at": datetime.utcnow() - timedelta(minutes=5),
+    }})
+    await _seed(goal_db, _goal("goal1"))
+
+    await ensure_progress_counters(goal_db, USER_ID)
+
+    assert await _counters(goal_db) == {"Programming": {"goals": 1}}
+
+# --- Roadmap scheduling --- #
+
+ROADMAP = {
+    "title": "ML Roadmap",
+    "description": "Path",
+    "phases": [],
+    "milestones": [
+        {"id": "a", "title": "Python", "estimated_days": 2},
+        {"id": "b", "title": "Pandas", "estimated_days": 5, "prerequisites": ["a"]},
+        {"id": "c", "title": "ML", "estimated_days": 1, "prerequisites": ["a"]},
+        {"id": "d", "title": "Deep Learning", "estimated_days": 3, "prerequisites": ["b", "c"]},
+    ]
+}
 
-    goal1 = {
-        "id": "goal1", "title": "Goal 1", "completed": True,
-        "milestones": [
-            {"id": "m1.1", "completed": True},
-            {"id": "m1.2", "completed": True}
-        ]
-    }
-    goal2 = {
-        "id": "goal2", "title": "Goal 2", "completed": False,
-        "milestones": [
-            {"id": "m2.1", "completed": True},
-            {"id": "m2.2", "completed": False},
-            {"id": "m2.3", "completed": False}
-        ]
-    }
-    goal3 = {
-        "id": "goal3", "title": "Goal 3", "completed": False,
-        "milestones": [] # Goal with no milestones
-    }
+@pytest.mark.asyncio
+async def test_roadmap_plan_and_incremental_milestone_update(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """The plan is cached per roadmap version and a milestone change reschedules it."""
+    response = await async_client.post("/api/learning-path/roadmap", json=ROADMAP, headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json()["version"] == 1
 
-    # Mock find_one to return user with these goals
-    mock_find_one = AsyncMock()
-    mock_find_one.return_value = {
-        "username": "testuser",
-        "goals": [goal1, goal2, goal3]
-    }
+    plan = (await async_client.get("/api/learning-path/roadmap/plan", headers=auth_headers)).json()
+    assert plan["critical_path"] == ["a", "b", "d"]
+    assert plan["next_actionable"] == ["a"]
+    assert plan["remaining_days"] == 10
+
+    response = await async_client.patch(
+        "/api/learning-path/roadmap/milestones/a", json={"completed": True}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["next_actionable"] == ["b", "c"]
+    assert response.json()["remaining_days"] == 8
+
+    roadmap = (await goal_db.users.find_one({"_id": USER_ID}))["roadmap"]
+    assert roadmap["version"] == 2
+    assert roadmap["milestones"][0]["completed"] is True
+    assert roadmap["milestones"][0]["completion_date"] is not None
+
+    # Another worker's write (version bump without this cache seeing it) forces a rebuild
+    await goal_db.users.update_one(
+        {"_id": USER_ID, "roadmap.milestones.id": "c"},
+        {"$set": {"roadmap.milestones.$.estimated_days": 9}, "$inc": {"roadmap.version": 1}}
+    )
+    plan = (await async_client.get("/api/learning-path/roadmap/plan", headers=auth_headers)).json()
+    assert plan["critical_path"] == ["c", "d"]
+
+@pytest.mark.asyncio
+async def test_roadmap_milestone_update_ignores_explicit_nulls(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Null fields are not written; a body of only nulls is an empty update."""
+    await async_client.post("/api/learning-path/roadmap", json=ROADMAP, headers=auth_headers)
+
+    response = await async_client.patch(
+        "/api/learning-path/roadmap/milestones/b", json={"estimated_days": None, "completed": None}, headers=auth_headers
+    )
+    assert response.status_code == 400
+
+    response = await async_client.patch(
+        "/api/learning-path/roadmap/milestones/b", json={"estimated_days": None, "completed": True}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["remaining_days"] == 6
+
+    milestone = (await goal_db.users.find_one({"_id": USER_ID}))["roadmap"]["milestones"][1]
+    assert milestone["estimated_days"] == 5
+    assert (await async_client.get("/api/learning-path/roadmap/plan", headers=auth_headers)).status_code == 200
+
+@pytest.mark.asyncio
+async def test_roadmap_with_cycle_is_rejected(async_client: AsyncClient, auth_headers, mock_auth_dependencies, goal_db):
+    """Prerequisite cycles and unknown milestones are a 400, on create and on update."""
+    cyclic = dict(ROADMAP, milestones=[
+        {"id": "a", "title": "A", "prerequisites": ["b"]},
+        {"id": "b", "title": "B", "prerequisites": ["a"]},
+    ])
+    response = await async_client.post("/api/learning-path/roadmap", json=cyclic, headers=auth_headers)
+    assert response.status_code == 400
+    assert "cycle" in response.json()["detail"]
+
+    await async_client.post("/api/learning-path/roadmap", json=ROADMAP, headers=auth_headers)
+    response = await async_client.put(
+        "/api/learning-path/roadmap", json={"milestones": [{"id": "x", "title": "X", "prerequisites": ["y"]}]},
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+
+    response = await async_client.patch(
+        "/api/learning-path/roadmap/milestones/nope", json={"completed": True}, headers=auth_headers
+    )
+    assert response.status_code == 404
 
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
+# --- Embedded learning paths: targeted updates --- #
+
+@pytest.mark.asyncio
+async def test_mark_resource_completed_updates_only_that_resource(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+    """The resource is updated in place with arrayFilters instead of rewriting learning_paths."""
+    path = {"id": "lp1", "title": "Path", "description": "d", "topics": ["ml"], "difficulty": "beginner",
+            "estimated_time": 10, "created_at": "2024-01-01", "updated_at": "2024-01-02",
+            "resources": [{"id": "r1", "title": "R", "url": "https://example.com", "type": "article", "completed": True}]}
     mock_db = MagicMock()
-    mock_db.users = mock_users
+    mock_db.users.find_one_and_update = AsyncMock(return_value={"learning_paths": [path]})
 
-    # Define override for DB
     async def override_get_db():
         return mock_db
     app.dependency_overrides[get_db] = override_get_db
 
-    response = await async_client.get("/api/learning-path/progress", headers=auth_headers)
+    response = await async_client.post("/api/learning-path/lp1/resources/r1/complete", json={"notes": "done"}, headers=auth_headers)
 
     assert response.status_code == 200
-    progress_data = response.json()
-
-    assert "total_goals" in progress_data
-    assert "completed_goals" in progress_data
-    assert "total_milestones" in progress_data
-    assert "completed_milestones" in progress_data
-    assert "overall_progress" in progress_data
-
-    assert progress_data["total_goals"] == 3
-    assert progress_data["completed_goals"] == 1
-    # Total milestones = 2 (goal1) + 3 (goal2) + 0 (goal3) = 5
-    assert progress_data["total_milestones"] == 5
-    # Completed milestones = 2 (goal1) + 1 (goal2) = 3
-    assert progress_data["completed_milestones"] == 3
-    # Overall progress: (3 completed milestones / 5 total milestones) * 100 = 60%
-    assert progress_data["overall_progress"] == pytest.approx(60.0)
+    assert response.json()["resources"][0]["completed"] is True
+    query, update = mock_db.users.find_one_and_update.await_args.args
+    kwargs = mock_db.users.find_one_and_update.await_args.kwargs
+    assert query == {"username": "testuser", "learning_paths": {"$elemMatch": {"id": "lp1", "resources.id": "r1"}}}
+    assert set(update["$set"]) == {
+        "learning_paths.$[lp].resources.$[res].completed",
+        "learning_paths.$[lp].resources.$[res].completion_date",
+        "learning_paths.$[lp].resources.$[res].notes",
+        "learning_paths.$[lp].updated_at",
+    }
+    assert kwargs["array_filters"] == [{"lp.id": "lp1"}, {"res.id": "r1"}]
+    assert kwargs["projection"] == {"_id": 0, "learning_paths": {"$elemMatch": {"id": "lp1"}}}
 
 @pytest.mark.asyncio
-async def test_get_learning_path_progress_no_goals(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
-    """Test getting progress when the user has no goals."""
-    # mock_auth_dependencies handles auth
-
-    # Mock find_one to return user with empty goals list
-    mock_find_one = AsyncMock(return_value={"username": "testuser", "goals": []})
-    mock_users = MagicMock()
-    mock_users.find_one = mock_find_one
+async def test_add_duplicate_resource_to_learning_path(async_client: AsyncClient, auth_headers, mock_auth_dependencies):
+    """A resource already in the path is rejected without rewriting the path."""
     mock_db = MagicMock()
-    mock_db.users = mock_users
+    mock_db.users.find_one_and_update = AsyncMock(return_value=None)
+    mock_db.users.find_one = AsyncMock(return_value={"_id": USER_ID})  # The path exists
 
-    # Define override for DB
     async def override_get_db():
         return mock_db
     app.dependency_overrides[get_db] = override_get_db
 
-    response = await async_client.get("/api/learning-path/progress", headers=auth_headers)
-    assert response.status_code == 200
-    progress_data = response.json()
-    assert progress_data["total_goals"] == 0
-    assert progress_data["completed_goals"] == 0
-    assert progress_data["total_milestones"] == 0
-    assert progress_data["completed_milestones"] == 0
-    # Check if the key exists, even if calculation is zero
-    assert "overall_progress" in progress_data or progress_data.get("overall_progress") == 0.0
+    resource = {"id": "r1", "title": "R", "url": "https://example.com", "type": "article"}
+    response = await async_client.post("/api/learning-path/lp1/resources", json=resource, headers=auth_headers)
+
+    assert response.status_code == 400
+    query = mock_db.users.find_one_and_update.await_args.args[0]
+    assert query["learning_paths"] == {"$elemMatch": {"id": "lp1", "resources.id": {"$ne": "r1"}}}
 
 # Cleanup overrides after tests in this module
 @pytest.fixture(scope="module", autouse=True)
 def cleanup_overrides():
     yield
-    app.dependency_overrides = {}
\ No newline at end of file
+    app.dependency_overrides = {}
@@ -32,4 +32,33 @@ async def test_health_check(async_client: AsyncClient):
     except ValueError:
         pytest.fail(f"Invalid timestamp format: {data['timestamp']}")
 
-# Test database connection check (implicitly tested by health check if DB is up)
\ No newline at end of file
+# Test database connection check (implicitly tested by health check if DB is up)
+@pytest.mark.asyncio
+async def test_liveness_probe(async_client: AsyncClient):
+    """The liveness probe is a constant response."""
+    response = await async_client.get("/api/health/live")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "ok"}
+
+@pytest.mark.asyncio
+async def test_readiness_probe_uses_cached_status(async_client: AsyncClient):
+    """Readiness reflects the last background refresh and does no I/O itself."""
+    from utils.health import dependency_health
+
+    await dependency_health.refresh()  # Mock database answers the ping
+    response = await async_client.get("/api/health/ready")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["ready"] is True
+    assert data["database"] == "ok"
+    assert "database_pool" in data
+    assert "event_loop_lag" in data
+
+@pytest.mark.asyncio
+async def test_health_endpoints_do_not_block_loop(async_client: AsyncClient):
+    """Probes must not sleep or do blocking work on the event loop."""
+    from tests.utils import assert_loop_not_blocked
+
+    async with assert_loop_not_blocked(50):
+        for path in ("/api/health", "/api/health/live", "/api/health/ready"):
+            await async_client.get(path)
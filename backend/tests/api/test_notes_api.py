@@ -69,6 +69,8 @@ def mock_db():
     mock_db.notes.insert_one = AsyncMock()
     mock_db.notes.update_one = AsyncMock()
     mock_db.notes.delete_one = AsyncMock()
+    mock_db.notes.find_one_and_update = AsyncMock()
+    mock_db.notes.find_one_and_delete = AsyncMock()
     mock_db.notes.count_documents = AsyncMock(return_value=10)
 
     # Set up find cursor mock
@@ -175,6 +177,7 @@ async def test_update_note(async_client: AsyncClient, mock_db, setup_test_user):
     mock_update_result.matched_count = 1
     mock_update_result.modified_count = 1
     mock_db.notes.update_one.return_value = mock_update_result
+    mock_db.notes.find_one_and_update.return_value = existing_note_mock
 
     with patch('routers.notes.db', mock_db):
         # Ensure NO trailing slash
@@ -198,6 +201,7 @@ async def test_delete_note(async_client: AsyncClient, mock_db, setup_test_user):
     mock_delete_result = MagicMock()
     mock_delete_result.deleted_count = 1
     mock_db.notes.delete_one.return_value = mock_delete_result
+    mock_db.notes.find_one_and_delete.return_value = mock_db.notes.find_one.return_value
 
     with patch('routers.notes.db', mock_db):
         # Ensure NO trailing slash
@@ -302,4 +306,336 @@ async def test_rate_limit(async_client: AsyncClient, auth_headers, mock_db, monk
                 else:
                     assert response.status_code == 429, f"Request {i+1} did not trigger rate limit"
 
-            assert mock_check.call_count == limit + 1
\ No newline at end of file
+            assert mock_check.call_count == limit + 1
+# --- Keyset pagination (called directly; the HTTP path needs Redis for rate limiting) ---
+
+def _notes_page(count, start_minute=0):
+    return [
+        {**test_note, "_id": ObjectId(), "updated_at": datetime(2024, 1, 1, 12, 59 - start_minute - i, tzinfo=timezone.utc)}
+        for i in range(count)
+    ]
+
+@pytest.mark.asyncio
+async def test_get_notes_returns_cursor_when_more_pages(mock_db):
+    from routers.notes import get_notes, note_counts
+    from utils.pagination import decode_cursor
+    note_counts.clear()
+    page = _notes_page(6)  # limit + 1 means another page exists
+    mock_db.notes.find.return_value.to_list.return_value = page
+
+    with patch('routers.notes.db', mock_db):
+        result = await get_notes(request=None, tag=None, after=None, skip=None, limit=5,
+                                 include_total=False, current_user={"_id": "user1"}, _=None)
+
+    assert len(result["items"]) == 5
+    assert result["has_more"] is True
+    assert "total" not in result
+    mock_db.notes.count_documents.assert_not_awaited()
+    position = decode_cursor(result["next_cursor"])
+    assert position == {"u": page[4]["updated_at"], "i": page[4]["_id"]}
+    mock_db.notes.find.return_value.skip.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_notes_after_cursor_seeks_instead_of_skipping(mock_db):
+    from routers.notes import get_notes, note_counts
+    from utils.pagination import encode_cursor
+    note_counts.clear()
+    last_id = ObjectId()
+    last_updated = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+    mock_db.notes.find.return_value.to_list.return_value = _notes_page(2)
+
+    with patch('routers.notes.db', mock_db):
+        result = await get_notes(request=None, tag="test", after=encode_cursor({"u": last_updated, "i": last_id}),
+                                 skip=None, limit=5, include_total=False, current_user={"_id": "user1"}, _=None)
+
+    query = mock_db.notes.find.call_args.args[0]
+    assert query["user_id"] == "user1"
+    assert query["tags"] == "test"
+    assert query["$or"] == [
+        {"updated_at": {"$lt": last_updated}},
+        {"updated_at": last_updated, "_id": {"$lt": last_id}},
+    ]
+    mock_db.notes.find.return_value.sort.assert_called_with([("updated_at", -1), ("_id", -1)])
+    mock_db.notes.find.return_value.skip.assert_not_called()
+    assert result["has_more"] is False
+    assert result["next_cursor"] is None
+
+@pytest.mark.asyncio
+async def test_get_notes_rejects_bad_cursor(mock_db):
+    from routers.notes import get_notes
+    with patch('routers.notes.db', mock_db):
+        with pytest.raises(HTTPException) as exc_info:
+            await get_notes(request=None, tag=None, after="not-a-cursor", skip=None, limit=5,
+                            include_total=False, current_user={"_id": "user1"}, _=None)
+    assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_get_notes_total_is_cached_until_write(mock_db):
+    from routers.notes import get_notes, note_counts
+    note_counts.clear()
+    mock_db.notes.find.return_value.to_list.return_value = _notes_page(1)
+    mock_db.notes.count_documents.return_value = 1
+
+    with patch('routers.notes.db', mock_db):
+        for _ in range(3):
+            result = await get_notes(request=None, tag=None, after=None, skip=None, limit=5,
+                                     include_total=True, current_user={"_id": "user1"}, _=None)
+        assert result["total"] == 1
+        assert result["current_page"] == 1
+        assert mock_db.notes.count_documents.await_count == 1
+
+        note_counts.invalidate("user1")
+        await get_notes(request=None, tag=None, after=None, skip=None, limit=5,
+                        include_total=True, current_user={"_id": "user1"}, _=None)
+        assert mock_db.notes.count_documents.await_count == 2
+
+# --- Full-text search ---
+
+def _search_hits(count, score=2.0):
+    return [
+        {"_id": ObjectId(), "title": f"Note {i}", "tags": ["python"], "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+         "content": "Notes about learning spaced repetition in Python.", "score": score - i * 0.1}
+        for i in range(count)
+    ]
+
+def _mock_aggregate(mock_db, hits):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=hits)
+    mock_db.notes.aggregate = MagicMock(return_value=cursor)
+
+def test_search_route_registered_before_note_id():
+    paths = [route.path for route in app.routes]
+    assert paths.index("/api/notes/search") < paths.index("/api/notes/{note_id}")
+
+@pytest.mark.asyncio
+async def test_search_notes_single_ranked_query(mock_db):
+    from routers.notes import search_notes
+    from utils.pagination import decode_cursor
+    hits = _search_hits(3)
+    _mock_aggregate(mock_db, hits)
+
+    with patch('routers.notes.db', mock_db):
+        result = await search_notes(q="learn -java", tags=["Python"], after=None, limit=2,
+                                    current_user={"_id": "user1"}, _=None)
+
+    pipeline = mock_db.notes.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"$text": {"$search": "learn -java"}, "user_id": "user1", "tags": {"$all": ["python"]}}}
+    assert pipeline[1] == {"$addFields": {"score": {"$meta": "textScore"}}}
+    assert {"$sort": {"score": -1, "_id": -1}} in pipeline
+    assert {"$limit": 3} in pipeline
+    mock_db.notes.find.assert_not_called()
+
+    assert [item["id"] for item in result["items"]] == [str(h["_id"]) for h in hits[:2]]
+    assert result["has_more"] is True
+    assert decode_cursor(result["next_cursor"]) == {"s": hits[1]["score"], "i": hits[1]["_id"]}
+    first = result["items"][0]
+    assert "content" not in first
+    assert [first["snippet"][a:b] for a, b in first["highlights"]] == ["learning"]
+
+@pytest.mark.asyncio
+async def test_search_notes_after_cursor_filters_by_score(mock_db):
+    from routers.notes import search_notes
+    from utils.pagination import encode_cursor
+    last_id = ObjectId()
+    _mock_aggregate(mock_db, _search_hits(1))
+
+    with patch('routers.notes.db', mock_db):
+        result = await search_notes(q="python", tags=[], after=encode_cursor({"s": 1.5, "i": last_id}), limit=5,
+                                    current_user={"_id": "user1"}, _=None)
+
+    pipeline = mock_db.notes.aggregate.call_args.args[0]
+    assert pipeline[2] == {"$match": {"$or": [
+        {"score": {"$lt": 1.5}},
+        {"score": 1.5, "_id": {"$lt": last_id}},
+    ]}}
+    assert result["has_more"] is False
+    assert result["next_cursor"] is None
+
+def test_build_snippet_windows_around_first_match():
+    from routers.notes import build_snippet
+    content = "filler " * 100 + "Spaced repetition beats cramming. " + "tail " * 100
+    snippet, highlights = build_snippet(content, ["repetition"], length=60)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert [snippet[a:b] for a, b in highlights] == ["repetition"]
+
+# --- Tag counts ---
+
+def _mock_tag_counts(mock_db, counts=()):
+    mock_db.note_tag_counts.bulk_write = AsyncMock()
+    mock_db.note_tag_counts.delete_many = AsyncMock()
+    cursor = MagicMock()
+    cursor.sort = MagicMock(return_value=cursor)
+    cursor.to_list = AsyncMock(return_value=list(counts))
+    mock_db.note_tag_counts.find = MagicMock(return_value=cursor)
+    aggregate_cursor = MagicMock()
+    aggregate_cursor.to_list = AsyncMock(return_value=[])
+    mock_db.notes.aggregate = MagicMock(return_value=aggregate_cursor)
+    mock_db.users.update_one = AsyncMock()
+
+def _tag_incs(mock_db):
+    requests = mock_db.note_tag_counts.bulk_write.await_args.args[0]
+    return {r._filter["tag"]: r._doc["$inc"]["count"] for r in requests}
+
+def test_tags_route_registered_before_note_id():
+    paths = [route.path for route in app.routes]
+    assert paths.index("/api/notes/tags") < paths.index("/api/notes/{note_id}")
+
+@pytest.mark.asyncio
+async def test_update_note_applies_tag_diff(mock_db):
+    from routers.notes import update_note, NoteUpdate
+    _mock_tag_counts(mock_db)
+    note_id = ObjectId()
+    mock_db.notes.find_one.side_effect = [
+        {"_id": note_id, "user_id": "user1", "tags": ["a", "b"]},
+        {"_id": note_id, "user_id": "user1", "title": "t", "content": "c", "tags": ["b", "c"],
+         "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2)},
+    ]
+    mock_db.notes.find_one_and_update.return_value = {"_id": note_id, "tags": ["a", "b"]}
+
+    with patch('routers.notes.db', mock_db):
+        await update_note(str(note_id), NoteUpdate(tags=["b", "c"]), current_user={"_id": "user1"}, _=None)
+
+    assert _tag_incs(mock_db) == {"a": -1, "c": 1}
+    mock_db.note_tag_counts.delete_many.assert_awaited_once_with(
+        {"user_id": "user1", "tag": {"$in": ["a"]}, "count": {"$lte": 0}})
+
+@pytest.mark.asyncio
+async def test_content_only_update_leaves_tag_counts_alone(mock_db):
+    from routers.notes import update_note, NoteUpdate
+    _mock_tag_counts(mock_db)
+    note_id = ObjectId()
+    note = {"_id": note_id, "user_id": "user1", "title": "t", "content": "c", "tags": ["a"],
+            "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2)}
+    mock_db.notes.find_one.side_effect = [note, note]
+    mock_db.notes.find_one_and_update.return_value = note
+
+    with patch('routers.notes.db', mock_db):
+        await update_note(str(note_id), NoteUpdate(content="new"), current_user={"_id": "user1"}, _=None)
+
+    mock_db.note_tag_counts.bulk_write.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_delete_note_decrements_its_tags(mock_db):
+    from routers.notes import delete_note
+    _mock_tag_counts(mock_db)
+    note_id = ObjectId()
+    mock_db.notes.find_one.return_value = {"_id": note_id, "user_id": "user1", "tags": ["a", "b"]}
+    mock_db.notes.find_one_and_delete.return_value = {"_id": note_id, "tags": ["a", "b"]}
+
+    with patch('routers.notes.db', mock_db):
+        await delete_note(str(note_id), current_user={"_id": "user1"}, _=None)
+
+    assert _tag_incs(mock_db) == {"a": -1, "b": -1}
+
+@pytest.mark.asyncio
+async def test_get_note_tags_reads_aggregate_only(mock_db):
+    from routers.notes import get_note_tags
+    counts = [{"tag": "python", "count": 3}, {"tag": "go", "count": 1}]
+    _mock_tag_counts(mock_db, counts)
+
+    with patch('routers.notes.db', mock_db):
+        result = await get_note_tags(current_user={"_id": "user1", "note_tag_counts_built": True}, _=None)
+
+    assert result == {"tags": counts, "total_tags": 2}
+    mock_db.notes.find.assert_not_called()
+    mock_db.notes.aggregate.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_note_tags_backfills_once(mock_db):
+    from routers.notes import get_note_tags
+    _mock_tag_counts(mock_db)
+
+    with patch('routers.notes.db', mock_db):
+        await get_note_tags(current_user={"_id": "user1"}, _=None)
+
+    pipeline = mock_db.notes.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"user_id": "user1"}}
+    assert pipeline[-1]["$merge"]["on"] == ["user_id", "tag"]
+    mock_db.note_tag_counts.delete_many.assert_awaited_once_with({"user_id": "user1"})
+    mock_db.users.update_one.assert_awaited_once_with(
+        {"_id": "user1"}, {"$set": {"note_tag_counts_built": True}})
+
+# --- NDJSON import/export ---
+
+class _StreamingRequest:
+    """Stands in for Request with a body delivered in small chunks."""
+
+    def __init__(self, body: bytes, chunk_size: int = 64):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for i in range(0, len(self.body), self.chunk_size):
+            yield self.body[i:i + self.chunk_size]
+
+@pytest.mark.asyncio
+async def test_import_notes_batches_and_reports_bad_lines(mock_db, monkeypatch):
+    notes = sys.modules["routers.notes"]
+    monkeypatch.setattr(notes, "NOTE_IMPORT_BATCH_SIZE", 2)
+    _mock_tag_counts(mock_db)
+    batches = []
+    mock_db.notes.insert_many = AsyncMock(side_effect=lambda docs, ordered: batches.append(list(docs)))
+    body = "\n".join([
+        json.dumps({"title": "One", "content": "a", "tags": ["Vault"]}),
+        "{not json",
+        json.dumps({"title": "Two", "content": "b", "tags": ["vault"]}),
+        "",
+        json.dumps({"title": "", "content": "c"}),
+        json.dumps({"title": "Three", "content": "d"}),
+    ]).encode()
+
+    with patch('routers.notes.db', mock_db):
+        result = await notes.import_notes(_StreamingRequest(body), current_user={"_id": "user1"}, _=None)
+
+    assert result["imported"] == 3
+    assert result["failed"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 5]
+    assert [len(b) for b in batches] == [2, 1]
+    assert all(doc["user_id"] == "user1" for b in batches for doc in b)
+    mock_db.notes.find_one.assert_not_called()
+    assert _tag_incs(mock_db) == {"vault": 2}
+
+@pytest.mark.asyncio
+async def test_import_notes_reports_rejected_writes(mock_db):
+    from pymongo.errors import BulkWriteError
+    notes = sys.modules["routers.notes"]
+    _mock_tag_counts(mock_db)
+    mock_db.notes.insert_many = AsyncMock(side_effect=BulkWriteError(
+        {"writeErrors": [{"index": 1, "errmsg": "document too large"}]}))
+    body = b'{"title": "A", "content": "a"}\n{"title": "B", "content": "b"}\n'
+
+    with patch('routers.notes.db', mock_db):
+        result = await notes.import_notes(_StreamingRequest(body), current_user={"_id": "user1"}, _=None)
+
+    assert result["imported"] == 1
+    assert result["errors"] == [{"line": 2, "error": "document too large"}]
+
+@pytest.mark.asyncio
+async def test_export_notes_streams_from_cursor(mock_db):
+    from routers.notes import export_notes
+    notes_page = _notes_page(3)
+
+    class _Cursor:
+        def sort(self, *args):
+            return self
+
+        def batch_size(self, size):
+            self.size = size
+            return self
+
+        async def __aiter__(self):
+            for note in notes_page:
+                yield dict(note)
+
+    cursor = _Cursor()
+    mock_db.notes.find = MagicMock(return_value=cursor)
+
+    with patch('routers.notes.db', mock_db):
+        response = await export_notes(current_user={"_id": "user1"}, _=None)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+
+    assert response.media_type == "application/x-ndjson"
+    assert mock_db.notes.find.call_args.args == ({"user_id": "user1"}, {"user_id": 0})
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line["id"] for line in lines] == [str(note["_id"]) for note in notes_page]
+    assert "_id" not in lines[0]
@@ -1162,4 +1162,82 @@ async def test_resource_ids_are_unique_per_type(async_client: AsyncClient, auth_
 
     finally:
         # Clean up override
-        del app.dependency_overrides[get_db]
\ No newline at end of file
+        del app.dependency_overrides[get_db]
+# --- Central library: batch resolution --- #
+
+@pytest.fixture
+async def library_db():
+    """Mock DB whose user_library_status is an in-memory collection, with find() spied on."""
+    from mongomock_motor import AsyncMongoMockClient
+    collection = AsyncMongoMockClient()["library_test"]["user_library_status"]
+    await collection.insert_one({
+        "username": "testuser", "resource_id": "course-ng-ml", "completed": True,
+        "completion_date": datetime(2024, 5, 1, 12, 0), "notes": "Great course"
+    })
+    await collection.insert_one({"username": "someone_else", "resource_id": "pg-python-docs", "completed": True})
+
+    mock_db = MagicMock()
+    mock_db.user_library_status.find = MagicMock(wraps=collection.find)
+    mock_user_instance = MockUser(username="testuser")
+    app.dependency_overrides[get_current_user] = lambda: mock_user_instance
+    app.dependency_overrides[get_current_active_user] = lambda: mock_user_instance
+
+    async def override_get_db():
+        return mock_db
+    app.dependency_overrides[get_db] = override_get_db
+    return mock_db
+
+@pytest.mark.asyncio
+async def test_resolve_career_path_resources_in_one_query(async_client: AsyncClient, auth_headers, library_db):
+    """Every resource of a career path comes back hydrated, with one status query."""
+    from resources.learning_paths import get_formatted_learning_path, get_resource_ids
+    expected_ids = get_resource_ids(get_formatted_learning_path("ml_engineer"))
+
+    response = await async_client.post("/api/resources/library/resolve", json={"career_path": "ml_engineer"}, headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data["resources"]) == expected_ids
+    assert data["missing"] == []
+    course = data["resources"]["course-ng-ml"]
+    assert course["completed"] is True
+    assert course["completion_date"] == "2024-05-01T12:00:00"
+    assert course["notes"] == "Great course"
+    assert data["resources"]["pg-python-docs"]["completed"] is False  # Another user's status
+    assert course["title"] and course["url"] and course["type"]
+
+    library_db.user_library_status.find.assert_called_once()
+    query = library_db.user_library_status.find.call_args.args[0]
+    assert query == {"username": "testuser", "resource_id": {"$in": expected_ids}}
+
+@pytest.mark.asyncio
+async def test_resolve_learning_path_and_ids(async_client: AsyncClient, auth_headers, library_db):
+    """IDs are collected from a roadmap's phases and milestones plus explicit IDs; unknown ones are reported."""
+    roadmap = {
+        "phases": [{"title": "Phase 1", "resources": ["pg-python-docs", "course-ng-ml"]}],
+        "milestones": [{"id": "1", "resources": ["course-ng-ml", "not-a-resource"]}],
+    }
+    payload = {"resource_ids": ["book-d2l"], "learning_path": roadmap}
+
+    response = await async_client.post("/api/resources/library/resolve", json=payload, headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data["resources"]) == ["book-d2l", "course-ng-ml", "pg-python-docs"]
+    assert data["missing"] == ["not-a-resource"]
+
+@pytest.mark.asyncio
+async def test_resolve_unknown_career_path(async_client: AsyncClient, auth_headers, library_db):
+    response = await async_client.post("/api/resources/library/resolve", json={"career_path": "astronaut"}, headers=auth_headers)
+    assert response.status_code == 404
+    library_db.user_library_status.find.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_library_lists_completed_resources(async_client: AsyncClient, auth_headers, library_db):
+    """Completed resources (stored with a datetime completion date) are listed, not skipped."""
+    response = await async_client.get("/api/resources/library", params={"search": "Classic Coursera course", "limit": 100}, headers=auth_headers)
+
+    assert response.status_code == 200
+    by_id = {resource["id"]: resource for resource in response.json()}
+    assert by_id["course-ng-ml"]["completed"] is True
+    assert by_id["course-ng-ml"]["completion_date"] == "2024-05-01T12:00:00"
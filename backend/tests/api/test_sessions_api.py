@@ -0,0 +1,71 @@
+"""Session endpoint tests (called directly with a mocked collection)."""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+
+import sys
+import database
+import routers.sessions  # noqa: F401
+
+# routers/__init__ re-exports the APIRouter objects under the module names
+sessions = sys.modules["routers.sessions"]
+
+USER = {"_id": "user1", "username": "alice"}
+
+@pytest.fixture
+def mock_db():
+    mock_db = MagicMock()
+    mock_db.sessions.find_one = AsyncMock()
+    mock_db.sessions.update_one = AsyncMock()
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[])
+    mock_db.sessions.find = MagicMock(return_value=cursor)
+    return mock_db
+
+@pytest.mark.asyncio
+async def test_expired_session_is_not_revived(mock_db):
+    mock_db.sessions.update_one.return_value = MagicMock(matched_count=0)
+
+    with patch.object(database, "db", mock_db):
+        with pytest.raises(HTTPException) as exc_info:
+            await sessions.update_session_activity("abc", current_user=USER)
+
+    assert exc_info.value.status_code == 404
+    query = mock_db.sessions.update_one.await_args.args[0]
+    assert query["session_id"] == "abc"
+    assert "$gt" in query["expires_at"]
+
+@pytest.mark.asyncio
+async def test_all_sessions_is_one_query(mock_db):
+    with patch.object(sessions, "db", mock_db):
+        await sessions.get_all_sessions(current_user=USER)
+
+    assert mock_db.sessions.find.call_count == 1
+
+@pytest.mark.asyncio
+async def test_sessions_expire_by_ttl_index():
+    class Collections:
+        def __getattr__(self, name):
+            collection = MagicMock(create_index=AsyncMock())
+            setattr(self, name, collection)
+            return collection
+
+    mock_db = Collections()
+
+    with patch.object(database, "db", mock_db):
+        await database.create_indexes()
+
+    calls = mock_db.sessions.create_index.await_args_list
+    assert any(c.args == ("expires_at",) and c.kwargs == {"expireAfterSeconds": 0} for c in calls)
+    assert any(c.args == ([("user_id", 1), ("expires_at", 1)],) for c in calls)
+    assert any(c.args == ("session_id",) and c.kwargs.get("unique") for c in calls)
+
+@pytest.mark.asyncio
+async def test_renew_session_accepts_uuid_ids(mock_db):
+    mock_db.sessions.update_one.return_value = MagicMock(matched_count=1)
+
+    with patch.object(database, "db", mock_db):
+        result = await sessions.renew_session("0b7e0c7a-7b1c-4a36-9c53-1f2d2f1d7a10", current_user=USER)
+
+    assert result == {"message": "Session expiry time renewed"}
+    assert "last_active" not in mock_db.sessions.update_one.await_args.args[1]["$max"]
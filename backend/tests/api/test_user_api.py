@@ -304,4 +304,89 @@ async def test_login_with_invalid_password(mock_auth, async_client: AsyncClient)
     assert response.status_code == 401
     error_response = response.json()
     assert "detail" in error_response
-    assert error_response["detail"] == "Incorrect username or password"
\ No newline at end of file
+    assert error_response["detail"] == "Incorrect username or password"
+# --- Data export (called directly) ---
+
+@pytest.mark.asyncio
+async def test_large_export_runs_as_job():
+    from routers.users import export_user_data
+    user = {"_id": ObjectId(), "username": "testuser"}
+    job = {"_id": "job1", "kind": "user_export", "status": "pending", "progress": {"items_written": 0, "items_total": 10}}
+
+    with patch("routers.users.count_export_items", AsyncMock(return_value=10)), \
+         patch("routers.users.USER_EXPORT_INLINE_LIMIT", 5), \
+         patch("routers.users.jobs") as jobs:
+        jobs.submit = AsyncMock(return_value=job)
+        response = await export_user_data(db=MagicMock(), current_user=user, format="ndjson", compress=True, background=None)
+
+    assert response.status_code == 202
+    kwargs = jobs.submit.await_args.kwargs
+    assert kwargs["params"] == {"format": "ndjson", "compress": True, "username": "testuser"}
+
+@pytest.mark.asyncio
+async def test_small_export_is_streamed():
+    from routers.users import export_user_data
+    user = {"_id": ObjectId(), "username": "testuser"}
+
+    async def chunks(*args):
+        yield b"{}"
+
+    with patch("routers.users.count_export_items", AsyncMock(return_value=1)), \
+         patch("routers.users.stream_export", chunks):
+        response = await export_user_data(db=MagicMock(), current_user=user, format="json", compress=False, background=None)
+
+    assert response.media_type == "application/json"
+    assert 'filename="user_data_export_testuser_' in response.headers["content-disposition"]
+
+# --- Account deletion (called directly) ---
+
+@pytest.mark.asyncio
+async def test_delete_account_tombstones_and_schedules_job():
+    from routers.users import delete_account
+    user = {"_id": ObjectId(), "username": "testuser"}
+    job = {"_id": "job1", "kind": "account_deletion", "status": "pending", "progress": {}}
+    db = MagicMock()
+    db.users.update_one = AsyncMock()
+
+    with patch("routers.users.jobs") as jobs:
+        jobs.find_active = AsyncMock(return_value=None)
+        jobs.submit = AsyncMock(return_value=job)
+        result = await delete_account(db=db, current_user=user)
+
+    assert result["job_id"] == "job1"
+    assert jobs.submit.await_args.kwargs["user_id"] == str(user["_id"])
+    assert db.users.update_one.await_args.args[1]["$set"]["disabled"] is True
+
+# --- Sparse fieldsets ---
+
+@pytest.mark.asyncio
+async def test_get_me_with_fields_returns_only_those(async_client: AsyncClient):
+    app.dependency_overrides[get_current_active_user] = lambda: MockUser(username="testuser")
+
+    response = await async_client.get("/api/users/me/", params={"fields": "username,first_name"})
+
+    assert response.status_code == 200
+    assert response.json() == {"username": "testuser", "first_name": "Test"}
+
+@pytest.mark.asyncio
+async def test_get_me_rejects_unknown_fields(async_client: AsyncClient):
+    app.dependency_overrides[get_current_active_user] = lambda: MockUser(username="testuser")
+
+    response = await async_client.get("/api/users/me", params={"fields": "hashed_password"})
+
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_current_user_reads_requested_projection():
+    from types import SimpleNamespace
+    from auth import create_access_token
+
+    db = MagicMock()
+    db.users.find_one = AsyncMock(return_value={"_id": ObjectId(), "username": "testuser", "email": "t@example.com", "disabled": False})
+    request = SimpleNamespace(state=SimpleNamespace(user_projection={"username": 1, "disabled": 1}))
+    token = create_access_token({"sub": "testuser"})
+
+    with patch("auth._is_blacklisted", AsyncMock(return_value=False)):
+        await get_current_user(token, db, request)
+
+    assert db.users.find_one.await_args.args == ({"username": "testuser"}, {"username": 1, "disabled": 1})
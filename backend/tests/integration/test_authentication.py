@@ -145,7 +145,7 @@ async def test_token_refresh(async_client: AsyncClient, setup_test_user):
     # Case 1: Valid refresh token, expect new tokens
     @patch('routers.auth.create_access_token', return_value="new_access_token_1")
     @patch('routers.auth.create_refresh_token', return_value="new_refresh_token_1")
-    @patch('routers.auth.verify_refresh_token')
+    @patch('routers.auth.verify_refresh_token', new_callable=AsyncMock)
     async def test_refresh_valid(async_client: AsyncClient, mock_verify_refresh, mock_create_refresh, mock_create_access):
         # Set the refresh token cookie on the client
         REFRESH_TOKEN = "valid_refresh_token_for_test"
@@ -174,7 +174,7 @@ async def test_token_refresh(async_client: AsyncClient, setup_test_user):
         async_client.cookies.clear()
 
     # Case 2: Expired refresh token
-    @patch('routers.auth.verify_refresh_token')
+    @patch('routers.auth.verify_refresh_token', new_callable=AsyncMock)
     async def test_refresh_expired(async_client: AsyncClient, mock_verify_refresh):
         EXPIRED_TOKEN = "expired_token_for_test"
         async_client.cookies.set(REFRESH_TOKEN_COOKIE_NAME, EXPIRED_TOKEN)
@@ -187,7 +187,7 @@ async def test_token_refresh(async_client: AsyncClient, setup_test_user):
         async_client.cookies.clear()
 
     # Case 3: Invalid refresh token
-    @patch('routers.auth.verify_refresh_token')
+    @patch('routers.auth.verify_refresh_token', new_callable=AsyncMock)
     async def test_refresh_invalid(async_client: AsyncClient, mock_verify_refresh):
         INVALID_TOKEN = "invalid_token_for_test"
         async_client.cookies.set(REFRESH_TOKEN_COOKIE_NAME, INVALID_TOKEN)
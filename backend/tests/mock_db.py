@@ -41,8 +41,8 @@ class MockCollection:
         self.indexes[index_key] = {"unique": unique}
         return index_key
 
-    async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Find a single document."""
+    async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Find a single document, keeping only the included fields of ``projection``."""
         self._event_loop = self._get_event_loop()
         logger.info(f"Finding one in {self.name} with query: {query}")
 
@@ -76,6 +76,8 @@ class MockCollection:
             if matches:
                 logger.debug(f"Found matching document in {self.name}: {doc}")
                 # Return a copy to prevent modification of the stored data
+                if projection:
+                    return {k: v for k, v in doc.items() if k == "_id" or projection.get(k)}
                 return doc.copy()
         logger.debug(f"No matching document found in {self.name} for query: {query}")
         return None
@@ -0,0 +1,70 @@
+"""
+Benchmark of list response serialisation, 1k items.
+
+Compares FastAPI's default response_model path (dump, re-validate, serialise,
+stdlib ``json``) with ``fast_response``, for models the handler already
+validated and for raw documents. Run with ``-s`` to see the numbers.
+"""
+import json
+import time
+import asyncio
+from typing import List
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from routers.learning_path import Goal
+from routers.resources import LibraryResource
+from utils.fast_json import fast_response
+
+pytestmark = [pytest.mark.slow, pytest.mark.performance]
+
+ITEMS = 1000
+ROUNDS = 5
+
+def _resources() -> List[LibraryResource]:
+    return [
+        LibraryResource(
+            id=f"res_{i}", type="articles", title=f"Resource {i}", url=f"https://example.com/{i}",
+            topics=["python", "ml", "testing"], difficulty="intermediate", estimated_time=30,
+            date_added="2024-01-01T00:00:00", notes="Some notes " * 5,
+        )
+        for i in range(ITEMS)
+    ]
+
+def _goals() -> List[dict]:
+    return [
+        {"id": f"goal_{i}", "title": f"Goal {i}", "description": "Learn things " * 5, "target_date": "2024-12-31",
+         "priority": i % 5, "category": "ml", "completed": False, "completion_date": None, "notes": ""}
+        for i in range(ITEMS)
+    ]
+
+def _default_path(response_type, data) -> bytes:
+    # What FastAPI does with a response_model: dump, re-validate and serialise, then json.dumps
+    field = create_response_field(name="benchmark", type_=response_type)
+    content = asyncio.run(serialize_response(field=field, response_content=data, is_coroutine=True))
+    return JSONResponse(content).body
+
+def _best(func) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+@pytest.mark.parametrize("name,response_type,make,validated", [
+    ("library resources (prevalidated)", List[LibraryResource], _resources, True),
+    ("goals (raw documents)", List[Goal], _goals, False),
+])
+def test_fast_response_beats_default_serialisation(name, response_type, make, validated):
+    data = make()
+    assert json.loads(fast_response(response_type, data, validated).body) == json.loads(_default_path(response_type, data))
+
+    default = _best(lambda: _default_path(response_type, data))
+    fast = _best(lambda: fast_response(response_type, data, validated))
+
+    print(f"\n{ITEMS} {name}: default {default * 1e3:.2f}ms, fast path {fast * 1e3:.2f}ms ({default / fast:.1f}x)")
+    assert fast < default
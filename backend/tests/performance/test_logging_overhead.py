@@ -0,0 +1,63 @@
+"""
+Benchmark of the logging cost paid by the calling thread per record.
+
+Compares a stdlib StreamHandler writing synchronously (what basicConfig gave
+every module) with the queue-based pipeline from utils.logging_config, and
+shows the effect of demoting per-request chatter below the active level.
+Output goes to a real file so the synchronous case pays actual I/O.
+Run with ``-s`` to see the numbers.
+"""
+import logging
+import time
+
+import pytest
+
+from utils.logging_config import RedactingFormatter, TEXT_FORMAT, configure_logging, stop_logging
+
+pytestmark = [pytest.mark.slow, pytest.mark.performance]
+
+RECORDS = 5000
+ROUNDS = 3
+
+def per_record(logger: logging.Logger, level: int) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(RECORDS):
+            logger.log(level, f"[Rate Limiter Log] Path: /api/notes, Client: user:{i}")
+        best = min(best, (time.perf_counter() - start) / RECORDS)
+    return best
+
+def test_queue_logging_is_cheaper_for_the_caller(tmp_path):
+    logger = logging.getLogger("bench.logging")
+    root = logging.getLogger()
+    stop_logging()
+    saved = list(root.handlers)
+    for handler in saved:
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+
+    try:
+        with open(tmp_path / "sync.log", "w") as sync_file:
+            handler = logging.StreamHandler(sync_file)
+            handler.setFormatter(RedactingFormatter(TEXT_FORMAT))
+            root.addHandler(handler)
+            sync_cost = per_record(logger, logging.INFO)
+            root.removeHandler(handler)
+
+        with open(tmp_path / "queued.log", "w") as queued_file:
+            configure_logging(level="INFO", stream=queued_file, sample_rates={})
+            queued_cost = per_record(logger, logging.INFO)
+            demoted_cost = per_record(logger, logging.DEBUG)
+            stop_logging()
+    finally:
+        for handler in saved:
+            root.addHandler(handler)
+        configure_logging()
+
+    print(
+        f"\nPer-record caller cost: sync stream {sync_cost * 1e6:.1f}us, "
+        f"queue {queued_cost * 1e6:.1f}us, demoted to DEBUG {demoted_cost * 1e6:.2f}us"
+    )
+    assert queued_cost < sync_cost
+    assert demoted_cost < queued_cost
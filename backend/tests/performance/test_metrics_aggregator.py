@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the per-request metrics recording cost.
+
+Compares queuing an event on the batched aggregator (what the request path
+now pays) with applying the event inline and with the previous approach of
+spawning a task per request. Run with ``-s`` to see the numbers.
+"""
+import asyncio
+import time
+
+import pytest
+
+from utils import monitoring
+from utils.monitoring import record_request_metrics, reset_metrics
+
+pytestmark = [pytest.mark.slow, pytest.mark.performance]
+
+EVENTS = 20000
+ROUNDS = 5
+
+async def _apply_async(*event):
+    monitoring._apply_request_event(*event)
+
+def best_of(fn) -> float:
+    """Return the best per-event time (seconds) over ROUNDS runs of fn."""
+    timings = []
+    for _ in range(ROUNDS):
+        reset_metrics()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) / EVENTS)
+    return min(timings)
+
+@pytest.mark.asyncio
+async def test_record_cost_is_constant_time_append():
+    """Queuing an event should be cheaper than applying it or spawning a task."""
+    event = ("GET", "/api/notes/{note_id}", "/api/notes/1", 200, 0.01, "127.0.0.1", "bench", 0.0)
+
+    def queue_events():
+        for _ in range(EVENTS):
+            record_request_metrics("GET", "/api/notes/{note_id}", "/api/notes/1", 200, 0.01, "127.0.0.1", "bench")
+
+    def apply_inline():
+        for _ in range(EVENTS):
+            monitoring._apply_request_event(*event)
+
+    def spawn_tasks():
+        for _ in range(EVENTS):
+            asyncio.create_task(_apply_async(*event))
+
+    try:
+        queued = best_of(queue_events)
+        inline = best_of(apply_inline)
+        spawned = best_of(spawn_tasks)
+        await asyncio.sleep(0)  # Let the spawned tasks finish
+        reset_metrics()
+        start = time.perf_counter()
+        queue_events()
+        monitoring.aggregator.flush()
+        batched = (time.perf_counter() - start) / EVENTS
+    finally:
+        reset_metrics()
+
+    print(
+        f"\nper-event (best of {ROUNDS}): queue={queued * 1e9:.0f}ns "
+        f"queue+batch apply={batched * 1e9:.0f}ns inline apply={inline * 1e9:.0f}ns "
+        f"task per request={spawned * 1e9:.0f}ns"
+    )
+    assert queued < inline
+    assert queued < spawned
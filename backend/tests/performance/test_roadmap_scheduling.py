@@ -0,0 +1,55 @@
+"""
+Benchmark of roadmap scheduling for large generated roadmaps.
+
+Times a full schedule (topological sort, both passes, plan with critical path)
+of a 500-milestone roadmap and an incremental reschedule after one milestone
+changes. Run with ``-s`` to see the numbers.
+"""
+import time
+import random
+from datetime import date
+
+import pytest
+
+from utils.roadmap_graph import RoadmapSchedule
+
+pytestmark = [pytest.mark.slow, pytest.mark.performance]
+
+MILESTONES = 500
+ROUNDS = 5
+
+def _roadmap():
+    rng = random.Random(3)
+    return [
+        {
+            "id": f"m{i}",
+            "title": f"Milestone {i}",
+            "estimated_days": rng.randint(1, 30),
+            "prerequisites": [f"m{p}" for p in rng.sample(range(max(0, i - 50), i), min(i, rng.randint(0, 4)))],
+        }
+        for i in range(MILESTONES)
+    ]
+
+def _best(func) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def test_large_roadmap_plans_in_milliseconds():
+    milestones = _roadmap()
+    full = _best(lambda: RoadmapSchedule(milestones).plan(date(2025, 1, 1)))
+    rebuild = _best(lambda: RoadmapSchedule(milestones))
+
+    schedule = RoadmapSchedule(milestones)
+    ids = [m["id"] for m in milestones]
+    update = _best(lambda: schedule.update_node(random.choice(ids), estimated_days=random.randint(1, 30)))
+    print(
+        f"\n{MILESTONES} milestones: full plan {full * 1000:.2f} ms, "
+        f"schedule rebuild {rebuild * 1000:.2f} ms, one-node update {update * 1000:.3f} ms"
+    )
+
+    assert full < 0.05
+    assert update < rebuild
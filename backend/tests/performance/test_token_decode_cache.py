@@ -0,0 +1,45 @@
+"""
+Microbenchmark of access token verification cost per request.
+
+Compares a full ``jwt.decode`` (signature, JSON and claim validation) with
+the verified-token cache lookup ``get_current_user`` now performs for a token
+it has already seen. Run with ``-s`` to see the numbers.
+"""
+import time
+
+import pytest
+from jose import jwt
+from unittest.mock import patch
+
+import auth
+from auth import create_access_token, decode_access_token, SECRET_KEY, ALGORITHM
+from utils.token_cache import VerifiedTokenCache
+
+pytestmark = [pytest.mark.slow, pytest.mark.performance]
+
+ITERATIONS = 5000
+ROUNDS = 5
+
+@pytest.mark.asyncio
+async def test_cached_decode_is_cheaper_than_full_verification():
+    token = create_access_token({"sub": "benchmark_user"})
+
+    def full_decode():
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return (time.perf_counter() - start) / ITERATIONS
+
+    async def cached_decode():
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            await decode_access_token(token)
+        return (time.perf_counter() - start) / ITERATIONS
+
+    with patch.object(auth, "access_token_cache", VerifiedTokenCache()), patch.object(auth, "redis_client", None):
+        await decode_access_token(token)  # Prime the cache
+        uncached = min(full_decode() for _ in range(ROUNDS))
+        cached = min([await cached_decode() for _ in range(ROUNDS)])
+
+    print(f"\nAccess token verification per request: full decode {uncached * 1e6:.1f}us, cached {cached * 1e6:.1f}us")
+    assert cached < uncached
@@ -1,5 +1,10 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from bson import ObjectId
 
+from utils.loop_monitor import LoopLagMonitor
+
 def serialize_object_id(obj):
     """Recursively convert ObjectId instances to strings in nested dicts/lists."""
     if isinstance(obj, ObjectId):
@@ -8,4 +13,28 @@ def serialize_object_id(obj):
         return {k: serialize_object_id(v) for k, v in obj.items()}
     if isinstance(obj, list):
         return [serialize_object_id(item) for item in obj]
-    return obj
\ No newline at end of file
+    return obj
+
+@asynccontextmanager
+async def assert_loop_not_blocked(max_ms: float, interval: float = 0.005):
+    """
+    Fail the test if the event loop is blocked longer than ``max_ms`` inside the block.
+
+    Usage:
+        async with assert_loop_not_blocked(50):
+            await async_client.get("/api/health")
+
+    The assertion message includes the stack of the blocking call.
+    """
+    monitor = LoopLagMonitor(interval=interval, block_threshold=max_ms / 1000)
+    await monitor.start()
+    try:
+        yield monitor
+        # Give the heartbeat one more tick to observe a stall at the very end
+        await asyncio.sleep(interval * 2)
+    finally:
+        await monitor.stop()
+    max_lag_ms = monitor.max_lag * 1000
+    if max_lag_ms > max_ms:
+        stacks = "\n\n".join("\n".join(sample["stack"]) for sample in monitor.blocking_samples)
+        raise AssertionError(f"Event loop blocked for {max_lag_ms:.1f}ms (limit {max_ms}ms)\n{stacks}")
@@ -0,0 +1,82 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from bson import ObjectId
+
+from utils import account_deletion
+from utils.account_deletion import purge_plan, run_account_deletion
+
+USER_ID = str(ObjectId())
+
+class FakeCollection:
+    """Holds ``count`` matching documents and deletes them batch by batch."""
+
+    def __init__(self, count):
+        self.remaining = [ObjectId() for _ in range(count)]
+        self.batches = []
+
+    def find(self, query, projection):
+        collection = self
+
+        class Cursor:
+            def limit(self, size):
+                self.size = size
+                return self
+
+            async def to_list(self, length):
+                return [{"_id": _id} for _id in collection.remaining[:self.size]]
+
+        return Cursor()
+
+    async def delete_many(self, query):
+        ids = set(query["_id"]["$in"])
+        self.batches.append(len(ids))
+        self.remaining = [_id for _id in self.remaining if _id not in ids]
+        return MagicMock(deleted_count=len(ids))
+
+@pytest.fixture
+def db(monkeypatch):
+    collections = {name: FakeCollection(0) for name, _ in purge_plan(USER_ID, "alice")}
+    collections["notes"] = FakeCollection(25)
+    collections["users"] = FakeCollection(1)
+    db = MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    db.users.update_one = AsyncMock()
+    db.collections = collections
+    monkeypatch.setattr(account_deletion.database, "db", db)
+    monkeypatch.setattr(account_deletion, "ACCOUNT_DELETION_BATCH_SIZE", 10)
+    monkeypatch.setattr(account_deletion, "ACCOUNT_DELETION_BATCH_PAUSE", 0)
+    return db
+
+def _context(state=None):
+    context = MagicMock(job_id="job1", user_id=USER_ID, params={"username": "alice"}, state=state or {})
+    context.report = AsyncMock()
+    return context
+
+def test_user_document_is_purged_last():
+    plan = purge_plan(USER_ID, "alice")
+    assert plan[-1] == ("users", {"_id": ObjectId(USER_ID)})
+    assert ("user_library_status", {"username": "alice"}) in plan
+    assert {"notes", "sessions"} <= {name for name, _ in plan}
+
+@pytest.mark.asyncio
+async def test_purges_in_bounded_batches(db):
+    result = await run_account_deletion(_context())
+
+    assert db.collections["notes"].batches == [10, 10, 5]
+    assert result["deleted"] == {"notes": 25, "users": 1}
+    db.users.update_one.assert_awaited_once()
+    assert db.users.update_one.await_args.args[1]["$set"]["disabled"] is True
+
+@pytest.mark.asyncio
+async def test_resumes_from_checkpoint(db):
+    notes_step = [name for name, _ in purge_plan(USER_ID, "alice")].index("notes")
+    context = _context(state={"step": notes_step + 1, "deleted": {"notes": 25}})
+
+    result = await run_account_deletion(context)
+
+    assert db.collections["notes"].batches == []
+    db.users.update_one.assert_not_awaited()
+    assert result["deleted"] == {"notes": 25, "users": 1}
+    last_state = context.report.await_args.kwargs["state"]
+    assert last_state["step"] == len(purge_plan(USER_ID, "alice"))
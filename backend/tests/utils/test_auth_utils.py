@@ -80,4 +80,37 @@ def test_password_hashing():
 #     with pytest.raises(HTTPException) as excinfo:
 #         await get_current_active_user(current_user=mock_user)
 #     assert excinfo.value.status_code == 400
-#     assert "Inactive user" in excinfo.value.detail
\ No newline at end of file
+#     assert "Inactive user" in excinfo.value.detail
+# Disabled and deleted (tombstoned) accounts get no tokens
+@pytest.mark.asyncio
+async def test_authenticate_user_rejects_closed_accounts():
+    from unittest.mock import MagicMock
+    from auth import authenticate_user
+
+    for closed in ({"disabled": True}, {"deleted_at": datetime.now(timezone.utc)}):
+        db = MagicMock()
+        db.users.find_one = AsyncMock(return_value={"username": "gone", "hashed_password": get_password_hash("pw"), **closed})
+        with patch("auth.verify_password_async", AsyncMock(return_value=True)) as verify:
+            assert await authenticate_user("gone", "pw", db) is None
+        verify.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_refresh_rejects_closed_account_and_revokes_family():
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+    from fastapi import HTTPException, Response
+    from routers.auth import REFRESH_TOKEN_COOKIE_NAME, refresh_access_token
+
+    db = MagicMock()
+    db.users.find_one = AsyncMock(return_value={"username": "gone", "disabled": True, "deleted_at": datetime.now(timezone.utc)})
+    request = SimpleNamespace(cookies={REFRESH_TOKEN_COOKIE_NAME: "token"})
+
+    with patch("routers.auth.verify_refresh_token", AsyncMock(return_value={"sub": "gone", "fam": "f1"})), \
+         patch("routers.auth.revoke_refresh_token_family", AsyncMock()) as revoke, \
+         patch("routers.auth.create_access_token") as create_access:
+        with pytest.raises(HTTPException) as exc_info:
+            await refresh_access_token(request, Response(), MagicMock(), db)
+
+    assert exc_info.value.status_code == 401
+    revoke.assert_awaited_once_with("token")
+    create_access.assert_not_called()
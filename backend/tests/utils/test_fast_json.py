@@ -0,0 +1,41 @@
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError
+
+from utils.fast_json import ORJSONResponse, fast_response, serialize, type_adapter
+
+class Item(BaseModel):
+    id: str
+    title: str
+    created_at: Optional[datetime] = None
+
+ITEMS = [{"id": "a", "title": "First", "created_at": datetime(2024, 1, 2, tzinfo=timezone.utc), "extra": 1}]
+
+def test_adapters_are_cached_per_type():
+    assert type_adapter(List[Item]) is type_adapter(List[Item])
+
+def test_raw_data_is_validated_and_matches_fastapi_output():
+    expected = jsonable_encoder(type_adapter(List[Item]).validate_python(ITEMS))
+    assert json.loads(serialize(List[Item], ITEMS)) == expected
+    with pytest.raises(ValidationError):
+        serialize(List[Item], [{"id": "a"}])
+
+def test_validated_models_are_dumped_as_is():
+    grouped = {"items": [Item(id="a", title="First")]}
+    body = serialize(Dict[str, List[Item]], grouped, validated=True)
+    assert json.loads(body) == {"items": [{"id": "a", "title": "First", "created_at": None}]}
+
+def test_response_passes_bytes_through_and_encodes_plain_data():
+    response = fast_response(List[Item], ITEMS, headers={"X-Total-Pages": "3"})
+    assert response.body == serialize(List[Item], ITEMS)
+    assert response.headers["x-total-pages"] == "3"
+    assert response.media_type == "application/json"
+
+    oid = ObjectId()
+    plain = ORJSONResponse({"id": oid, 1: "one"})
+    assert json.loads(plain.body) == {"id": str(oid), "1": "one"}
@@ -0,0 +1,25 @@
+import pytest
+from fastapi import HTTPException
+
+from utils.fieldsets import PROFILE_FIELDS, mongo_projection, parse_fields
+
+ALLOWED = ["id", "username", "email", "first_name", "disabled", "resources", "goals"]
+
+def test_no_fields_means_all_unless_defaulted():
+    assert parse_fields(None, ALLOWED) is None
+    assert parse_fields(None, ALLOWED, default=["username"]) == ["username"]
+    assert parse_fields("*", ALLOWED) is None
+
+def test_fields_keep_model_order_and_expand_profile():
+    assert parse_fields(" goals, username ,", ALLOWED) == ["username", "goals"]
+    assert parse_fields("profile", ALLOWED) == [name for name in ALLOWED if name in PROFILE_FIELDS]
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("username,password,hashed_password", ALLOWED)
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Unknown fields: hashed_password, password"
+
+def test_projection_maps_id_and_keeps_auth_fields():
+    assert mongo_projection(None) is None
+    assert mongo_projection(["id", "goals"]) == {"_id": 1, "goals": 1, "username": 1, "email": 1, "disabled": 1}
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from utils.health import DependencyHealth
+
+@pytest.mark.asyncio
+async def test_not_ready_before_first_refresh():
+    health = DependencyHealth()
+    snapshot = health.snapshot()
+    assert snapshot["ready"] is False
+    assert snapshot["database"] == "unknown"
+
+@pytest.mark.asyncio
+async def test_refresh_pings_without_writing():
+    """Refresh only issues read-only pings."""
+    mock_db = MagicMock()
+    mock_db.command = AsyncMock(return_value={"ok": 1})
+    mock_redis = MagicMock()
+    mock_redis.ping = AsyncMock(return_value=True)
+
+    health = DependencyHealth()
+    with patch("database.db", mock_db), patch("utils.health.get_redis_connection", return_value=mock_redis):
+        status = await health.refresh()
+
+    mock_db.command.assert_awaited_once_with("ping")
+    assert mock_db.mock_calls == [("command", ("ping",), {})]
+    assert status["database"] == "ok"
+    assert status["redis"] == "ok"
+    assert health.is_ready() is True
+
+@pytest.mark.asyncio
+async def test_slow_dependency_times_out():
+    """A hung dependency is reported as a timeout instead of stalling the refresh."""
+    async def hang(*args):
+        await asyncio.sleep(10)
+
+    mock_db = MagicMock()
+    mock_db.command = hang
+    health = DependencyHealth(timeout=0.05)
+    with patch("database.db", mock_db), patch("utils.health.get_redis_connection", return_value=None):
+        status = await health.refresh()
+
+    assert status["database"] == "error: timeout"
+    assert status["redis"] == "unavailable"
+    assert health.is_ready() is False
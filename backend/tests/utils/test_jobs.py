@@ -0,0 +1,186 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import database
+from utils.jobs import JobRunner, job_handler, COMPLETED, FAILED, RUNNING
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+class FakeJobs:
+    """Just enough of a collection for JobRunner's queries."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        for key, value in query.items():
+            if key == "$or":
+                lease = doc.get("lease_until")
+                if lease is not None and lease >= datetime.now(timezone.utc):
+                    return False
+            elif isinstance(value, dict) and "$in" in value:
+                if doc.get(key) not in value["$in"]:
+                    return False
+            elif doc.get(key) != value:
+                return False
+        return True
+
+    def _apply(self, doc, update):
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+    async def insert_one(self, doc):
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc and self._matches(doc, query) else None
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        doc = self.docs.get(query["_id"])
+        if not doc or not self._matches(doc, query):
+            return None
+        self._apply(doc, update)
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if doc and self._matches(doc, query):
+            self._apply(doc, update)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.docs.values() if self._matches(d, query)])
+
+@pytest.fixture
+def fake_jobs():
+    collection = FakeJobs()
+    with patch.object(database, "db", MagicMock(jobs=collection)):
+        yield collection
+
+async def _drain(runner):
+    while runner._tasks:
+        await asyncio.gather(*list(runner._tasks), return_exceptions=True)
+
+@job_handler("test_echo")
+async def _echo(context):
+    await context.report(done=1)
+    return {"echo": context.params["value"]}
+
+@job_handler("test_fail")
+async def _fail(context):
+    raise RuntimeError("boom")
+
+@pytest.mark.asyncio
+async def test_job_runs_in_background_and_completes(fake_jobs):
+    runner = JobRunner()
+    job = await runner.submit("test_echo", user_id="u1", params={"value": 7})
+    await _drain(runner)
+
+    stored = fake_jobs.docs[job["_id"]]
+    assert stored["status"] == COMPLETED
+    assert stored["result"] == {"echo": 7}
+    assert stored["progress"] == {"done": 1}
+    assert "lease_until" not in stored
+    assert stored["expires_at"] > datetime.now(timezone.utc)
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error(fake_jobs):
+    runner = JobRunner()
+    job = await runner.submit("test_fail")
+    await _drain(runner)
+
+    assert fake_jobs.docs[job["_id"]]["status"] == FAILED
+    assert fake_jobs.docs[job["_id"]]["error"] == "boom"
+
+@pytest.mark.asyncio
+async def test_unknown_kind_is_rejected(fake_jobs):
+    with pytest.raises(ValueError):
+        await JobRunner().submit("no_such_kind")
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_from_checkpoint(fake_jobs):
+    started = asyncio.Event()
+    seen_states = []
+
+    @job_handler("test_resumable")
+    async def resumable(context):
+        seen_states.append(dict(context.state))
+        if not context.state:
+            await context.report(state={"step": 1}, step=1)
+            started.set()
+            await asyncio.sleep(3600)
+        return {"resumed_at": context.state["step"]}
+
+    runner = JobRunner()
+    job = await runner.submit("test_resumable")
+    await started.wait()
+    await runner.shutdown()
+
+    stored = fake_jobs.docs[job["_id"]]
+    assert stored["status"] == RUNNING
+    assert stored["state"] == {"step": 1}
+
+    resumer = JobRunner()
+    assert await resumer.resume() == 1
+    await _drain(resumer)
+
+    assert fake_jobs.docs[job["_id"]]["status"] == COMPLETED
+    assert fake_jobs.docs[job["_id"]]["result"] == {"resumed_at": 1}
+    assert seen_states == [{}, {"step": 1}]
+
+@pytest.mark.asyncio
+async def test_leased_job_is_not_claimed_twice(fake_jobs):
+    await fake_jobs.insert_one({
+        "_id": "j1", "kind": "test_echo", "params": {"value": 1}, "status": RUNNING,
+        "owner": "other-host:1", "lease_until": datetime.now(timezone.utc) + timedelta(minutes=1),
+    })
+    runner = JobRunner()
+    assert await runner.resume() == 0
+    await runner._run("j1")
+    assert fake_jobs.docs["j1"]["owner"] == "other-host:1"
+
+@pytest.mark.asyncio
+async def test_sweep_takes_over_job_whose_lease_expired(fake_jobs):
+    """A job left running by a crashed worker is reclaimed once its lease lapses, without a restart."""
+    runner = JobRunner(sweep_seconds=0.01)
+    runner.start()
+    await fake_jobs.insert_one({
+        "_id": "crashed", "kind": "test_echo", "params": {"value": 7}, "status": RUNNING,
+        "owner": "dead-host:1", "lease_until": datetime.now(timezone.utc) + timedelta(milliseconds=50),
+    })
+    try:
+        for _ in range(100):
+            if fake_jobs.docs["crashed"]["status"] == COMPLETED:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await runner.shutdown()
+
+    assert fake_jobs.docs["crashed"]["status"] == COMPLETED
+    assert fake_jobs.docs["crashed"]["result"] == {"echo": 7}
+
+@pytest.mark.asyncio
+async def test_resume_does_not_start_a_job_twice_in_one_process(fake_jobs):
+    started = asyncio.Event()
+
+    @job_handler("test_slow")
+    async def slow(context):
+        started.set()
+        await asyncio.sleep(3600)
+
+    await fake_jobs.insert_one({"_id": "s1", "kind": "test_slow", "params": {}, "status": "pending"})
+    runner = JobRunner()
+    assert await runner.resume() == 1
+    await started.wait()
+    fake_jobs.docs["s1"]["lease_until"] = datetime.now(timezone.utc) - timedelta(seconds=1)  # Renewal not yet due
+    assert await runner.resume() == 0
+    await runner.shutdown()
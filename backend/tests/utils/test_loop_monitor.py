@@ -0,0 +1,67 @@
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+
+from utils.loop_monitor import LoopLagMonitor
+from utils.monitoring import get_metrics, reset_metrics, record_loop_lag, record_loop_block
+from tests.utils import assert_loop_not_blocked
+
+def blocking_sleep(seconds: float) -> None:
+    time.sleep(seconds)
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/blocking")
+    async def blocking():
+        blocking_sleep(0.2)
+        return {"ok": True}
+
+    @app.get("/cooperative")
+    async def cooperative():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    return app
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+@pytest.mark.asyncio
+async def test_monitor_samples_blocking_stack():
+    """A synchronous call on the loop is measured and its stack captured."""
+    monitor = LoopLagMonitor(interval=0.01, block_threshold=0.05, on_lag=record_loop_lag, on_block=record_loop_block)
+    await monitor.start()
+    await asyncio.sleep(0.02)
+    blocking_sleep(0.2)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.max_lag >= 0.15
+    assert len(monitor.blocking_samples) == 1
+    assert any("blocking_sleep" in line for line in monitor.blocking_samples[0]["stack"])
+
+    event_loop = get_metrics()["event_loop"]
+    assert event_loop["blocked_count"] == 1
+    assert event_loop["lag"]["max"] >= 0.15
+    assert event_loop["lag"]["count"] > 0
+
+@pytest.mark.asyncio
+async def test_helper_passes_for_cooperative_endpoint():
+    async with AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://test") as client:
+        async with assert_loop_not_blocked(100):
+            response = await client.get("/cooperative")
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_helper_fails_for_blocking_endpoint():
+    async with AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://test") as client:
+        with pytest.raises(AssertionError) as excinfo:
+            async with assert_loop_not_blocked(100):
+                await client.get("/blocking")
+    assert "blocking_sleep" in str(excinfo.value)
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from httpx import AsyncClient, ASGITransport
+
+from utils.middleware import RequestContextMiddleware
+from utils.monitoring import reset_metrics, get_metrics
+
+def make_app(environment: str = "development") -> FastAPI:
+    """Build a small app wrapped in the request middleware."""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str, request: Request):
+        request.state.rate_limit_headers = {"X-RateLimit-Remaining": 9}
+        return {"item_id": item_id, "request_id": request.state.request_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk-{i}\n".encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    app.add_middleware(RequestContextMiddleware, environment=environment)
+    return app
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+@pytest.mark.asyncio
+async def test_headers_and_request_id():
+    """Security, rate limit and tracing headers are added in one pass."""
+    async with AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://test") as client:
+        response = await client.get("/items/42")
+
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == response.json()["request_id"]
+    assert float(response.headers["X-Process-Time"]) >= 0
+    assert response.headers["X-RateLimit-Remaining"] == "9"
+    assert response.headers["X-Frame-Options"] == "DENY"
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+    assert "Content-Security-Policy" in response.headers
+    assert "Strict-Transport-Security" not in response.headers
+
+@pytest.mark.asyncio
+async def test_docs_skip_csp_and_production_adds_hsts():
+    """Docs keep working without CSP; HSTS is only sent in production."""
+    async with AsyncClient(transport=ASGITransport(app=make_app("production")), base_url="http://test") as client:
+        response = await client.get("/docs")
+
+    assert "Content-Security-Policy" not in response.headers
+    assert "Strict-Transport-Security" in response.headers
+
+@pytest.mark.asyncio
+async def test_streaming_response_is_not_buffered():
+    """Each body chunk should be forwarded as its own ASGI message."""
+    app = make_app()
+    messages = []
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Block like a real server until the client goes away
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/stream", "raw_path": b"/stream",
+        "root_path": "", "query_string": b"", "headers": [], "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    disconnected.set()
+
+    bodies = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+    assert bodies == [b"chunk-0\n", b"chunk-1\n", b"chunk-2\n"]
+
+@pytest.mark.asyncio
+async def test_metrics_recorded_by_route_template():
+    """Metrics are recorded once per request, keyed by route template."""
+    async with AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://test") as client:
+        for item_id in ("a", "b", "c"):
+            await client.get(f"/items/{item_id}")
+
+    result = get_metrics()
+    assert result["requests"]["total"] == 3
+    assert result["requests"]["by_path"] == {"/items/{item_id}": 3}
+    assert result["performance"]["latency_by_route"]["/items/{item_id}"]["count"] == 3
@@ -0,0 +1,175 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import utils.monitoring as monitoring
+from utils.monitoring import (
+    LatencyHistogram, WindowedLatencyHistogram, get_route_template,
+    log_request_metrics, get_metrics, reset_metrics, UNMATCHED_ROUTE
+)
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    """Start every test from empty metrics."""
+    reset_metrics()
+    yield
+    reset_metrics()
+
+def make_request(path: str, route_path: str = None):
+    """Build a minimal request stand-in with an optional matched route."""
+    scope = {}
+    if route_path:
+        scope["route"] = SimpleNamespace(path=route_path)
+    return SimpleNamespace(
+        url=SimpleNamespace(path=path),
+        method="GET",
+        scope=scope,
+        client=None,
+        headers={},
+    )
+
+def test_histogram_percentiles_within_precision():
+    """Percentiles should be accurate to the configured relative precision."""
+    histogram = LatencyHistogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1000.0)  # 1ms .. 1s
+
+    summary = histogram.summary()
+    assert summary["count"] == 1000
+    assert summary["max"] == pytest.approx(1.0)
+    assert summary["mean"] == pytest.approx(0.5005)
+    assert summary["p50"] == pytest.approx(0.5, rel=0.06)
+    assert summary["p90"] == pytest.approx(0.9, rel=0.06)
+    assert summary["p99"] == pytest.approx(0.99, rel=0.06)
+
+def test_histogram_memory_is_fixed():
+    """Recording more values must not grow the bucket array."""
+    histogram = LatencyHistogram()
+    bucket_count = len(histogram.counts)
+    for i in range(10000):
+        histogram.record((i % 97) * 0.003)
+    histogram.record(0.0)
+    histogram.record(3600.0)  # Beyond max_value lands in the overflow bucket
+    assert len(histogram.counts) == bucket_count
+    assert histogram.count == 10002
+    assert histogram.percentile(100) == 3600.0
+
+def test_windowed_histogram_rotation():
+    """Old windows should age out after two rotations."""
+    now = [0.0]
+    histogram = WindowedLatencyHistogram(window_seconds=10, clock=lambda: now[0])
+    histogram.record(0.1)
+
+    now[0] = 11  # One rotation: previous window still reported
+    histogram.record(0.2)
+    assert histogram.summary()["count"] == 2
+
+    now[0] = 22  # Second rotation: first window dropped
+    assert histogram.summary()["count"] == 1
+
+    now[0] = 100  # Long idle period: everything dropped
+    assert histogram.summary()["count"] == 0
+
+def test_route_template_used_for_keys():
+    """Requests are grouped by matched route template, not raw path."""
+    assert get_route_template(make_request("/api/notes/abc", "/api/notes/{note_id}")) == "/api/notes/{note_id}"
+    assert get_route_template(make_request("/nowhere")) == UNMATCHED_ROUTE
+
+@pytest.mark.asyncio
+async def test_get_metrics_reports_route_percentiles():
+    """get_metrics should expose per-route latency percentiles."""
+    response = MagicMock(status_code=200)
+    for i, note_id in enumerate(["a", "b", "c", "d"]):
+        request = make_request(f"/api/notes/{note_id}", "/api/notes/{note_id}")
+        await log_request_metrics(request, response, 0.01 * (i + 1))
+
+    result = get_metrics()
+    route_latency = result["performance"]["latency_by_route"]
+    assert list(route_latency.keys()) == ["/api/notes/{note_id}"]
+    assert route_latency["/api/notes/{note_id}"]["count"] == 4
+    assert route_latency["/api/notes/{note_id}"]["max"] == pytest.approx(0.04)
+    assert result["performance"]["latency"]["p99"] == pytest.approx(0.04, rel=0.06)
+    assert result["performance"]["avg_response_time"] == pytest.approx(0.025)
+
+@pytest.mark.asyncio
+async def test_prometheus_labels_use_route_template():
+    """Prometheus series and in-memory keys must not grow with IDs in the path."""
+    from utils.prometheus import render_latest
+
+    response = MagicMock(status_code=200)
+    for note_id in range(50):
+        request = make_request(f"/api/notes/{note_id}", "/api/notes/{note_id}")
+        await log_request_metrics(request, response, 0.01)
+
+    monitoring.aggregator.flush()
+    payload, content_type = render_latest()
+    text = payload.decode()
+    assert content_type.startswith("text/plain")
+    assert 'route="/api/notes/{note_id}"' in text
+    assert 'route="/api/notes/7"' not in text
+    assert len(monitoring.metrics["performance"]["latency_by_route"]) == 1
+    assert list(monitoring.metrics["requests"]["by_path"].keys()) == ["/api/notes/{note_id}"]
+
+def test_mongo_command_timer_observes_duration():
+    """The pymongo listener should record command latency by command name."""
+    from prometheus_client import REGISTRY
+    from utils.prometheus import MongoCommandTimer
+
+    labels = {"command": "find", "outcome": "success"}
+    before = REGISTRY.get_sample_value("mongodb_command_duration_seconds_sum", labels) or 0.0
+    MongoCommandTimer().succeeded(SimpleNamespace(command_name="find", duration_micros=2500))
+    after = REGISTRY.get_sample_value("mongodb_command_duration_seconds_sum", labels)
+    assert after - before == pytest.approx(0.0025)
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_requires_token(monkeypatch):
+    """The scrape endpoint must reject callers without the shared secret."""
+    from fastapi import HTTPException
+    import utils.prometheus as prometheus
+
+    monkeypatch.setattr(prometheus, "METRICS_TOKEN", "")
+    with pytest.raises(HTTPException) as excinfo:
+        await prometheus.verify_metrics_token("Bearer anything")
+    assert excinfo.value.status_code == 403
+
+    monkeypatch.setattr(prometheus, "METRICS_TOKEN", "s3cret")
+    with pytest.raises(HTTPException) as excinfo:
+        await prometheus.verify_metrics_token("Bearer wrong")
+    assert excinfo.value.status_code == 401
+    assert await prometheus.verify_metrics_token("Bearer s3cret") is None
+
+def test_aggregator_batches_until_flush():
+    """Recording only queues events; they are applied on flush or on read."""
+    for i in range(3):
+        monitoring.record_request_metrics("GET", "/api/notes/", "/api/notes/", 200, 0.01)
+
+    assert monitoring.aggregator.pending() == 3
+    assert monitoring.metrics["requests"]["total"] == 0
+
+    result = get_metrics()
+    assert monitoring.aggregator.pending() == 0
+    assert result["requests"]["total"] == 3
+    assert result["requests"]["by_status"] == {"200": 3}
+
+def test_aggregator_queue_is_bounded():
+    """A stalled flusher must not grow memory without bound."""
+    aggregator = monitoring.MetricsAggregator(max_pending=10)
+    for i in range(25):
+        aggregator.record(("GET", "/x", "/x", 200, 0.01, "unknown", "unknown", 0.0))
+    assert aggregator.pending() == 10
+
+@pytest.mark.asyncio
+async def test_aggregator_background_flush():
+    """The periodic task applies queued events and stop() drains the rest."""
+    aggregator = monitoring.MetricsAggregator()
+    aggregator.start(interval=0.01)
+    aggregator.record(("GET", "/x", "/x", 200, 0.01, "unknown", "unknown", 0.0))
+    await asyncio.sleep(0.05)
+    assert aggregator.pending() == 0
+    assert monitoring.metrics["requests"]["total"] == 1
+
+    aggregator.record(("GET", "/x", "/x", 200, 0.01, "unknown", "unknown", 0.0))
+    await aggregator.stop()
+    assert aggregator.pending() == 0
+    assert monitoring.metrics["requests"]["total"] == 2
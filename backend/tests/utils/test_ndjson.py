@@ -0,0 +1,34 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from utils.ndjson import encode_line, iter_lines
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+async def _collect(stream, **kwargs):
+    return [item async for item in iter_lines(stream, **kwargs)]
+
+@pytest.mark.asyncio
+async def test_lines_split_across_chunks():
+    lines = await _collect(_chunks(b'{"a":', b'1}\n{"b"', b':2}\n', b'{"c":3}'))
+    assert lines == [(1, b'{"a":1}'), (2, b'{"b":2}'), (3, b'{"c":3}')]
+
+@pytest.mark.asyncio
+async def test_blank_lines_keep_numbering():
+    lines = await _collect(_chunks(b"x\n\ny\n"))
+    assert lines == [(1, b"x"), (2, b""), (3, b"y")]
+
+@pytest.mark.asyncio
+async def test_overlong_line_is_reported_not_buffered():
+    lines = await _collect(_chunks(b"ok\n", b"a" * 10, b"a" * 10, b"\nnext\n"), max_line_bytes=15)
+    assert lines == [(1, b"ok"), (2, None), (3, b"next")]
+
+def test_encode_line_handles_bson_types():
+    oid = ObjectId()
+    line = encode_line({"id": oid, "at": datetime(2024, 1, 1, tzinfo=timezone.utc)})
+    assert line.endswith(b"\n")
+    assert json.loads(line) == {"id": str(oid), "at": "2024-01-01T00:00:00+00:00"}
@@ -0,0 +1,53 @@
+import pytest
+from datetime import datetime, timezone
+from bson import ObjectId
+from fastapi import HTTPException
+
+from utils.pagination import CountCache, decode_cursor, encode_cursor, keyset_filter
+
+def test_cursor_round_trip_preserves_types():
+    values = {"u": datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc), "i": ObjectId(), "s": 1.5}
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+
+@pytest.mark.parametrize("cursor", ["", "%%%", "bm90IGpzb24", "WzEsMl0"])
+def test_malformed_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor)
+    assert exc_info.value.status_code == 400
+
+def test_keyset_filter_breaks_ties_on_id():
+    last_id = ObjectId()
+    assert keyset_filter("score", 2.0, last_id, descending=False) == {"$or": [
+        {"score": {"$gt": 2.0}},
+        {"score": 2.0, "_id": {"$gt": last_id}},
+    ]}
+
+def test_count_cache_expires_and_invalidates():
+    cache = CountCache(ttl=60)
+    cache.set("alice", None, 10)
+    cache.set("alice", "python", 3)
+    cache.set("bob", None, 7)
+    assert cache.get("alice", "python") == 3
+
+    cache.invalidate("alice")
+    assert cache.get("alice", None) is None
+    assert cache.get("alice", "python") is None
+    assert cache.get("bob", None) == 7
+
+    expired = CountCache(ttl=-1)
+    expired.set("alice", None, 1)
+    assert expired.get("alice", None) is None
+
+def test_count_cache_evicts_least_recently_used_owners():
+    cache = CountCache(ttl=60, max_size=3)
+    cache.set("alice", None, 10)
+    cache.set("alice", "python", 3)
+    cache.set("bob", None, 7)
+    assert cache.get("alice", None) == 10  # alice is now the most recent
+
+    cache.set("carol", None, 1)
+    assert cache.get("bob", None) is None
+    assert cache.get("alice", "python") == 3
+    assert cache.get("carol", None) == 1
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from passlib.context import CryptContext
+
+from auth import authenticate_user, get_password_hash_async, verify_password_async, BCRYPT_ROUNDS
+from utils.password_hasher import PasswordHasher, PasswordHasherBusy
+
+@pytest.mark.asyncio
+async def test_runs_off_the_event_loop_thread():
+    hasher = PasswordHasher(workers=1, queue_limit=4)
+    try:
+        thread_id = await hasher.run(threading.get_ident)
+    finally:
+        hasher.shutdown()
+    assert thread_id != threading.get_ident()
+    assert hasher.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    """Calls beyond the queue limit fail fast with a 503."""
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, queue_limit=2)
+    try:
+        running = [asyncio.create_task(hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHasherBusy) as exc_info:
+            await hasher.run(release.wait)
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"]
+        assert hasher.stats()["rejected"] == 1
+        release.set()
+        await asyncio.gather(*running)
+    finally:
+        release.set()
+        hasher.shutdown()
+    assert hasher.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_async_hash_round_trip():
+    hashed = await get_password_hash_async("Secret123!")
+    assert await verify_password_async("Secret123!", hashed) is True
+    assert await verify_password_async("wrong", hashed) is False
+
+def _mock_db(user):
+    db = MagicMock()
+    db.users.find_one = AsyncMock(return_value=user)
+    db.users.update_one = AsyncMock()
+    return db
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_cost():
+    """A hash with a different cost is upgraded after a successful login."""
+    cheap = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    old_hash = cheap.hash("Secret123!")
+    assert BCRYPT_ROUNDS != 4
+    db = _mock_db({"_id": "u1", "username": "alice", "hashed_password": old_hash})
+
+    user = await authenticate_user("alice", "Secret123!", db)
+
+    assert user is not None
+    db.users.update_one.assert_awaited_once()
+    query, update = db.users.update_one.await_args.args
+    assert query == {"_id": "u1", "hashed_password": old_hash}
+    new_hash = update["$set"]["hashed_password"]
+    assert new_hash != old_hash
+    assert new_hash.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+
+@pytest.mark.asyncio
+async def test_login_keeps_current_hash():
+    current = await get_password_hash_async("Secret123!")
+    db = _mock_db({"_id": "u1", "username": "alice", "hashed_password": current})
+
+    assert await authenticate_user("alice", "Secret123!", db) is not None
+    db.users.update_one.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_failed_login_does_not_rehash():
+    cheap = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    db = _mock_db({"_id": "u1", "username": "alice", "hashed_password": cheap.hash("Secret123!")})
+
+    assert await authenticate_user("alice", "wrong", db) is None
+    db.users.update_one.assert_not_awaited()
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from utils import query_tracker
+from utils.query_tracker import RequestCommandListener, begin_request, end_request, get_current_stats
+from utils.monitoring import record_request_metrics, get_metrics, reset_metrics
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+def run_command(listener, request_id, command_name, command, reply, duration_micros=1000):
+    """Feed a started/succeeded pair through the listener."""
+    listener.started(SimpleNamespace(request_id=request_id, command_name=command_name, command=command))
+    listener.succeeded(SimpleNamespace(
+        request_id=request_id, command_name=command_name, reply=reply, duration_micros=duration_micros
+    ))
+
+def test_commands_attributed_to_current_request():
+    """Commands run inside a request context are counted on that request."""
+    listener = RequestCommandListener()
+    token = begin_request("req-1")
+    run_command(
+        listener, 1, "find", {"find": "notes", "filter": {"user_id": "u1"}},
+        {"cursor": {"firstBatch": [{"_id": 1}, {"_id": 2}]}, "ok": 1}, duration_micros=2000
+    )
+    run_command(listener, 2, "insert", {"insert": "notes", "documents": [{}]}, {"n": 1, "ok": 1})
+    stats = end_request(token)
+
+    assert get_current_stats() is None
+    assert stats.request_id == "req-1"
+    assert stats.commands == 2
+    assert stats.docs_returned == 3
+    assert stats.db_time == pytest.approx(0.003)
+    assert stats.reply_bytes == 0  # Not measured unless DB_TRACK_REPLY_BYTES is set
+    assert stats.by_command == {"find:notes": 1, "insert:notes": 1}
+    assert stats.n_plus_one() == []
+
+def test_reply_bytes_measured_when_enabled(monkeypatch):
+    """DB_TRACK_REPLY_BYTES opts into encoding replies to measure their size."""
+    monkeypatch.setattr(query_tracker, "DB_TRACK_REPLY_BYTES", True)
+    listener = RequestCommandListener()
+    token = begin_request("req-1")
+    run_command(listener, 1, "find", {"find": "notes", "filter": {}}, {"cursor": {"firstBatch": [{"_id": 1}]}, "ok": 1})
+    stats = end_request(token)
+
+    assert stats.reply_bytes > 0
+
+def test_commands_outside_requests_are_ignored():
+    """Background work has no request context and is not tracked."""
+    listener = RequestCommandListener()
+    run_command(listener, 1, "find", {"find": "notes", "filter": {}}, {"cursor": {"firstBatch": []}})
+    assert get_current_stats() is None
+
+def test_n_plus_one_and_slow_queries_reported_per_route():
+    """A per-item lookup loop is flagged and slow queries are sampled."""
+    listener = RequestCommandListener()
+    token = begin_request("req-2")
+    for i in range(query_tracker.N_PLUS_ONE_THRESHOLD):
+        run_command(
+            listener, i, "find", {"find": "users", "filter": {"username": f"user{i}"}},
+            {"cursor": {"firstBatch": [{"_id": i}]}}
+        )
+    run_command(
+        listener, 99, "aggregate", {"aggregate": "notes", "pipeline": []},
+        {"cursor": {"firstBatch": []}}, duration_micros=int(query_tracker.DB_SLOW_QUERY_THRESHOLD * 2e6)
+    )
+    stats = end_request(token)
+
+    record_request_metrics("POST", "/api/resources/batch", "/api/resources/batch", 200, 0.3, db_stats=stats)
+    database = get_metrics()["database"]
+
+    route_stats = database["by_route"]["/api/resources/batch"]
+    assert route_stats["queries"] == query_tracker.N_PLUS_ONE_THRESHOLD + 1
+    assert route_stats["n_plus_one_requests"] == 1
+    assert route_stats["n_plus_one_patterns"] == {"find:users(username)": query_tracker.N_PLUS_ONE_THRESHOLD}
+    assert route_stats["avg_queries"] == query_tracker.N_PLUS_ONE_THRESHOLD + 1
+    assert database["slow_queries"][0]["collection"] == "notes"
+    assert database["slow_queries"][0]["route"] == "/api/resources/batch"
+    assert database["slow_queries"][0]["request_id"] == "req-2"
+
+@pytest.mark.asyncio
+async def test_context_visible_in_executor_threads():
+    """Motor runs commands in executor threads with a copy of the context."""
+    import contextvars
+    listener = RequestCommandListener()
+    token = begin_request("req-3")
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, context.run, run_command, listener, 1, "count", {"count": "notes"}, {"n": 4})
+    stats = end_request(token)
+    assert stats.commands == 1
+    assert stats.docs_returned == 4
@@ -0,0 +1,111 @@
+import random
+from datetime import date
+
+import pytest
+
+from utils.roadmap_graph import RoadmapGraphError, RoadmapPlanCache, RoadmapSchedule
+
+START = date(2025, 1, 1)
+
+def _diamond():
+    # a -> b -> d, a -> c -> d
+    return [
+        {"id": "a", "title": "A", "estimated_days": 2},
+        {"id": "b", "title": "B", "estimated_days": 5, "prerequisites": ["a"]},
+        {"id": "c", "title": "C", "estimated_days": 1, "prerequisites": ["a"]},
+        {"id": "d", "title": "D", "estimated_days": 3, "prerequisites": ["b", "c"]},
+    ]
+
+def _random_dag(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"m{i}",
+            "estimated_days": rng.randint(1, 20),
+            "prerequisites": [f"m{p}" for p in rng.sample(range(max(0, i - 30), i), min(i, rng.randint(0, 3)))],
+        }
+        for i in range(count)
+    ]
+
+def _dates(schedule):
+    return (schedule.earliest_start, schedule.earliest_finish, schedule.latest_start, schedule.latest_finish,
+            schedule.project_days)
+
+def test_plan_computes_dates_slack_and_critical_path():
+    plan = RoadmapSchedule(_diamond()).plan(START)
+
+    assert plan["end_date"] == "2025-01-11"
+    assert plan["remaining_days"] == 10
+    assert plan["critical_path"] == ["a", "b", "d"]
+    assert plan["next_actionable"] == ["a"]
+    by_id = {entry["id"]: entry for entry in plan["schedule"]}
+    assert by_id["c"]["earliest_start"] == "2025-01-03"
+    assert by_id["c"]["latest_start"] == "2025-01-07"
+    assert by_id["c"]["slack_days"] == 4
+    assert not by_id["c"]["critical"]
+
+def test_completed_milestones_take_no_time_and_unlock_successors():
+    milestones = _diamond()
+    milestones[0]["completed"] = True
+    plan = RoadmapSchedule(milestones).plan(START)
+
+    assert plan["remaining_days"] == 8
+    assert plan["critical_path"] == ["b", "d"]
+    assert plan["next_actionable"] == ["b", "c"]  # Critical first
+
+@pytest.mark.parametrize("milestones,message", [
+    ([{"id": "a", "prerequisites": ["b"]}, {"id": "b", "prerequisites": ["a"]}], "cycle"),
+    ([{"id": "a", "prerequisites": ["zzz"]}], "unknown milestone zzz"),
+    ([{"id": "a"}, {"id": "a"}], "Duplicate"),
+    ([{"id": "a", "estimated_days": -1}], "negative"),
+])
+def test_invalid_graphs_are_rejected(milestones, message):
+    with pytest.raises(RoadmapGraphError, match=message):
+        RoadmapSchedule(milestones)
+
+def test_incremental_updates_match_a_full_rebuild():
+    milestones = _random_dag(300)
+    schedule = RoadmapSchedule(milestones)
+    rng = random.Random(11)
+
+    for _ in range(200):
+        node = rng.choice(milestones)
+        if rng.random() < 0.5:
+            node["estimated_days"] = rng.randint(0, 25)
+            schedule.update_node(node["id"], estimated_days=node["estimated_days"])
+        else:
+            node["completed"] = not node.get("completed", False)
+            schedule.update_node(node["id"], completed=node["completed"])
+        assert _dates(schedule) == _dates(RoadmapSchedule(milestones))
+
+def test_update_invalidates_the_cached_plan():
+    schedule = RoadmapSchedule(_diamond())
+    assert schedule.plan(START)["remaining_days"] == 10
+    schedule.update_node("c", estimated_days=9)
+    plan = schedule.plan(START)
+    assert plan["remaining_days"] == 14
+    assert plan["critical_path"] == ["a", "c", "d"]
+
+def test_missing_or_null_duration_counts_as_zero():
+    milestones = _diamond()
+    milestones[1]["estimated_days"] = None
+    del milestones[3]["estimated_days"]
+    schedule = RoadmapSchedule(milestones)
+    assert schedule.plan(START)["remaining_days"] == 3
+
+    schedule.update_node("c", estimated_days=None)
+    plan = schedule.plan(START)
+    assert plan["remaining_days"] == 2
+    assert plan["schedule"][1]["estimated_days"] == 0
+
+def test_plan_cache_serves_only_the_matching_version():
+    cache = RoadmapPlanCache(max_size=2)
+    schedule = RoadmapSchedule(_diamond())
+    cache.put(("alice", "r1"), 3, schedule)
+
+    assert cache.get(("alice", "r1"), 3) is schedule
+    assert cache.get(("alice", "r1"), 4) is None
+
+    cache.put(("bob", "r1"), 1, schedule)
+    cache.put(("carol", "r1"), 1, schedule)
+    assert cache.get(("alice", "r1"), 3) is None  # Evicted
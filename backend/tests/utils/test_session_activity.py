@@ -0,0 +1,116 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import database
+from utils.session_activity import SessionActivityBuffer
+
+TTL = timedelta(minutes=60)
+
+def _match_all(operations, ordered=True):
+    return MagicMock(matched_count=len(operations))
+
+@pytest.fixture
+def sessions():
+    collection = MagicMock()
+    collection.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+    collection.bulk_write = AsyncMock(side_effect=_match_all)
+    with patch.object(database, "db", MagicMock(sessions=collection)):
+        yield collection
+
+@pytest.mark.asyncio
+async def test_unknown_session_is_written_through_then_buffered(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+
+    assert await buffer.touch("s1", "u1") is True
+    assert sessions.update_one.await_count == 1
+    for _ in range(5):
+        assert await buffer.touch("s1", "u1") is True
+    assert sessions.update_one.await_count == 1
+    sessions.bulk_write.assert_not_awaited()
+
+    assert await buffer.flush() == 1
+    operations = sessions.bulk_write.await_args.args[0]
+    assert len(operations) == 1
+    assert operations[0]._filter["session_id"] == "s1"
+    assert set(operations[0]._doc["$max"]) == {"last_active", "expires_at"}
+
+@pytest.mark.asyncio
+async def test_heartbeats_coalesce_by_an_order_of_magnitude(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+    for i in range(10):
+        buffer.remember(f"s{i}", "u1", datetime.now(timezone.utc) + TTL)
+
+    for _ in range(20):
+        for i in range(10):
+            await buffer.touch(f"s{i}", "u1")
+    await buffer.flush()
+
+    assert sessions.update_one.await_count == 0
+    assert sessions.bulk_write.await_count == 1
+    assert buffer.stats()["buffered"] == 200
+
+@pytest.mark.asyncio
+async def test_session_near_expiry_is_written_through(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+    buffer.remember("s1", "u1", datetime.now(timezone.utc) + timedelta(seconds=45))
+
+    await buffer.touch("s1", "u1")
+
+    assert sessions.update_one.await_count == 1
+
+@pytest.mark.asyncio
+async def test_other_users_session_is_not_buffered(sessions):
+    sessions.update_one.return_value = MagicMock(matched_count=0)
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+    buffer.remember("s1", "owner", datetime.now(timezone.utc) + TTL)
+
+    assert await buffer.touch("s1", "intruder") is False
+    assert buffer.stats()["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+    buffer.remember("s1", "u1", datetime.now(timezone.utc) + TTL)
+    await buffer.touch("s1", "u1")
+
+    sessions.bulk_write.side_effect = ConnectionError("down")
+    assert await buffer.flush() == 0
+    assert buffer.stats()["pending"] == 1
+
+    sessions.bulk_write.side_effect = _match_all
+    assert await buffer.flush() == 1
+
+@pytest.mark.asyncio
+async def test_flush_that_misses_a_session_forgets_the_batch(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+    for session_id in ("s1", "s2"):
+        buffer.remember(session_id, "u1", datetime.now(timezone.utc) + TTL)
+        await buffer.touch(session_id, "u1")
+
+    # One of the two sessions was revoked since it was buffered
+    sessions.bulk_write.side_effect = None
+    sessions.bulk_write.return_value = MagicMock(matched_count=1)
+    await buffer.flush()
+    assert buffer.stats()["known"] == 0
+
+    await buffer.touch("s1", "u1")
+    assert sessions.update_one.await_count == 1
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=30)
+    buffer.start()
+    buffer.remember("s1", "u1", datetime.now(timezone.utc) + TTL)
+    await buffer.touch("s1", "u1")
+
+    await buffer.stop()
+
+    assert sessions.bulk_write.await_count == 1
+
+@pytest.mark.asyncio
+async def test_zero_interval_writes_every_touch(sessions):
+    buffer = SessionActivityBuffer(TTL, flush_interval=0)
+    for _ in range(3):
+        await buffer.touch("s1", "u1")
+    assert sessions.update_one.await_count == 3
@@ -0,0 +1,34 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from utils.tag_counts import apply_tag_diff, rebuild_tag_counts, tag_count_pipeline, tag_diff
+
+def test_tag_diff_only_reports_changes():
+    assert tag_diff(["a", "b"], ["b", "c"]) == {"a": -1, "c": 1}
+    assert tag_diff(["a"], ["a"]) == {}
+    assert tag_diff([], ["a", "a"]) == {"a": 1}
+
+@pytest.mark.asyncio
+async def test_apply_tag_diff_skips_noop_writes():
+    db = MagicMock()
+    db.note_tag_counts.bulk_write = AsyncMock()
+    await apply_tag_diff(db, "user1", ["a"], ["a"])
+    db.note_tag_counts.bulk_write.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_apply_tag_diff_swallows_errors():
+    db = MagicMock()
+    db.note_tag_counts.bulk_write = AsyncMock(side_effect=ConnectionError("down"))
+    await apply_tag_diff(db, "user1", [], ["a"])
+
+def test_pipeline_groups_by_user_and_tag():
+    pipeline = tag_count_pipeline()
+    assert pipeline[0] == {"$unwind": "$tags"}
+    assert pipeline[1]["$group"]["_id"] == {"user_id": "$user_id", "tag": "$tags"}
+
+@pytest.mark.asyncio
+async def test_full_rebuild_replaces_collection():
+    db = MagicMock()
+    db.notes.aggregate.return_value.to_list = AsyncMock(return_value=[])
+    await rebuild_tag_counts(db)
+    assert db.notes.aggregate.call_args.args[0][-1] == {"$out": "note_tag_counts"}
@@ -0,0 +1,65 @@
+import time
+import pytest
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+from jose import ExpiredSignatureError, JWTError, jwt
+
+import auth
+from auth import (
+    create_access_token, decode_access_token, get_current_user, revoke_access_token,
+    SECRET_KEY, ALGORITHM
+)
+from utils.token_cache import VerifiedTokenCache
+
+@pytest.fixture
+def token_cache():
+    cache = VerifiedTokenCache(max_size=4, ttl=60)
+    with patch.object(auth, "access_token_cache", cache), patch.object(auth, "redis_client", None):
+        yield cache
+
+@pytest.mark.asyncio
+async def test_repeat_decode_is_served_from_cache(token_cache):
+    token = create_access_token({"sub": "alice"})
+    first = await decode_access_token(token)
+    with patch("auth.jwt.decode", side_effect=AssertionError("should not re-verify")):
+        second = await decode_access_token(token)
+    assert first == second
+    assert token_cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_expired_tokens_are_rejected(token_cache):
+    token = create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=-1))
+    with pytest.raises(ExpiredSignatureError):
+        await decode_access_token(token)
+    assert token_cache.stats()["size"] == 0
+
+@pytest.mark.asyncio
+async def test_cached_entry_expires_with_token(token_cache):
+    token = create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=1))
+    await decode_access_token(token)
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    with patch("utils.token_cache.time.time", return_value=claims["exp"] + 1):
+        assert token_cache.get(token) is None
+
+@pytest.mark.asyncio
+async def test_revoked_token_stops_validating(token_cache):
+    token = create_access_token({"sub": "alice"})
+    await decode_access_token(token)
+    await revoke_access_token(token)
+    with pytest.raises(JWTError):
+        await decode_access_token(token)
+
+@pytest.mark.asyncio
+async def test_lru_is_bounded(token_cache):
+    for i in range(10):
+        await decode_access_token(create_access_token({"sub": f"user{i}"}))
+    assert token_cache.stats()["size"] == 4
+
+@pytest.mark.asyncio
+async def test_get_current_user_reports_expiry(token_cache):
+    token = create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=-1))
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(token, db=AsyncMock())
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == "Token has expired"
@@ -0,0 +1,125 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from jose import jwt
+
+import auth
+from auth import create_refresh_token, verify_refresh_token, SECRET_KEY, ALGORITHM
+from utils.token_store import (
+    RefreshTokenStore, token_ids, USED_KEY_PREFIX, REVOKED_FAMILY_KEY_PREFIX
+)
+
+class FakeRedis:
+    """Evaluates the rotation script's logic in Python and counts round trips."""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+
+    def register_script(self, source):
+        async def script(keys, args):
+            self.calls += 1
+            used_key, family_key = keys
+            now, _ttl, _family_ttl, grace = (int(a) for a in args)
+            if family_key in self.data:
+                return -1
+            if used_key not in self.data:
+                self.data[used_key] = now
+                return 1
+            if now - self.data[used_key] <= grace:
+                return 0
+            self.data[family_key] = "1"
+            return -2
+        return script
+
+    async def set(self, key, value, ex=None):
+        self.calls += 1
+        self.data[key] = value
+
+def _payload(token):
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def test_refresh_tokens_carry_jti_and_family():
+    first = _payload(create_refresh_token({"sub": "alice"}))
+    rotated = _payload(create_refresh_token({"sub": "alice"}, family=first["fam"]))
+    assert first["jti"] == first["fam"]
+    assert rotated["jti"] != first["jti"]
+    assert rotated["fam"] == first["fam"]
+
+def test_legacy_tokens_get_short_ids():
+    jti, family = token_ids("legacy.jwt.value", {"sub": "alice"})
+    assert len(jti) == 32
+    assert family == jti
+
+@pytest.mark.asyncio
+async def test_first_redemption_wins_in_one_round_trip():
+    redis = FakeRedis()
+    store = RefreshTokenStore(redis)
+    token = create_refresh_token({"sub": "alice"})
+    payload = _payload(token)
+
+    assert await store.redeem(token, payload) is True
+    assert redis.calls == 1
+    assert USED_KEY_PREFIX + payload["jti"] in redis.data
+
+@pytest.mark.asyncio
+async def test_refresh_storm_is_answered_locally():
+    """Concurrent tabs redeeming the same cookie cost no extra Redis ops."""
+    redis = FakeRedis()
+    store = RefreshTokenStore(redis)
+    token = create_refresh_token({"sub": "alice"})
+    payload = _payload(token)
+
+    results = [await store.redeem(token, payload) for _ in range(20)]
+
+    assert results.count(True) == 1
+    assert redis.calls == 1
+    assert REVOKED_FAMILY_KEY_PREFIX + payload["fam"] not in redis.data
+
+@pytest.mark.asyncio
+async def test_reuse_after_grace_revokes_family():
+    redis = FakeRedis()
+    store = RefreshTokenStore(redis, grace_seconds=0)
+    token = create_refresh_token({"sub": "alice"})
+    payload = _payload(token)
+    rotated = create_refresh_token({"sub": "alice"}, family=payload["fam"])
+
+    assert await store.redeem(token, payload) is True
+    # Replay from another worker (empty negative cache) after the grace window
+    other_worker = RefreshTokenStore(redis, grace_seconds=0)
+    redis.data[USED_KEY_PREFIX + payload["jti"]] = int(time.time()) - 5
+    assert await other_worker.redeem(token, payload) is False
+    assert REVOKED_FAMILY_KEY_PREFIX + payload["fam"] in redis.data
+
+    # The legitimate rotated token is now dead as well, and the revoked family
+    # is answered from the negative cache on repeat
+    assert await other_worker.redeem(rotated, _payload(rotated)) is False
+    calls = redis.calls
+    assert await other_worker.redeem(rotated, _payload(rotated)) is False
+    assert redis.calls == calls
+
+@pytest.mark.asyncio
+async def test_revoke_family_blocks_unused_tokens():
+    redis = FakeRedis()
+    store = RefreshTokenStore(redis)
+    token = create_refresh_token({"sub": "alice"})
+    payload = _payload(token)
+
+    await store.revoke_family(payload["fam"])
+    assert await RefreshTokenStore(redis).redeem(token, payload) is False
+
+@pytest.mark.asyncio
+async def test_redis_errors_fail_open():
+    client = MagicMock()
+    client.register_script.return_value = AsyncMock(side_effect=ConnectionError("down"))
+    store = RefreshTokenStore(client)
+    token = create_refresh_token({"sub": "alice"})
+    assert await store.redeem(token, _payload(token)) is True
+
+@pytest.mark.asyncio
+async def test_verify_refresh_token_rejects_reuse():
+    store = RefreshTokenStore(FakeRedis())
+    token = create_refresh_token({"sub": "alice"})
+    with patch.object(auth, "refresh_token_store", store):
+        assert (await verify_refresh_token(token))["sub"] == "alice"
+        assert await verify_refresh_token(token) is None
@@ -0,0 +1,117 @@
+import gzip
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from bson import ObjectId
+
+from utils import user_export
+from utils.user_export import count_export_items, run_export_job, stream_export
+
+USER_ID = ObjectId()
+USER = {
+    "_id": USER_ID,
+    "username": "alice",
+    "email": "alice@example.com",
+    "notification_preferences": {"newsletter": False},
+    "resources": {"articles": [{"title": "A1"}, {"title": "A2"}], "videos": []},
+    "concepts": [{"name": "C1"}],
+    "goals": [{"title": "G1"}],
+}
+NOTES = [{"_id": ObjectId(), "title": "N1", "content": "x", "tags": []}]
+# Already migrated into the goals collection, milestones joined back in by $lookup
+GOALS = [{"id": "g2", "title": "G2", "milestones": [{"id": "m1", "title": "M1"}]}]
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+def _aggregate(pipeline, **kwargs):
+    project = pipeline[1]["$project"]
+    if "item" in project:
+        value = USER
+        for part in project["item"].lstrip("$").split("."):
+            value = value.get(part, {})
+        return FakeCursor([{"item": item} for item in (value or [])])
+    if "types" in project:
+        return FakeCursor([{"types": list(USER["resources"])}])
+    # count_export_items: evaluated here rather than by MongoDB
+    embedded = sum(len(v) for v in USER["resources"].values())
+    embedded += sum(len(USER.get(name, [])) for name in user_export.EMBEDDED_LISTS)
+    return FakeCursor([{"items": embedded}])
+
+@pytest.fixture
+def db():
+    db = MagicMock()
+    db.users.find_one = AsyncMock(return_value=USER)
+    db.users.aggregate = MagicMock(side_effect=_aggregate)
+    db.notes.find = MagicMock(return_value=FakeCursor(NOTES))
+    db.notes.count_documents = AsyncMock(return_value=len(NOTES))
+    db.goals.aggregate = MagicMock(return_value=FakeCursor(GOALS))
+    db.goals.count_documents = AsyncMock(return_value=len(GOALS))
+    return db
+
+async def _collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+@pytest.mark.asyncio
+async def test_json_export_layout(db):
+    export = json.loads(await _collect(stream_export(db, USER_ID, "json")))
+
+    assert export["user_info"]["username"] == "alice"
+    assert export["preferences"] == {"newsletter": False}
+    assert export["learning_data"]["resources"] == {"articles": [{"title": "A1"}, {"title": "A2"}], "videos": []}
+    assert export["learning_data"]["concepts"] == [{"name": "C1"}]
+    assert export["learning_data"]["milestones"] == []
+    assert export["learning_data"]["goals"] == [{"title": "G1"}] + GOALS
+    assert export["notes"][0]["id"] == str(NOTES[0]["_id"])
+    # Embedded lists are unwound by the server, never loaded with the user document
+    projection = db.users.find_one.await_args.args[1]
+    assert "resources" not in projection and "concepts" not in projection
+
+@pytest.mark.asyncio
+async def test_ndjson_gzip_export(db):
+    body = gzip.decompress(await _collect(stream_export(db, USER_ID, "ndjson", compress=True)))
+    sections = [json.loads(line)["section"] for line in body.splitlines()]
+
+    assert sections[:3] == ["export", "user_info", "preferences"]
+    assert sections.count("resources.articles") == 2
+    assert sections[-1] == "notes"
+
+@pytest.mark.asyncio
+async def test_progress_is_reported(db, monkeypatch):
+    monkeypatch.setattr(user_export, "USER_EXPORT_PROGRESS_EVERY", 4)
+    reports = []
+
+    async def progress(items):
+        reports.append(items)
+
+    await _collect(stream_export(db, USER_ID, "json", progress=progress))
+    assert reports == [4, 6]
+    assert await count_export_items(db, USER_ID) == 6
+
+@pytest.mark.asyncio
+async def test_export_job_writes_file(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(user_export, "USER_EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(user_export.database, "db", db)
+    context = MagicMock(job_id="job1", user_id=str(USER_ID), params={"format": "json", "compress": True, "username": "alice"})
+    context.report = AsyncMock()
+
+    result = await run_export_job(context)
+
+    path = tmp_path / "job1.export"
+    assert json.loads(gzip.decompress(path.read_bytes()))["user_info"]["email"] == "alice@example.com"
+    assert result["size"] == path.stat().st_size
+    assert result["filename"].endswith(".json.gz")
+    assert result["media_type"] == "application/gzip"
+    context.report.assert_awaited_with(items_written=6)
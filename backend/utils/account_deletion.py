@@ -0,0 +1,89 @@
+"""
+Background account deletion.
+
+Deleting a heavy account in one transaction can exceed transaction limits and
+holds locks for the whole request. Instead the account is tombstoned (marked
+``disabled`` with a ``deleted_at``, so every authenticated endpoint rejects it
+at once) and an ``account_deletion`` job purges the user's data collection by
+collection in ``ACCOUNT_DELETION_BATCH_SIZE`` batches. The user document goes
+last, which keeps the tombstone (and the username) reserved until the purge is
+done.
+
+The job checkpoints after each collection and each batch; deletes are
+idempotent, so a job resumed after a crash simply continues.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+import database
+from utils.jobs import JobContext, job_handler
+from utils.user_export import user_key
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+ACCOUNT_DELETION_BATCH_SIZE = int(os.getenv("ACCOUNT_DELETION_BATCH_SIZE", "1000"))
+ACCOUNT_DELETION_BATCH_PAUSE = float(os.getenv("ACCOUNT_DELETION_BATCH_PAUSE", "0.05"))  # seconds between batches
+
+def purge_plan(user_id: str, username: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Collections holding the user's data and the filter selecting it, in deletion order."""
+    return [
+        ("sessions", {"user_id": user_id}),
+        ("notes", {"user_id": user_id}),
+        ("note_tag_counts", {"user_id": user_id}),
+        ("progress_history", {"user_id": user_id}),
+        ("progress_counters", {"user_id": user_id}),
+        ("milestones", {"user_id": user_id}),
+        ("goals", {"user_id": user_id}),
+        ("resources", {"user_id": user_id}),
+        ("learning_paths", {"user_id": user_id}),
+        ("study_sessions", {"user_id": user_id}),
+        ("reviews", {"user_id": user_id}),
+        ("user_library_status", {"username": username}),
+        ("users", {"_id": user_key(user_id)}),
+    ]
+
+async def tombstone_user(db: Any, user_id: str) -> None:
+    """Disable the account immediately; its data is purged afterwards."""
+    await db.users.update_one(
+        {"_id": user_key(user_id), "deleted_at": {"$exists": False}},
+        {"$set": {"disabled": True, "deleted_at": datetime.now(timezone.utc)}}
+    )
+
+async def _purge(collection: Any, query: Dict[str, Any], batch_size: int) -> int:
+    """Delete one batch of matching documents; returns how many were deleted."""
+    batch = await collection.find(query, {"_id": 1}).limit(batch_size).to_list(length=batch_size)
+    if not batch:
+        return 0
+    result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+    return result.deleted_count
+
+@job_handler("account_deletion")
+async def run_account_deletion(context: JobContext) -> Dict[str, Any]:
+    """Purge every collection in ``purge_plan``, resuming from the checkpointed step."""
+    db = database.db
+    plan = purge_plan(context.user_id, context.params["username"])
+    state = {"step": context.state.get("step", 0), "deleted": dict(context.state.get("deleted", {}))}
+
+    if state["step"] == 0:
+        await tombstone_user(db, context.user_id)
+
+    for step in range(state["step"], len(plan)):
+        name, query = plan[step]
+        while True:
+            deleted = await _purge(db[name], query, ACCOUNT_DELETION_BATCH_SIZE)
+            if not deleted:
+                break
+            state["deleted"][name] = state["deleted"].get(name, 0) + deleted
+            await context.report(state=state, collection=name, deleted=dict(state["deleted"]))
+            if ACCOUNT_DELETION_BATCH_PAUSE:
+                await asyncio.sleep(ACCOUNT_DELETION_BATCH_PAUSE)
+        state["step"] = step + 1
+        await context.report(state=state, collections_done=step + 1, collections_total=len(plan))
+
+    logger.info(f"Deleted account {context.user_id}: {state['deleted']}")
+    return {"deleted": state["deleted"]}
@@ -0,0 +1,65 @@
+"""
+Sparse fieldsets for user profile responses.
+
+``?fields=username,first_name`` selects top-level fields of the response
+model. The selection is pushed down to MongoDB as a projection, so the heavy
+embedded lists (resources, concepts, goals, sessions, ...) are not even read
+unless asked for, and the response carries only the selected fields.
+
+Special values:
+    - ``profile``: the light profile shape (``PROFILE_FIELDS``) used by the navbar
+    - ``*``: every field
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+PROFILE_FIELDS = ["id", "username", "email", "first_name", "last_name", "disabled", "is_active", "created_at", "updated_at"]
+
+# Always read: needed for the active-user check and to validate the response model
+REQUIRED_DOCUMENT_FIELDS = ("_id", "username", "email", "disabled")
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], default: Optional[Sequence[str]] = None) -> Optional[List[str]]:
+    """
+    Resolve a ``fields`` query value to field names in model order.
+
+    Returns None when every field is selected.
+
+    Raises:
+        HTTPException: 400 for unknown field names.
+    """
+    allowed = list(allowed)
+    if fields is None:
+        if default is None:
+            return None
+        requested = set(default)
+    else:
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        if "*" in requested:
+            return None
+        if "profile" in requested:
+            requested.discard("profile")
+            requested.update(PROFILE_FIELDS)
+
+    unknown = requested - set(allowed) - set(PROFILE_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return [name for name in allowed if name in requested]
+
+def mongo_projection(selected: Optional[Sequence[str]]) -> Optional[Dict[str, int]]:
+    """Projection reading only the selected fields (plus the ones auth needs)."""
+    if selected is None:
+        return None
+    projection = {("_id" if name == "id" else name): 1 for name in selected}
+    projection.update({name: 1 for name in REQUIRED_DOCUMENT_FIELDS})
+    return projection
+
+def sparse_response(model: BaseModel, selected: Sequence[str]) -> JSONResponse:
+    """The response model trimmed to the selected fields."""
+    return JSONResponse(content=jsonable_encoder(model.model_dump(include=set(selected))))
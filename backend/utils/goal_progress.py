@@ -0,0 +1,250 @@
+"""
+Incremental learning-path progress.
+
+The progress endpoint reads precomputed counters instead of walking every goal
+and milestone:
+
+    - ``progress_counters``: one document per ``(user_id, category)`` with
+      ``goals``, ``completed_goals``, ``milestones`` and ``completed_milestones``
+    - each goal document carries ``milestones_total`` and
+      ``milestones_completed`` for its own milestones
+    - ``progress_history``: append-only, one document per change of a goal's
+      progress, indexed by ``(user_id, date)``
+
+The goal and milestone write endpoints keep them up to date with ``$inc``,
+using the before-image returned by the atomic write to compute the delta, so
+concurrent updates never lose a count.
+
+Counters of users whose goals predate them are built once from the goals and
+milestones collections (``ensure_progress_counters``), which also moves any
+``progress_history`` still embedded in goal documents into the collection.
+The build is claimed atomically on the user document; concurrent requests of
+the same user wait for it to finish, so no counted write can land in the
+middle of it and be overwritten.
+"""
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from utils.user_export import user_key
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+PROGRESS_HISTORY_LIMIT = int(os.getenv("PROGRESS_HISTORY_LIMIT", "1000"))  # most recent entries returned
+PROGRESS_REBUILD_TIMEOUT = float(os.getenv("PROGRESS_REBUILD_TIMEOUT", "30"))  # seconds before a stalled build is taken over
+PROGRESS_REBUILD_POLL = 0.05  # seconds between checks while another request builds the counters
+
+COUNTER_FIELDS = ("goals", "completed_goals", "milestones", "completed_milestones")
+COUNTERS_FLAG = "progress_counters_built"  # True once built; COUNTERS_BUILDING while a request builds them
+COUNTERS_BUILDING = "building"
+COUNTERS_CLAIMED_AT = "progress_counters_claimed_at"
+DEFAULT_CATEGORY = "Uncategorized"
+
+CounterDelta = Dict[str, Dict[str, int]]
+
+def goal_progress(goal: Dict[str, Any]) -> float:
+    """Percentage of the goal's milestones that are completed."""
+    total = goal.get("milestones_total", 0)
+    return goal.get("milestones_completed", 0) / total * 100 if total > 0 else 0
+
+def goal_contribution(goal: Optional[Dict[str, Any]]) -> CounterDelta:
+    """What one goal adds to its category's counters."""
+    if not goal:
+        return {}
+    return {goal.get("category") or DEFAULT_CATEGORY: {
+        "goals": 1,
+        "completed_goals": int(bool(goal.get("completed", False))),
+        "milestones": goal.get("milestones_total", 0),
+        "completed_milestones": goal.get("milestones_completed", 0),
+    }}
+
+def merge_deltas(*deltas: CounterDelta, sign: int = 1) -> CounterDelta:
+    """Sum counter deltas, dropping zero entries."""
+    merged: CounterDelta = defaultdict(lambda: defaultdict(int))
+    for delta in deltas:
+        for category, counts in delta.items():
+            for field, value in counts.items():
+                merged[category][field] += sign * value
+    return {
+        category: {field: value for field, value in counts.items() if value}
+        for category, counts in merged.items()
+        if any(counts.values())
+    }
+
+def goal_delta(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> CounterDelta:
+    """Counter change for a goal going from ``before`` to ``after`` (None: absent)."""
+    return merge_deltas(goal_contribution(after), merge_deltas(goal_contribution(before), sign=-1))
+
+async def apply_counter_delta(db: Any, user_id: str, delta: CounterDelta) -> None:
+    """Add ``delta`` to the user's category counters in one round trip."""
+    ops = [
+        UpdateOne({"user_id": user_id, "category": category}, {"$inc": counts}, upsert=True)
+        for category, counts in delta.items()
+        if counts
+    ]
+    if ops:
+        await db.progress_counters.bulk_write(ops, ordered=False)
+
+async def record_progress(db: Any, user_id: str, goal: Dict[str, Any]) -> None:
+    """Append the goal's current progress to the history."""
+    await db.progress_history.insert_one({
+        "user_id": user_id,
+        "goal_id": goal.get("id"),
+        "goal_title": goal.get("title"),
+        "date": datetime.now().isoformat(),
+        "progress": goal_progress(goal),
+    })
+
+async def count_milestone_change(
+    db: Any,
+    user_id: str,
+    goal_id: str,
+    total: int = 0,
+    completed: int = 0
+) -> Optional[Dict[str, Any]]:
+    """
+    Apply a milestone being added/removed (``total``) or (un)completed
+    (``completed``) to its goal and category counters, and record the goal's
+    new progress.
+
+    Returns the updated goal, or None if the user has no such goal.
+    """
+    goal = await db.goals.find_one_and_update(
+        {"user_id": user_id, "id": goal_id},
+        {"$inc": {"milestones_total": total, "milestones_completed": completed}},
+        projection={"_id": 0, "id": 1, "title": 1, "category": 1, "milestones_total": 1, "milestones_completed": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if goal is None:
+        return None
+    delta = {goal.get("category") or DEFAULT_CATEGORY: {"milestones": total, "completed_milestones": completed}}
+    await apply_counter_delta(db, user_id, merge_deltas(delta))
+    if total or completed:
+        await record_progress(db, user_id, goal)
+    return goal
+
+async def read_progress_counters(db: Any, user_id: str) -> List[Dict[str, Any]]:
+    """The user's per-category counters (categories that still have goals)."""
+    counters = await db.progress_counters.find({"user_id": user_id}, {"_id": 0, "user_id": 0}).to_list(length=None)
+    return [counter for counter in counters if counter.get("goals", 0) > 0]
+
+async def find_progress_history(
+    db: Any,
+    user_id: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = PROGRESS_HISTORY_LIMIT
+) -> List[Dict[str, Any]]:
+    """History entries with ``since <= date < until``, the most recent ``limit`` in date order."""
+    query: Dict[str, Any] = {"user_id": user_id}
+    date_range = {}
+    if since:
+        date_range["$gte"] = since
+    if until:
+        date_range["$lt"] = until
+    if date_range:
+        query["date"] = date_range
+    entries = await db.progress_history.find(
+        query, {"_id": 0, "user_id": 0}
+    ).sort("date", -1).limit(limit).to_list(length=limit)
+    entries.reverse()
+    return entries
+
+async def rebuild_progress_counters(db: Any, user_id: str) -> None:
+    """Recompute the user's counters from the goals and milestones collections."""
+    milestone_counts = {}
+    async for row in db.milestones.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": "$goal_id",
+            "total": {"$sum": 1},
+            "completed": {"$sum": {"$cond": [{"$eq": ["$completed", True]}, 1, 0]}}
+        }}
+    ]):
+        milestone_counts[row["_id"]] = row
+
+    goals = await db.goals.find(
+        {"user_id": user_id},
+        {"_id": 0, "id": 1, "title": 1, "category": 1, "completed": 1, "progress_history": 1}
+    ).to_list(length=None)
+
+    goal_ops, history_ops, contributions = [], [], []
+    for goal in goals:
+        counts = milestone_counts.get(goal.get("id"), {})
+        goal["milestones_total"] = counts.get("total", 0)
+        goal["milestones_completed"] = counts.get("completed", 0)
+        goal_ops.append(UpdateOne(
+            {"user_id": user_id, "id": goal["id"]},
+            {
+                "$set": {"milestones_total": goal["milestones_total"], "milestones_completed": goal["milestones_completed"]},
+                "$unset": {"progress_history": ""}
+            }
+        ))
+        contributions.append(goal_contribution(goal))
+        # Legacy history embedded in the goal; upserted so a re-run adds nothing
+        for entry in goal.get("progress_history") or []:
+            if isinstance(entry, dict) and entry.get("date"):
+                history_ops.append(UpdateOne(
+                    {"user_id": user_id, "goal_id": goal["id"], "date": entry["date"]},
+                    {"$setOnInsert": {"goal_title": goal.get("title"), "progress": entry.get("progress", 0)}},
+                    upsert=True
+                ))
+
+    if history_ops:
+        await db.progress_history.bulk_write(history_ops, ordered=False)
+    if goal_ops:
+        await db.goals.bulk_write(goal_ops, ordered=False)
+
+    # Upsert the totals in place; categories that no longer have goals are dropped
+    totals = merge_deltas(*contributions)
+    counter_ops = [
+        UpdateOne(
+            {"user_id": user_id, "category": category},
+            {"$set": {field: counts.get(field, 0) for field in COUNTER_FIELDS}},
+            upsert=True
+        )
+        for category, counts in totals.items()
+    ]
+    if counter_ops:
+        await db.progress_counters.bulk_write(counter_ops, ordered=False)
+    await db.progress_counters.delete_many({"user_id": user_id, "category": {"$nin": list(totals)}})
+
+    await db.users.update_one(
+        {"_id": user_key(user_id)},
+        {"$set": {COUNTERS_FLAG: True}, "$unset": {COUNTERS_CLAIMED_AT: ""}}
+    )
+    logger.info(f"Built progress counters for user {user_id}: {len(goals)} goals, {len(history_ops)} history entries")
+
+async def claim_counter_rebuild(db: Any, user_id: str) -> bool:
+    """Atomically claim building the user's counters (or take over a stalled build)."""
+    now = datetime.now(timezone.utc)
+    result = await db.users.update_one(
+        {
+            "_id": user_key(user_id),
+            "$or": [
+                {COUNTERS_FLAG: {"$exists": False}},
+                {COUNTERS_FLAG: False},
+                {COUNTERS_FLAG: COUNTERS_BUILDING, COUNTERS_CLAIMED_AT: {"$lt": now - timedelta(seconds=PROGRESS_REBUILD_TIMEOUT)}},
+            ],
+        },
+        {"$set": {COUNTERS_FLAG: COUNTERS_BUILDING, COUNTERS_CLAIMED_AT: now}}
+    )
+    return result.modified_count == 1
+
+async def ensure_progress_counters(db: Any, user_id: str) -> None:
+    """Build the user's counters unless they are built; waits if another request is building them."""
+    while True:
+        if await claim_counter_rebuild(db, user_id):
+            await rebuild_progress_counters(db, user_id)
+            return
+        user = await db.users.find_one({"_id": user_key(user_id)}, {COUNTERS_FLAG: 1})
+        if user is None or user.get(COUNTERS_FLAG) is True:
+            return
+        await asyncio.sleep(PROGRESS_REBUILD_POLL)
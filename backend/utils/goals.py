@@ -0,0 +1,122 @@
+"""
+Goal and milestone storage.
+
+Goals live in the ``goals`` collection and milestones in ``milestones``, one
+document each, keyed by ``(user_id, id)`` and ``(user_id, goal_id, id)``.
+Editing one milestone is a single-document update instead of a rewrite of the
+user's embedded ``goals`` array, and listing goals never loads the rest of the
+user document.
+
+Accounts created before the split still have their goals (with milestones
+nested inside) embedded in the user document. ``ensure_goals_migrated`` moves
+them into the collections the first time the user touches their goals; the
+copy is an idempotent upsert, so an interrupted migration simply runs again.
+The progress counters (see ``utils.goal_progress``) are built right after.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from utils.goal_progress import COUNTERS_FLAG, ensure_progress_counters
+from utils.user_export import user_key
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+GOAL_PROJECTION = {"_id": 0, "user_id": 0}  # Includes the goal's milestone counters
+MILESTONE_PROJECTION = {"_id": 0, "user_id": 0, "goal_id": 0}
+MIGRATED_FLAG = "goals_migrated"
+
+def split_goal(user_id: str, goal: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Turn an embedded goal into a goal document and its milestone documents."""
+    goal = dict(goal)
+    goal_id = goal.get("id") or str(ObjectId())
+    milestones = goal.pop("milestones", None) or []
+    goal.update(id=goal_id, user_id=user_id)
+    milestone_docs = [
+        {**milestone, "id": milestone.get("id") or str(ObjectId()), "user_id": user_id, "goal_id": goal_id}
+        for milestone in milestones
+        if isinstance(milestone, dict)
+    ]
+    return goal, milestone_docs
+
+async def migrate_embedded_goals(db: Any, user_id: str) -> int:
+    """Move the user's embedded goals into the collections; returns how many were found."""
+    user = await db.users.find_one({"_id": user_key(user_id)}, {"goals": 1})
+    embedded = [goal for goal in (user or {}).get("goals") or [] if isinstance(goal, dict)]
+
+    goal_ops, milestone_ops = [], []
+    for goal in embedded:
+        goal_doc, milestone_docs = split_goal(user_id, goal)
+        goal_ops.append(UpdateOne({"user_id": user_id, "id": goal_doc["id"]}, {"$setOnInsert": goal_doc}, upsert=True))
+        milestone_ops.extend(
+            UpdateOne(
+                {"user_id": user_id, "goal_id": doc["goal_id"], "id": doc["id"]},
+                {"$setOnInsert": doc},
+                upsert=True
+            )
+            for doc in milestone_docs
+        )
+    if goal_ops:
+        await db.goals.bulk_write(goal_ops, ordered=False)
+    if milestone_ops:
+        await db.milestones.bulk_write(milestone_ops, ordered=False)
+
+    await db.users.update_one(
+        {"_id": user_key(user_id)},
+        {"$set": {MIGRATED_FLAG: True}, "$unset": {"goals": ""}}
+    )
+    if embedded:
+        logger.info(f"Migrated {len(embedded)} embedded goals ({len(milestone_ops)} milestones) for user {user_id}")
+    return len(embedded)
+
+def _user_flag(current_user: Any, flag: str) -> bool:
+    if isinstance(current_user, dict):
+        return current_user.get(flag, False)
+    return getattr(current_user, flag, False)
+
+async def ensure_goals_migrated(db: Any, current_user: Any, user_id: str) -> None:
+    """Migrate the user's embedded goals and build their progress counters, unless already done."""
+    if not _user_flag(current_user, MIGRATED_FLAG):
+        await migrate_embedded_goals(db, user_id)
+    if _user_flag(current_user, COUNTERS_FLAG) is not True:
+        await ensure_progress_counters(db, user_id)
+
+async def attach_milestones(db: Any, user_id: str, goals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in each goal's ``milestones`` with one query for all of them."""
+    if not goals:
+        return goals
+    by_goal: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    cursor = db.milestones.find(
+        {"user_id": user_id, "goal_id": {"$in": [goal["id"] for goal in goals]}},
+        {"_id": 0, "user_id": 0}
+    )
+    async for milestone in cursor:
+        by_goal[milestone.pop("goal_id")].append(milestone)
+    for goal in goals:
+        goal["milestones"] = sorted(by_goal.get(goal["id"], []), key=milestone_sort_key)
+    return goals
+
+def milestone_sort_key(milestone: Dict[str, Any]) -> Tuple[bool, str]:
+    """Open milestones first, then by target date."""
+    return milestone.get("completed", False), milestone.get("target_date", "")
+
+def goal_sort_key(goal: Dict[str, Any]) -> Tuple[bool, int, str]:
+    """Open goals first, then highest priority, then by target date."""
+    return goal.get("completed", False), -goal.get("priority", 0), goal.get("target_date", "")
+
+async def find_goals(db: Any, user_id: str, query: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """The user's goals matching ``query``, sorted, with their milestones."""
+    goals = await db.goals.find({**(query or {}), "user_id": user_id}, GOAL_PROJECTION).to_list(length=None)
+    goals.sort(key=goal_sort_key)
+    return await attach_milestones(db, user_id, goals)
+
+async def delete_goal_documents(db: Any, user_id: str, goal_id: str) -> Optional[Dict[str, Any]]:
+    """Delete a goal and its milestones; returns the deleted goal, or None if there was none."""
+    goal = await db.goals.find_one_and_delete({"user_id": user_id, "id": goal_id}, projection=GOAL_PROJECTION)
+    if goal is not None:
+        await db.milestones.delete_many({"user_id": user_id, "goal_id": goal_id})
+    return goal
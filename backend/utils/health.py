@@ -0,0 +1,118 @@
+"""
+Cached dependency health for liveness and readiness probes.
+
+Probes are hit constantly by Docker and the load balancer, so they never talk
+to MongoDB or Redis themselves. A background task refreshes the dependency
+status every ``HEALTH_REFRESH_INTERVAL`` seconds (read-only pings with a
+timeout) and the probe endpoints only read the cached result.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import database
+from utils.cache import get_redis_connection
+from utils.monitoring import get_loop_lag_summary
+from utils.prometheus import time_redis
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+HEALTH_REFRESH_INTERVAL = float(os.getenv("HEALTH_REFRESH_INTERVAL", "10"))  # seconds
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))  # seconds per dependency ping
+HEALTH_STALE_AFTER = HEALTH_REFRESH_INTERVAL * 3  # Cached status older than this is not trusted
+
+class DependencyHealth:
+    """Holds the last known dependency status and refreshes it in the background."""
+
+    def __init__(self, interval: float = HEALTH_REFRESH_INTERVAL, timeout: float = HEALTH_CHECK_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self._status: Dict[str, Any] = {
+            "database": "unknown",
+            "redis": "unknown",
+            "checked_at": None,
+        }
+        self._checked_monotonic: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _ping_database(self) -> str:
+        try:
+            # Read-only ping; probes never write to the database
+            await asyncio.wait_for(database.db.command("ping"), timeout=self.timeout)
+            return "ok"
+        except asyncio.TimeoutError:
+            return "error: timeout"
+        except Exception as e:
+            return f"error: {str(e)}"
+
+    async def _ping_redis(self) -> str:
+        redis = get_redis_connection()
+        if not redis:
+            return "unavailable"
+        try:
+            with time_redis("ping"):
+                await asyncio.wait_for(redis.ping(), timeout=self.timeout)
+            return "ok"
+        except asyncio.TimeoutError:
+            return "error: timeout"
+        except Exception as e:
+            return f"error: {str(e)}"
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Ping every dependency concurrently and cache the result."""
+        db_status, redis_status = await asyncio.gather(self._ping_database(), self._ping_redis())
+        self._status = {
+            "database": db_status,
+            "redis": redis_status,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._checked_monotonic = time.monotonic()
+        return self._status
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the cached status plus pool stats and loop lag (no I/O)."""
+        lag = get_loop_lag_summary()
+        return dict(
+            self._status,
+            ready=self.is_ready(),
+            database_pool=database.pool_stats.snapshot(),
+            event_loop_lag={"p99": lag["p99"], "max": lag["max"]},
+        )
+
+    def is_ready(self) -> bool:
+        """Ready when the last refresh is recent and MongoDB answered."""
+        if self._checked_monotonic is None:
+            return False
+        if time.monotonic() - self._checked_monotonic > max(HEALTH_STALE_AFTER, self.interval * 3):
+            return False
+        return self._status["database"] == "ok"
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing dependency health: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start the periodic refresh task on the running loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the refresh task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+dependency_health = DependencyHealth()
@@ -0,0 +1,255 @@
+"""
+Durable background jobs.
+
+Long-running per-user work (data exports, account deletion) runs outside the
+request as a job. Each job is a document in the ``jobs`` collection holding its
+kind, parameters, status, progress and a handler-defined checkpoint, so:
+
+    - clients poll the job document for progress instead of holding a request open
+    - a worker claims a job with a lease that is renewed while it runs; if the
+      process dies the lease lapses and ``JobRunner.resume`` picks the job up
+      again from its last checkpoint. It runs at startup and then every
+      ``JOB_SWEEP_SECONDS`` (``JobRunner.start``), so a job left behind by a
+      crashed worker is taken over by any live one once its lease expires
+    - finished jobs get an ``expires_at`` and are removed by a TTL index
+
+Handlers are registered per kind with ``@job_handler("kind")`` and receive a
+``JobContext``; they must be safe to re-run from their last checkpoint.
+"""
+import os
+import socket
+import asyncio
+import logging
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from pymongo import ReturnDocument
+
+import database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))  # finished jobs are kept this long
+JOB_SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS", str(JOB_LEASE_SECONDS)))  # how often expired leases are reclaimed
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+JobHandler = Callable[["JobContext"], Awaitable[Optional[Dict[str, Any]]]]
+_handlers: Dict[str, JobHandler] = {}
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register ``func`` as the handler for jobs of ``kind``."""
+    def register(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return register
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job document."""
+    return {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job.get("progress", {}),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at"),
+    }
+
+class JobContext:
+    """Handed to a job handler: its parameters, checkpoint and progress reporting."""
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job_id: str = job["_id"]
+        self.user_id: Optional[str] = job.get("user_id")
+        self.params: Dict[str, Any] = job.get("params", {})
+        self.state: Dict[str, Any] = dict(job.get("state", {}))
+        self.progress: Dict[str, Any] = dict(job.get("progress", {}))
+
+    async def report(self, state: Optional[Dict[str, Any]] = None, **progress: Any) -> None:
+        """Persist progress and, if given, the checkpoint the job resumes from."""
+        self.progress.update(progress)
+        fields: Dict[str, Any] = {"progress": self.progress, "updated_at": datetime.now(timezone.utc)}
+        if state is not None:
+            self.state = state
+            fields["state"] = state
+        await database.db.jobs.update_one({"_id": self.job_id, "owner": WORKER_ID}, {"$set": fields})
+
+class JobRunner:
+    """Starts, leases and resumes jobs in this process."""
+
+    def __init__(self, lease_seconds: float = JOB_LEASE_SECONDS, retention_hours: float = JOB_RETENTION_HOURS,
+                 sweep_seconds: float = JOB_SWEEP_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.retention_hours = retention_hours
+        self.sweep_seconds = sweep_seconds
+        self._tasks: Set[asyncio.Task] = set()
+        self._running: Set[str] = set()  # job IDs with a task in this process
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def submit(self, kind: str, user_id: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                     progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Create a job and start running it in the background."""
+        if kind not in _handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        now = datetime.now(timezone.utc)
+        job = {
+            "_id": uuid4().hex,
+            "kind": kind,
+            "user_id": user_id,
+            "params": params or {},
+            "status": PENDING,
+            "progress": progress or {},
+            "state": {},
+            "created_at": now,
+            "updated_at": now,
+        }
+        await database.db.jobs.insert_one(job)
+        self._spawn(job["_id"])
+        return job
+
+    async def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        query: Dict[str, Any] = {"_id": job_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return await database.db.jobs.find_one(query)
+
+    async def find_active(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the user's unfinished job of ``kind``, if any."""
+        return await database.db.jobs.find_one({"kind": kind, "user_id": user_id, "status": {"$in": [PENDING, RUNNING]}})
+
+    def _spawn(self, job_id: str) -> bool:
+        if job_id in self._running:
+            return False
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks.add(task)
+        self._running.add(job_id)
+
+        def done(task: asyncio.Task) -> None:
+            self._tasks.discard(task)
+            self._running.discard(job_id)
+        task.add_done_callback(done)
+        return True
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await database.db.jobs.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$in": [PENDING, RUNNING]},
+                "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}],
+            },
+            {"$set": {
+                "status": RUNNING,
+                "owner": WORKER_ID,
+                "lease_until": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now,
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await database.db.jobs.update_one(
+                    {"_id": job_id, "owner": WORKER_ID},
+                    {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                logger.warning(f"Could not renew lease for job {job_id}: {str(e)}")
+
+    async def _finish(self, job_id: str, fields: Dict[str, Any]) -> None:
+        now = datetime.now(timezone.utc)
+        fields.update(updated_at=now, expires_at=now + timedelta(hours=self.retention_hours))
+        await database.db.jobs.update_one(
+            {"_id": job_id, "owner": WORKER_ID},
+            {"$set": fields, "$unset": {"lease_until": "", "state": ""}}
+        )
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._claim(job_id)
+        if job is None:
+            # Finished, or another worker holds the lease
+            return
+        handler = _handlers.get(job["kind"])
+        if handler is None:
+            logger.error(f"No handler for job {job_id} of kind '{job['kind']}'")
+            return
+
+        lease = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            context = JobContext(job)
+            result = await handler(context)
+            await self._finish(job_id, {"status": COMPLETED, "result": result, "progress": context.progress})
+            logger.info(f"Job {job_id} ({job['kind']}) completed")
+        except asyncio.CancelledError:
+            # Shutting down: release the lease so the job resumes on the next start
+            await database.db.jobs.update_one(
+                {"_id": job_id, "owner": WORKER_ID},
+                {"$set": {"lease_until": datetime.now(timezone.utc)}}
+            )
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {str(e)}")
+            await self._finish(job_id, {"status": FAILED, "error": str(e)})
+        finally:
+            lease.cancel()
+
+    async def resume(self) -> int:
+        """Start every unfinished job whose lease has lapsed; returns how many were started."""
+        now = datetime.now(timezone.utc)
+        cursor = database.db.jobs.find(
+            {
+                "status": {"$in": [PENDING, RUNNING]},
+                "kind": {"$in": list(_handlers)},
+                "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}],
+            },
+            {"_id": 1}
+        )
+        count = 0
+        async for job in cursor:
+            if self._spawn(job["_id"]):
+                count += 1
+        if count:
+            logger.info(f"Resuming {count} unfinished jobs")
+        return count
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.resume()
+            except Exception as e:
+                logger.error(f"Error reclaiming expired job leases: {str(e)}")
+
+    def start(self) -> None:
+        """Periodically take over jobs whose worker died (their lease expired)."""
+        if self.sweep_seconds > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def shutdown(self) -> None:
+        """Stop the sweep and cancel running jobs; their leases are released for the next start."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+jobs = JobRunner()
@@ -0,0 +1,229 @@
+"""
+Non-blocking, structured logging setup.
+
+Every module keeps using ``logging.getLogger(__name__)``. ``configure_logging``
+swaps the root handlers for a single ``QueueHandler``: the calling thread only
+formats the message and enqueues the record, and a ``QueueListener`` thread
+does redaction, formatting and the actual stream I/O off the event loop.
+
+On top of that:
+    - ``request_id`` is attached to every record from the request context
+      (set by utils.middleware.RequestContextMiddleware)
+    - high-frequency INFO/DEBUG messages can be sampled per logger, e.g.
+      ``LOG_SAMPLE_RATES="utils.rate_limiter=0.01,routers.notes=0.1"``;
+      warnings and errors are never sampled
+    - JWTs, bearer tokens, passwords and cookie secrets are masked before output
+    - ``LOG_FORMAT=json`` emits one JSON object per line
+    - ``LOG_LEAN_RECORDS=true`` stops the logging module from collecting the
+      caller's file/line and thread/process names for every record. This is
+      process-wide (it affects every handler, including pytest's), so it is
+      off by default
+"""
+import os
+import re
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+# Configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")  # logger=rate pairs, rate in (0, 1]
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_LEAN_RECORDS = os.getenv("LOG_LEAN_RECORDS", "false").lower() == "true"
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s"
+REDACTED = "[REDACTED]"
+
+# Patterns for secrets that must never reach the log output
+REDACTION_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    # JWTs (header.payload.signature, base64url)
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+"), REDACTED),
+    # Authorization header values
+    (re.compile(r"(?i)\b(bearer|basic)\s+[\w\-.~+/=]+"), r"\1 " + REDACTED),
+    # key=value and "key": "value" pairs for sensitive keys
+    (re.compile(
+        r"(?i)([\"']?\b(?:password|passwd|secret|token|refresh_token|access_token|api_key|csrftoken|authorization|cookie)[\"']?\s*[:=]\s*)"
+        r"(\"[^\"]*\"|'[^']*'|[^\s,;}&]+)"
+    ), r"\1" + REDACTED),
+]
+
+_request_id: ContextVar[Optional[str]] = ContextVar("log_request_id", default=None)
+_listener: Optional["DrainingQueueListener"] = None
+_queue_handler: Optional[logging.Handler] = None
+
+def set_request_id(request_id: str) -> Token:
+    """Attach ``request_id`` to log records emitted in the current context."""
+    return _request_id.set(request_id)
+
+def reset_request_id(token: Token) -> None:
+    _request_id.reset(token)
+
+def redact(message: str) -> str:
+    """Mask secrets in a formatted log message."""
+    for pattern, replacement in REDACTION_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse ``"logger=rate,other=rate"`` into a dict, ignoring malformed entries."""
+    rates: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        try:
+            value = float(rate)
+        except ValueError:
+            continue
+        if name.strip() and 0 < value <= 1:
+            rates[name.strip()] = value
+    return rates
+
+class RequestContextFilter(logging.Filter):
+    """Stamp the current request ID on each record (runs in the emitting thread)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get() or "-"
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep 1 in N records below WARNING for the configured loggers.
+
+    A logger inherits the rate of its closest configured ancestor. Sampling is
+    deterministic (every Nth record per logger) so bursts are thinned evenly.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._every: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+
+    def _keep_every(self, name: str) -> int:
+        every = self._every.get(name)
+        if every is None:
+            every = 1
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    every = max(1, round(1 / self.rates[candidate]))
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._every[name] = every
+        return every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        every = self._keep_every(record.name)
+        if every == 1:
+            return True
+        count = self._counters.get(record.name, 0)
+        self._counters[record.name] = count + 1
+        return count % every == 0
+
+class RedactingFormatter(logging.Formatter):
+    """Plain-text formatter that masks secrets."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return redact(super().format(record))
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with redacted message and request ID."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage()),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = redact(record.exc_text)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of raising."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    log_format: str = LOG_FORMAT,
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream=None,
+    lean_records: bool = LOG_LEAN_RECORDS,
+) -> DrainingQueueListener:
+    """
+    Route all logging through a queue drained by a background thread.
+
+    Replaces the plain stream handlers installed by ``logging.basicConfig``;
+    handlers added by other tools (e.g. pytest's capture) are left alone.
+    Safe to call more than once.
+
+    ``lean_records`` opts in to the process-wide LogRecord optimisations
+    described in the module docstring.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    if lean_records:
+        # Skip record fields our formats never print (documented logging optimisations);
+        # the caller-frame lookup and process/thread names are a large share of LogRecord cost.
+        # These are global to the logging module, hence opt-in
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if type(handler) is logging.StreamHandler:
+            root.removeHandler(handler)
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if log_format == "json" else RedactingFormatter(TEXT_FORMAT))
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES) if sample_rates is None else sample_rates))
+    _queue_handler.addFilter(RequestContextFilter())
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = DrainingQueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+atexit.register(stop_logging)
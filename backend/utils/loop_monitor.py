@@ -0,0 +1,118 @@
+"""
+Event loop lag monitor and blocking-call detector.
+
+A heartbeat task sleeps for a fixed interval and measures how late it wakes
+up; that delay is the scheduling lag every other coroutine on the loop is
+paying. A watchdog thread watches the heartbeat and, when the loop has been
+stuck longer than the blocking threshold, samples the loop thread's stack so
+the offending synchronous call (bcrypt, BeautifulSoup, sync Redis, ...) shows
+up in the metrics instead of only as a latency spike.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))  # seconds between heartbeats
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))  # seconds stuck before sampling a stack
+MAX_BLOCKING_SAMPLES = 20
+MAX_STACK_FRAMES = 15
+
+class LoopLagMonitor:
+    """Measure event loop lag and capture stacks of callbacks that block it."""
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL,
+        block_threshold: float = LOOP_BLOCK_THRESHOLD,
+        on_lag: Optional[Callable[[float], None]] = None,
+        on_block: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.on_lag = on_lag
+        self.on_block = on_block
+        self.max_lag = 0.0
+        self.blocking_samples: Deque[Dict[str, Any]] = deque(maxlen=MAX_BLOCKING_SAMPLES)
+        self._heartbeat = time.perf_counter()
+        self._sampled_heartbeat: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def start(self) -> None:
+        """Start the heartbeat task and watchdog thread on the running loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        # Let the heartbeat begin its first sleep so an immediate stall is measured
+        await asyncio.sleep(0)
+
+    async def stop(self) -> None:
+        """Stop monitoring."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if self.on_lag is not None:
+                self.on_lag(lag)
+
+    def _watch(self) -> None:
+        check_every = max(self.block_threshold / 4, 0.001)
+        while not self._stop.wait(check_every):
+            heartbeat = self._heartbeat
+            stalled_for = time.perf_counter() - heartbeat - self.interval
+            if stalled_for < self.block_threshold or self._sampled_heartbeat == heartbeat:
+                continue
+            # One sample per stall: the heartbeat has not moved since we last sampled
+            self._sampled_heartbeat = heartbeat
+            sample = self._sample_stack(stalled_for)
+            if sample is not None:
+                self.blocking_samples.append(sample)
+                if self.on_block is not None:
+                    self.on_block(sample)
+
+    def _sample_stack(self, stalled_for: float) -> Optional[Dict[str, Any]]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        stack = traceback.format_stack(frame, limit=MAX_STACK_FRAMES)
+        return {
+            "blocked_for": stalled_for,
+            "timestamp": datetime.now().isoformat(),
+            "stack": [line.strip() for line in stack],
+        }
@@ -1,12 +1,16 @@
 import os
+import math
 import time
 import logging
 import asyncio
+from collections import deque
 from datetime import datetime
 from fastapi import Request, Response
 from typing import Dict, Any, Optional, List, Callable
 import json
-from contextlib import asynccontextmanager
+
+from utils.prometheus import observe_request, mark_process_dead
+from utils.query_tracker import RequestQueryStats
 
 # Configure logging
 logger = logging.getLogger("monitoring")
@@ -34,7 +38,8 @@ metrics = {
         "viewed": 0,
     },
     "performance": {
-        "response_times": [],
+        "latency": None,
+        "latency_by_route": {},
         "slow_requests": [],
     },
     "errors": {
@@ -50,29 +55,225 @@ metrics = {
         "created": 0,
         "terminated": 0,
         "expired": 0,
+    },
+    "database": {
+        "by_route": {},
+        "slow_queries": [],
+    },
+    "event_loop": {
+        "lag": None,
+        "blocked": 0,
+        "blocking_samples": deque(maxlen=20),
     }
 }
 
 # Configuration
 SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", "0.5"))  # seconds
-MAX_RESPONSE_TIMES = 1000  # Limit the size of response_times list
 MAX_SLOW_REQUESTS = 100    # Limit the size of slow_requests list
+MAX_SLOW_QUERIES = 100     # Limit the size of database slow_queries list
+LATENCY_WINDOW_SECONDS = float(os.getenv("LATENCY_WINDOW_SECONDS", "300"))  # Histogram rotation interval
+UNMATCHED_ROUTE = "unmatched"  # Label for requests that did not match any route
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0"))  # seconds between batch applies
+MAX_PENDING_EVENTS = int(os.getenv("MAX_PENDING_EVENTS", "100000"))  # Oldest events dropped beyond this
 
 # Alerts configuration (webhook URLs or other notification channels)
 ALERT_WEBHOOKS = os.getenv("ALERT_WEBHOOKS", "").split(",")
 ALERT_ENABLED = os.getenv("ALERT_ENABLED", "False").lower() == "true"
 
+
+class LatencyHistogram:
+    """
+    Fixed-memory latency histogram with logarithmic buckets (HDR-style).
+
+    Bucket boundaries grow geometrically from ``min_value`` to ``max_value``,
+    so every recorded value is accurate to within ``precision`` (relative).
+    Recording is O(1); percentiles are computed by walking the buckets.
+    """
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 60.0, precision: float = 0.05):
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_growth = math.log1p(precision)
+        # Bucket 0 holds values below min_value, the last bucket values above max_value
+        self._bucket_count = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 2
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all recorded values."""
+        self.counts = [0] * self._bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _bucket_index(self, value: float) -> int:
+        if value < self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self._log_growth) + 1
+        return min(index, self._bucket_count - 1)
+
+    def _bucket_upper_bound(self, index: int) -> float:
+        if index == 0:
+            return self.min_value
+        return self.min_value * math.exp(index * self._log_growth)
+
+    def record(self, value: float) -> None:
+        """Record a single observation (in seconds)."""
+        self.counts[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add the observations of another histogram with the same layout."""
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> float:
+        """Return the value at the given percentile (0-100)."""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                if index == self._bucket_count - 1:
+                    return self.max
+                # Never report more than the largest value actually observed
+                return min(self._bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """Return count, mean, p50, p90, p99 and max."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+class WindowedLatencyHistogram:
+    """
+    Latency histogram over a rolling time window.
+
+    Two fixed-size histograms are kept: the current window and the one before
+    it. When the window elapses the current one becomes the previous one, so
+    summaries always cover between one and two windows of data.
+    """
+
+    def __init__(self, window_seconds: float = LATENCY_WINDOW_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._current = LatencyHistogram()
+        self._previous = LatencyHistogram()
+        self._window_start = clock()
+
+    def _maybe_rotate(self) -> None:
+        now = self._clock()
+        elapsed = now - self._window_start
+        if elapsed < self.window_seconds:
+            return
+        if elapsed >= 2 * self.window_seconds:
+            # Nothing recent enough to keep
+            self._previous.reset()
+        else:
+            self._previous, self._current = self._current, self._previous
+        self._current.reset()
+        self._window_start = now
+
+    def record(self, value: float) -> None:
+        """Record a single observation (in seconds)."""
+        self._maybe_rotate()
+        self._current.record(value)
+
+    def snapshot(self) -> LatencyHistogram:
+        """Return a merged copy of the current and previous windows."""
+        self._maybe_rotate()
+        merged = LatencyHistogram()
+        merged.merge(self._previous)
+        merged.merge(self._current)
+        return merged
+
+    def summary(self) -> Dict[str, Any]:
+        """Return percentile summary for the rolling window."""
+        return self.snapshot().summary()
+
+def get_route_template(request: Request) -> str:
+    """
+    Return the path template of the route that handled the request.
+
+    Uses the matched route (e.g. ``/api/notes/{note_id}``) rather than the raw
+    URL so that metric keys stay bounded regardless of IDs in the path.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+def record_latency(route: str, duration: float) -> None:
+    """Record a request duration in the overall and per-route histograms."""
+    performance = metrics["performance"]
+    if performance["latency"] is None:
+        performance["latency"] = WindowedLatencyHistogram()
+    performance["latency"].record(duration)
+
+    route_histogram = performance["latency_by_route"].get(route)
+    if route_histogram is None:
+        route_histogram = performance["latency_by_route"][route] = WindowedLatencyHistogram()
+    route_histogram.record(duration)
+
 async def log_request_metrics(request: Request, response: Response, duration: float) -> None:
     """Log metrics for a request"""
-    path = request.url.path
-    method = request.method
-    status = response.status_code
-
+    record_request_metrics(
+        method=request.method,
+        route=get_route_template(request),
+        path=request.url.path,
+        status=response.status_code,
+        duration=duration,
+        client_ip=request.client.host if request.client else "unknown",
+        user_agent=request.headers.get("User-Agent", "unknown"),
+    )
+
+def record_request_metrics(
+    method: str,
+    route: str,
+    path: str,
+    status: int,
+    duration: float,
+    client_ip: str = "unknown",
+    user_agent: str = "unknown",
+    db_stats: Optional[RequestQueryStats] = None
+) -> None:
+    """
+    Queue metrics for a finished request.
+
+    This is a constant-time append; the event is applied to ``metrics`` by the
+    aggregator's next batch (or on the next ``get_metrics()`` call).
+    """
+    aggregator.record((method, route, path, status, duration, client_ip, user_agent, time.time(), db_stats))
+
+def _apply_request_event(
+    method: str,
+    route: str,
+    path: str,
+    status: int,
+    duration: float,
+    client_ip: str,
+    user_agent: str,
+    recorded_at: float,
+    db_stats: Optional[RequestQueryStats] = None
+) -> None:
+    """Apply a single queued request event to the in-memory metrics."""
     # Update total request count
     metrics["requests"]["total"] += 1
 
-    # Update by path
-    metrics["requests"]["by_path"][path] = metrics["requests"]["by_path"].get(path, 0) + 1
+    # Update by route template (raw paths would create a key per ID)
+    metrics["requests"]["by_path"][route] = metrics["requests"]["by_path"].get(route, 0) + 1
 
     # Update by method
     metrics["requests"]["by_method"][method] = metrics["requests"]["by_method"].get(method, 0) + 1
@@ -81,21 +282,21 @@ async def log_request_metrics(request: Request, response: Response, duration: fl
     status_str = str(status)
     metrics["requests"]["by_status"][status_str] = metrics["requests"]["by_status"].get(status_str, 0) + 1
 
-    # Track performance
-    metrics["performance"]["response_times"].append(duration)
-    if len(metrics["performance"]["response_times"]) > MAX_RESPONSE_TIMES:
-        metrics["performance"]["response_times"].pop(0)
+    # Track latency distribution per route template
+    record_latency(route, duration)
+    observe_request(method, route, status, duration)
 
     # Track slow requests
     if duration > SLOW_REQUEST_THRESHOLD:
         slow_request = {
             "path": path,
+            "route": route,
             "method": method,
             "duration": duration,
             "status": status,
-            "timestamp": datetime.now().isoformat(),
-            "client_ip": request.client.host if request.client else "unknown",
-            "user_agent": request.headers.get("User-Agent", "unknown"),
+            "timestamp": datetime.fromtimestamp(recorded_at).isoformat(),
+            "client_ip": client_ip,
+            "user_agent": user_agent,
         }
         metrics["performance"]["slow_requests"].append(slow_request)
         if len(metrics["performance"]["slow_requests"]) > MAX_SLOW_REQUESTS:
@@ -104,6 +305,131 @@ async def log_request_metrics(request: Request, response: Response, duration: fl
         # Log slow request
         logger.warning(f"Slow request: {path} - {duration:.2f}s - {status} - {method}")
 
+    if db_stats is not None:
+        _apply_db_stats(route, db_stats)
+
+def _apply_db_stats(route: str, db_stats: RequestQueryStats) -> None:
+    """Fold one request's Mongo usage into the per-route database metrics."""
+    route_stats = metrics["database"]["by_route"].get(route)
+    if route_stats is None:
+        route_stats = metrics["database"]["by_route"][route] = {
+            "requests": 0,
+            "queries": 0,
+            "db_time": 0.0,
+            "docs_returned": 0,
+            "reply_bytes": 0,
+            "n_plus_one_requests": 0,
+            "n_plus_one_patterns": {},
+        }
+    route_stats["requests"] += 1
+    route_stats["queries"] += db_stats.commands
+    route_stats["db_time"] += db_stats.db_time
+    route_stats["docs_returned"] += db_stats.docs_returned
+    route_stats["reply_bytes"] += db_stats.reply_bytes
+
+    patterns = db_stats.n_plus_one()
+    if patterns:
+        route_stats["n_plus_one_requests"] += 1
+        for pattern in patterns:
+            key = f"{pattern['command']}:{pattern['collection']}({','.join(pattern['filter_keys'])})"
+            route_stats["n_plus_one_patterns"][key] = max(route_stats["n_plus_one_patterns"].get(key, 0), pattern["count"])
+        logger.warning(f"Possible N+1 queries on {route}: {patterns}")
+
+    slow_queries = metrics["database"]["slow_queries"]
+    for sample in db_stats.slow_queries:
+        slow_queries.append(dict(sample, route=route))
+    if len(slow_queries) > MAX_SLOW_QUERIES:
+        del slow_queries[:len(slow_queries) - MAX_SLOW_QUERIES]
+
+class MetricsAggregator:
+    """
+    Batches request events before applying them to ``metrics``.
+
+    Producers only append to a ``deque`` (atomic in CPython, so no lock is
+    needed even from threads). A background task drains the queue every
+    ``METRICS_FLUSH_INTERVAL`` seconds and applies the events in one batch,
+    instead of scheduling a task per request. The queue is bounded; if the
+    flusher falls behind, the oldest events are dropped.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_EVENTS):
+        self._events = deque(maxlen=max_pending)
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, event: tuple) -> None:
+        """Queue a request event (O(1))."""
+        self._events.append(event)
+
+    def pending(self) -> int:
+        """Number of events waiting to be applied."""
+        return len(self._events)
+
+    def clear(self) -> None:
+        """Drop all pending events."""
+        self._events.clear()
+
+    def flush(self) -> int:
+        """Apply all pending events and return how many were applied."""
+        events = self._events
+        applied = 0
+        while True:
+            try:
+                event = events.popleft()
+            except IndexError:
+                break
+            _apply_request_event(*event)
+            applied += 1
+        return applied
+
+    async def _run(self, interval: float) -> None:
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Error applying metrics batch: {str(e)}")
+        except asyncio.CancelledError:
+            pass
+
+    def start(self, interval: float = METRICS_FLUSH_INTERVAL) -> None:
+        """Start the periodic flush task on the running loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stop the flush task and apply whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+aggregator = MetricsAggregator()
+
+def record_loop_lag(lag: float) -> None:
+    """Record one event loop scheduling lag measurement (seconds)."""
+    event_loop = metrics["event_loop"]
+    if event_loop["lag"] is None:
+        event_loop["lag"] = WindowedLatencyHistogram()
+    event_loop["lag"].record(lag)
+
+def get_loop_lag_summary() -> Dict[str, Any]:
+    """Return the percentile summary of recent event loop lag."""
+    loop_lag = metrics["event_loop"]["lag"]
+    return loop_lag.summary() if loop_lag else LatencyHistogram().summary()
+
+def record_loop_block(sample: Dict[str, Any]) -> None:
+    """Record a stack sample of a callback that blocked the event loop."""
+    event_loop = metrics["event_loop"]
+    event_loop["blocked"] += 1
+    # deque.append is atomic, so the watchdog thread can call this directly
+    event_loop["blocking_samples"].append(sample)
+    logger.warning(f"Event loop blocked for {sample['blocked_for']:.3f}s at: {sample['stack'][-1] if sample['stack'] else 'unknown'}")
+
 async def log_auth_metrics(event_type: str) -> None:
     """Log authentication-related metrics"""
     if event_type in metrics["auth"]:
@@ -178,10 +504,24 @@ async def send_alert(title: str, data: Dict[str, Any]) -> None:
 
 def get_metrics() -> Dict[str, Any]:
     """Get current metrics"""
+    # Apply queued request events so the snapshot is current
+    aggregator.flush()
+
     # Calculate some derived metrics
-    avg_response_time = 0
-    if metrics["performance"]["response_times"]:
-        avg_response_time = sum(metrics["performance"]["response_times"]) / len(metrics["performance"]["response_times"])
+    latency = metrics["performance"]["latency"]
+    latency_summary = latency.summary() if latency else LatencyHistogram().summary()
+    latency_by_route = {
+        route: histogram.summary()
+        for route, histogram in metrics["performance"]["latency_by_route"].items()
+    }
+    database_by_route = {
+        route: dict(
+            stats,
+            avg_queries=stats["queries"] / stats["requests"],
+            avg_db_time=stats["db_time"] / stats["requests"],
+        )
+        for route, stats in metrics["database"]["by_route"].items()
+    }
 
     # Clean up the metrics before returning
     result = {
@@ -194,7 +534,9 @@ def get_metrics() -> Dict[str, Any]:
         "auth": metrics["auth"],
         "resources": metrics["resources"],
         "performance": {
-            "avg_response_time": avg_response_time,
+            "avg_response_time": latency_summary["mean"],
+            "latency": latency_summary,
+            "latency_by_route": dict(sorted(latency_by_route.items(), key=lambda x: x[1]["p99"], reverse=True)),
             "slow_requests_count": len(metrics["performance"]["slow_requests"]),
             "recent_slow_requests": metrics["performance"]["slow_requests"][-5:] if metrics["performance"]["slow_requests"] else [],
         },
@@ -208,6 +550,15 @@ def get_metrics() -> Dict[str, Any]:
             "by_endpoint": dict(sorted(metrics["rate_limits"]["by_endpoint"].items(), key=lambda x: x[1], reverse=True)[:10]),
         },
         "sessions": metrics["sessions"],
+        "event_loop": {
+            "lag": get_loop_lag_summary(),
+            "blocked_count": metrics["event_loop"]["blocked"],
+            "recent_blocking_samples": list(metrics["event_loop"]["blocking_samples"])[-5:],
+        },
+        "database": {
+            "by_route": dict(sorted(database_by_route.items(), key=lambda x: x[1]["db_time"], reverse=True)),
+            "slow_queries": metrics["database"]["slow_queries"][-10:],
+        },
         "timestamp": datetime.now().isoformat(),
     }
 
@@ -216,6 +567,7 @@ def get_metrics() -> Dict[str, Any]:
 def reset_metrics() -> None:
     """Reset metrics (for testing or rotating metrics)"""
     global metrics
+    aggregator.clear()
     metrics = {
         "requests": {
             "total": 0,
@@ -237,7 +589,8 @@ def reset_metrics() -> None:
             "viewed": 0,
         },
         "performance": {
-            "response_times": [],
+            "latency": None,
+            "latency_by_route": {},
             "slow_requests": [],
         },
         "errors": {
@@ -253,28 +606,28 @@ def reset_metrics() -> None:
             "created": 0,
             "terminated": 0,
             "expired": 0,
+        },
+        "database": {
+            "by_route": {},
+            "slow_queries": [],
+        },
+        "event_loop": {
+            "lag": None,
+            "blocked": 0,
+            "blocking_samples": deque(maxlen=20),
         }
     }
 
-@asynccontextmanager
-async def track_request_performance(request: Request, call_next: Callable) -> Response:
-    """Context manager to track request performance"""
-    start_time = time.time()
-    try:
-        response = await call_next(request)
-        return response
-    finally:
-        duration = time.time() - start_time
-        # Run this in the background to avoid slowing down the response
-        asyncio.create_task(log_request_metrics(request, response, duration))
-
 async def startup_monitoring():
     """Initialize monitoring on application startup"""
     logger.info("Initializing monitoring system")
     # Here we could connect to external monitoring services if needed
     reset_metrics()
+    aggregator.start()
 
 async def shutdown_monitoring():
     """Cleanup monitoring on application shutdown"""
     logger.info("Shutting down monitoring system")
+    await aggregator.stop()
+    mark_process_dead()
     # Here we could persist metrics or perform cleanup if needed
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Newline-delimited JSON (NDJSON) streaming helpers.
+
+``iter_lines`` splits an async byte stream (e.g. ``Request.stream()``) into
+lines without buffering the whole body: memory is bounded by the chunk size
+plus ``NDJSON_MAX_LINE_BYTES``. ``encode_line`` serialises one document for a
+streaming response; ``encode_json`` is the same without the newline.
+"""
+import os
+import json
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Optional, Tuple
+
+from bson import ObjectId
+
+# Configuration
+NDJSON_MAX_LINE_BYTES = int(os.getenv("NDJSON_MAX_LINE_BYTES", str(256 * 1024)))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes],
+    max_line_bytes: int = NDJSON_MAX_LINE_BYTES,
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Yield ``(line_number, line)`` for each line of the stream, 1-based.
+
+    A line longer than ``max_line_bytes`` is discarded as it arrives and
+    yielded as ``None`` so the caller can report it. The final line does not
+    need a trailing newline.
+    """
+    buffer = bytearray()
+    overflow = False
+    line_number = 0
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            piece = chunk[start:] if end == -1 else chunk[start:end]
+            if not overflow:
+                buffer += piece
+                if len(buffer) > max_line_bytes:
+                    overflow = True
+                    buffer.clear()
+            if end == -1:
+                break
+            line_number += 1
+            yield line_number, None if overflow else bytes(buffer)
+            buffer.clear()
+            overflow = False
+            start = end + 1
+
+    if buffer or overflow:
+        yield line_number + 1, None if overflow else bytes(buffer)
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(document: Any) -> bytes:
+    """Serialise a document compactly, converting datetimes and ObjectIds."""
+    return json.dumps(document, default=_default, separators=(",", ":")).encode()
+
+def encode_line(document: Any) -> bytes:
+    """Serialise one document as an NDJSON line."""
+    return encode_json(document) + b"\n"
@@ -0,0 +1,123 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Offset pagination (``skip``) makes MongoDB walk and discard every earlier
+document, so page N costs O(N). Keyset pagination instead remembers the sort
+key of the last item returned and asks for items strictly after it, which is
+an index seek no matter how deep the page is.
+
+Cursors are opaque to clients: URL-safe base64 of a small JSON object holding
+the sort key values of the last item.
+"""
+import os
+import json
+import time
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+# Configuration
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))  # seconds
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "10000"))
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Encode sort key values as an opaque cursor string."""
+    payload = {}
+    for key, value in values.items():
+        if isinstance(value, datetime):
+            payload[key] = {"$date": value.isoformat()}
+        elif isinstance(value, ObjectId):
+            payload[key] = {"$oid": str(value)}
+        else:
+            payload[key] = value
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError("cursor must be an object")
+        values = {}
+        for key, value in payload.items():
+            if isinstance(value, dict) and "$date" in value:
+                values[key] = datetime.fromisoformat(value["$date"])
+            elif isinstance(value, dict) and "$oid" in value:
+                values[key] = ObjectId(value["$oid"])
+            else:
+                values[key] = value
+        return values
+    except (ValueError, TypeError, binascii.Error, json.JSONDecodeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        ) from e
+
+def keyset_filter(field: str, value: Any, last_id: ObjectId, descending: bool = True) -> Dict[str, Any]:
+    """
+    Return the filter selecting documents after ``(value, last_id)``.
+
+    Ties on ``field`` are broken by ``_id`` so the order is total and no
+    document is skipped or repeated between pages.
+    """
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: last_id}},
+    ]}
+
+class CountCache:
+    """
+    Short-lived cache of ``count_documents`` results, grouped by owner.
+
+    Holds at most ``max_size`` counts; past that, the least recently used
+    owners are evicted whole.
+    """
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL, max_size: int = COUNT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._owners: "OrderedDict[str, Dict[Hashable, Tuple[int, float]]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, owner: str, key: Hashable) -> Optional[int]:
+        entries = self._owners.get(owner)
+        if entries is None or key not in entries:
+            return None
+        count, expires_at = entries[key]
+        if expires_at < time.monotonic():
+            del entries[key]
+            self._size -= 1
+            return None
+        self._owners.move_to_end(owner)
+        return count
+
+    def set(self, owner: str, key: Hashable, count: int) -> None:
+        entries = self._owners.setdefault(owner, {})
+        if key not in entries:
+            self._size += 1
+        entries[key] = (count, time.monotonic() + self.ttl)
+        self._owners.move_to_end(owner)
+        while self._size > self.max_size:
+            _, evicted = self._owners.popitem(last=False)
+            self._size -= len(evicted)
+
+    def invalidate(self, owner: str) -> None:
+        """Forget every cached count for ``owner`` (after a write)."""
+        self._size -= len(self._owners.pop(owner, {}))
+
+    def clear(self) -> None:
+        self._owners.clear()
+        self._size = 0
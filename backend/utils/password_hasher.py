@@ -0,0 +1,90 @@
+"""
+Bounded executor for password hashing.
+
+bcrypt is deliberately slow (~100-300 ms of CPU per call at the default cost),
+so running it inline in an async handler stalls every other request on the
+worker. Hashing and verification are run in a small dedicated thread pool
+instead; bcrypt releases the GIL while it works, so the event loop keeps
+serving. The number of calls waiting for or holding a worker is capped: once
+``PASSWORD_HASH_QUEUE_LIMIT`` is reached the caller gets an immediate 503
+rather than queueing behind a login burst.
+"""
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))  # running + waiting calls
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))  # seconds, sent with the 503
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+T = TypeVar("T")
+
+class PasswordHasherBusy(HTTPException):
+    """Raised when the hashing queue is full."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry shortly",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+        )
+
+class PasswordHasher:
+    """Run password hashing callables on a bounded thread pool."""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run ``func(*args)`` on the hashing pool.
+
+        Raises:
+            PasswordHasherBusy: If ``queue_limit`` calls are already in flight.
+        """
+        # in_flight is only touched from the event loop thread, so no lock is needed
+        if self.in_flight >= self.queue_limit:
+            self.rejected += 1
+            logger.warning(f"Password hashing queue full ({self.in_flight} in flight); rejecting request")
+            raise PasswordHasherBusy()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """Return queue depth and rejection counters."""
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,138 @@
+"""
+Prometheus exposition for request, database and Redis timings.
+
+All label values come from bounded sets (route templates, HTTP methods,
+status codes, Mongo/Redis command names), so memory stays flat no matter how
+many distinct IDs appear in request paths.
+
+Multi-worker uvicorn/gunicorn deployments should set ``PROMETHEUS_MULTIPROC_DIR``
+to an empty, writable directory shared by the workers. prometheus_client then
+stores samples in memory-mapped files and ``/metrics`` aggregates across
+processes.
+"""
+import os
+import hmac
+import time
+import logging
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Header, HTTPException, status
+
+from prometheus_client import (
+    CollectorRegistry, Histogram, REGISTRY,
+    generate_latest, CONTENT_TYPE_LATEST
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring as mongo_monitoring
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+PROMETHEUS_ENABLED = os.getenv("PROMETHEUS_ENABLED", "true").lower() == "true"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+# Shared secret the scraper must send as "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Latency buckets (seconds) tuned for an API: sub-millisecond up to 10s
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+BACKEND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+DB_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency",
+    ["command", "outcome"],
+    buckets=BACKEND_BUCKETS,
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency",
+    ["command", "outcome"],
+    buckets=BACKEND_BUCKETS,
+)
+
+def observe_request(method: str, route: str, status: int, duration: float) -> None:
+    """Record an HTTP request duration. ``route`` must be a route template."""
+    if PROMETHEUS_ENABLED:
+        REQUEST_DURATION.labels(method, route, str(status)).observe(duration)
+
+def observe_db_command(command: str, duration: float, succeeded: bool = True) -> None:
+    """Record a MongoDB command duration."""
+    if PROMETHEUS_ENABLED:
+        DB_COMMAND_DURATION.labels(command, "success" if succeeded else "failure").observe(duration)
+
+@contextmanager
+def time_redis(command: str) -> Iterator[None]:
+    """
+    Time the Redis call awaited inside the block.
+
+    Usage:
+        with time_redis("get"):
+            value = await redis_client.get(key)
+    """
+    start = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except Exception:
+        outcome = "failure"
+        raise
+    finally:
+        if PROMETHEUS_ENABLED:
+            REDIS_COMMAND_DURATION.labels(command, outcome).observe(time.perf_counter() - start)
+
+class MongoCommandTimer(mongo_monitoring.CommandListener):
+    """pymongo command listener feeding ``mongodb_command_duration_seconds``."""
+
+    def started(self, event: mongo_monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: mongo_monitoring.CommandSucceededEvent) -> None:
+        observe_db_command(event.command_name, event.duration_micros / 1_000_000)
+
+    def failed(self, event: mongo_monitoring.CommandFailedEvent) -> None:
+        observe_db_command(event.command_name, event.duration_micros / 1_000_000, succeeded=False)
+
+async def verify_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    """
+    Dependency guarding the scrape endpoint with the METRICS_TOKEN shared secret.
+
+    The endpoint stays closed until a token is configured, so route templates
+    and latency data are never exposed to anonymous callers.
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Metrics scraping is not configured"
+        )
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def render_latest() -> Tuple[bytes, str]:
+    """Render the exposition payload and its content type."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Aggregate the per-process files written by every worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges from the multiprocess directory on shutdown."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        try:
+            multiprocess.mark_process_dead(os.getpid())
+        except Exception as e:
+            logger.warning(f"Could not mark Prometheus process dead: {str(e)}")
@@ -0,0 +1,149 @@
+"""
+Per-request MongoDB command instrumentation.
+
+The request middleware opens a ``RequestQueryStats`` for every HTTP request and
+stores it in a context variable. Motor copies the caller's context into its
+executor threads, so ``RequestCommandListener`` (a pymongo CommandListener)
+sees the same object and attributes each command to the request that issued
+it: name, collection, duration and documents returned. Reply size needs each
+reply re-encoded, so it is only measured with ``DB_TRACK_REPLY_BYTES=true``.
+
+Repeated commands with the same shape (command, collection, filter keys)
+within one request are counted so N+1 patterns, such as calling
+``get_next_resource_id`` once per item, can be flagged per route.
+"""
+import os
+import threading
+from collections import Counter
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+from pymongo import monitoring as mongo_monitoring
+
+# Configuration
+DB_SLOW_QUERY_THRESHOLD = float(os.getenv("DB_SLOW_QUERY_THRESHOLD", "0.1"))  # seconds
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))  # same-shape commands per request
+DB_TRACK_REPLY_BYTES = os.getenv("DB_TRACK_REPLY_BYTES", "false").lower() == "true"  # re-encodes every reply
+MAX_SLOW_QUERIES_PER_REQUEST = 5
+
+# Commands that are driver housekeeping rather than application queries
+IGNORED_COMMANDS = frozenset({"isMaster", "ismaster", "hello", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"})
+
+QueryShape = Tuple[str, str, Tuple[str, ...]]
+
+class RequestQueryStats:
+    """Mongo usage accumulated for a single request."""
+
+    __slots__ = (
+        "request_id", "commands", "db_time", "docs_returned", "reply_bytes",
+        "by_command", "shapes", "slow_queries", "_started", "_lock"
+    )
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.commands = 0
+        self.db_time = 0.0
+        self.docs_returned = 0
+        self.reply_bytes = 0
+        self.by_command: Counter = Counter()
+        self.shapes: Counter = Counter()
+        self.slow_queries: List[Dict[str, Any]] = []
+        self._started: Dict[int, Tuple[str, QueryShape]] = {}
+        # Motor may run several commands of one request in parallel threads
+        self._lock = threading.Lock()
+
+    def n_plus_one(self) -> List[Dict[str, Any]]:
+        """Return the command shapes repeated at least N_PLUS_ONE_THRESHOLD times."""
+        return [
+            {"command": command, "collection": collection, "filter_keys": list(keys), "count": count}
+            for (command, collection, keys), count in self.shapes.items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+def begin_request(request_id: str) -> Token:
+    """Start collecting Mongo usage for the current request context."""
+    return _current_stats.set(RequestQueryStats(request_id))
+
+def end_request(token: Token) -> Optional[RequestQueryStats]:
+    """Stop collecting and return the stats gathered for the request."""
+    stats = _current_stats.get()
+    _current_stats.reset(token)
+    return stats
+
+def get_current_stats() -> Optional[RequestQueryStats]:
+    """Return the stats for the request being handled, if any."""
+    return _current_stats.get()
+
+def _command_shape(command_name: str, command: Dict[str, Any]) -> Tuple[str, QueryShape]:
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        collection = ""
+    query = command.get("filter") or command.get("query") or {}
+    if not query and command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or []
+        if statements:
+            query = statements[0].get("q") or {}
+    keys = tuple(sorted(query.keys())) if isinstance(query, dict) else ()
+    return collection, (command_name, collection, keys)
+
+def _docs_returned(reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch")
+        if batch is None:
+            batch = cursor.get("nextBatch", [])
+        return len(batch)
+    count = reply.get("n")
+    return count if isinstance(count, int) else 0
+
+class RequestCommandListener(mongo_monitoring.CommandListener):
+    """Attribute every Mongo command to the request that issued it."""
+
+    def started(self, event: mongo_monitoring.CommandStartedEvent) -> None:
+        stats = _current_stats.get()
+        if stats is None or event.command_name in IGNORED_COMMANDS:
+            return
+        collection, shape = _command_shape(event.command_name, event.command)
+        with stats._lock:
+            stats._started[event.request_id] = (collection, shape)
+
+    def succeeded(self, event: mongo_monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, event.reply)
+
+    def failed(self, event: mongo_monitoring.CommandFailedEvent) -> None:
+        self._finish(event, None)
+
+    def _finish(self, event: Any, reply: Optional[Dict[str, Any]]) -> None:
+        stats = _current_stats.get()
+        if stats is None:
+            return
+        with stats._lock:
+            started = stats._started.pop(event.request_id, None)
+        if started is None:
+            return
+        collection, shape = started
+        duration = event.duration_micros / 1_000_000
+        docs = _docs_returned(reply) if reply else 0
+        size = len(bson.encode(reply)) if reply and DB_TRACK_REPLY_BYTES else 0
+
+        with stats._lock:
+            stats.commands += 1
+            stats.db_time += duration
+            stats.docs_returned += docs
+            stats.reply_bytes += size
+            stats.by_command[f"{event.command_name}:{collection}"] += 1
+            stats.shapes[shape] += 1
+            if duration >= DB_SLOW_QUERY_THRESHOLD and len(stats.slow_queries) < MAX_SLOW_QUERIES_PER_REQUEST:
+                stats.slow_queries.append({
+                    "command": event.command_name,
+                    "collection": collection,
+                    "filter_keys": list(shape[2]),
+                    "duration": duration,
+                    "docs_returned": docs,
+                    "reply_bytes": size,
+                    "request_id": stats.request_id,
+                    "succeeded": reply is not None,
+                })
@@ -10,6 +10,8 @@ from functools import wraps
 from fastapi import Depends
 import asyncio
 
+from utils.prometheus import time_redis
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -98,7 +100,7 @@ async def get_redis_client() -> AsyncIterator[redis.Redis]:
             REDIS_URL, db=REDIS_DB, decode_responses=True, socket_timeout=5
         )
         await redis_client.ping()  # Verify connection
-        logger.info("Redis client connected successfully.")
+        logger.debug("Redis client connected successfully.")
         # Yield the client *after* successful connection attempt
         yield redis_client
     except redis.ConnectionError as e:
@@ -123,13 +125,13 @@ async def get_redis_client() -> AsyncIterator[redis.Redis]:
                 # Check for the modern async close method first
                 if hasattr(redis_client, 'aclose') and callable(redis_client.aclose):
                     await redis_client.aclose()
-                    logger.info("Redis client closed successfully using aclose() after request.")
+                    logger.debug("Redis client closed successfully using aclose() after request.")
                 # Fallback to the older async close method
                 elif hasattr(redis_client, 'close') and callable(redis_client.close):
                      # Ensure close is actually awaitable (it should be for redis.asyncio)
                      if asyncio.iscoroutinefunction(redis_client.close):
                          await redis_client.close()
-                         logger.info("Redis client closed successfully using close() after request.")
+                         logger.debug("Redis client closed successfully using close() after request.")
                      else:
                           logger.warning("Redis client 'close' method is not awaitable.")
                 else:
@@ -198,12 +200,14 @@ async def check_rate_limit(
             pipe.get(key)
             pipe.ttl(key)
             # Await pipeline execution
-            count_str, ttl = await pipe.execute()
+            with time_redis("pipeline"):
+                count_str, ttl = await pipe.execute()
 
         if count_str is None:
             # First request
             # Await setex
-            await redis_client.setex(key, window, 1)
+            with time_redis("setex"):
+                await redis_client.setex(key, window, 1)
             return True, limit - 1, 0, current_time + window
 
         count = int(count_str)
@@ -213,7 +217,8 @@ async def check_rate_limit(
 
         # Increment counter
         # Await incr
-        await redis_client.incr(key)
+        with time_redis("incr"):
+            await redis_client.incr(key)
         return True, limit - count - 1, 0, current_time + ttl
 
     except redis.RedisError as e:
@@ -259,17 +264,17 @@ def rate_limit_dependency_with_logging(
         # --- Start Debug Logging for Bypass ---
         skip_header = request.headers.get("X-Skip-Rate-Limit")
         client_id = get_client_identifier(request) # Get client_id early for logging
-        logger.info(f"[Rate Limiter Log] Path: {request.url.path}, Client: {client_id}")
-        logger.info(f"[Rate Limiter Log] Checking Header - X-Skip-Rate-Limit: '{skip_header}' (Type: {type(skip_header).__name__})")
-        logger.info(f"[Rate Limiter Log] IS_DEVELOPMENT flag: {IS_DEVELOPMENT}")
-        logger.info(f"[Rate Limiter Log] IS_TEST_ENVIRONMENT flag: {IS_TEST_ENVIRONMENT}") # Log test env flag
+        logger.debug(f"[Rate Limiter Log] Path: {request.url.path}, Client: {client_id}")
+        logger.debug(f"[Rate Limiter Log] Checking Header - X-Skip-Rate-Limit: '{skip_header}' (Type: {type(skip_header).__name__})")
+        logger.debug(f"[Rate Limiter Log] IS_DEVELOPMENT flag: {IS_DEVELOPMENT}")
+        logger.debug(f"[Rate Limiter Log] IS_TEST_ENVIRONMENT flag: {IS_TEST_ENVIRONMENT}") # Log test env flag
 
         # Initialize headers state
         request.state.rate_limit_headers = {}
 
         # Skip rate limiting in development OR test environment when explicitly requested via header
         if (IS_DEVELOPMENT or IS_TEST_ENVIRONMENT) and request.headers.get("X-Skip-Rate-Limit") == "true":
-            logger.info("[Rate Limiter Log] Bypass Active: Skipping rate limit check (DEVELOPMENT/TEST and Header is 'true').")
+            logger.debug("[Rate Limiter Log] Bypass Active: Skipping rate limit check (DEVELOPMENT/TEST and Header is 'true').")
             # Set bypass indicator headers
             request.state.rate_limit_headers = {
                 "X-RateLimit-Limit": str(limit),
@@ -280,9 +285,9 @@ def rate_limit_dependency_with_logging(
 
         # Log reason if bypass didn't happen
         if (IS_DEVELOPMENT or IS_TEST_ENVIRONMENT) and request.headers.get("X-Skip-Rate-Limit") != "true":
-             logger.info(f"[Rate Limiter Log] Bypass Inactive: DEVELOPMENT/TEST is True but header is '{skip_header}' (not 'true').")
+             logger.debug(f"[Rate Limiter Log] Bypass Inactive: DEVELOPMENT/TEST is True but header is '{skip_header}' (not 'true').")
         elif not (IS_DEVELOPMENT or IS_TEST_ENVIRONMENT):
-             logger.info(f"[Rate Limiter Log] Bypass Inactive: Not in DEVELOPMENT or TEST environment.")
+             logger.debug(f"[Rate Limiter Log] Bypass Inactive: Not in DEVELOPMENT or TEST environment.")
         # --- End Debug Logging for Bypass ---
 
         # Get client identifier (IP address by default)
@@ -304,7 +309,7 @@ def rate_limit_dependency_with_logging(
                 "X-RateLimit-Remaining": str(remaining),
                 "X-RateLimit-Reset": str(reset_time) # reset_time from check_rate_limit
             }
-            logger.info(f"[Rate Limiter Log] Rate limit check passed for key prefix '{key_prefix}' for client {identifier}. Remaining: {remaining}")
+            logger.debug(f"[Rate Limiter Log] Rate limit check passed for key prefix '{key_prefix}' for client {identifier}. Remaining: {remaining}")
         else:
             # Exception will be raised, headers added by exception handler
             logger.warning(f"[Rate Limiter Log] Rate limit exceeded for key prefix '{key_prefix}' for client {identifier}. Limit: {limit}/{window}s.")
@@ -0,0 +1,265 @@
+"""
+Roadmap dependency graph and scheduling.
+
+A roadmap's ``milestones`` form a graph through their ``prerequisites``.
+``RoadmapSchedule`` orders it topologically and runs the classic critical-path
+passes over the remaining work (completed milestones take no time):
+
+    - forward pass: earliest start/finish of each milestone
+    - backward pass: latest start/finish that does not delay the end
+    - slack: latest minus earliest start; zero-slack milestones are critical
+
+``plan()`` turns that into dates, the critical path and the next actionable
+milestones (not completed, every prerequisite completed).
+
+When a single milestone's duration or completion changes, ``update_node``
+re-propagates only through the milestones whose dates actually move, instead
+of recomputing the whole graph. Schedules are kept in ``plan_cache`` keyed by
+roadmap and tagged with the roadmap's ``version``, so a worker that did not see
+a change rebuilds from the database on its next read.
+"""
+import os
+import heapq
+import logging
+from collections import OrderedDict, deque
+from datetime import date, timedelta
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+ROADMAP_PLAN_CACHE_SIZE = int(os.getenv("ROADMAP_PLAN_CACHE_SIZE", "1000"))
+ROADMAP_NEXT_ACTIONABLE = int(os.getenv("ROADMAP_NEXT_ACTIONABLE", "5"))
+
+def duration(milestone: Dict[str, Any]) -> int:
+    """A milestone's estimated days; missing or null counts as 0."""
+    return milestone.get("estimated_days") or 0
+
+class RoadmapGraphError(ValueError):
+    """The milestones do not form a valid dependency graph."""
+
+class RoadmapSchedule:
+    """Critical-path schedule of a roadmap's milestones."""
+
+    def __init__(self, milestones: Iterable[Dict[str, Any]]):
+        self.nodes: List[Dict[str, Any]] = [dict(milestone) for milestone in milestones]
+        self.index: Dict[str, int] = {}
+        for i, node in enumerate(self.nodes):
+            if node["id"] in self.index:
+                raise RoadmapGraphError(f"Duplicate milestone ID: {node['id']}")
+            if duration(node) < 0:
+                raise RoadmapGraphError(f"Milestone {node['id']} has a negative duration")
+            self.index[node["id"]] = i
+
+        count = len(self.nodes)
+        self.predecessors: List[List[int]] = [[] for _ in range(count)]
+        self.successors: List[List[int]] = [[] for _ in range(count)]
+        for i, node in enumerate(self.nodes):
+            for prerequisite in node.get("prerequisites") or []:
+                if prerequisite not in self.index:
+                    raise RoadmapGraphError(f"Milestone {node['id']} depends on unknown milestone {prerequisite}")
+                self.predecessors[i].append(self.index[prerequisite])
+                self.successors[self.index[prerequisite]].append(i)
+
+        self.order = self._topological_order()
+        self.position = [0] * count
+        for position, i in enumerate(self.order):
+            self.position[i] = position
+
+        self.earliest_start = [0] * count
+        self.earliest_finish = [0] * count
+        self.latest_start = [0] * count
+        self.latest_finish = [0] * count
+        self.project_days = 0
+        self._forward_pass()
+        self._backward_pass()
+        self._plans: Dict[Tuple[date, int], Dict[str, Any]] = {}
+
+    def _topological_order(self) -> List[int]:
+        # Kahn's algorithm; ties keep the roadmap's own order
+        indegree = [len(predecessors) for predecessors in self.predecessors]
+        ready = deque(i for i, degree in enumerate(indegree) if degree == 0)
+        order = []
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+            for successor in self.successors[i]:
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    ready.append(successor)
+        if len(order) < len(self.nodes):
+            cycle = sorted(self.nodes[i]["id"] for i, degree in enumerate(indegree) if degree > 0)
+            raise RoadmapGraphError(f"Prerequisite cycle between milestones: {', '.join(cycle)}")
+        return order
+
+    def remaining_days(self, i: int) -> int:
+        node = self.nodes[i]
+        return 0 if node.get("completed", False) else duration(node)
+
+    def _schedule_early(self, i: int) -> None:
+        start = max((self.earliest_finish[p] for p in self.predecessors[i]), default=0)
+        self.earliest_start[i] = start
+        self.earliest_finish[i] = start + self.remaining_days(i)
+
+    def _schedule_late(self, i: int) -> None:
+        finish = min((self.latest_start[s] for s in self.successors[i]), default=self.project_days)
+        self.latest_finish[i] = finish
+        self.latest_start[i] = finish - self.remaining_days(i)
+
+    def _forward_pass(self) -> None:
+        for i in self.order:
+            self._schedule_early(i)
+        self.project_days = max(self.earliest_finish, default=0)
+
+    def _backward_pass(self) -> None:
+        for i in reversed(self.order):
+            self._schedule_late(i)
+
+    def update_node(self, node_id: str, **changes: Any) -> None:
+        """
+        Apply changes to one milestone (``estimated_days``, ``completed``, ...)
+        and reschedule only what they affect.
+
+        Prerequisite changes alter the graph itself; build a new schedule for those.
+        """
+        if "prerequisites" in changes:
+            raise RoadmapGraphError("Prerequisite changes need a new schedule")
+        i = self.index.get(node_id)
+        if i is None:
+            raise KeyError(node_id)
+        if duration(changes) < 0:
+            raise RoadmapGraphError(f"Milestone {node_id} has a negative duration")
+        self.nodes[i].update(changes)
+        self._plans.clear()
+
+        # Forward: in topological order, through successors whose earliest finish moves
+        pending = [(self.position[i], i)]
+        queued = {i}
+        while pending:
+            _, j = heapq.heappop(pending)
+            previous_finish = self.earliest_finish[j]
+            self._schedule_early(j)
+            if self.earliest_finish[j] != previous_finish or j == i:
+                for successor in self.successors[j]:
+                    if successor not in queued:
+                        queued.add(successor)
+                        heapq.heappush(pending, (self.position[successor], successor))
+
+        project_days = max(self.earliest_finish, default=0)
+        if project_days != self.project_days:
+            # The end moved, so every latest date does
+            self.project_days = project_days
+            self._backward_pass()
+            return
+
+        # Backward: in reverse topological order, through predecessors whose latest start moves
+        pending = [(-self.position[i], i)]
+        queued = {i}
+        while pending:
+            _, j = heapq.heappop(pending)
+            previous_start = self.latest_start[j]
+            self._schedule_late(j)
+            if self.latest_start[j] != previous_start or j == i:
+                for predecessor in self.predecessors[j]:
+                    if predecessor not in queued:
+                        queued.add(predecessor)
+                        heapq.heappush(pending, (-self.position[predecessor], predecessor))
+
+    def slack(self, i: int) -> int:
+        return self.latest_start[i] - self.earliest_start[i]
+
+    def is_critical(self, i: int) -> bool:
+        return self.slack(i) == 0 and self.remaining_days(i) > 0
+
+    def critical_path(self) -> List[str]:
+        """IDs along one zero-slack chain from the start to the end of the remaining work."""
+        current = next(
+            (i for i in self.order if self.is_critical(i) and self.earliest_start[i] == 0),
+            None
+        )
+        path = []
+        while current is not None:
+            if self.remaining_days(current) > 0:
+                path.append(self.nodes[current]["id"])
+            current = min(
+                (
+                    s for s in self.successors[current]
+                    if self.slack(s) == 0 and self.earliest_start[s] == self.earliest_finish[current]
+                ),
+                key=lambda s: self.position[s],
+                default=None
+            )
+        return path
+
+    def next_actionable(self, limit: int = ROADMAP_NEXT_ACTIONABLE) -> List[str]:
+        """IDs of open milestones whose prerequisites are all completed, most urgent first."""
+        actionable = [
+            i for i in self.order
+            if not self.nodes[i].get("completed", False)
+            and all(self.nodes[p].get("completed", False) for p in self.predecessors[i])
+        ]
+        actionable.sort(key=lambda i: (self.slack(i), self.earliest_start[i], self.position[i]))
+        return [self.nodes[i]["id"] for i in actionable[:limit]]
+
+    def plan(self, start: date, next_limit: int = ROADMAP_NEXT_ACTIONABLE) -> Dict[str, Any]:
+        """The schedule as dates from ``start``; cached until the next change."""
+        key = (start, next_limit)
+        if key not in self._plans:
+            def day(offset: int) -> str:
+                return (start + timedelta(days=offset)).isoformat()
+
+            schedule = []
+            for i in self.order:
+                node = self.nodes[i]
+                schedule.append({
+                    "id": node["id"],
+                    "title": node.get("title", ""),
+                    "estimated_days": duration(node),
+                    "completed": node.get("completed", False),
+                    "prerequisites": node.get("prerequisites") or [],
+                    "earliest_start": day(self.earliest_start[i]),
+                    "earliest_finish": day(self.earliest_finish[i]),
+                    "latest_start": day(self.latest_start[i]),
+                    "latest_finish": day(self.latest_finish[i]),
+                    "slack_days": self.slack(i),
+                    "critical": self.is_critical(i),
+                })
+            self._plans = {key: {
+                "start_date": start.isoformat(),
+                "end_date": day(self.project_days),
+                "remaining_days": self.project_days,
+                "critical_path": self.critical_path(),
+                "next_actionable": self.next_actionable(next_limit),
+                "schedule": schedule,
+            }}
+        return self._plans[key]
+
+class RoadmapPlanCache:
+    """Bounded LRU of schedules keyed by roadmap, each tagged with the roadmap version it reflects."""
+
+    def __init__(self, max_size: int = ROADMAP_PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[int, RoadmapSchedule]]" = OrderedDict()
+
+    def get(self, key: Hashable, version: int) -> Optional[RoadmapSchedule]:
+        """The cached schedule for ``key`` if it reflects ``version``."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, version: int, schedule: RoadmapSchedule) -> None:
+        self._entries[key] = (version, schedule)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+plan_cache = RoadmapPlanCache()
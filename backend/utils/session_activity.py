@@ -0,0 +1,186 @@
+"""
+Write-coalescing buffer for session activity heartbeats.
+
+Every open tab pings ``/api/sessions/{id}/activity``, and each ping used to be
+its own ``update_one``. ``SessionActivityBuffer`` keeps the latest
+``last_active``/``expires_at`` per session in memory and writes them every
+``SESSION_ACTIVITY_FLUSH_INTERVAL`` seconds as one unordered ``bulk_write``.
+
+Expiry stays correct because a touch is only buffered when the expiry already
+stored in MongoDB is further away than two flush intervals; anything closer
+(or a session this worker has not seen yet) is written through immediately,
+which also confirms the session exists. The TTL index therefore can never
+delete a session whose extension is still sitting in the buffer, even if one
+flush fails. Updates use ``$max`` and never upsert, so concurrent workers
+cannot move a session backwards or revive a deleted one.
+
+Durability bound: a crash loses at most one flush interval of ``last_active``
+updates. Set the interval to 0 to write every touch through.
+"""
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+import database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+SESSION_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("SESSION_ACTIVITY_FLUSH_INTERVAL", "30"))  # seconds, 0 disables buffering
+SESSION_ACTIVITY_MAX_PENDING = int(os.getenv("SESSION_ACTIVITY_MAX_PENDING", "5000"))  # flush early at this many dirty sessions
+SESSION_ACTIVITY_KNOWN_SIZE = int(os.getenv("SESSION_ACTIVITY_KNOWN_SIZE", "50000"))  # sessions whose stored expiry is tracked
+
+class SessionActivityBuffer:
+    """Coalesces session touches into periodic bulk writes."""
+
+    def __init__(
+        self,
+        ttl: timedelta,
+        flush_interval: float = SESSION_ACTIVITY_FLUSH_INTERVAL,
+        max_pending: int = SESSION_ACTIVITY_MAX_PENDING,
+        known_size: int = SESSION_ACTIVITY_KNOWN_SIZE,
+    ):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.known_size = known_size
+        self.buffered = 0
+        self.writes = 0
+        # session_id -> (last_active or None, expires_at) awaiting flush
+        self._pending: Dict[str, Tuple[Optional[datetime], datetime]] = {}
+        # session_id -> (user_id, expires_at as stored in MongoDB)
+        self._known: "OrderedDict[str, Tuple[str, datetime]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def safety_margin(self) -> timedelta:
+        return timedelta(seconds=self.flush_interval * 2)
+
+    def remember(self, session_id: str, user_id: str, expires_at: datetime) -> None:
+        """Record a session's stored expiry (e.g. after reading it) so touches can be buffered."""
+        if expires_at.tzinfo is None:
+            # Motor returns naive UTC datetimes
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        self._known[session_id] = (user_id, expires_at)
+        self._known.move_to_end(session_id)
+        while len(self._known) > self.known_size:
+            self._known.popitem(last=False)
+
+    def forget(self, session_id: str) -> None:
+        """Drop local state for a deleted session."""
+        self._known.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    def forget_user(self, user_id: str) -> None:
+        for session_id in [sid for sid, (owner, _) in self._known.items() if owner == user_id]:
+            self.forget(session_id)
+
+    async def touch(self, session_id: str, user_id: str, active: bool = True) -> bool:
+        """
+        Extend a session's expiry and, if ``active``, its ``last_active``.
+
+        Returns False if the session does not exist, belongs to someone else
+        or has expired.
+        """
+        now = datetime.now(timezone.utc)
+        expires_at = now + self.ttl
+        known = self._known.get(session_id)
+
+        if self.flush_interval > 0 and known and known[0] == user_id and known[1] - now > self.safety_margin:
+            last_active, pending_expiry = self._pending.get(session_id, (None, expires_at))
+            self._pending[session_id] = (
+                now if active else last_active,
+                max(pending_expiry, expires_at),
+            )
+            self.buffered += 1
+            if len(self._pending) >= self.max_pending:
+                await self.flush()
+            return True
+
+        fields = {"expires_at": expires_at}
+        if active:
+            fields["last_active"] = now
+        result = await database.db.sessions.update_one(
+            {"session_id": session_id, "user_id": user_id, "expires_at": {"$gt": now}},
+            {"$max": fields}
+        )
+        self.writes += 1
+        if result.matched_count == 0:
+            self.forget(session_id)
+            return False
+        self._pending.pop(session_id, None)
+        self.remember(session_id, user_id, expires_at)
+        return True
+
+    async def flush(self) -> int:
+        """Write all pending touches in one bulk write; returns the number of sessions written."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            now = datetime.now(timezone.utc)
+            operations = []
+            for session_id, (last_active, expires_at) in pending.items():
+                fields = {"expires_at": expires_at}
+                if last_active is not None:
+                    fields["last_active"] = last_active
+                operations.append(UpdateOne(
+                    {"session_id": session_id, "expires_at": {"$gt": now}},
+                    {"$max": fields}
+                ))
+            try:
+                result = await database.db.sessions.bulk_write(operations, ordered=False)
+                self.writes += 1
+            except Exception as e:
+                logger.error(f"Error flushing activity for {len(operations)} sessions: {str(e)}")
+                # Retry on the next flush unless a newer touch has replaced the entry
+                for session_id, entry in pending.items():
+                    self._pending.setdefault(session_id, entry)
+                return 0
+
+            if result.matched_count < len(operations):
+                # Some sessions expired or were revoked meanwhile; the result does not
+                # say which, so forget the batch and let the next touch write through
+                for session_id in pending:
+                    self._known.pop(session_id, None)
+            else:
+                for session_id, (_, expires_at) in pending.items():
+                    known = self._known.get(session_id)
+                    if known is not None:
+                        self._known[session_id] = (known[0], max(known[1], expires_at))
+            logger.debug(f"Flushed activity for {len(operations)} sessions")
+            return len(operations)
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self._pending), "known": len(self._known), "buffered": self.buffered, "writes": self.writes}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in session activity flush task: {str(e)}")
+
+    def start(self) -> None:
+        """Start the periodic flush task on the running loop."""
+        if self.flush_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write out anything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
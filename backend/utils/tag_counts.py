@@ -0,0 +1,111 @@
+"""
+Per-user note tag counts.
+
+``note_tag_counts`` holds one ``{user_id, tag, count}`` document per tag in
+use, kept current by applying the tag diff of every note write with ``$inc``.
+Rendering a tag cloud is then one indexed read proportional to the number of
+tags, not to the number of notes.
+
+``rebuild_tag_counts`` recomputes the collection from ``notes`` with an
+aggregation pipeline. It backfills users created before the aggregate existed
+and repairs drift if an incremental update was ever lost.
+"""
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COLLECTION = "note_tag_counts"
+
+def tag_diff(old_tags: Iterable[str], new_tags: Iterable[str]) -> Dict[str, int]:
+    """Return ``{tag: delta}`` for the tags added (+1) and removed (-1)."""
+    diff = Counter(set(new_tags))
+    diff.subtract(Counter(set(old_tags)))
+    return {tag: delta for tag, delta in diff.items() if delta}
+
+async def apply_tag_diff(db: Any, user_id: str, old_tags: Iterable[str], new_tags: Iterable[str]) -> None:
+    """Apply a single note's tag change to the user's counts."""
+    await increment_tag_counts(db, user_id, tag_diff(old_tags or [], new_tags or []))
+
+async def increment_tag_counts(db: Any, user_id: str, deltas: Dict[str, int]) -> None:
+    """
+    Add ``deltas`` to the user's tag counts in one bulk write.
+
+    Errors are logged rather than raised: the note write already succeeded and
+    counts can be repaired with ``rebuild_tag_counts``.
+    """
+    deltas = {tag: delta for tag, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    try:
+        await db.note_tag_counts.bulk_write(
+            [
+                UpdateOne({"user_id": user_id, "tag": tag}, {"$inc": {"count": delta}}, upsert=True)
+                for tag, delta in deltas.items()
+            ],
+            ordered=False,
+        )
+        removed = [tag for tag, delta in deltas.items() if delta < 0]
+        if removed:
+            await db.note_tag_counts.delete_many({"user_id": user_id, "tag": {"$in": removed}, "count": {"$lte": 0}})
+    except Exception as e:
+        logger.error(f"Error updating tag counts for user {user_id}: {str(e)}")
+
+async def get_tag_counts(db: Any, user_id: str) -> List[Dict[str, Any]]:
+    """Return the user's tags with counts, most used first."""
+    cursor = db.note_tag_counts.find(
+        {"user_id": user_id, "count": {"$gt": 0}},
+        {"_id": 0, "tag": 1, "count": 1}
+    ).sort([("count", -1), ("tag", 1)])
+    return await cursor.to_list(length=None)
+
+def tag_count_pipeline(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Aggregation computing ``{user_id, tag, count}`` documents from ``notes``."""
+    pipeline: List[Dict[str, Any]] = []
+    if user_id is not None:
+        pipeline.append({"$match": {"user_id": user_id}})
+    pipeline += [
+        {"$unwind": "$tags"},
+        {"$group": {"_id": {"user_id": "$user_id", "tag": "$tags"}, "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "user_id": "$_id.user_id", "tag": "$_id.tag", "count": 1}},
+    ]
+    return pipeline
+
+async def rebuild_tag_counts(db: Any, user_id: Optional[str] = None) -> None:
+    """
+    Recompute tag counts from the notes collection.
+
+    With ``user_id`` only that user's counts are replaced (``$merge``);
+    without it the whole collection is atomically replaced (``$out``, which
+    keeps the collection's indexes).
+    """
+    pipeline = tag_count_pipeline(user_id)
+    if user_id is None:
+        pipeline.append({"$out": COLLECTION})
+    else:
+        await db.note_tag_counts.delete_many({"user_id": user_id})
+        pipeline.append({"$merge": {
+            "into": COLLECTION,
+            "on": ["user_id", "tag"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }})
+    # $out/$merge return no documents; iterating runs the pipeline
+    await db.notes.aggregate(pipeline).to_list(length=None)
+    logger.info(f"Rebuilt note tag counts{' for user ' + user_id if user_id else ''}")
+
+async def _rebuild_all() -> None:
+    from database import db
+    await rebuild_tag_counts(db)
+    # Skip the lazy per-user backfill in GET /api/notes/tags
+    await db.users.update_many({}, {"$set": {"note_tag_counts_built": True}})
+
+if __name__ == "__main__":
+    # Full rebuild job: python -m utils.tag_counts
+    import asyncio
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_rebuild_all())
@@ -0,0 +1,84 @@
+"""
+Cache of verified access token claims.
+
+The same access token is presented on every request of a session, and
+decoding it means base64, JSON parsing, HMAC verification and claim checks
+each time. ``VerifiedTokenCache`` maps a SHA-256 digest of tokens that
+already passed full verification to their claims, so repeat requests skip
+straight to the user lookup.
+
+An entry is served only while:
+    - the token's own ``exp`` has not passed
+    - it is younger than ``TOKEN_CACHE_TTL`` (bounds how long a revocation made
+      by another worker can go unnoticed)
+    - its ``jti`` has not been revoked in this process
+
+Raw tokens are never stored.
+"""
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.token_store import NegativeCache
+
+# Configuration
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))  # seconds
+
+def token_digest(token: str) -> bytes:
+    """Return the cache key for a raw token."""
+    return hashlib.sha256(token.encode()).digest()
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified token digests to their claims."""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revoked = NegativeCache(max_size)
+        # digest -> (claims, valid_until)
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached claims for ``token`` if still valid."""
+        key = token_digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, valid_until = entry
+        if valid_until <= time.time() or self.is_revoked(claims.get("jti")):
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache claims of a token that passed full verification."""
+        key = token_digest(token)
+        valid_until = min(float(claims.get("exp", 0)), time.time() + self.ttl)
+        self._entries[key] = (claims, valid_until)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def revoke(self, jti: str, exp: float) -> None:
+        """Stop serving any token with this ``jti`` until it expires."""
+        self.revoked.add(f"jti:{jti}", exp)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return bool(jti) and f"jti:{jti}" in self.revoked
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.revoked.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,172 @@
+"""
+Refresh token rotation store.
+
+Every refresh token carries a ``jti`` (token ID) and a ``fam`` (family ID)
+shared by all tokens rotated from the same login. Redeeming a token runs one
+Lua script in Redis that, atomically and in a single round trip:
+
+    - rejects the token if its family has been revoked
+    - marks the ``jti`` as used with ``SET NX`` (first redemption wins)
+    - on a second redemption outside the grace window, revokes the whole family
+
+A token presented again after rotation means it leaked, so the family is
+revoked and the attacker's copy stops working too. Redemptions within
+``REFRESH_REUSE_GRACE_SECONDS`` are treated as a benign race (several tabs
+refreshing with the same cookie) and only rejected.
+
+Revoked families, and JTIs redeemed within the grace window, are also
+remembered in a bounded in-process negative cache, so a refresh storm costs
+one Redis op per rotation and duplicates are rejected without touching Redis.
+"""
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from utils.prometheus import time_redis
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))
+REFRESH_NEGATIVE_CACHE_SIZE = int(os.getenv("REFRESH_NEGATIVE_CACHE_SIZE", "10000"))
+DEFAULT_FAMILY_TTL = 30 * 86400  # Must outlive any refresh token in the family
+
+USED_KEY_PREFIX = "refresh:used:"
+REVOKED_FAMILY_KEY_PREFIX = "refresh:revoked:"
+
+# Script results
+ROTATED = 1
+CONCURRENT_REUSE = 0
+FAMILY_REVOKED = -1
+REUSE_DETECTED = -2
+
+# KEYS[1] = used-jti key, KEYS[2] = revoked-family key
+# ARGV[1] = now (epoch seconds), ARGV[2] = used-jti TTL, ARGV[3] = family TTL, ARGV[4] = grace seconds
+ROTATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return -1
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+local used_at = tonumber(redis.call('GET', KEYS[1]))
+if used_at and tonumber(ARGV[1]) - used_at <= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[3])
+return -2
+"""
+
+def token_ids(token: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Return ``(jti, family)`` for a decoded refresh token.
+
+    Tokens issued before JTIs existed fall back to a digest of the token, so
+    Redis keys stay short and old sessions keep working until they rotate.
+    """
+    jti = payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()[:32]
+    return jti, payload.get("fam") or jti
+
+class NegativeCache:
+    """Bounded, expiring set of keys known to be rejected."""
+
+    def __init__(self, max_size: int = REFRESH_NEGATIVE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+
+    def add(self, key: str, expires_at: float) -> None:
+        self._entries[key] = expires_at
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.time():
+            del self._entries[key]
+            return False
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+class RefreshTokenStore:
+    """Redeem refresh tokens exactly once and revoke leaked token families."""
+
+    def __init__(
+        self,
+        redis_client: Any = None,
+        family_ttl: int = DEFAULT_FAMILY_TTL,
+        grace_seconds: int = REFRESH_REUSE_GRACE_SECONDS,
+    ):
+        self.redis = redis_client
+        self.family_ttl = family_ttl
+        self.grace_seconds = grace_seconds
+        self.negative_cache = NegativeCache()
+        self._script = None
+
+    def _rotate_script(self):
+        if self._script is None:
+            self._script = self.redis.register_script(ROTATE_SCRIPT)
+        return self._script
+
+    async def redeem(self, token: str, payload: Dict[str, Any]) -> bool:
+        """
+        Mark a decoded refresh token as used.
+
+        Returns True if this is the token's first redemption and its family is
+        still valid; the caller may then issue a rotated token.
+        """
+        jti, family = token_ids(token, payload)
+        if f"jti:{jti}" in self.negative_cache or f"fam:{family}" in self.negative_cache:
+            logger.info("Refresh token rejected from negative cache")
+            return False
+
+        exp = float(payload.get("exp") or 0)
+        now = int(time.time())
+        ttl = max(1, int(exp) - now)
+
+        if self.redis is None:
+            logger.warning("Redis client not available, refresh token reuse detection disabled")
+            return True
+        try:
+            with time_redis("refresh_rotate"):
+                result = int(await self._rotate_script()(
+                    keys=[USED_KEY_PREFIX + jti, REVOKED_FAMILY_KEY_PREFIX + family],
+                    args=[now, ttl, self.family_ttl, self.grace_seconds],
+                ))
+        except Exception as e:
+            # Fail open like the rest of the Redis-backed auth features
+            logger.error(f"Refresh token store unavailable, skipping reuse detection: {str(e)}")
+            return True
+
+        if result == ROTATED:
+            # Duplicates inside the grace window are answered locally; later ones
+            # must reach Redis so the family gets revoked
+            self.negative_cache.add(f"jti:{jti}", now + self.grace_seconds)
+            return True
+        if result == CONCURRENT_REUSE:
+            logger.info(f"Refresh token {jti} redeemed concurrently; rejecting duplicate")
+            self.negative_cache.add(f"jti:{jti}", now + self.grace_seconds)
+            return False
+        if result == REUSE_DETECTED:
+            logger.warning(f"Refresh token reuse detected for {jti}; revoked token family {family}")
+        self.negative_cache.add(f"fam:{family}", now + self.family_ttl)
+        return False
+
+    async def revoke_family(self, family: str) -> None:
+        """Revoke every token rotated from the same login (e.g. on logout)."""
+        self.negative_cache.add(f"fam:{family}", time.time() + self.family_ttl)
+        if self.redis is None:
+            return
+        try:
+            with time_redis("set"):
+                await self.redis.set(REVOKED_FAMILY_KEY_PREFIX + family, "1", ex=self.family_ttl)
+        except Exception as e:
+            logger.error(f"Could not revoke refresh token family {family}: {str(e)}")
@@ -0,0 +1,286 @@
+"""
+Streaming export of a user's data.
+
+The export is produced section by section straight from MongoDB cursors:
+lists embedded in the user document are unwound server-side by an aggregation
+and arrive in batches, and notes come from a batched ``find``. The account is
+never materialised in memory, whatever its size.
+
+Goals come from the ``goals`` collection with their milestones joined back in,
+plus any goals still embedded in a user document that was never migrated.
+
+Formats:
+    - ``json``: one object with ``export_date``, ``user_info``,
+      ``preferences``, ``learning_data`` and ``notes``
+    - ``ndjson``: one ``{"section": ..., "data": ...}`` line per item
+
+Either can be gzip-compressed. Accounts with more than
+``USER_EXPORT_INLINE_LIMIT`` items are exported by a ``user_export`` job into
+``USER_EXPORT_DIR`` instead of inside the request.
+"""
+import os
+import time
+import zlib
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+
+import database
+from utils.jobs import JobContext, job_handler, JOB_RETENTION_HOURS
+from utils.ndjson import NDJSON_MEDIA_TYPE, encode_json, encode_line
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration
+USER_EXPORT_DIR = os.getenv("USER_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "learning_platform_exports"))
+USER_EXPORT_INLINE_LIMIT = int(os.getenv("USER_EXPORT_INLINE_LIMIT", "5000"))  # items; larger accounts use a job
+USER_EXPORT_BATCH_SIZE = int(os.getenv("USER_EXPORT_BATCH_SIZE", "500"))
+USER_EXPORT_PROGRESS_EVERY = int(os.getenv("USER_EXPORT_PROGRESS_EVERY", "1000"))  # items between progress reports
+
+EXPORT_FORMATS = ("json", "ndjson")
+EMBEDDED_LISTS = ["learning_paths", "concepts", "study_sessions", "review_sessions", "goals", "milestones"]
+USER_INFO_FIELDS = ["username", "email", "first_name", "last_name", "created_at"]
+CHUNK_SIZE = 64 * 1024
+
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+def user_key(user_id: Any) -> Any:
+    """The users ``_id`` for a user ID that may have been stringified."""
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        return ObjectId(user_id)
+    return user_id
+
+def _size(expression: Any) -> Dict[str, Any]:
+    return {"$cond": [{"$isArray": expression}, {"$size": expression}, 0]}
+
+async def count_export_items(db: Any, user_id: Any) -> int:
+    """Number of items an export of this user will contain, computed server-side."""
+    resources = {"$reduce": {
+        "input": {"$objectToArray": {"$ifNull": ["$resources", {}]}},
+        "initialValue": 0,
+        "in": {"$add": ["$$value", _size("$$this.v")]},
+    }}
+    pipeline = [
+        {"$match": {"_id": user_key(user_id)}},
+        {"$project": {"_id": 0, "items": {"$add": [resources] + [_size(f"${name}") for name in EMBEDDED_LISTS]}}},
+    ]
+    counts = await db.users.aggregate(pipeline).to_list(length=1)
+    embedded = counts[0]["items"] if counts else 0
+    notes = await db.notes.count_documents({"user_id": str(user_id)})
+    goals = await db.goals.count_documents({"user_id": str(user_id)})
+    return embedded + notes + goals
+
+async def _resource_types(db: Any, user_id: Any) -> List[str]:
+    pipeline = [
+        {"$match": {"_id": user_key(user_id)}},
+        {"$project": {"_id": 0, "types": {"$map": {
+            "input": {"$objectToArray": {"$ifNull": ["$resources", {}]}},
+            "in": "$$this.k",
+        }}}},
+    ]
+    docs = await db.users.aggregate(pipeline).to_list(length=1)
+    return docs[0]["types"] if docs else []
+
+async def _embedded_items(db: Any, user_id: Any, path: str) -> AsyncIterator[Any]:
+    cursor = db.users.aggregate([
+        {"$match": {"_id": user_key(user_id)}},
+        {"$project": {"_id": 0, "item": f"${path}"}},
+        {"$unwind": "$item"},
+    ], batchSize=USER_EXPORT_BATCH_SIZE)
+    async for doc in cursor:
+        yield doc["item"]
+
+async def _goal_items(db: Any, user_id: Any) -> AsyncIterator[Any]:
+    # Goals not yet migrated out of the user document, then the goals collection
+    # with each goal's milestones nested as they were when embedded
+    async for goal in _embedded_items(db, user_id, "goals"):
+        yield goal
+    cursor = db.goals.aggregate([
+        {"$match": {"user_id": str(user_id)}},
+        {"$lookup": {
+            "from": "milestones",
+            "localField": "id",
+            "foreignField": "goal_id",
+            "pipeline": [
+                {"$match": {"user_id": str(user_id)}},
+                {"$project": {"_id": 0, "user_id": 0, "goal_id": 0}},
+            ],
+            "as": "milestones",
+        }},
+        {"$project": {"_id": 0, "user_id": 0}},
+    ], batchSize=USER_EXPORT_BATCH_SIZE)
+    async for goal in cursor:
+        yield goal
+
+def _section_items(db: Any, user_id: Any, path: str) -> AsyncIterator[Any]:
+    return _goal_items(db, user_id) if path == "goals" else _embedded_items(db, user_id, path)
+
+async def _note_items(db: Any, user_id: Any) -> AsyncIterator[Dict[str, Any]]:
+    cursor = db.notes.find({"user_id": str(user_id)}, {"user_id": 0}).batch_size(USER_EXPORT_BATCH_SIZE)
+    async for note in cursor:
+        note["id"] = str(note.pop("_id"))
+        yield note
+
+async def _json_array(items: AsyncIterator[Any], counted: Callable[[], Awaitable[None]]) -> AsyncIterator[bytes]:
+    yield b"["
+    first = True
+    async for item in items:
+        yield (b"" if first else b",") + encode_json(item)
+        first = False
+        await counted()
+    yield b"]"
+
+async def iter_export(
+    db: Any,
+    user_id: Any,
+    export_format: str = "json",
+    progress: Optional[ProgressCallback] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield the export as small byte chunks.
+
+    ``progress`` is awaited with the running item count every
+    USER_EXPORT_PROGRESS_EVERY items and once at the end.
+    """
+    user = await db.users.find_one(
+        {"_id": user_key(user_id)},
+        {field: 1 for field in USER_INFO_FIELDS + ["notification_preferences"]}
+    )
+    if user is None:
+        raise ValueError("User not found")
+    user_info = {field: user.get(field) for field in USER_INFO_FIELDS}
+    preferences = user.get("notification_preferences", {})
+    export_date = datetime.now(timezone.utc)
+
+    sections = [(f"resources.{kind}", f"resources.{kind}") for kind in await _resource_types(db, user_id)]
+    sections += [(name, name) for name in EMBEDDED_LISTS]
+
+    written = 0
+
+    async def counted() -> None:
+        nonlocal written
+        written += 1
+        if progress is not None and written % USER_EXPORT_PROGRESS_EVERY == 0:
+            await progress(written)
+
+    if export_format == "ndjson":
+        yield encode_line({"section": "export", "data": {"export_date": export_date}})
+        yield encode_line({"section": "user_info", "data": user_info})
+        yield encode_line({"section": "preferences", "data": preferences})
+        for name, path in sections:
+            async for item in _section_items(db, user_id, path):
+                yield encode_line({"section": name, "data": item})
+                await counted()
+        async for note in _note_items(db, user_id):
+            yield encode_line({"section": "notes", "data": note})
+            await counted()
+    else:
+        yield (
+            b'{"export_date":' + encode_json(export_date)
+            + b',"user_info":' + encode_json(user_info)
+            + b',"preferences":' + encode_json(preferences)
+            + b',"learning_data":{"resources":{'
+        )
+        resource_sections = [s for s in sections if s[0].startswith("resources.")]
+        for i, (name, path) in enumerate(resource_sections):
+            yield (b"," if i else b"") + encode_json(name.split(".", 1)[1]) + b":"
+            async for chunk in _json_array(_embedded_items(db, user_id, path), counted):
+                yield chunk
+        yield b"}"
+        for name in EMBEDDED_LISTS:
+            yield b"," + encode_json(name) + b":"
+            async for chunk in _json_array(_section_items(db, user_id, name), counted):
+                yield chunk
+        yield b'},"notes":'
+        async for chunk in _json_array(_note_items(db, user_id), counted):
+            yield chunk
+        yield b"}"
+
+    if progress is not None:
+        await progress(written)
+
+async def _coalesce(chunks: AsyncIterator[bytes], size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def stream_export(
+    db: Any,
+    user_id: Any,
+    export_format: str = "json",
+    compress: bool = False,
+    progress: Optional[ProgressCallback] = None,
+) -> AsyncIterator[bytes]:
+    """The export as ~64 KiB chunks, gzip-compressed if ``compress``."""
+    chunks = _coalesce(iter_export(db, user_id, export_format, progress))
+    return _gzip(chunks) if compress else chunks
+
+def export_media_type(export_format: str, compress: bool) -> str:
+    if compress:
+        return "application/gzip"
+    return NDJSON_MEDIA_TYPE if export_format == "ndjson" else "application/json"
+
+def export_filename(username: str, export_format: str, compress: bool) -> str:
+    extension = export_format + (".gz" if compress else "")
+    return f'user_data_export_{username}_{datetime.now(timezone.utc).strftime("%Y%m%d")}.{extension}'
+
+def export_path(job_id: str) -> str:
+    """Where a ``user_export`` job writes its file."""
+    return os.path.join(USER_EXPORT_DIR, f"{job_id}.export")
+
+def prune_exports(max_age_seconds: float = JOB_RETENTION_HOURS * 3600) -> None:
+    """Delete export files older than the job retention period."""
+    try:
+        entries = os.scandir(USER_EXPORT_DIR)
+    except FileNotFoundError:
+        return
+    cutoff = time.time() - max_age_seconds
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError as e:
+                logger.warning(f"Could not remove old export {entry.path}: {str(e)}")
+
+@job_handler("user_export")
+async def run_export_job(context: JobContext) -> Dict[str, Any]:
+    """Write the export to USER_EXPORT_DIR; re-running starts the file over."""
+    export_format = context.params.get("format", "json")
+    compress = context.params.get("compress", False)
+    await asyncio.to_thread(prune_exports)
+    await asyncio.to_thread(os.makedirs, USER_EXPORT_DIR, exist_ok=True)
+
+    async def progress(items: int) -> None:
+        await context.report(items_written=items)
+
+    path = export_path(context.job_id)
+    partial = path + ".part"
+    with open(partial, "wb") as f:
+        async for chunk in stream_export(database.db, context.user_id, export_format, compress, progress):
+            await asyncio.to_thread(f.write, chunk)
+    os.replace(partial, path)
+
+    return {
+        "filename": export_filename(context.params.get("username", "user"), export_format, compress),
+        "media_type": export_media_type(export_format, compress),
+        "size": os.path.getsize(path),
+    }
@@ -133,7 +133,8 @@ const authApi = {
     try {
       // The apiClient call will automatically handle 401s and token refresh
       // via the configured interceptors.
-      const response = await apiClient.get<RawUserResponse>('/auth/me');
+      // Only the light profile shape is needed here; skip the learning-data lists
+      const response = await apiClient.get<RawUserResponse>('/auth/me', { params: { fields: 'profile' } });
       console.log("[authApi.getCurrentUser] Received raw data from /auth/me:", response.data);
 
       // Transform snake_case to camelCase
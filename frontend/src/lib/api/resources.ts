@@ -1,5 +1,5 @@
 import apiClient from './client'
-import { Resource, ResourceTypeString as ResourceType, ResourceCreateInput, ResourceUpdateInput, ResourceStats } from '@/types/resource'
+import { Resource, ResourceTypeString as ResourceType, ResourceCreateInput, ResourceUpdateInput, ResourceStats, LibraryResolveRequest, LibraryResolveResponse } from '@/types/resource'
 
 const resourcesApi = {
   // Get all resources
@@ -178,6 +178,17 @@ const resourcesApi = {
   getResource: async (type: ResourceType, id: string): Promise<Resource> => {
     return resourcesApi.getResourceById(type, id);
   },
+
+  // Resolve every library resource a learning path, roadmap or career path references in one request
+  async resolveLibraryResources(request: LibraryResolveRequest): Promise<LibraryResolveResponse> {
+    try {
+      const response = await apiClient.post<LibraryResolveResponse>('/api/resources/library/resolve', request);
+      return response.data;
+    } catch (error) {
+      console.error('Error resolving library resources:', error);
+      throw error;
+    }
+  },
 }
 
 export default resourcesApi
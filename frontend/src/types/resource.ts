@@ -132,4 +132,15 @@ export interface ResourceStats {
   by_topic?: Record<string, { total: number; completed: number }>;
   by_difficulty?: Record<DifficultyLevel, { total: number; completed: number }>;
   recent_completions?: Resource[];
-}
\ No newline at end of file
+}
+
+export interface LibraryResolveRequest {
+  resource_ids?: string[];
+  learning_path?: unknown;
+  career_path?: string;
+}
+
+export interface LibraryResolveResponse {
+  resources: Record<string, Resource>;
+  missing: string[];
+}